@@ -11,6 +11,11 @@ from typing import Dict, List, Optional, Any, Union
 from dataclasses import dataclass
 from enum import Enum
 
+try:
+    from ..request_deadline import DeadlineExceededError, check_deadline
+except (ImportError, ValueError):
+    from request_deadline import DeadlineExceededError, check_deadline
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -180,6 +185,9 @@ class BaseTeachingAgent(ABC):
                     error_code="INVALID_INPUT"
                 )
             
+            # 请求截止时间已过则不再处理
+            check_deadline(f"{self.agent_type.value}任务")
+            
             # 处理任务
             response = self.process_task(task)
             
@@ -198,6 +206,19 @@ class BaseTeachingAgent(ABC):
             
             return response
             
+        except DeadlineExceededError as e:
+            error_msg = f"任务执行超时: {str(e)}"
+            logger.warning(error_msg)
+            
+            task.error = error_msg
+            self.task_history.append(task)
+            
+            return AgentResponse(
+                success=False,
+                message=error_msg,
+                error_code="DEADLINE_EXCEEDED",
+                processing_time=time.time() - start_time
+            )
         except Exception as e:
             error_msg = f"任务执行失败: {str(e)}"
             logger.error(error_msg)
@@ -256,6 +277,7 @@ class BaseTeachingAgent(ABC):
         """
         if not self.llm_client:
             raise ValueError("LLM客户端未初始化")
+        check_deadline("LLM调用")
         
         # 合并配置参数
         llm_params = {
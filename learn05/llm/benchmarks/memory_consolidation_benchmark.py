@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+记忆整合基准测试
+
+对比改造前的两两比较（每次比较都重新切分两条记忆的正文）与MinHash-LSH候选+精确比较，
+并统计后台分段整合时单次持锁的最长时间。
+
+用法:
+    python benchmarks/memory_consolidation_benchmark.py [单个用户的记忆数]
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from llm.context.memory_store import MemoryImportance, MemoryStore, MemoryType
+
+PHRASES = [
+    '一元二次方程', '求根公式', '因式分解', '函数图像', '三角函数', '勾股定理', '牛顿第二定律',
+    '电磁感应', '欧姆定律', '化学方程式', '氧化还原反应', '光合作用', '呼吸作用', '细胞分裂',
+    '文言文翻译', '议论文写作', '现在完成时', '定语从句', '辛亥革命', '工业革命', '季风气候',
+    '板块运动', '概念混淆', '计算粗心', '审题不清', '掌握较好', '需要巩固', '课堂表现积极'
+]
+
+
+def make_vocabulary(rng: random.Random, size: int = 5000) -> list:
+    """学科短语加随机生成的2-4字词（取常用汉字区）"""
+    return PHRASES + [''.join(chr(rng.randint(0x4e00, 0x6fff)) for _ in range(rng.randint(2, 4)))
+                      for _ in range(size)]
+
+
+def build_store(count: int, duplicate_rate: float = 0.1, seed: int = 7) -> MemoryStore:
+    """单个用户的记忆，其中约duplicate_rate比例是已有记忆略加改动的近似重复"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    store = MemoryStore({'max_memories': count * 2, 'auto_decay': False})
+    contents = []
+    for _ in range(count):
+        if contents and rng.random() < duplicate_rate:
+            content = rng.choice(contents) + "，" + rng.choice(vocabulary)
+        else:
+            content = "，".join(rng.sample(vocabulary, 12)) + f"（第{rng.randint(1, 10 ** 6)}次记录）"
+        contents.append(content)
+        store.add_memory(content, MemoryType.EPISODIC, MemoryImportance.MEDIUM, user_id='student')
+    return store
+
+
+def legacy_similar_pairs(store: MemoryStore) -> int:
+    """改造前的两两比较（只统计相似对，不合并）"""
+    memories = list(store.memories.values())
+    similar = 0
+    for i, memory1 in enumerate(memories):
+        for memory2 in memories[i + 1:]:
+            content1 = memory1.content.lower()
+            content2 = memory2.content.lower()
+            common_words = set(content1.split()) & set(content2.split())
+            if len(common_words) / max(len(content1.split()), len(content2.split())) > 0.7:
+                similar += 1
+    return similar
+
+
+def main(count: int = 2000):
+    store = build_store(count)
+    start = time.perf_counter()
+    legacy_similar_pairs(store)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged = store.consolidate_memories('student')
+    lsh_seconds = time.perf_counter() - start
+    print(f"记忆数: {count}")
+    print(f"改造前两两比较: {legacy_seconds:.2f}s")
+    print(f"LSH整合: {lsh_seconds:.3f}s，合并{merged}条")
+
+    # 后台分段：每段最多consolidation_max_pause秒
+    store = build_store(count)
+    pauses = []
+    while store._consolidation_queue:
+        start = time.perf_counter()
+        store.consolidate_pending(max_seconds=store.consolidation_max_pause)
+        pauses.append(time.perf_counter() - start)
+    print(f"分段整合: {len(pauses)}段，单段最长持锁{max(pauses) * 1000:.1f}ms"
+          f"（上限{store.consolidation_max_pause * 1000:.0f}ms）")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
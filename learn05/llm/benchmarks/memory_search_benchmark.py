@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+记忆检索基准测试
+
+对比改造前的全量扫描（每条记忆每次查询都小写正文/标签/元数据并做子串匹配）
+与倒排索引+BM25，覆盖不带过滤、按用户过滤和按类型+标签过滤的查询。
+
+用法:
+    python benchmarks/memory_search_benchmark.py [记忆数]
+"""
+
+import itertools
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from llm.context.memory_store import MemoryImportance, MemoryStore, MemoryType
+
+SUBJECTS = ['数学', '物理', '化学', '生物', '语文', '英语', '历史', '地理']
+PHRASES = [
+    '一元二次方程', '求根公式', '因式分解', '函数图像', '三角函数', '勾股定理', '牛顿第二定律',
+    '电磁感应', '欧姆定律', '化学方程式', '氧化还原反应', '光合作用', '呼吸作用', '细胞分裂',
+    '文言文翻译', '议论文写作', '现在完成时', '定语从句', '辛亥革命', '工业革命', '季风气候',
+    '板块运动', '错题', '概念混淆', '计算粗心', '审题不清', '掌握较好', '需要巩固', '课堂表现积极',
+    '作业按时完成', '考试焦虑', '学习计划', '复习方法', 'quadratic', 'photosynthesis', 'grammar'
+]
+QUERIES = ['光合作用', '一元二次方程求根', '欧姆定律 错题', '定语从句', '考试焦虑', 'photosynthesis']
+
+
+def make_vocabulary(rng: random.Random, size: int = 20000) -> list:
+    """随机生成2-4字的词（取常用汉字区），与学科短语混合后按Zipf分布抽取"""
+    words = [''.join(chr(rng.randint(0x4e00, 0x6fff)) for _ in range(rng.randint(2, 4)))
+             for _ in range(size)]
+    vocabulary = PHRASES + words
+    rng.shuffle(vocabulary)
+    return vocabulary
+
+
+def build_store(count: int, users: int = 1000, seed: int = 7) -> MemoryStore:
+    rng = random.Random(seed)
+    store = MemoryStore({'max_memories': count + 1, 'auto_decay': False})
+    types = list(MemoryType)
+    importances = list(MemoryImportance)
+    vocabulary = make_vocabulary(rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for index in range(count):
+        subject = rng.choice(SUBJECTS)
+        content = f"学生在{subject}学习中，" + "，".join(rng.choices(vocabulary, cum_weights=cum_weights, k=12)) + "。"
+        store.add_memory(content, rng.choice(types), rng.choice(importances),
+                         user_id=f"user-{index % users}", tags=[subject],
+                         metadata={'subject': subject, 'source': '课堂记录'})
+    return store
+
+
+def legacy_search(store: MemoryStore, query: str, memory_type=None, user_id=None, tags=None, limit=10):
+    """改造前的search_memories（不含access副作用）"""
+    if user_id:
+        search_ids = store.user_memories.get(user_id, [])
+    elif memory_type:
+        search_ids = store.type_index.get(memory_type, [])
+    else:
+        search_ids = list(store.memories.keys())
+
+    candidates = []
+    for memory_id in search_ids:
+        memory = store.memories.get(memory_id)
+        if not memory:
+            continue
+        if memory_type and memory.memory_type != memory_type:
+            continue
+        if tags and not any(tag in memory.tags for tag in tags):
+            continue
+        score = memory.get_relevance_score(query)
+        if score > 0:
+            candidates.append((memory, score))
+    candidates.sort(key=lambda x: x[1], reverse=True)
+    return candidates[:limit]
+
+
+def timed(function, repeat: int) -> float:
+    """平均每次调用耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(count: int = 100000):
+    start = time.perf_counter()
+    store = build_store(count)
+    build_seconds = time.perf_counter() - start
+    print(f"记忆数: {count}  建库+索引耗时: {build_seconds:.1f}s  "
+          f"词表大小: {store.search_index.vocabulary_size}")
+
+    cases = [
+        ("不过滤", {}),
+        ("按用户", {'user_id': 'user-42'}),
+        ("类型+标签", {'memory_type': MemoryType.SEMANTIC, 'tags': ['物理']}),
+    ]
+    print(f"{'查询':<12}{'过滤':<10}{'改造前(ms)':>12}{'改造后(ms)':>12}{'加速':>8}")
+    for query in QUERIES:
+        for name, filters in cases:
+            repeat = 3 if not filters else 20
+            before = timed(lambda: legacy_search(store, query, **filters), repeat)
+            after = timed(lambda: store.search_memories(query, **filters), repeat)
+            print(f"{query:<12}{name:<10}{before:>12.2f}{after:>12.2f}{before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
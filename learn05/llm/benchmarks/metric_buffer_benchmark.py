@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+MetricCollector指标存储基准测试
+
+对比改造前的deque（每次查询复制并用列表推导过滤，清理时重建）与列式环形缓冲区，
+覆盖写入、仪表盘式查询（最近60秒的某个指标）和按保留期清理。
+
+用法:
+    python benchmarks/metric_buffer_benchmark.py [样本数]
+"""
+
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from llm.optimization.performance_monitor import MetricRingBuffer, MetricType, PerformanceMetric
+
+METRIC_NAMES = [f"metric_{index}" for index in range(20)]
+
+
+class LegacyMetricStore:
+    """改造前的存储方式"""
+
+    def __init__(self, capacity: int):
+        self._metrics = deque(maxlen=capacity)
+
+    def append(self, metric):
+        self._metrics.append(metric)
+
+    def query(self, start_time=None, end_time=None, metric_names=None):
+        metrics = list(self._metrics)
+        if start_time:
+            metrics = [m for m in metrics if m.timestamp >= start_time]
+        if end_time:
+            metrics = [m for m in metrics if m.timestamp <= end_time]
+        if metric_names:
+            metrics = [m for m in metrics if m.name in metric_names]
+        return metrics
+
+    def drop_before(self, cutoff_time):
+        filtered = [m for m in list(self._metrics) if m.timestamp >= cutoff_time]
+        self._metrics.clear()
+        self._metrics.extend(filtered)
+
+
+def build_samples(count: int, start: datetime):
+    """每毫秒一个样本，20个指标名轮流出现"""
+    return [
+        PerformanceMetric(
+            name=METRIC_NAMES[index % len(METRIC_NAMES)],
+            metric_type=MetricType.GAUGE,
+            value=index * 0.5,
+            timestamp=start + timedelta(milliseconds=index),
+            labels={'endpoint': f"/api/{index % 5}", 'method': 'GET'}
+        )
+        for index in range(count)
+    ]
+
+
+def run(store, samples, queries: int):
+    """返回(写入耗时, 单次查询耗时, 清理耗时, 最后一次查询结果数)"""
+    start = time.perf_counter()
+    for metric in samples:
+        store.append(metric)
+    insert_time = time.perf_counter() - start
+
+    end_time = samples[-1].timestamp
+    start = time.perf_counter()
+    for _ in range(queries):
+        result = store.query(start_time=end_time - timedelta(seconds=60), metric_names=['metric_3'])
+    query_time = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    store.drop_before(end_time - timedelta(seconds=600))
+    drop_time = time.perf_counter() - start
+
+    return insert_time, query_time, drop_time, len(result)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    samples = build_samples(count, datetime(2024, 1, 1))
+
+    rows = [
+        ('deque', run(LegacyMetricStore(count), samples, queries=5)),
+        ('ring buffer', run(MetricRingBuffer(count), samples, queries=50)),
+    ]
+
+    print(f"样本数: {count}  查询: 最近60秒的单个指标")
+    print(f"{'存储':<14}{'写入(秒)':>12}{'查询(毫秒)':>14}{'清理(毫秒)':>14}{'结果数':>10}")
+    for name, (insert_time, query_time, drop_time, result_count) in rows:
+        print(f"{name:<14}{insert_time:>12.2f}{query_time * 1000:>14.2f}{drop_time * 1000:>14.2f}{result_count:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+提示词压缩基准测试
+
+在记录的会话上对比改造前的按消息重要性整条丢弃与不同压缩比的抽取式压缩，
+报告节省的token和回答质量的代理指标：
+- 答案支撑词召回：会话最后一条助手回答中、在原提示里出现过的词，压缩后仍然出现的比例
+- 显著词召回：历史消息TF-IDF最高的20个词在压缩后仍然出现的比例
+- 数字公式保留：历史消息中的数字和算式在压缩后仍然出现的比例
+
+会话文件为ContextManager.save_contexts_to_file导出的JSON；不指定时使用生成的辅导会话。
+
+用法:
+    python benchmarks/prompt_compression_benchmark.py [会话导出文件.json]
+"""
+
+import json
+import math
+import random
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from llm.context.context_manager import ConversationContext, Message, MessageRole
+from llm.context.context_strategies import SemanticCompressionStrategy, StrategyConfig
+from llm.context.text_index import tokenize
+
+_NUMBER_PATTERN = re.compile(r'[0-9a-zA-Z^+\-*/=().]*[0-9][0-9a-zA-Z^+\-*/=().]*')
+
+# 讲解模板，{a}/{b}/{c}每次随机取值，同一会话内的讲解内容各不相同
+TOPICS = {
+    '一元二次方程': [
+        '一元二次方程的一般形式是ax^2+bx+c=0，其中a不等于0。',
+        '方程x^2-{s}x+{p}=0的判别式是{d}，所以有两个不相等的实数根。',
+        '求根公式是x=(-b±√Δ)/(2a)，代入a=1、b=-{s}、c={p}就能算出来。',
+        '方程x^2-{s}x+{p}=0可以因式分解为(x-{a})(x-{b})=0，所以x={a}或x={b}。',
+        '两根之和等于-b/a，这里是{s}；两根之积等于c/a，这里是{p}。',
+        '第{c}题要先检查二次项系数是不是0，不是0才能用求根公式。',
+    ],
+    '光合作用': [
+        '光合作用发生在叶绿体中，需要光照、二氧化碳和水。',
+        '光反应在类囊体薄膜上进行，产生ATP和NADPH并释放氧气。',
+        '暗反应在叶绿体基质中进行，把二氧化碳固定成三碳化合物。',
+        '光照强度从0增加到{a}00勒克斯时，光合速率逐渐上升，超过{b}000勒克斯后趋于饱和。',
+        '光合作用的总反应式是6CO2+6H2O→C6H12O6+6O2。',
+        '第{c}组实验中温度升到{p}摄氏度以后，酶的活性下降，光合速率也随之下降。',
+    ],
+    '欧姆定律': [
+        '欧姆定律说明导体中的电流与电压成正比、与电阻成反比，即I=U/R。',
+        '电阻为{a}0欧的导体两端加{b}伏电压时，电流是{b}/{a}0安。',
+        '串联电路中总电阻等于各电阻之和，{a}欧和{b}欧串联后是{s}欧。',
+        '并联电路中总电阻的倒数等于各电阻倒数之和，所以并联后总电阻比{a}欧还小。',
+        '实验时要用滑动变阻器改变电压，第{c}次测量时电压表读数是{b}伏。',
+        '如果电流表示数为0而电压表有示数，可能是与电压表并联的{a}号电阻断路。',
+    ],
+}
+
+
+def fill(template: str, rng: random.Random) -> str:
+    a, b = rng.randint(1, 9), rng.randint(1, 9)
+    return template.format(a=a, b=b, s=a + b, p=a * b, d=(a - b) ** 2, c=rng.randint(1, 30))
+
+
+FILLERS = [
+    '好的，我明白了。', '嗯嗯，谢谢老师！', '你还有哪里不清楚吗？', '我们继续往下看。',
+    '这一点很多同学都会弄错，要注意。', '没关系，我们再来一遍。', '可以再讲一遍吗？我还是有点糊涂。',
+]
+
+
+def generate_sessions(count: int = 30, turns: int = 24, seed: int = 11) -> list:
+    """生成辅导会话：讲解中夹杂重复提问和寒暄，最后一轮回答总结前面讲过的要点"""
+    rng = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        topic = rng.choice(list(TOPICS))
+        facts = TOPICS[topic]
+        messages = [Message(MessageRole.SYSTEM, f'你是耐心的中学辅导老师，当前主题是{topic}。')]
+        question = f'老师，{topic}这部分我不太懂，能讲讲吗？'
+        for _ in range(turns):
+            if rng.random() < 0.3:
+                question = rng.choice([question, f'能再讲讲{topic}吗？', rng.choice(FILLERS)])
+            else:
+                question = f'{fill(rng.choice(facts), rng)[:10]}这里是什么意思？'
+            messages.append(Message(MessageRole.USER, question))
+            answer = ''.join(fill(fact, rng) for fact in rng.sample(facts, 2)) + rng.choice(FILLERS)
+            messages.append(Message(MessageRole.ASSISTANT, answer))
+        messages.append(Message(MessageRole.USER, f'请帮我总结一下{topic}的要点。'))
+        # 总结复述前面讲过的三句
+        explained = [sentence for msg in messages if msg.role == MessageRole.ASSISTANT
+                     for sentence in re.findall(r'[^。！？]+[。！？]', msg.content) if sentence not in FILLERS]
+        messages.append(Message(MessageRole.ASSISTANT, '总结：' + ''.join(rng.sample(explained, 3))))
+        sessions.append(messages)
+    return sessions
+
+
+def load_sessions(file_path: str) -> list:
+    """读取save_contexts_to_file导出的会话（只取以助手回答结尾的会话）"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    sessions = []
+    for context_data in data.get('contexts', {}).values():
+        messages = ConversationContext.from_dict(context_data).messages
+        if len(messages) >= 4 and messages[-1].role == MessageRole.ASSISTANT:
+            sessions.append(messages)
+    return sessions
+
+
+def recall(reference: set, text: str) -> float:
+    """reference中的词在text中出现的比例"""
+    if not reference:
+        return 1.0
+    return len(reference & set(tokenize(text))) / len(reference)
+
+
+def evaluate(name: str, strategy: SemanticCompressionStrategy, sessions: list, idf: dict):
+    tokens_before = tokens_after = 0
+    answer_recalls, salient_recalls, number_recalls = [], [], []
+    start = time.perf_counter()
+    outputs = [strategy.apply(session[:-1]) for session in sessions]
+    elapsed = time.perf_counter() - start
+
+    for session, output in zip(sessions, outputs):
+        prompt, answer = session[:-1], session[-1].content
+        original = ''.join(msg.content for msg in prompt)
+        compressed = ''.join(msg.content for msg in output)
+        tokens_before += strategy.total_tokens(prompt)
+        tokens_after += sum(strategy.message_tokens(msg) for msg in output)
+
+        answer_recalls.append(recall(set(tokenize(answer)) & set(tokenize(original)), compressed))
+        history_terms = Counter(term for msg in prompt if msg.role != MessageRole.SYSTEM
+                                for term in tokenize(msg.content))
+        salient = sorted(history_terms, key=lambda term: history_terms[term] * idf.get(term, 0.0), reverse=True)
+        salient_recalls.append(recall(set(salient[:20]), compressed))
+        numbers = set(_NUMBER_PATTERN.findall(original))
+        number_recalls.append(sum(1 for item in numbers if item in compressed) / len(numbers) if numbers else 1.0)
+
+    mean = lambda values: sum(values) / len(values)
+    saved = 1 - tokens_after / tokens_before if tokens_before else 0.0
+    print(f"{name:<16}{tokens_before:>10}{tokens_after:>10}{saved:>9.1%}"
+          f"{mean(answer_recalls):>10.3f}{mean(salient_recalls):>10.3f}{mean(number_recalls):>10.3f}"
+          f"{elapsed / len(sessions) * 1000:>10.2f}")
+
+
+def main(file_path: str = None):
+    sessions = load_sessions(file_path) if file_path else generate_sessions()
+    if not sessions:
+        print("没有可用的会话")
+        return
+
+    # 各会话作为文档计算IDF，用于挑选显著词
+    document_frequency = Counter(term for session in sessions
+                                 for term in {term for msg in session for term in tokenize(msg.content)})
+    idf = {term: math.log(1 + len(sessions) / df) for term, df in document_frequency.items()}
+
+    # max_tokens=0让每个会话都进入压缩，最近4条消息原样保留
+    config = StrategyConfig(max_tokens=0, preserve_recent=4)
+    cases = [('整条丢弃(0.7)', SemanticCompressionStrategy(0.7, extractive=False, config=config))]
+    cases.extend((f'抽取式({ratio})', SemanticCompressionStrategy(ratio, config=config)) for ratio in (0.7, 0.5, 0.3))
+
+    print(f"会话数: {len(sessions)}")
+    print(f"{'方法':<16}{'原token':>10}{'压缩后':>10}{'节省':>9}{'答案支撑':>10}{'显著词':>10}{'数字公式':>10}{'ms/会话':>10}")
+    for name, strategy in cases:
+        evaluate(name, strategy, sessions, idf)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
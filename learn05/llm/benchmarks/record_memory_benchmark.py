@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+缓存/记忆/会话记录的内存占用基准测试
+
+对比改造前的dataclass + datetime布局与现在的__slots__ + 单调时间戳布局，
+输出每条记录的平均字节数（tracemalloc统计，值对象在两种布局间共享，不计入）。
+
+用法:
+    python benchmarks/record_memory_benchmark.py [记录数]
+"""
+
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from llm.optimization.cache_manager import CacheItem
+from llm.context.memory_store import MemoryItem, MemoryType, MemoryImportance
+from llm.context.session_manager import SessionInfo, SessionStatus, UserRole
+
+
+@dataclass
+class LegacyCacheItem:
+    """改造前的缓存项布局"""
+    key: str
+    value: Any
+    created_at: datetime
+    accessed_at: datetime
+    access_count: int = 0
+    ttl_seconds: Optional[int] = None
+    size_bytes: int = 0
+
+
+@dataclass
+class LegacyMemoryItem:
+    """改造前的记忆项布局"""
+    memory_id: str
+    content: str
+    memory_type: MemoryType
+    importance: MemoryImportance
+    created_at: datetime = field(default_factory=datetime.now)
+    last_accessed: datetime = field(default_factory=datetime.now)
+    access_count: int = 0
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    tags: List[str] = field(default_factory=list)
+    related_memories: List[str] = field(default_factory=list)
+    decay_rate: float = 0.1
+    strength: float = 1.0
+
+
+@dataclass
+class LegacySessionInfo:
+    """改造前的会话信息布局"""
+    session_id: str
+    user_id: str
+    user_role: UserRole
+    status: SessionStatus = SessionStatus.ACTIVE
+    created_at: datetime = field(default_factory=datetime.now)
+    last_activity: datetime = field(default_factory=datetime.now)
+    expires_at: Optional[datetime] = None
+    user_info: Dict[str, Any] = field(default_factory=dict)
+    session_data: Dict[str, Any] = field(default_factory=dict)
+    context_types: Set[str] = field(default_factory=set)
+    activity_count: int = 0
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+
+
+def measure(factory: Callable[[int], Any], count: int) -> float:
+    """创建count条记录，返回每条记录的平均字节数"""
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    records = [factory(index) for index in range(count)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # 扣除保存记录的列表本身
+    return (end - start - sys.getsizeof(records)) / count
+
+
+def main(count: int = 100000):
+    keys = [f"key-{index}" for index in range(count)]
+    value = "缓存的LLM响应片段"
+    now = datetime.now()
+
+    cases = [
+        ("CacheItem",
+         lambda i: LegacyCacheItem(keys[i], value, datetime.now(), datetime.now(), ttl_seconds=3600, size_bytes=64),
+         lambda i: CacheItem(keys[i], value, ttl_seconds=3600, size_bytes=64)),
+        ("MemoryItem",
+         lambda i: LegacyMemoryItem(keys[i], value, MemoryType.SEMANTIC, MemoryImportance.MEDIUM),
+         lambda i: MemoryItem(keys[i], value, MemoryType.SEMANTIC, MemoryImportance.MEDIUM)),
+        ("SessionInfo",
+         lambda i: LegacySessionInfo(keys[i], keys[i], UserRole.STUDENT, expires_at=now),
+         lambda i: SessionInfo(keys[i], keys[i], UserRole.STUDENT, expires_at=now)),
+    ]
+
+    print(f"记录数: {count}")
+    print(f"{'类型':<12}{'改造前(字节/条)':>18}{'改造后(字节/条)':>18}{'节省':>10}")
+    for name, legacy_factory, compact_factory in cases:
+        before = measure(legacy_factory, count)
+        after = measure(compact_factory, count)
+        print(f"{name:<12}{before:>18.1f}{after:>18.1f}{1 - after / before:>10.1%}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+流式直方图组件
+对数分桶的延迟直方图，O(1)记录、内存有上限，供各监控模块计算p50/p90/p99等分位数
+"""
+
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+# 默认分位数
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class LogHistogram:
+    """对数分桶直方图（HDR风格）
+
+    第i个桶覆盖(gamma^(i-1), gamma^i]，gamma = (1+a)/(1-a)，取桶的代表值时相对误差不超过a。
+    桶以字典稀疏存储，数量不超过log_gamma(max_value/min_value)，与样本数无关。
+    小于min_value的值计入最小的桶，大于max_value的值计入最大的桶；min/max/sum精确记录。
+    """
+
+    __slots__ = ('relative_accuracy', 'min_value', 'max_value', '_log_gamma',
+                 '_min_index', '_max_index', 'buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-4,
+                 max_value: float = 1e5):
+        """
+        Args:
+            relative_accuracy: 分位数的相对误差上限
+            min_value: 可区分的最小值（以秒计时默认0.1ms）
+            max_value: 可区分的最大值
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy必须在0和1之间")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self._min_index = self._index(min_value)
+        self._max_index = self._index(max_value)
+
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def record(self, value: float, count: int = 1):
+        """记录一个值"""
+        if value > self.min_value:
+            index = min(self._index(value), self._max_index)
+        else:
+            index = self._min_index
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LogHistogram'):
+        """合并另一个参数相同的直方图"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def clear(self):
+        """清空"""
+        self.buckets.clear()
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def mean(self) -> float:
+        """平均值"""
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """估算分位数（0 <= q <= 1），空直方图返回0"""
+        return self.quantiles((q,))[q]
+
+    def quantiles(self, qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[float, float]:
+        """一次遍历估算多个分位数"""
+        qs = sorted(qs)
+        if not self.count:
+            return {q: 0.0 for q in qs}
+
+        result = {}
+        ranks = [(q, max(1, math.ceil(q * self.count))) for q in qs]
+        position = 0
+        cumulative = 0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            while position < len(ranks) and cumulative >= ranks[position][1]:
+                q = ranks[position][0]
+                # 桶代表值与真实值的相对误差不超过relative_accuracy，再限制在实际最小/最大值之间
+                value = 2 * math.exp(index * self._log_gamma) / (1 + math.exp(self._log_gamma))
+                result[q] = min(max(value, self.min), self.max)
+                position += 1
+        return result
+
+    def summary(self, qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        """统计摘要：count/mean/min/max及p50、p90、p95、p99"""
+        summary = {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min if self.count else 0.0,
+            'max': self.max if self.count else 0.0
+        }
+        for q, value in self.quantiles(qs).items():
+            summary[f"p{q * 100:g}"] = value
+        return summary
+
+    def copy(self) -> 'LogHistogram':
+        """复制一份"""
+        histogram = LogHistogram(self.relative_accuracy, self.min_value, self.max_value)
+        histogram.merge(self)
+        return histogram
+
+
+class WindowedHistogram:
+    """带滑动时间窗口的直方图
+
+    同时维护全量直方图和按slot_seconds切分的子直方图环（覆盖window_seconds），
+    查询最近N秒时合并对应的子直方图，窗口精度为一个子直方图的时长。
+    """
+
+    def __init__(self, window_seconds: float = 3600, slot_seconds: float = 10,
+                 relative_accuracy: float = 0.01, min_value: float = 1e-4,
+                 max_value: float = 1e5):
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self._histogram_args = (relative_accuracy, min_value, max_value)
+        self._slot_count = max(1, math.ceil(window_seconds / slot_seconds))
+        # 每个槽位为[所属时间片编号, 子直方图]
+        self._slots = [[None, LogHistogram(*self._histogram_args)] for _ in range(self._slot_count)]
+        self.total = LogHistogram(*self._histogram_args)
+        self._lock = threading.Lock()
+
+    def record(self, value: float, now: Optional[float] = None):
+        """记录一个值"""
+        epoch = int((time.time() if now is None else now) // self.slot_seconds)
+        with self._lock:
+            slot = self._slots[epoch % self._slot_count]
+            if slot[0] != epoch:
+                slot[0] = epoch
+                slot[1].clear()
+            slot[1].record(value)
+            self.total.record(value)
+
+    def snapshot(self, window_seconds: Optional[float] = None,
+                 now: Optional[float] = None) -> LogHistogram:
+        """获取最近window_seconds秒（None表示全量）的直方图副本
+
+        超过window_seconds的窗口按可保留的最长窗口计算。
+        """
+        with self._lock:
+            if window_seconds is None:
+                return self.total.copy()
+
+            epoch = int((time.time() if now is None else now) // self.slot_seconds)
+            slots = min(self._slot_count, max(1, math.ceil(window_seconds / self.slot_seconds)))
+            oldest = epoch - slots + 1
+            histogram = LogHistogram(*self._histogram_args)
+            for slot_epoch, slot_histogram in self._slots:
+                if slot_epoch is not None and oldest <= slot_epoch <= epoch:
+                    histogram.merge(slot_histogram)
+            return histogram
+
+    def summary(self, window_seconds: Optional[float] = None,
+                qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        """窗口内的统计摘要"""
+        return self.snapshot(window_seconds).summary(qs)
+
+    def clear(self):
+        """清空"""
+        with self._lock:
+            for slot in self._slots:
+                slot[0] = None
+                slot[1].clear()
+            self.total.clear()
+
+
+def merge_histograms(histograms: Iterable[LogHistogram]) -> Optional[LogHistogram]:
+    """合并多个直方图，输入为空时返回None"""
+    merged = None
+    for histogram in histograms:
+        if merged is None:
+            merged = histogram.copy()
+        else:
+            merged.merge(histogram)
+    return merged
@@ -0,0 +1,572 @@
+# -*- coding: utf-8 -*-
+"""
+指标注册表组件
+进程内统一的计数器、仪表和直方图，按Prometheus文本格式（0.0.4）导出，供/metrics端点抓取。
+标签字符串在子指标创建时渲染一次，抓取时只格式化数值。
+
+全局注册表是模块级单例，包外以llm.components.metrics_registry导入，与包内的相对导入是同一份。
+"""
+
+import atexit
+import bisect
+import logging
+import math
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 抓取响应的Content-Type
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认直方图桶（秒），覆盖数据库查询到LLM长请求
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labelnames: Sequence[str], labelvalues: Sequence) -> str:
+    """渲染标签，如 {a="x",b="y"}，无标签时返回空串"""
+    if not labelnames:
+        return ""
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    """按文本格式渲染数值"""
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_family(name: str, metric_type: str, documentation: str,
+                  samples: Iterable[Tuple[Dict[str, str], float]]) -> str:
+    """渲染一组由外部统计结果临时生成的样本（用于抓取时回调）"""
+    lines = [f"# HELP {name} {_escape_help(documentation)}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(list(labels), list(labels.values()))} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _Child:
+    """子指标：数值存放在_values中（本进程列表，或启用共享后为共享内存单元格）"""
+
+    __slots__ = ('_lock', '_values', 'shared')
+
+    size = 1
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self._values = [0.0] * self.size
+        self.shared = False
+
+    def _bind(self, cells):
+        """改为写入cells（None表示恢复为本进程列表），保留已有数值；调用方需持有指标锁"""
+        if cells is None:
+            self._values = list(self._values)
+            self.shared = False
+        else:
+            for index, value in enumerate(self._values):
+                cells[index] = value
+            self._values = cells
+            self.shared = True
+
+    def _reset(self):
+        self._values = [0.0] * self.size
+        self.shared = False
+
+
+class _CounterChild(_Child):
+    __slots__ = ('_prefix',)
+
+    def __init__(self, prefix: str, lock: threading.Lock):
+        super().__init__(lock)
+        self._prefix = prefix
+
+    @property
+    def value(self) -> float:
+        return self._values[0]
+
+    def inc(self, amount: float = 1):
+        """增加计数（不能为负）"""
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        with self._lock:
+            self._values[0] += amount
+
+    def _render(self, lines: List[str], values: Optional[List[float]] = None):
+        lines.append(f"{self._prefix} {format_value((values or self._values)[0])}")
+
+
+class _GaugeChild(_Child):
+    __slots__ = ('_prefix', '_function')
+
+    def __init__(self, prefix: str, lock: threading.Lock):
+        super().__init__(lock)
+        self._prefix = prefix
+        self._function = None
+
+    @property
+    def value(self) -> float:
+        return self._values[0]
+
+    def set(self, value: float):
+        """设置当前值"""
+        with self._lock:
+            self._values[0] = value
+
+    def inc(self, amount: float = 1):
+        """增加"""
+        with self._lock:
+            self._values[0] += amount
+
+    def dec(self, amount: float = 1):
+        """减少"""
+        with self._lock:
+            self._values[0] -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """抓取时调用function取值（只反映本进程，不参与多进程汇总）"""
+        self._function = function
+
+    def _render(self, lines: List[str], values: Optional[List[float]] = None):
+        value = (values or self._values)[0]
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                logger.warning(f"仪表取值失败 {self._prefix}: {e}")
+                return
+        lines.append(f"{self._prefix} {format_value(value)}")
+
+
+class _HistogramChild(_Child):
+    # 数值布局：各桶非累计计数（最后一个为+Inf）、总和、样本数
+    __slots__ = ('_upper_bounds', '_bucket_prefixes', '_sum_prefix', '_count_prefix', 'size')
+
+    def __init__(self, name: str, labels: str, upper_bounds: Tuple[float, ...], lock: threading.Lock):
+        self.size = len(upper_bounds) + 2
+        super().__init__(lock)
+        self._upper_bounds = upper_bounds
+        # 桶的le标签拼在已有标签之后
+        inner = labels[1:-1] + "," if labels else ""
+        self._bucket_prefixes = [f'{name}_bucket{{{inner}le="{format_value(bound)}"}}'
+                                 for bound in upper_bounds]
+        self._sum_prefix = f"{name}_sum{labels}"
+        self._count_prefix = f"{name}_count{labels}"
+
+    @property
+    def bucket_counts(self) -> List[int]:
+        return [int(count) for count in self._values[:-2]]
+
+    @property
+    def sum(self) -> float:
+        return self._values[-2]
+
+    @property
+    def count(self) -> int:
+        return int(self._values[-1])
+
+    def observe(self, value: float):
+        """记录一个观测值"""
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            values = self._values
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def _render(self, lines: List[str], values: Optional[List[float]] = None):
+        if values is None:
+            with self._lock:
+                values = list(self._values)
+        cumulative = 0
+        for prefix, bucket_count in zip(self._bucket_prefixes, values):
+            cumulative += bucket_count
+            lines.append(f"{prefix} {format_value(cumulative)}")
+        lines.append(f"{self._sum_prefix} {format_value(values[-2])}")
+        lines.append(f"{self._count_prefix} {format_value(values[-1])}")
+
+
+class _Metric:
+    """指标基类：按标签值缓存子指标"""
+
+    metric_type = ""
+    kind = 0
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._header = f"# HELP {name} {_escape_help(documentation)}\n# TYPE {name} {self.metric_type}"
+        self._lock = threading.Lock()
+        self._children: Dict[tuple, _Child] = {}
+        # 只用于渲染其他进程独有序列的子指标
+        self._render_children: Dict[tuple, _Child] = {}
+        self._segment = None
+        # 无标签指标直接作为自身的子指标使用
+        self._default = None if self.labelnames else self._create_child(())
+
+    def _new_child(self, labelvalues: tuple) -> _Child:
+        raise NotImplementedError
+
+    def _create_child(self, labelvalues: tuple) -> _Child:
+        child = self._new_child(labelvalues)
+        if self._segment is not None:
+            self._share_child(labelvalues, child)
+        return child
+
+    def _share_child(self, labelvalues: tuple, child: _Child):
+        cells = self._segment.allocate(self.name, labelvalues, self.kind, child.size)
+        if cells is not None:
+            child._bind(cells)
+
+    def _all_children(self):
+        if self._default is not None:
+            yield (), self._default
+        yield from list(self._children.items())
+
+    def _attach_segment(self, segment):
+        """启用共享：已有子指标迁移到共享单元格（segment为None时迁回本进程）"""
+        with self._lock:
+            self._segment = segment
+            for labelvalues, child in self._all_children():
+                if segment is None:
+                    child._bind(None)
+                else:
+                    self._share_child(labelvalues, child)
+
+    def labels(self, *labelvalues, **labelkwargs):
+        """按标签值获取子指标（首次调用时创建并渲染标签字符串）"""
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self.labelnames)
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"指标{self.name}需要标签{self.labelnames}")
+            labelvalues = tuple(str(value) for value in labelvalues)
+            with self._lock:
+                child = self._children.get(labelvalues)
+                if child is None:
+                    child = self._create_child(labelvalues)
+                    self._children[labelvalues] = child
+        return child
+
+    def collect_values(self, shared: Optional[Dict[tuple, List[float]]] = None) -> Dict[tuple, List[float]]:
+        """各标签值的数值（shared为共享段汇总结果时合并本进程未共享的序列）"""
+        result = {labelvalues: list(values) for labelvalues, values in (shared or {}).items()}
+        for labelvalues, child in self._all_children():
+            if shared is None or not child.shared:
+                values = list(child._values)
+                current = result.get(labelvalues)
+                if current is None:
+                    result[labelvalues] = values
+                else:
+                    for index, value in enumerate(values):
+                        current[index] += value
+        return result
+
+    def _render(self, lines: List[str], shared: Optional[Dict[tuple, List[float]]] = None):
+        lines.append(self._header)
+        if shared is None:
+            for _, child in self._all_children():
+                child._render(lines)
+            return
+
+        for labelvalues, values in self.collect_values(shared).items():
+            child = self._default if labelvalues == () and self._default is not None \
+                else self._children.get(labelvalues)
+            if child is None:
+                child = self._render_children.get(labelvalues)
+                if child is None:
+                    child = self._render_children[labelvalues] = self._new_child(labelvalues)
+            child._render(lines, values)
+
+
+class Counter(_Metric):
+    """计数器（只增不减，名称建议以_total结尾）"""
+
+    metric_type = "counter"
+    kind = 0
+
+    def _new_child(self, labelvalues: tuple) -> _CounterChild:
+        return _CounterChild(self.name + format_labels(self.labelnames, labelvalues), self._lock)
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """仪表（可增可减的当前值）
+
+    多进程共享时不求和：每个worker各导出一条，标签末尾追加pid。
+    """
+
+    metric_type = "gauge"
+    kind = 1
+
+    def _new_child(self, labelvalues: tuple) -> _GaugeChild:
+        return _GaugeChild(self.name + format_labels(self.labelnames, labelvalues), self._lock)
+
+    def collect_values(self, shared: Optional[Dict[tuple, List[float]]] = None) -> Dict[tuple, List[float]]:
+        """各标签值的数值；shared为共享段汇总结果时标签值末尾带pid，本进程未共享的序列也按本进程pid补上"""
+        if shared is None:
+            return super().collect_values()
+        result = {labelvalues: list(values) for labelvalues, values in shared.items()}
+        pid = (str(os.getpid()),)
+        for labelvalues, child in self._all_children():
+            if not child.shared:
+                result[labelvalues + pid] = list(child._values)
+        return result
+
+    def _render(self, lines: List[str], shared: Optional[Dict[tuple, List[float]]] = None):
+        if shared is None:
+            super()._render(lines)
+            return
+
+        lines.append(self._header)
+        labelnames = self.labelnames + ('pid',)
+        pid = str(os.getpid())
+        render_children = {}
+        for labelvalues, values in self.collect_values(shared).items():
+            child = self._render_children.get(labelvalues)
+            if child is None:
+                child = _GaugeChild(self.name + format_labels(labelnames, labelvalues), self._lock)
+            render_children[labelvalues] = child
+            # 本进程的序列沿用set_function
+            local = self._default if labelvalues[:-1] == () else self._children.get(labelvalues[:-1])
+            child._function = local._function if labelvalues[-1] == pid and local is not None else None
+            child._render(lines, values)
+        # 已退出进程的序列不再保留
+        self._render_children = render_children
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default.dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.set_function(function)
+
+
+class Histogram(_Metric):
+    """直方图（固定上界的累计桶）"""
+
+    metric_type = "histogram"
+    kind = 2
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        bounds = sorted(float(bound) for bound in buckets)
+        if not bounds or bounds[-1] != math.inf:
+            bounds.append(math.inf)
+        self.upper_bounds = tuple(bounds)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self, labelvalues: tuple) -> _HistogramChild:
+        return _HistogramChild(self.name, format_labels(self.labelnames, labelvalues),
+                               self.upper_bounds, self._lock)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+
+def histogram_quantile(q: float, upper_bounds: Sequence[float], values: Sequence[float]) -> float:
+    """按桶计数估算分位数（桶内线性插值，同PromQL的histogram_quantile）
+
+    Args:
+        q: 分位数（0-1）
+        upper_bounds: 桶上界，最后一个为+Inf
+        values: 直方图子指标的数值（各桶非累计计数、总和、样本数）
+    """
+    counts = values[:len(upper_bounds)]
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    cumulative = 0.0
+    lower = 0.0
+    for bound, count in zip(upper_bounds, counts):
+        if cumulative + count >= rank and count:
+            if bound == math.inf:
+                return lower
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound if bound != math.inf else lower
+    return lower
+
+
+class MetricsRegistry:
+    """指标注册表
+
+    同名指标只注册一次，重复注册返回已有实例（类型或标签不一致时报错）；
+    register_collector注册的回调在抓取时调用，用于导出已有的统计字典。
+    enable_shared后指标值写入多进程共享段，抓取时返回全体worker的汇总值（仪表按worker分别导出）。
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], str]] = []
+        self._lock = threading.Lock()
+        self._segment = None
+        self._hooks_registered = False
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+                if self._segment is not None:
+                    metric._attach_segment(self._segment)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标{name}已以不同的类型或标签注册")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """注册或获取计数器"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """注册或获取仪表"""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """注册或获取直方图"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """按名称获取已注册的指标"""
+        return self._metrics.get(name)
+
+    def register_collector(self, collector: Callable[[], str]):
+        """注册抓取时回调，回调返回文本格式的指标（可用render_family生成）"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], str]):
+        """注销抓取时回调"""
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    @property
+    def shared_segment(self):
+        """当前使用的共享段，未启用时为None"""
+        return self._segment
+
+    def enable_shared(self, segment):
+        """启用多进程汇总：已有和之后创建的子指标都写入segment（SharedMetricsSegment）
+
+        进程退出时自动释放槽位；fork出的子进程自动另占槽位，数值从0开始。
+        """
+        with self._lock:
+            if self._segment is not None:
+                raise RuntimeError("已启用共享指标段")
+            self._segment = segment
+            for metric in self._metrics.values():
+                metric._attach_segment(segment)
+        if not self._hooks_registered:
+            self._hooks_registered = True
+            atexit.register(self.disable_shared)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._after_fork_in_child)
+        logger.info(f"指标注册表已启用共享段: {segment.name}")
+
+    def disable_shared(self):
+        """停用多进程汇总：数值迁回本进程，释放共享段槽位"""
+        with self._lock:
+            segment, self._segment = self._segment, None
+            if segment is None:
+                return
+            for metric in self._metrics.values():
+                metric._attach_segment(None)
+        segment.close()
+
+    def _after_fork_in_child(self):
+        segment = self._segment
+        if segment is None:
+            return
+        # 子进程的计数从0开始，父进程的累计值仍由父进程槽位提供
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            for _, child in metric._all_children():
+                child._lock = metric._lock
+                child._reset()
+        try:
+            segment.reopen_after_fork()
+        except Exception as e:
+            logger.error(f"子进程占用共享指标段失败，指标只在本进程统计: {e}")
+            self._segment = None
+            return
+        for metric in self._metrics.values():
+            metric._attach_segment(segment)
+
+    def values(self, name: str) -> Dict[tuple, List[float]]:
+        """指标各标签值的当前数值（启用共享时为全体worker汇总，仪表的标签值末尾带pid）"""
+        metric = self._metrics.get(name)
+        if metric is None:
+            return {}
+        segment = self._segment
+        if segment is None:
+            return metric.collect_values()
+        return metric.collect_values(segment.aggregate().get(name, {}))
+
+    def render(self) -> str:
+        """渲染全部指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+            segment = self._segment
+
+        shared = None
+        if segment is not None:
+            try:
+                shared = segment.aggregate()
+            except Exception as e:
+                logger.warning(f"读取共享指标段失败，仅导出本进程指标: {e}")
+
+        lines: List[str] = []
+        for metric in metrics:
+            if shared is None:
+                metric._render(lines)
+            else:
+                metric._render(lines, shared.get(metric.name, {}))
+        text = "\n".join(lines) + "\n" if lines else ""
+
+        parts = [text]
+        for collector in collectors:
+            try:
+                parts.append(collector())
+            except Exception as e:
+                logger.warning(f"指标回调失败: {e}")
+        return "".join(parts)
+
+
+# 全局注册表
+default_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """获取全局指标注册表"""
+    return default_registry
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+MinHash局部敏感哈希模块
+为文本的词集合计算MinHash签名，按分段（band）哈希到桶中，只有落入同一桶的文档才需要精确比较；
+语义缓存、记忆整合和抽取式压缩的去重共用这一实现
+"""
+
+import operator
+import random
+import zlib
+from typing import Dict, Hashable, Iterable, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 大于2^32的素数，哈希函数为 (a * x + b) mod _PRIME
+_PRIME = 4294967311
+_MAX_HASH = _PRIME - 1
+
+
+class MinHashLSH:
+    """MinHash签名与分段LSH索引
+
+    num_perm个哈希函数分成bands段、每段rows个值；两段签名完全相同即成为候选对。
+    Jaccard相似度为s的两个集合成为候选的概率为 1 - (1 - s^rows)^bands，
+    默认64个哈希分16段时，s=0.7约99%、s=0.3约12%。
+
+    Args:
+        num_perm: 签名长度（哈希函数个数）
+        bands: 分段数，须整除num_perm
+        seed: 哈希函数参数的随机种子（相同种子的签名可比较）
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("bands必须整除num_perm")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        # a < 2^31，保证numpy的uint64乘加不溢出
+        self._a = [rng.randint(1, 2 ** 31 - 1) for _ in range(num_perm)]
+        self._b = [rng.randint(0, _MAX_HASH) for _ in range(num_perm)]
+        if np is not None:
+            self._a_array = np.array(self._a, dtype=np.uint64)[:, None]
+            self._b_array = np.array(self._b, dtype=np.uint64)[:, None]
+
+        # 桶键 -> 文档键集合；文档键 -> (签名, 所在桶键)
+        self._buckets: Dict[int, Set[Hashable]] = {}
+        self._entries: Dict[Hashable, Tuple[Tuple[int, ...], Tuple[int, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def signature(self, tokens: Iterable[str]) -> Optional[Tuple[int, ...]]:
+        """计算词集合的MinHash签名，空集合返回None"""
+        # crc32在进程间稳定，签名可以持久化
+        hashes = {zlib.crc32(token.encode('utf-8')) for token in tokens}
+        if not hashes:
+            return None
+        if np is not None:
+            values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+            return tuple(((self._a_array * values + self._b_array) % _PRIME).min(axis=1).tolist())
+        return tuple(min((a * value + b) % _PRIME for value in hashes)
+                     for a, b in zip(self._a, self._b))
+
+    def _bucket_keys(self, signature: Tuple[int, ...], scope: Hashable) -> Tuple[int, ...]:
+        rows = self.rows
+        return tuple(hash((scope, band, signature[band * rows:(band + 1) * rows]))
+                     for band in range(self.bands))
+
+    def query(self, signature: Tuple[int, ...], scope: Hashable = None) -> Set[Hashable]:
+        """查找与签名至少有一段相同的文档（只在同一scope内查找）"""
+        candidates: Set[Hashable] = set()
+        for bucket_key in self._bucket_keys(signature, scope):
+            bucket = self._buckets.get(bucket_key)
+            if bucket:
+                candidates |= bucket
+        return candidates
+
+    def insert(self, key: Hashable, signature: Tuple[int, ...], scope: Hashable = None):
+        """加入文档（已存在时先删除）"""
+        self.remove(key)
+        bucket_keys = self._bucket_keys(signature, scope)
+        for bucket_key in bucket_keys:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self._buckets[bucket_key] = set()
+            bucket.add(key)
+        self._entries[key] = (signature, bucket_keys)
+
+    def remove(self, key: Hashable) -> bool:
+        """删除文档"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for bucket_key in entry[1]:
+            bucket = self._buckets[bucket_key]
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[bucket_key]
+        return True
+
+    def get_signature(self, key: Hashable) -> Optional[Tuple[int, ...]]:
+        """已缓存的签名"""
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def clear(self):
+        """清空索引"""
+        self._buckets.clear()
+        self._entries.clear()
+
+
+def estimate_jaccard(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """由两个MinHash签名估计Jaccard相似度（相同位置取值相等的比例）"""
+    return sum(map(operator.eq, first, second)) / len(first)
+
+
+def jaccard(first: Set[str], second: Set[str]) -> float:
+    """两个集合的Jaccard相似度"""
+    if not first and not second:
+        return 0.0
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
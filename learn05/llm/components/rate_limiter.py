@@ -4,14 +4,15 @@
 提供对大模型API调用的速率控制功能
 """
 
+import asyncio
 import logging
+import re
 import time
 from typing import Dict, List, Optional, Any, Union
 import threading
 from abc import ABC, abstractmethod
 from collections import deque
 
-# 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -90,27 +91,25 @@ class TokenBucketRateLimiter(RateLimiter):
                 return False
     
     def wait(self) -> None:
-        """等待直到可以获取令牌
+        """等待直到可以获取令牌（同步阻塞，异步代码请使用AsyncTokenBucketRateLimiter）
         """
-        with self.lock:
-            # 先填充令牌
-            self._refill()
+        while True:
+            with self.lock:
+                # 先填充令牌
+                self._refill()
+                
+                # 检查是否有足够的令牌
+                if self.tokens >= 1:
+                    # 消耗一个令牌
+                    self.tokens -= 1
+                    return
+                
+                # 计算需要等待的时间
+                time_needed = (1 - self.tokens) / self.rate
+                logger.debug(f"速率限制: 需要等待 {time_needed:.2f} 秒")
             
-            # 检查是否有足够的令牌
-            if self.tokens >= 1:
-                # 消耗一个令牌
-                self.tokens -= 1
-                return
-            
-            # 计算需要等待的时间
-            time_needed = (1 - self.tokens) / self.rate
-            logger.debug(f"速率限制: 需要等待 {time_needed:.2f} 秒")
-        
-        # 在锁外等待，避免阻塞其他线程
-        time.sleep(time_needed)
-        
-        # 再次尝试获取令牌
-        self.wait()
+            # 在锁外等待，避免阻塞其他线程
+            time.sleep(time_needed)
     
     def reset(self) -> None:
         """重置速率限制器
@@ -167,33 +166,31 @@ class WindowRateLimiter(RateLimiter):
                 return False
     
     def wait(self) -> None:
-        """等待直到可以获取令牌
+        """等待直到可以获取令牌（同步阻塞，异步代码请使用AsyncWindowRateLimiter）
         """
-        with self.lock:
-            # 清理过期请求
-            self._clean_old_requests()
+        while True:
+            with self.lock:
+                # 清理过期请求
+                self._clean_old_requests()
+                
+                # 检查是否可以立即获取令牌
+                if len(self.request_times) < self.max_requests:
+                    # 记录新请求时间
+                    self.request_times.append(time.time())
+                    return
+                
+                # 计算需要等待的时间
+                # 获取队列中最早的请求时间
+                earliest_request_time = self.request_times[0]
+                # 计算该请求何时会过期
+                time_needed = earliest_request_time + self.window_size - time.time()
+                # 确保等待时间不为负数
+                time_needed = max(0, time_needed)
+                
+                logger.debug(f"速率限制: 需要等待 {time_needed:.2f} 秒")
             
-            # 检查是否可以立即获取令牌
-            if len(self.request_times) < self.max_requests:
-                # 记录新请求时间
-                self.request_times.append(time.time())
-                return
-            
-            # 计算需要等待的时间
-            # 获取队列中最早的请求时间
-            earliest_request_time = self.request_times[0]
-            # 计算该请求何时会过期
-            time_needed = earliest_request_time + self.window_size - time.time()
-            # 确保等待时间不为负数
-            time_needed = max(0, time_needed)
-            
-            logger.debug(f"速率限制: 需要等待 {time_needed:.2f} 秒")
-        
-        # 在锁外等待，避免阻塞其他线程
-        time.sleep(time_needed)
-        
-        # 再次尝试获取令牌
-        self.wait()
+            # 在锁外等待，避免阻塞其他线程
+            time.sleep(time_needed)
     
     def reset(self) -> None:
         """重置速率限制器
@@ -203,6 +200,301 @@ class WindowRateLimiter(RateLimiter):
             logger.info(f"重置速率限制器: 请求记录已清空")
 
 
+class AsyncRateLimiter(ABC):
+    """异步速率限制器抽象基类
+    
+    等待通过asyncio.sleep完成，不阻塞事件循环；
+    等待者按到达顺序（FIFO）获得配额。
+    """
+    
+    def __init__(self):
+        # asyncio.Lock按FIFO顺序唤醒等待者，队首等待期间后来者排队
+        self._lock = asyncio.Lock()
+        self.stats = {'acquired': 0, 'waited': 0, 'total_wait_time': 0.0}
+    
+    @abstractmethod
+    def _try_consume(self, amount: float) -> float:
+        """尝试扣减配额
+        
+        Returns:
+            float: 0表示扣减成功，否则为还需等待的秒数
+        """
+        pass
+    
+    def try_acquire(self, amount: float = 1) -> bool:
+        """非阻塞地尝试获取配额（有等待者时不插队）
+        
+        Args:
+            amount: 需要的配额数量
+            
+        Returns:
+            bool: 是否成功获取
+        """
+        if self._lock.locked():
+            return False
+        if self._try_consume(amount) == 0:
+            self.stats['acquired'] += 1
+            return True
+        return False
+    
+    async def acquire(self, amount: float = 1) -> None:
+        """等待直到获取配额
+        
+        Args:
+            amount: 需要的配额数量（请求数或token数）
+        """
+        start_time = time.monotonic()
+        async with self._lock:
+            while True:
+                wait_time = self._try_consume(amount)
+                if wait_time == 0:
+                    break
+                logger.debug(f"异步速率限制: 需要等待 {wait_time:.2f} 秒")
+                await asyncio.sleep(wait_time)
+        
+        waited = time.monotonic() - start_time
+        self.stats['acquired'] += 1
+        if waited > 0.001:
+            self.stats['waited'] += 1
+            self.stats['total_wait_time'] += waited
+    
+    async def wait(self) -> None:
+        """等待直到可以获取一个令牌（与同步接口保持一致）"""
+        await self.acquire(1)
+    
+    def refund(self, amount: float) -> None:
+        """返还已获取但未使用的配额（默认不支持返还，由子类实现）"""
+        pass
+    
+    @abstractmethod
+    def reset(self) -> None:
+        """重置速率限制器"""
+        pass
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {**self.stats, 'waiting': len(getattr(self._lock, '_waiters', None) or ())}
+
+
+class AsyncTokenBucketRateLimiter(AsyncRateLimiter):
+    """异步令牌桶速率限制器
+    
+    支持一次获取多个令牌（如按token数限流），以及调用结束后按实际用量补扣或返还。
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        """初始化异步令牌桶
+        
+        Args:
+            rate: 令牌生成速率(个/秒)
+            capacity: 令牌桶容量
+        """
+        super().__init__()
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill_time = time.monotonic()
+    
+    def _refill(self) -> None:
+        """填充令牌桶"""
+        current_time = time.monotonic()
+        elapsed_time = current_time - self.last_refill_time
+        self.tokens = min(self.capacity, self.tokens + elapsed_time * self.rate)
+        self.last_refill_time = current_time
+    
+    def _try_consume(self, amount: float) -> float:
+        self._refill()
+        # 超过容量的请求在桶满时放行（令牌数变为负值，后续请求等待偿还）
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= amount
+            return 0
+        return (needed - self.tokens) / self.rate
+    
+    def debit(self, amount: float) -> None:
+        """补扣令牌（实际用量超过预留时调用，可使余额为负）"""
+        self._refill()
+        self.tokens -= amount
+    
+    def refund(self, amount: float) -> None:
+        """返还令牌（实际用量少于预留时调用）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+    
+    def reset(self) -> None:
+        """重置速率限制器"""
+        self.tokens = float(self.capacity)
+        self.last_refill_time = time.monotonic()
+        logger.info("重置异步速率限制器: 令牌桶已充满")
+
+
+class AsyncWindowRateLimiter(AsyncRateLimiter):
+    """异步滑动窗口速率限制器"""
+    
+    def __init__(self, window_size: int, max_requests: int):
+        """初始化异步滑动窗口速率限制器
+        
+        Args:
+            window_size: 窗口大小(秒)
+            max_requests: 窗口内最大请求数（或最大token数）
+        """
+        super().__init__()
+        self.window_size = window_size
+        self.max_requests = max_requests
+        self.request_times = deque()  # (时间, 数量)
+        self.used = 0.0
+    
+    def _clean_old_requests(self) -> None:
+        """清理过期的请求记录"""
+        window_start = time.monotonic() - self.window_size
+        while self.request_times and self.request_times[0][0] < window_start:
+            _, amount = self.request_times.popleft()
+            self.used -= amount
+    
+    def _try_consume(self, amount: float) -> float:
+        self._clean_old_requests()
+        if self.used + amount <= self.max_requests or not self.request_times:
+            self.request_times.append((time.monotonic(), amount))
+            self.used += amount
+            return 0
+        
+        # 计算释放足够配额需要等待的时间
+        release_needed = self.used + amount - self.max_requests
+        released = 0.0
+        for timestamp, recorded in self.request_times:
+            released += recorded
+            if released >= release_needed:
+                return max(0.001, timestamp + self.window_size - time.monotonic())
+        return self.window_size
+    
+    def debit(self, amount: float) -> None:
+        """补扣配额"""
+        self.request_times.append((time.monotonic(), amount))
+        self.used += amount
+    
+    def refund(self, amount: float) -> None:
+        """返还配额（从最近的记录中扣回）"""
+        while amount > 0 and self.request_times:
+            timestamp, recorded = self.request_times.pop()
+            returned = min(recorded, amount)
+            amount -= returned
+            self.used -= returned
+            if recorded > returned:
+                self.request_times.append((timestamp, recorded - returned))
+                break
+    
+    def reset(self) -> None:
+        """重置速率限制器"""
+        self.request_times.clear()
+        self.used = 0.0
+        logger.info("重置异步速率限制器: 请求记录已清空")
+
+
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf\uf900-\ufaff]')
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算文本的token数（中日韩字符约1个token，其余约4个字符1个token）
+    
+    Args:
+        text: 文本内容
+        
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
+
+
+class AsyncLLMRateLimiter:
+    """大模型调用的双桶速率限制器（RPM + TPM）
+    
+    调用前按估算的提示词token数预留TPM配额，调用后按LLMUsage的实际用量补扣或返还。
+    """
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int,
+                 request_limiter: Optional[AsyncRateLimiter] = None,
+                 token_limiter: Optional[AsyncTokenBucketRateLimiter] = None):
+        """初始化双桶速率限制器
+        
+        Args:
+            requests_per_minute: 每分钟请求数
+            tokens_per_minute: 每分钟token数
+            request_limiter: 自定义请求数限制器（默认按RPM构造令牌桶）
+            token_limiter: 自定义token数限制器（默认按TPM构造令牌桶）
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_limiter = request_limiter or AsyncTokenBucketRateLimiter(
+            requests_per_minute / 60.0, requests_per_minute
+        )
+        self.token_limiter = token_limiter or AsyncTokenBucketRateLimiter(
+            tokens_per_minute / 60.0, tokens_per_minute
+        )
+        self.stats = {'reserved_tokens': 0, 'used_tokens': 0, 'adjusted_tokens': 0}
+    
+    @staticmethod
+    def estimate_request_tokens(prompt: Optional[str] = None,
+                                messages: Optional[List[Dict[str, str]]] = None) -> int:
+        """估算请求的提示词token数"""
+        total = estimate_tokens(prompt)
+        for message in messages or []:
+            # 每条消息额外计入角色等格式开销
+            total += estimate_tokens(message.get('content', '')) + 4
+        return total
+    
+    async def acquire(self, estimated_tokens: int = 0) -> int:
+        """等待请求配额并预留token配额
+        
+        Args:
+            estimated_tokens: 预估的token数
+            
+        Returns:
+            int: 实际预留的token数，调用结束后传给record_usage
+        """
+        await self.request_limiter.acquire(1)
+        if estimated_tokens > 0:
+            try:
+                await self.token_limiter.acquire(estimated_tokens)
+            except BaseException:
+                # 等待token配额时被取消（如调用方wait_for超时），归还已占用的请求配额
+                self.request_limiter.refund(1)
+                raise
+        self.stats['reserved_tokens'] += estimated_tokens
+        return estimated_tokens
+    
+    def record_usage(self, reserved_tokens: int, used_tokens: int) -> None:
+        """按实际用量修正token配额
+        
+        Args:
+            reserved_tokens: acquire时预留的token数
+            used_tokens: 实际消耗的token数（LLMUsage.total_tokens）
+        """
+        difference = used_tokens - reserved_tokens
+        if difference > 0:
+            self.token_limiter.debit(difference)
+        elif difference < 0:
+            self.token_limiter.refund(-difference)
+        self.stats['used_tokens'] += used_tokens
+        self.stats['adjusted_tokens'] += difference
+    
+    def reset(self) -> None:
+        """重置速率限制器"""
+        self.request_limiter.reset()
+        self.token_limiter.reset()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            **self.stats,
+            'requests': self.request_limiter.get_stats(),
+            'tokens': self.token_limiter.get_stats(),
+            'available_tokens': getattr(self.token_limiter, 'tokens', None)
+        }
+
+
 class RateLimiterFactory:
     """速率限制器工厂类
     用于创建不同类型的速率限制器
@@ -235,6 +527,34 @@ class RateLimiterFactory:
         """
         logger.info(f"创建滑动窗口速率限制器: 窗口大小={window_size}秒, 最大请求数={max_requests}")
         return WindowRateLimiter(window_size, max_requests)
+    
+    @staticmethod
+    def create_async_token_bucket(rate: float, capacity: int) -> AsyncTokenBucketRateLimiter:
+        """创建异步令牌桶速率限制器
+        
+        Args:
+            rate: 令牌生成速率(个/秒)
+            capacity: 令牌桶容量
+            
+        Returns:
+            AsyncTokenBucketRateLimiter: 异步令牌桶速率限制器实例
+        """
+        logger.info(f"创建异步令牌桶速率限制器: 速率={rate}/秒, 容量={capacity}")
+        return AsyncTokenBucketRateLimiter(rate, capacity)
+    
+    @staticmethod
+    def create_async_window(window_size: int, max_requests: int) -> AsyncWindowRateLimiter:
+        """创建异步滑动窗口速率限制器
+        
+        Args:
+            window_size: 窗口大小(秒)
+            max_requests: 窗口内最大请求数
+            
+        Returns:
+            AsyncWindowRateLimiter: 异步滑动窗口速率限制器实例
+        """
+        logger.info(f"创建异步滑动窗口速率限制器: 窗口大小={window_size}秒, 最大请求数={max_requests}")
+        return AsyncWindowRateLimiter(window_size, max_requests)
 
 
 class MultiLevelRateLimiter:
@@ -242,11 +562,11 @@ class MultiLevelRateLimiter:
     支持同时应用多种速率限制策略
     """
     
-    def __init__(self, limiters: List[RateLimiter]):
+    def __init__(self, limiters: List[Union[RateLimiter, AsyncRateLimiter]]):
         """初始化多级速率限制器
         
         Args:
-            limiters: 速率限制器列表
+            limiters: 速率限制器列表（同步或异步）
         """
         self.limiters = limiters
     
@@ -256,15 +576,34 @@ class MultiLevelRateLimiter:
         Returns:
             bool: 是否成功获取所有令牌
         """
-        return all(limiter.acquire() for limiter in self.limiters)
+        return all(
+            limiter.try_acquire() if isinstance(limiter, AsyncRateLimiter) else limiter.acquire()
+            for limiter in self.limiters
+        )
     
     def wait(self) -> None:
-        """等待直到可以获取所有令牌
+        """等待直到可以获取所有令牌（仅用于同步限制器）
         """
         # 依次等待每个速率限制器
         for limiter in self.limiters:
+            if isinstance(limiter, AsyncRateLimiter):
+                raise TypeError("异步速率限制器请使用 wait_async()")
             limiter.wait()
     
+    async def wait_async(self, amount: float = 1) -> None:
+        """异步等待直到可以获取所有令牌
+        
+        异步限制器直接await；同步限制器在线程中等待，均不阻塞事件循环。
+        
+        Args:
+            amount: 每个异步限制器需要的配额数量
+        """
+        for limiter in self.limiters:
+            if isinstance(limiter, AsyncRateLimiter):
+                await limiter.acquire(amount)
+            else:
+                await asyncio.to_thread(limiter.wait)
+    
     def reset(self) -> None:
         """重置所有速率限制器
         """
@@ -317,4 +656,47 @@ def get_preset_rate_limiter(preset_name: str) -> RateLimiter:
     elif config['type'] == 'window':
         return factory.create_window(config['window_size'], config['max_requests'])
     else:
-        raise ValueError(f"不支持的速率限制器类型: {config['type']}")
\ No newline at end of file
+        raise ValueError(f"不支持的速率限制器类型: {config['type']}")
+
+
+def get_preset_async_rate_limiter(preset_name: str) -> AsyncRateLimiter:
+    """获取预定义配置对应的异步速率限制器
+    
+    Args:
+        preset_name: 预定义配置名称
+        
+    Returns:
+        AsyncRateLimiter: 异步速率限制器实例
+    """
+    if preset_name not in PRESET_RATE_LIMITERS:
+        raise ValueError(f"未知的预定义速率限制器配置: {preset_name}")
+    
+    config = PRESET_RATE_LIMITERS[preset_name]
+    factory = RateLimiterFactory()
+    
+    if config['type'] == 'token_bucket':
+        return factory.create_async_token_bucket(config['rate'], config['capacity'])
+    elif config['type'] == 'window':
+        return factory.create_async_window(config['window_size'], config['max_requests'])
+    else:
+        raise ValueError(f"不支持的速率限制器类型: {config['type']}")
+
+
+def get_preset_llm_rate_limiter(preset_name: str, tokens_per_minute: int) -> AsyncLLMRateLimiter:
+    """获取预定义请求配额 + 指定TPM的双桶异步速率限制器
+    
+    Args:
+        preset_name: 预定义配置名称（决定请求数限制）
+        tokens_per_minute: 每分钟token数
+        
+    Returns:
+        AsyncLLMRateLimiter: 双桶速率限制器实例
+    """
+    request_limiter = get_preset_async_rate_limiter(preset_name)
+    config = PRESET_RATE_LIMITERS[preset_name]
+    if config['type'] == 'token_bucket':
+        requests_per_minute = int(config['rate'] * 60)
+    else:
+        requests_per_minute = int(config['max_requests'] * 60 / config['window_size'])
+    return AsyncLLMRateLimiter(requests_per_minute, tokens_per_minute,
+                               request_limiter=request_limiter)
\ No newline at end of file
@@ -4,24 +4,275 @@
 提供对大模型API调用失败的重试处理功能
 """
 
+import asyncio
 import logging
+import threading
 import time
 import random
+from email.utils import parsedate_to_datetime
 from typing import Dict, List, Optional, Any, Union, Callable, TypeVar
 from abc import ABC, abstractmethod
 import functools
-import requests
 
-# 配置日志
+try:
+    import requests
+    _REQUESTS_EXCEPTIONS = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.HTTPError
+    )
+except ImportError:
+    requests = None
+    _REQUESTS_EXCEPTIONS = ()
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
 
+class RetryBudget:
+    """重试预算（令牌桶）
+    
+    每个请求存入ratio个令牌，每次重试消耗1个令牌，使重试量不超过请求量的一定比例；
+    min_retries_per_second保证低流量时仍有少量重试额度。
+    服务商故障时重试被预算截断，避免在其最脆弱时成倍放大负载。
+    """
+    
+    def __init__(self, ratio: float = 0.1, min_retries_per_second: float = 1.0,
+                 max_tokens: float = 100.0):
+        """初始化重试预算
+        
+        Args:
+            ratio: 允许的重试/请求比例
+            min_retries_per_second: 每秒保底重试次数
+            max_tokens: 令牌上限
+        """
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+        self.tokens = min(max_tokens, 10.0)
+        self.last_refill_time = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self) -> None:
+        current_time = time.monotonic()
+        elapsed_time = current_time - self.last_refill_time
+        self.tokens = min(self.max_tokens, self.tokens + elapsed_time * self.min_retries_per_second)
+        self.last_refill_time = current_time
+    
+    def record_request(self) -> None:
+        """记录一次请求（存入令牌）"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+    
+    def try_spend(self) -> bool:
+        """尝试消耗一次重试额度
+        
+        Returns:
+            bool: 是否允许重试
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def get_retry_after(exception: Exception) -> Optional[float]:
+    """从异常中解析服务端建议的重试等待时间（retry_after属性或Retry-After响应头）
+    
+    Args:
+        exception: 异常对象
+        
+    Returns:
+        Optional[float]: 等待秒数，无法解析时返回None
+    """
+    retry_after = getattr(exception, 'retry_after', None)
+    if retry_after is None:
+        response = getattr(exception, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if headers:
+            retry_after = headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+    try:
+        # HTTP日期格式
+        return max(0.0, parsedate_to_datetime(str(retry_after)).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryEngine:
+    """重试引擎（同步与异步调用共用）
+    
+    - 去相关抖动（decorrelated jitter）退避
+    - 遵循Retry-After
+    - 截止时间感知：等待后已无法在截止时间前完成时不再重试
+    - 重试预算：超出预算的重试被抑制
+    """
+    
+    def __init__(self, max_attempts: Optional[int] = 3, base_delay: float = 1.0,
+                 max_delay: float = 30.0, budget: Optional[RetryBudget] = None,
+                 retry_predicate: Optional[Callable[[int, Exception], bool]] = None,
+                 backoff: Optional[Callable[[int, float], float]] = None,
+                 result_error: Optional[Callable[[Any], Optional[Exception]]] = None):
+        """初始化重试引擎
+        
+        Args:
+            max_attempts: 最大重试次数（None表示完全由retry_predicate决定）
+            base_delay: 基础延迟时间(秒)
+            max_delay: 最大延迟时间(秒)
+            budget: 重试预算（None表示不限制）
+            retry_predicate: 判断是否重试的函数(失败次数, 异常)
+            backoff: 计算等待时间的函数(失败次数, 上次等待时间)，默认去相关抖动
+            result_error: 将“失败的返回值”转换为异常的函数，返回None表示结果正常
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retry_predicate = retry_predicate
+        self.backoff = backoff or self.decorrelated_jitter
+        self.result_error = result_error
+        self.stats = {
+            'calls': 0,
+            'retries_attempted': 0,
+            'retries_succeeded': 0,
+            'suppressed_by_budget': 0,
+            'suppressed_by_deadline': 0,
+            'failures': 0
+        }
+    
+    def decorrelated_jitter(self, attempt: int, previous_delay: float) -> float:
+        """去相关抖动：在[base, 上次等待*3]之间随机取值"""
+        upper = max(self.base_delay, previous_delay * 3)
+        return min(self.max_delay, random.uniform(self.base_delay, upper))
+    
+    def _plan_retry(self, failures: int, exception: Exception, previous_delay: float,
+                    deadline: Optional[float]) -> Optional[float]:
+        """决定是否重试，返回等待时间；不重试时返回None"""
+        if self.max_attempts is not None and failures > self.max_attempts:
+            return None
+        if self.retry_predicate and not self.retry_predicate(failures, exception):
+            return None
+        
+        delay = self.backoff(failures, previous_delay)
+        retry_after = get_retry_after(exception)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            self.stats['suppressed_by_deadline'] += 1
+            logger.info(f"剩余时间不足以等待 {delay:.2f} 秒后重试，放弃重试")
+            return None
+        if self.budget is not None and not self.budget.try_spend():
+            self.stats['suppressed_by_budget'] += 1
+            logger.warning("重试预算已耗尽，放弃重试")
+            return None
+        
+        self.stats['retries_attempted'] += 1
+        return delay
+    
+    def _check_result(self, result: Any) -> Optional[Exception]:
+        return self.result_error(result) if self.result_error else None
+    
+    async def execute(self, func: Callable[..., Any], *args,
+                      deadline: Optional[float] = None, **kwargs) -> Any:
+        """异步执行函数并在需要时重试
+        
+        Args:
+            func: 要执行的异步函数
+            deadline: 截止时间（time.monotonic()时间戳）
+            
+        Returns:
+            Any: 函数返回值
+        """
+        self.stats['calls'] += 1
+        if self.budget is not None:
+            self.budget.record_request()
+        
+        failures = 0
+        delay = self.base_delay
+        while True:
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                error, result = e, None
+            else:
+                error = self._check_result(result)
+                if error is None:
+                    if failures:
+                        self.stats['retries_succeeded'] += 1
+                    return result
+            
+            failures += 1
+            next_delay = self._plan_retry(failures, error, delay, deadline)
+            if next_delay is None:
+                self.stats['failures'] += 1
+                if result is not None:
+                    return result
+                raise error
+            delay = next_delay
+            logger.warning(f"第{failures}次尝试失败，{delay:.2f}秒后重试: {error}")
+            await asyncio.sleep(delay)
+    
+    def execute_sync(self, func: Callable[..., T], *args,
+                     deadline: Optional[float] = None, **kwargs) -> T:
+        """同步执行函数并在需要时重试（参数同execute）"""
+        self.stats['calls'] += 1
+        if self.budget is not None:
+            self.budget.record_request()
+        
+        failures = 0
+        delay = self.base_delay
+        while True:
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                error, result = e, None
+            else:
+                error = self._check_result(result)
+                if error is None:
+                    if failures:
+                        self.stats['retries_succeeded'] += 1
+                    return result
+            
+            failures += 1
+            next_delay = self._plan_retry(failures, error, delay, deadline)
+            if next_delay is None:
+                self.stats['failures'] += 1
+                logger.error(f"重试结束，操作失败: {error}")
+                if result is not None:
+                    return result
+                raise error
+            delay = next_delay
+            logger.info(f"尝试 {failures} 失败: {error}, 等待 {delay:.2f} 秒后重试...")
+            time.sleep(delay)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重试指标"""
+        return {
+            **self.stats,
+            'budget_tokens': self.budget.tokens if self.budget is not None else None
+        }
+
+
 class RetryHandler(ABC):
     """重试处理器抽象基类"""
     
+    # 可选的共享重试预算
+    budget: Optional[RetryBudget] = None
+    # 惰性创建的重试引擎
+    _engine: Optional[RetryEngine] = None
+    
     @abstractmethod
     def should_retry(self, attempt: int, exception: Exception) -> bool:
         """判断是否应该重试
@@ -47,6 +298,36 @@ class RetryHandler(ABC):
         """
         pass
     
+    def next_delay(self, attempt: int, previous_delay: float) -> float:
+        """计算下一次等待时间（默认使用wait_time，子类可利用上次等待时间）
+        
+        Args:
+            attempt: 当前尝试次数
+            previous_delay: 上次等待时间(秒)
+            
+        Returns:
+            float: 等待时间(秒)
+        """
+        return self.wait_time(attempt)
+    
+    @property
+    def engine(self) -> RetryEngine:
+        """基于当前策略的重试引擎（惰性创建，统计信息随处理器保留）
+        
+        每次取用时同步处理器当前的budget、base_delay和max_delay，运行中修改这些属性会立即生效。
+        """
+        engine = self._engine
+        if engine is None:
+            engine = self._engine = RetryEngine(
+                max_attempts=None,
+                retry_predicate=self.should_retry,
+                backoff=self.next_delay
+            )
+        engine.base_delay = getattr(self, 'base_delay', getattr(self, 'delay', 1.0))
+        engine.max_delay = getattr(self, 'max_delay', 30.0)
+        engine.budget = self.budget
+        return engine
+    
     def retry(self, func: Callable[..., T], *args, **kwargs) -> T:
         """执行函数并在需要时重试
         
@@ -58,37 +339,41 @@ class RetryHandler(ABC):
         Returns:
             T: 函数返回值
         """
-        attempt = 0
-        while True:
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                attempt += 1
-                if self.should_retry(attempt, e):
-                    wait_time = self.wait_time(attempt)
-                    logger.info(f"尝试 {attempt} 失败: {e}, 等待 {wait_time:.2f} 秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    logger.error(f"重试次数已达上限，操作失败: {e}")
-                    raise
+        return self.engine.execute_sync(func, *args, **kwargs)
+    
+    async def retry_async(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """异步执行函数并在需要时重试（等待不阻塞事件循环）
+        
+        Args:
+            func: 要执行的异步函数
+            *args: 函数参数
+            **kwargs: 关键字参数
+            
+        Returns:
+            Any: 函数返回值
+        """
+        return await self.engine.execute(func, *args, **kwargs)
 
 
 class ExponentialBackoffRetryHandler(RetryHandler):
     """指数退避重试策略的实现"""
     
-    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0, jitter: bool = True):
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0, jitter: bool = True,
+                 budget: Optional[RetryBudget] = None):
         """初始化指数退避重试处理器
         
         Args:
             max_attempts: 最大尝试次数
             base_delay: 基础延迟时间(秒)
             max_delay: 最大延迟时间(秒)
-            jitter: 是否添加随机抖动
+            jitter: 是否添加随机抖动（启用时使用去相关抖动）
+            budget: 重试预算（可选）
         """
         self.max_attempts = max_attempts
         self.base_delay = base_delay
         self.max_delay = max_delay
         self.jitter = jitter
+        self.budget = budget
         # 默认重试的状态码和异常类型
         self.retriable_status_codes = {
             429,  # Too Many Requests
@@ -97,11 +382,7 @@ class ExponentialBackoffRetryHandler(RetryHandler):
             503,  # Service Unavailable
             504   # Gateway Timeout
         }
-        self.retriable_exceptions = (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.Timeout,
-            requests.exceptions.HTTPError
-        )
+        self.retriable_exceptions = _REQUESTS_EXCEPTIONS
     
     def should_retry(self, attempt: int, exception: Exception) -> bool:
         """判断是否应该重试
@@ -120,13 +401,13 @@ class ExponentialBackoffRetryHandler(RetryHandler):
         # 检查异常类型是否在可重试列表中
         if isinstance(exception, self.retriable_exceptions):
             # 对于HTTP错误，检查状态码
-            if isinstance(exception, requests.exceptions.HTTPError) and hasattr(exception, 'response'):
+            if requests and isinstance(exception, requests.exceptions.HTTPError) and hasattr(exception, 'response'):
                 return exception.response.status_code in self.retriable_status_codes
             return True
         
         # 检查是否是特定于大模型API的可重试错误
         if hasattr(exception, 'error_type'):
-            return exception.error_type in ('rate_limit', 'server_error', 'timeout')
+            return getattr(exception.error_type, 'value', exception.error_type) in ('rate_limit', 'server_error', 'timeout', 'network_error')
         
         # 对于其他异常，默认不重试
         return False
@@ -152,6 +433,20 @@ class ExponentialBackoffRetryHandler(RetryHandler):
             wait_time *= jitter_factor
         
         return wait_time
+    
+    def next_delay(self, attempt: int, previous_delay: float) -> float:
+        """计算下一次等待时间（启用抖动时使用去相关抖动，避免重试同步化）
+        
+        Args:
+            attempt: 当前尝试次数
+            previous_delay: 上次等待时间(秒)
+            
+        Returns:
+            float: 等待时间(秒)
+        """
+        if not self.jitter:
+            return self.wait_time(attempt)
+        return self.engine.decorrelated_jitter(attempt, previous_delay)
 
 
 class FixedIntervalRetryHandler(RetryHandler):
@@ -170,11 +465,7 @@ class FixedIntervalRetryHandler(RetryHandler):
         self.retriable_status_codes = {
             429, 500, 502, 503, 504
         }
-        self.retriable_exceptions = (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.Timeout,
-            requests.exceptions.HTTPError
-        )
+        self.retriable_exceptions = _REQUESTS_EXCEPTIONS
     
     def should_retry(self, attempt: int, exception: Exception) -> bool:
         """判断是否应该重试
@@ -193,13 +484,13 @@ class FixedIntervalRetryHandler(RetryHandler):
         # 检查异常类型是否在可重试列表中
         if isinstance(exception, self.retriable_exceptions):
             # 对于HTTP错误，检查状态码
-            if isinstance(exception, requests.exceptions.HTTPError) and hasattr(exception, 'response'):
+            if requests and isinstance(exception, requests.exceptions.HTTPError) and hasattr(exception, 'response'):
                 return exception.response.status_code in self.retriable_status_codes
             return True
         
         # 检查是否是特定于大模型API的可重试错误
         if hasattr(exception, 'error_type'):
-            return exception.error_type in ('rate_limit', 'server_error', 'timeout')
+            return getattr(exception.error_type, 'value', exception.error_type) in ('rate_limit', 'server_error', 'timeout', 'network_error')
         
         # 对于其他异常，默认不重试
         return False
@@ -234,11 +525,7 @@ class RandomIntervalRetryHandler(RetryHandler):
         self.retriable_status_codes = {
             429, 500, 502, 503, 504
         }
-        self.retriable_exceptions = (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.Timeout,
-            requests.exceptions.HTTPError
-        )
+        self.retriable_exceptions = _REQUESTS_EXCEPTIONS
     
     def should_retry(self, attempt: int, exception: Exception) -> bool:
         """判断是否应该重试
@@ -257,13 +544,13 @@ class RandomIntervalRetryHandler(RetryHandler):
         # 检查异常类型是否在可重试列表中
         if isinstance(exception, self.retriable_exceptions):
             # 对于HTTP错误，检查状态码
-            if isinstance(exception, requests.exceptions.HTTPError) and hasattr(exception, 'response'):
+            if requests and isinstance(exception, requests.exceptions.HTTPError) and hasattr(exception, 'response'):
                 return exception.response.status_code in self.retriable_status_codes
             return True
         
         # 检查是否是特定于大模型API的可重试错误
         if hasattr(exception, 'error_type'):
-            return exception.error_type in ('rate_limit', 'server_error', 'timeout')
+            return getattr(exception.error_type, 'value', exception.error_type) in ('rate_limit', 'server_error', 'timeout', 'network_error')
         
         # 对于其他异常，默认不重试
         return False
@@ -345,6 +632,12 @@ def retry_decorator(retry_handler: RetryHandler = None):
         retry_handler = RetryHandlerFactory.create_exponential_backoff()
         
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await retry_handler.retry_async(func, *args, **kwargs)
+            return async_wrapper
+        
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> T:
             return retry_handler.retry(func, *args, **kwargs)
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+多进程共享指标段
+多worker部署时，各进程的指标值写入同一块共享内存（multiprocessing.shared_memory），
+任一进程抓取即可得到全体worker的汇总值，不依赖Redis。
+计数器和直方图跨进程求和；仪表（处理中请求数、连接池大小等）求和没有意义，按进程分开导出，标签值末尾追加pid。
+
+布局固定：段头 + N个进程槽位，槽位0保留为“归档槽”。每个槽位只由占用它的进程写入（单写者，写指标无锁），
+包含槽头、条目目录（指标名与标签值、类型、单元格偏移与长度）和float64单元格区。
+槽位的分配和回收用文件锁串行化；进程崩溃时文件锁由系统释放，
+下一次分配或抓取时发现其进程已不存在，把计数器和直方图并入归档槽（仪表丢弃）后释放槽位。
+"""
+
+import logging
+import os
+import struct
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'LLMMETR1'
+_HEADER = struct.Struct('<8sqqqq')        # 魔数, 槽位数, 每槽条目数, 每槽单元格数, 键长度
+_SLOT_HEADER = struct.Struct('<qdqqq')    # pid, 进程创建时间, 已发布条目数, 已用单元格数, 状态
+_ENTRY_TAIL = struct.Struct('<qqq')       # 类型, 单元格偏移, 单元格数
+_HEADER_SIZE = 64
+_SLOT_HEADER_SIZE = 64
+
+# 槽位状态
+SLOT_FREE = 0
+SLOT_LIVE = 1
+SLOT_ARCHIVE = 2
+
+# 指标类型
+KIND_COUNTER = 0
+KIND_GAUGE = 1
+KIND_HISTOGRAM = 2
+
+_KEY_SEPARATOR = '\x1f'
+
+
+def _process_create_time(pid: int) -> float:
+    if psutil is None:
+        return 0.0
+    try:
+        return psutil.Process(pid).create_time()
+    except Exception:
+        return 0.0
+
+
+def _process_alive(pid: int, create_time: float) -> bool:
+    """判断槽位记录的进程是否仍在运行（用创建时间排除pid复用）"""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            if process.status() == psutil.STATUS_ZOMBIE:
+                return False
+            if create_time and abs(process.create_time() - create_time) > 0.01:
+                return False
+        except psutil.NoSuchProcess:
+            return False
+        except Exception:
+            pass
+    return True
+
+
+class SharedMetricsSegment:
+    """共享指标段
+
+    Args:
+        name: 共享内存名称（同一部署的所有worker使用相同名称）
+        slots: 可同时写入的进程数上限（另加一个归档槽）
+        slot_entries: 每个进程最多的指标序列数（带标签的子指标各算一个）
+        slot_cells: 每个进程最多的数值单元格数（计数器/仪表占1个，直方图占桶数+2个）
+        key_size: 指标名加标签值的最大字节数，超长的序列只在本进程内统计
+    """
+
+    def __init__(self, name: str, slots: int = 16, slot_entries: int = 1024,
+                 slot_cells: int = 8192, key_size: int = 120):
+        if fcntl is None:
+            raise RuntimeError("共享指标段需要fcntl文件锁，当前平台不支持")
+
+        self.name = name
+        self.slots = slots + 1
+        self.slot_entries = slot_entries
+        self.slot_cells = slot_cells
+        self.key_size = (key_size + 7) // 8 * 8
+        self._entry_size = self.key_size + _ENTRY_TAIL.size
+        self._directory_size = self.slot_entries * self._entry_size
+        self._slot_size = _SLOT_HEADER_SIZE + self._directory_size + self.slot_cells * 8
+        self.size = _HEADER_SIZE + self.slots * self._slot_size
+
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.metrics.lock")
+        self._lock_file = None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._cells: Optional[memoryview] = None
+        # allocate交出的单元格视图，断开共享内存前逐一释放
+        self._views: List[weakref.ref] = []
+        self._slot: Optional[int] = None
+        self._entries = 0
+        self._cells_used = 0
+        self._write_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        # 各槽位已解析的目录：槽位 -> ((pid, 创建时间), 条目列表)
+        self._directory_cache: Dict[int, Tuple[tuple, list]] = {}
+        self._warned_full = False
+
+        self._open()
+
+    # ------------------------------------------------------------------ 布局
+    def _slot_offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * self._slot_size
+
+    def _cells_base(self, slot: int) -> int:
+        """槽位单元格区在全段float64视图中的下标"""
+        return (self._slot_offset(slot) + _SLOT_HEADER_SIZE + self._directory_size) // 8
+
+    def _read_slot_header(self, slot: int) -> tuple:
+        return _SLOT_HEADER.unpack_from(self._shm.buf, self._slot_offset(slot))
+
+    def _write_slot_header(self, slot: int, pid: int, create_time: float, entries: int,
+                           cells_used: int, state: int):
+        _SLOT_HEADER.pack_into(self._shm.buf, self._slot_offset(slot),
+                               pid, create_time, entries, cells_used, state)
+
+    def _publish_entries(self, slot: int, entries: int, cells_used: int):
+        """条目写好后再更新计数，读者只会看到完整的条目"""
+        offset = self._slot_offset(slot)
+        struct.pack_into('<qq', self._shm.buf, offset + 16, entries, cells_used)
+
+    def _entry_offset(self, slot: int, index: int) -> int:
+        return self._slot_offset(slot) + _SLOT_HEADER_SIZE + index * self._entry_size
+
+    def _write_entry(self, slot: int, index: int, key: bytes, kind: int, offset: int, length: int):
+        position = self._entry_offset(slot, index)
+        self._shm.buf[position:position + self.key_size] = key.ljust(self.key_size, b'\0')
+        _ENTRY_TAIL.pack_into(self._shm.buf, position + self.key_size, kind, offset, length)
+
+    def _read_entry(self, slot: int, index: int) -> tuple:
+        position = self._entry_offset(slot, index)
+        key = bytes(self._shm.buf[position:position + self.key_size]).rstrip(b'\0').decode('utf-8')
+        kind, offset, length = _ENTRY_TAIL.unpack_from(self._shm.buf, position + self.key_size)
+        name, *labelvalues = key.split(_KEY_SEPARATOR)
+        return name, tuple(labelvalues), kind, offset, length
+
+    # ------------------------------------------------------------------ 打开与槽位
+    @contextmanager
+    def _file_lock(self, exclusive: bool = True):
+        # 文件锁只在进程间互斥，同一进程的线程另用线程锁
+        with self._thread_lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _attach(self, create: bool) -> shared_memory.SharedMemory:
+        shm = shared_memory.SharedMemory(name=self.name, create=create, size=self.size if create else 0)
+        # 段的生命周期跨越单个worker，不能由退出进程的resource_tracker删除
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+    def _layout_matches(self, shm: shared_memory.SharedMemory) -> bool:
+        if shm.size < self.size:
+            return False
+        return _HEADER.unpack_from(shm.buf, 0) == (
+            _MAGIC, self.slots, self.slot_entries, self.slot_cells, self.key_size)
+
+    def _initialize(self):
+        self._shm.buf[:self.size] = bytes(self.size)
+        _HEADER.pack_into(self._shm.buf, 0, _MAGIC, self.slots, self.slot_entries,
+                          self.slot_cells, self.key_size)
+        self._write_slot_header(0, 0, 0.0, 0, 0, SLOT_ARCHIVE)
+
+    def _open(self):
+        self._lock_file = open(self._lock_path, 'a+')
+        with self._file_lock():
+            try:
+                self._shm = self._attach(create=True)
+                self._initialize()
+            except FileExistsError:
+                self._shm = self._attach(create=False)
+                if not self._layout_matches(self._shm):
+                    self._shm.close()
+                    self._shm = None
+                    raise RuntimeError(f"共享指标段{self.name}的布局与当前配置不一致，"
+                                       f"请停止所有worker后删除/dev/shm/{self.name}或更换名称")
+
+            self._cells = self._shm.buf.cast('d')
+            self._reap_unlocked()
+            self._claim_slot_unlocked()
+
+    def _live_slots_unlocked(self) -> List[int]:
+        live = []
+        for slot in range(1, self.slots):
+            pid, create_time, _, _, state = self._read_slot_header(slot)
+            if state == SLOT_LIVE and _process_alive(pid, create_time):
+                live.append(slot)
+        return live
+
+    def _claim_slot_unlocked(self):
+        pid = os.getpid()
+        for slot in range(1, self.slots):
+            state = self._read_slot_header(slot)[4]
+            if state == SLOT_FREE:
+                start = self._cells_base(slot)
+                self._cells[start:start + self.slot_cells] = memoryview(bytes(self.slot_cells * 8)).cast('d')
+                self._write_slot_header(slot, pid, _process_create_time(pid), 0, 0, SLOT_LIVE)
+                self._slot = slot
+                self._entries = 0
+                self._cells_used = 0
+                logger.info(f"共享指标段{self.name}: 进程{pid}占用槽位{slot}")
+                return
+        raise RuntimeError(f"共享指标段{self.name}没有空闲槽位（上限{self.slots - 1}个进程）")
+
+    def _reap_unlocked(self) -> int:
+        """回收已退出进程的槽位，返回回收数量"""
+        reaped = 0
+        for slot in range(1, self.slots):
+            if slot == self._slot:
+                continue
+            pid, create_time, _, _, state = self._read_slot_header(slot)
+            if state == SLOT_LIVE and not _process_alive(pid, create_time):
+                self._archive_slot_unlocked(slot)
+                logger.info(f"共享指标段{self.name}: 回收已退出进程{pid}的槽位{slot}")
+                reaped += 1
+        return reaped
+
+    def _archive_slot_unlocked(self, slot: int):
+        """把槽位中的计数器和直方图并入归档槽，然后释放槽位"""
+        archive_entries = self._read_slot_header(0)[2]
+        archive_cells = self._read_slot_header(0)[3]
+        archive_index = {}
+        for index in range(archive_entries):
+            name, labelvalues, _, offset, length = self._read_entry(0, index)
+            archive_index[(name, labelvalues)] = (offset, length)
+
+        archive_base = self._cells_base(0)
+        base = self._cells_base(slot)
+        for index in range(self._read_slot_header(slot)[2]):
+            name, labelvalues, kind, offset, length = self._read_entry(slot, index)
+            if kind == KIND_GAUGE:
+                continue
+            target = archive_index.get((name, labelvalues))
+            if target is None:
+                if archive_entries >= self.slot_entries or archive_cells + length > self.slot_cells:
+                    logger.warning(f"共享指标段{self.name}归档槽已满，丢弃{name}")
+                    continue
+                target = archive_index[(name, labelvalues)] = (archive_cells, length)
+                self._write_entry(0, archive_entries, self._encode_key(name, labelvalues),
+                                  kind, archive_cells, length)
+                archive_entries += 1
+                archive_cells += length
+                self._publish_entries(0, archive_entries, archive_cells)
+            target_offset, target_length = target
+            for i in range(min(length, target_length)):
+                self._cells[archive_base + target_offset + i] += self._cells[base + offset + i]
+
+        self._write_slot_header(slot, 0, 0.0, 0, 0, SLOT_FREE)
+        self._directory_cache.pop(slot, None)
+
+    # ------------------------------------------------------------------ 写入
+    def _encode_key(self, name: str, labelvalues: tuple) -> bytes:
+        return _KEY_SEPARATOR.join((name,) + tuple(labelvalues)).encode('utf-8')
+
+    def allocate(self, name: str, labelvalues: tuple, kind: int, length: int) -> Optional[memoryview]:
+        """在本进程槽位中分配一个序列的单元格，空间不足或键过长时返回None（该序列只在本进程统计）"""
+        key = self._encode_key(name, labelvalues)
+        if len(key) > self.key_size:
+            logger.warning(f"指标键过长，不写入共享段: {name}{labelvalues}")
+            return None
+
+        with self._write_lock:
+            if self._slot is None:
+                return None
+            if self._entries >= self.slot_entries or self._cells_used + length > self.slot_cells:
+                if not self._warned_full:
+                    logger.warning(f"共享指标段{self.name}槽位已满，后续新序列只在本进程统计")
+                    self._warned_full = True
+                return None
+            offset = self._cells_used
+            self._write_entry(self._slot, self._entries, key, kind, offset, length)
+            self._entries += 1
+            self._cells_used += length
+            self._publish_entries(self._slot, self._entries, self._cells_used)
+
+        start = self._cells_base(self._slot) + offset
+        view = self._cells[start:start + length]
+        self._views.append(weakref.ref(view))
+        return view
+
+    # ------------------------------------------------------------------ 读取
+    def _slot_directory(self, slot: int, identity: tuple, entries: int) -> list:
+        cached = self._directory_cache.get(slot)
+        if cached is None or cached[0] != identity:
+            cached = (identity, [])
+            self._directory_cache[slot] = cached
+        directory = cached[1]
+        for index in range(len(directory), entries):
+            directory.append(self._read_entry(slot, index))
+        return directory
+
+    def aggregate(self) -> Dict[str, Dict[tuple, List[float]]]:
+        """汇总全部存活槽位与归档槽：指标名 -> 标签值 -> 数值列表
+
+        仪表不求和，标签值末尾追加写入进程的pid，每个进程一条。
+        """
+        with self._file_lock():
+            self._reap_unlocked()
+
+        result: Dict[str, Dict[tuple, List[float]]] = {}
+        with self._file_lock(exclusive=False):
+            for slot in range(self.slots):
+                pid, create_time, entries, _, state = self._read_slot_header(slot)
+                if state == SLOT_FREE:
+                    continue
+                base = self._cells_base(slot)
+                for name, labelvalues, kind, offset, length in self._slot_directory(
+                        slot, (pid, create_time), entries):
+                    values = self._cells[base + offset:base + offset + length].tolist()
+                    if kind == KIND_GAUGE:
+                        labelvalues = labelvalues + (str(pid),)
+                    series = result.setdefault(name, {})
+                    current = series.get(labelvalues)
+                    if current is None:
+                        series[labelvalues] = values
+                    else:
+                        for i, value in enumerate(values[:len(current)]):
+                            current[i] += value
+        return result
+
+    def live_workers(self) -> int:
+        """存活的进程数"""
+        with self._file_lock(exclusive=False):
+            return len(self._live_slots_unlocked())
+
+    # ------------------------------------------------------------------ 释放
+    def reopen_after_fork(self):
+        """fork出的子进程继承了父进程的槽位，需另占一个槽位"""
+        self._write_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._directory_cache = {}
+        self._lock_file = open(self._lock_path, 'a+')
+        with self._file_lock():
+            self._slot = None
+            self._reap_unlocked()
+            self._claim_slot_unlocked()
+
+    def release(self):
+        """进程退出前把本进程的计数并入归档槽并释放槽位"""
+        with self._write_lock:
+            slot, self._slot = self._slot, None
+        if slot is None or self._shm is None:
+            return
+        with self._file_lock():
+            if self._read_slot_header(slot)[0] == os.getpid():
+                self._archive_slot_unlocked(slot)
+
+    def close(self):
+        """释放槽位并断开共享内存
+
+        调用前应先把使用单元格的指标迁回本进程（MetricsRegistry.disable_shared会先迁回再调用本方法）；
+        仍未迁回的视图在这里被释放，之后再写入会抛出ValueError。
+        """
+        self.release()
+        views, self._views = self._views, []
+        for ref in views:
+            view = ref()
+            if view is not None:
+                view.release()
+        if self._cells is not None:
+            self._cells.release()
+            self._cells = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError as e:
+                # 外部仍持有段的缓冲区，映射留给垃圾回收
+                logger.warning(f"共享指标段{self.name}仍有视图未释放，暂不断开: {e}")
+            self._shm = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def unlink(self):
+        """删除共享内存段（部署整体停止时调用）"""
+        # 直接打开（unlink时会从resource_tracker注销）
+        shm = shared_memory.SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+        try:
+            os.remove(self._lock_path)
+        except OSError:
+            pass
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+流式请求指标组件
+记录流式调用的首token耗时（TTFT）、分片间隔分布、流总耗时和输出速率（tokens/秒），
+按层级（client-统一客户端端到端，provider-提供商上游）、提供商和模型聚合
+"""
+
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .histogram import WindowedHistogram
+from .metrics_registry import get_registry
+
+# 统计层级
+SCOPE_CLIENT = "client"
+SCOPE_PROVIDER = "provider"
+
+# 流结束方式
+OUTCOME_COMPLETED = "completed"
+OUTCOME_CANCELLED = "cancelled"
+OUTCOME_ERROR = "error"
+
+_registry = get_registry()
+_labels = ("scope", "provider", "model")
+ttft_seconds = _registry.histogram(
+    "llm_time_to_first_token_seconds", "流式请求首token耗时（秒）", _labels,
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0))
+inter_chunk_seconds = _registry.histogram(
+    "llm_stream_inter_chunk_seconds", "流式分片间隔（秒）", _labels,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+stream_duration_seconds = _registry.histogram(
+    "llm_stream_duration_seconds", "完整结束的流式请求总耗时（秒）", _labels,
+    buckets=(0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0))
+output_tokens_per_second = _registry.histogram(
+    "llm_stream_output_tokens_per_second", "首token之后的输出速率（tokens/秒）", _labels,
+    buckets=(1, 2, 5, 10, 20, 40, 80, 160, 320))
+streams_total = _registry.counter(
+    "llm_streams_total", "流式请求数", _labels + ("outcome",))
+
+
+@dataclass
+class StreamRecord:
+    """一次流式请求的结果"""
+    scope: str
+    provider: str
+    model: str
+    outcome: str
+    duration: float
+    chunks: int = 0
+    output_tokens: int = 0
+    time_to_first_token: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    max_gap: float = 0.0
+
+
+class _StreamStats:
+    """单个(层级, 提供商, 模型)的流式统计"""
+
+    def __init__(self, window_seconds: float):
+        self.ttft = WindowedHistogram(window_seconds=window_seconds)
+        self.inter_chunk = WindowedHistogram(window_seconds=window_seconds)
+        self.duration = WindowedHistogram(window_seconds=window_seconds)
+        self.tokens_per_second = WindowedHistogram(window_seconds=window_seconds)
+        self.outcomes: Dict[str, int] = {OUTCOME_COMPLETED: 0, OUTCOME_CANCELLED: 0, OUTCOME_ERROR: 0}
+        self.output_tokens = 0
+
+
+class StreamMetricsTracker:
+    """流式指标汇总
+
+    各层计时器写入同一个实例，完成时通知监听者（如性能监控器的慢请求告警）。
+    """
+
+    def __init__(self, window_seconds: float = 3600):
+        self.window_seconds = window_seconds
+        self._stats: Dict[tuple, _StreamStats] = {}
+        self._listeners: List[weakref.WeakMethod] = []
+        self._lock = threading.Lock()
+
+    def _get_stats(self, key: tuple) -> _StreamStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(key, _StreamStats(self.window_seconds))
+        return stats
+
+    def record_first_token(self, key: tuple, seconds: float):
+        """记录首token耗时"""
+        self._get_stats(key).ttft.record(seconds)
+        ttft_seconds.labels(*key).observe(seconds)
+
+    def record_gap(self, key: tuple, seconds: float):
+        """记录相邻分片的间隔"""
+        self._get_stats(key).inter_chunk.record(seconds)
+        inter_chunk_seconds.labels(*key).observe(seconds)
+
+    def record_finish(self, record: StreamRecord):
+        """记录流结束"""
+        key = (record.scope, record.provider, record.model)
+        stats = self._get_stats(key)
+        with self._lock:
+            stats.outcomes[record.outcome] += 1
+            stats.output_tokens += record.output_tokens
+        streams_total.labels(*key, record.outcome).inc()
+
+        if record.outcome == OUTCOME_COMPLETED:
+            stats.duration.record(record.duration)
+            stream_duration_seconds.labels(*key).observe(record.duration)
+            if record.tokens_per_second is not None:
+                stats.tokens_per_second.record(record.tokens_per_second)
+                output_tokens_per_second.labels(*key).observe(record.tokens_per_second)
+
+        callbacks = [listener() for listener in self._listeners]
+        if None in callbacks:
+            self._listeners = [listener for listener in self._listeners if listener() is not None]
+        for callback in callbacks:
+            if callback is not None:
+                callback(record)
+
+    def add_listener(self, callback: Callable[[StreamRecord], None]):
+        """注册流结束回调（绑定方法，以弱引用保存）"""
+        self._listeners.append(weakref.WeakMethod(callback))
+
+    def remove_listener(self, callback: Callable[[StreamRecord], None]):
+        """注销流结束回调"""
+        self._listeners = [listener for listener in self._listeners
+                           if listener() is not None and listener() != callback]
+
+    def get_stats(self, scope: Optional[str] = SCOPE_CLIENT,
+                  window_seconds: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """按"提供商/模型"汇总最近window_seconds秒（None表示全量）的流式统计"""
+        with self._lock:
+            items = list(self._stats.items())
+
+        result = {}
+        for (stats_scope, provider, model), stats in items:
+            if scope is not None and stats_scope != scope:
+                continue
+            name = f"{provider}/{model}" if scope is not None else f"{stats_scope}:{provider}/{model}"
+            result[name] = {
+                'provider': provider,
+                'model': model,
+                'streams': sum(stats.outcomes.values()),
+                'outcomes': dict(stats.outcomes),
+                'output_tokens': stats.output_tokens,
+                'time_to_first_token': stats.ttft.summary(window_seconds),
+                'inter_chunk': stats.inter_chunk.summary(window_seconds),
+                'duration': stats.duration.summary(window_seconds),
+                'tokens_per_second': stats.tokens_per_second.summary(window_seconds)
+            }
+        return result
+
+    def clear(self):
+        """清空统计（不影响注册表中的累计指标）"""
+        with self._lock:
+            self._stats.clear()
+
+
+class StreamTimer:
+    """单次流式请求计时器
+
+    用法：每收到一个分片调用on_chunk，流结束时调用finish（重复调用只记录一次）。
+    """
+
+    __slots__ = ('_tracker', '_key', '_start', '_first_at', '_last_at', 'chunks',
+                 'output_tokens', 'max_gap', '_finished')
+
+    def __init__(self, provider: str, model: str, scope: str = SCOPE_CLIENT,
+                 tracker: Optional[StreamMetricsTracker] = None):
+        self._tracker = tracker or get_stream_tracker()
+        self._key = (scope, provider, model or "unknown")
+        self._start = time.monotonic()
+        self._first_at: Optional[float] = None
+        self._last_at: Optional[float] = None
+        self.chunks = 0
+        self.output_tokens = 0
+        self.max_gap = 0.0
+        self._finished = False
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """首token耗时，尚未收到分片时为None"""
+        return None if self._first_at is None else self._first_at - self._start
+
+    def on_chunk(self, tokens: int = 0):
+        """记录收到一个分片"""
+        now = time.monotonic()
+        if self._first_at is None:
+            self._first_at = now
+            self._tracker.record_first_token(self._key, now - self._start)
+        else:
+            gap = now - self._last_at
+            if gap > self.max_gap:
+                self.max_gap = gap
+            self._tracker.record_gap(self._key, gap)
+        self._last_at = now
+        self.chunks += 1
+        self.output_tokens += tokens
+
+    def finish(self, outcome: str = OUTCOME_COMPLETED) -> Optional[StreamRecord]:
+        """结束计时并记录，返回本次流式请求的结果"""
+        if self._finished:
+            return None
+        self._finished = True
+
+        tokens_per_second = None
+        if self._first_at is not None and self._last_at > self._first_at and self.output_tokens:
+            # 首token之后的生成速率，不含排队和首token等待
+            tokens_per_second = self.output_tokens / (self._last_at - self._first_at)
+
+        scope, provider, model = self._key
+        record = StreamRecord(
+            scope=scope,
+            provider=provider,
+            model=model,
+            outcome=outcome,
+            duration=time.monotonic() - self._start,
+            chunks=self.chunks,
+            output_tokens=self.output_tokens,
+            time_to_first_token=self.time_to_first_token,
+            tokens_per_second=tokens_per_second,
+            max_gap=self.max_gap
+        )
+        self._tracker.record_finish(record)
+        return record
+
+
+# 全局实例
+default_tracker = StreamMetricsTracker()
+
+
+def get_stream_tracker() -> StreamMetricsTracker:
+    """获取全局流式指标汇总"""
+    return default_tracker
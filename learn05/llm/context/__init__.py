@@ -7,6 +7,8 @@
 from .context_manager import ContextManager, ConversationContext
 from .session_manager import SessionManager, SessionInfo
 from .memory_store import MemoryStore, MemoryType
+from .storage import StorageBackend, SQLiteStorage, create_storage
+from .prompt_compressor import ExtractiveCompressor
 from .context_strategies import (
     ContextStrategy,
     SlidingWindowStrategy,
@@ -21,6 +23,10 @@ __all__ = [
     'SessionInfo',
     'MemoryStore',
     'MemoryType',
+    'StorageBackend',
+    'SQLiteStorage',
+    'create_storage',
+    'ExtractiveCompressor',
     'ContextStrategy',
     'SlidingWindowStrategy',
     'TokenLimitStrategy',
@@ -53,5 +59,5 @@ def get_strategy_descriptions() -> dict:
     return {
         'sliding_window': '滑动窗口策略：保持最近N轮对话',
         'token_limit': 'Token限制策略：基于Token数量限制上下文长度',
-        'semantic_compression': '语义压缩策略：基于语义相似度压缩历史对话'
+        'semantic_compression': '语义压缩策略：抽取式压缩历史对话（分句去重、按显著性保留）'
     }
\ No newline at end of file
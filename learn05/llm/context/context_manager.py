@@ -5,12 +5,16 @@
 """
 
 from typing import Dict, List, Optional, Any, Union
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 import json
+import time
 import uuid
 from enum import Enum
 
+from .storage import StorageBackend, create_storage
+
 class MessageRole(Enum):
     """消息角色"""
     SYSTEM = "system"
@@ -34,6 +38,17 @@ class Message:
     timestamp: datetime = field(default_factory=datetime.now)
     metadata: Dict[str, Any] = field(default_factory=dict)
     message_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # (计数器名, 计数时的正文, token数)，正文被替换后自动失效
+    _token_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    
+    def token_count(self, counter) -> int:
+        """按计数器统计正文token数，每条消息每个计数器只计算一次"""
+        cache = self._token_cache
+        if cache is not None and cache[0] == counter.name and cache[1] is self.content:
+            return cache[2]
+        count = counter.count(self.content)
+        self._token_cache = (counter.name, self.content, count)
+        return count
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -143,13 +158,19 @@ class ConversationContext:
 class ContextManager:
     """上下文管理器"""
     
-    def __init__(self, config: Optional[Dict[str, Any]] = None):
+    def __init__(self, config: Optional[Dict[str, Any]] = None, storage: Optional[StorageBackend] = None):
         self.config = config or {}
-        self.contexts: Dict[str, ConversationContext] = {}
+        # 常驻内存的上下文，按最近访问排序
+        self.contexts: Dict[str, ConversationContext] = OrderedDict()
         self.default_max_messages = self.config.get('default_max_messages', 50)
         self.context_timeout = timedelta(hours=self.config.get('context_timeout_hours', 24))
         self.auto_cleanup = self.config.get('auto_cleanup', True)
         
+        # 持久化：上下文有改动时交给存储后端，不在内存中的上下文访问时再加载；
+        # 常驻数超过max_resident_contexts时淘汰最久未访问的（0表示不限制）
+        self.storage = storage if storage is not None else create_storage(self.config)
+        self.max_resident_contexts = self.config.get('max_resident_contexts', 0)
+        
         # 初始化策略
         self.strategy = None
         strategy_name = self.config.get('strategy', 'sliding_window')
@@ -160,10 +181,13 @@ class ContextManager:
         from .context_strategies import (
             SlidingWindowStrategy,
             TokenLimitStrategy,
-            SemanticCompressionStrategy
+            SemanticCompressionStrategy,
+            create_token_counter
         )
         
-        strategy_config = self.config.get('strategy_config', {})
+        strategy_config = dict(self.config.get('strategy_config', {}))
+        # 配置了tokenizer_model时按目标模型的分词器计数
+        strategy_config.setdefault('token_counter', create_token_counter(self.config.get('tokenizer_model')))
         
         if strategy_name == 'sliding_window':
             self.strategy = SlidingWindowStrategy(**strategy_config)
@@ -173,7 +197,7 @@ class ContextManager:
             self.strategy = SemanticCompressionStrategy(**strategy_config)
         else:
             # 默认使用滑动窗口策略
-            self.strategy = SlidingWindowStrategy(window_size=10)
+            self.strategy = SlidingWindowStrategy(window_size=10, token_counter=strategy_config['token_counter'])
     
     def create_context(self, 
                       session_id: str, 
@@ -193,12 +217,33 @@ class ContextManager:
         if system_prompt:
             context.add_message(MessageRole.SYSTEM, system_prompt)
         
-        self.contexts[session_id] = context
+        self._make_resident(context)
+        self._persist(context)
         return context
     
+    def _persist(self, context: ConversationContext):
+        """上下文有改动时交给存储后端（延迟批量写入）"""
+        if self.storage is not None:
+            self.storage.put('context', context.session_id, context, context.user_info.get('user_id'))
+    
+    def _make_resident(self, context: ConversationContext):
+        """放入内存并淘汰超出上限的最久未访问上下文（已持久化，淘汰后可重新加载）"""
+        self.contexts[context.session_id] = context
+        self.contexts.move_to_end(context.session_id)
+        if self.storage is not None and self.max_resident_contexts:
+            while len(self.contexts) > self.max_resident_contexts:
+                self.contexts.popitem(last=False)
+    
     def get_context(self, session_id: str) -> Optional[ConversationContext]:
         """获取对话上下文"""
         context = self.contexts.get(session_id)
+        if context is not None:
+            self.contexts.move_to_end(session_id)
+        elif self.storage is not None:
+            record = self.storage.get('context', session_id)
+            if record is not None:
+                context = ConversationContext.from_dict(record[0])
+                self._make_resident(context)
         
         if context and self.auto_cleanup:
             # 检查是否超时
@@ -219,6 +264,7 @@ class ContextManager:
                 setattr(context, key, value)
         
         context.updated_at = datetime.now()
+        self._persist(context)
         return True
     
     def add_message(self, 
@@ -237,6 +283,7 @@ class ContextManager:
         if self.strategy:
             context.messages = self.strategy.apply(context.messages)
         
+        self._persist(context)
         return True
     
     def get_conversation_history(self, 
@@ -277,10 +324,11 @@ class ContextManager:
     
     def remove_context(self, session_id: str) -> bool:
         """删除上下文"""
-        if session_id in self.contexts:
-            del self.contexts[session_id]
-            return True
-        return False
+        removed = self.contexts.pop(session_id, None) is not None
+        if self.storage is not None:
+            removed = removed or self.storage.get('context', session_id) is not None
+            self.storage.delete('context', session_id)
+        return removed
     
     def clear_context_messages(self, session_id: str) -> bool:
         """清空上下文消息"""
@@ -289,11 +337,14 @@ class ContextManager:
             return False
         
         context.clear_messages()
+        self._persist(context)
         return True
     
     def list_active_sessions(self) -> List[str]:
-        """列出活跃的会话"""
+        """列出活跃的会话（有存储后端时包括未加载到内存的，按更新时间索引查询）"""
         if not self.auto_cleanup:
+            if self.storage is not None:
+                return list(dict.fromkeys([*self.contexts, *self.storage.keys_updated_since('context', 0.0)]))
             return list(self.contexts.keys())
         
         active_sessions = []
@@ -303,6 +354,11 @@ class ContextManager:
             if current_time - context.updated_at <= self.context_timeout:
                 active_sessions.append(session_id)
         
+        if self.storage is not None:
+            since = time.time() - self.context_timeout.total_seconds()
+            resident = set(self.contexts)
+            active_sessions.extend(session_id for session_id in self.storage.keys_updated_since('context', since)
+                                   if session_id not in resident)
         return active_sessions
     
     def cleanup_expired_contexts(self) -> int:
@@ -319,28 +375,47 @@ class ContextManager:
         
         for session_id in expired_sessions:
             del self.contexts[session_id]
+            if self.storage is not None:
+                self.storage.delete('context', session_id)
         
+        if self.storage is not None:
+            cutoff = time.time() - self.context_timeout.total_seconds()
+            return len(expired_sessions) + self.storage.purge_before('context', cutoff)
         return len(expired_sessions)
     
+    def _all_context_dicts(self) -> Dict[str, Dict[str, Any]]:
+        """全部上下文的字典形式：常驻的直接转换，未加载的从存储后端读取（不放入内存）"""
+        contexts = {session_id: context.to_dict() for session_id, context in self.contexts.items()}
+        if self.storage is not None:
+            for session_id in self.storage.keys_updated_since('context', 0.0):
+                if session_id in contexts:
+                    continue
+                record = self.storage.get('context', session_id)
+                if record is not None:
+                    contexts[session_id] = record[0]
+        return contexts
+    
     def get_context_statistics(self) -> Dict[str, Any]:
-        """获取上下文统计信息"""
-        total_contexts = len(self.contexts)
+        """获取上下文统计信息（有存储后端时包括未加载的上下文）"""
+        contexts = self._all_context_dicts()
+        total_contexts = len(contexts)
         active_contexts = len(self.list_active_sessions())
         
         context_types = {}
         total_messages = 0
         
-        for context in self.contexts.values():
-            context_type = context.context_type.value
+        for context in contexts.values():
+            context_type = context['context_type']
             context_types[context_type] = context_types.get(context_type, 0) + 1
-            total_messages += len(context.messages)
+            total_messages += len(context['messages'])
         
         return {
             'total_contexts': total_contexts,
             'active_contexts': active_contexts,
             'context_types': context_types,
             'total_messages': total_messages,
-            'average_messages_per_context': total_messages / total_contexts if total_contexts > 0 else 0
+            'average_messages_per_context': total_messages / total_contexts if total_contexts > 0 else 0,
+            'stored_contexts': self.storage.count('context') if self.storage is not None else total_contexts
         }
     
     def export_context(self, session_id: str) -> Optional[Dict[str, Any]]:
@@ -355,7 +430,8 @@ class ContextManager:
         """导入上下文数据"""
         try:
             context = ConversationContext.from_dict(context_data)
-            self.contexts[context.session_id] = context
+            self._make_resident(context)
+            self._persist(context)
             return True
         except Exception as e:
             print(f"Error importing context: {e}")
@@ -368,8 +444,7 @@ class ContextManager:
             'contexts': {}
         }
         
-        for session_id, context in self.contexts.items():
-            data['contexts'][session_id] = context.to_dict()
+        data['contexts'] = self._all_context_dicts()
         
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
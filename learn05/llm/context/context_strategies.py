@@ -4,14 +4,126 @@
 实现不同的上下文管理策略
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Sequence
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
+import logging
 import re
 import math
 
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 from .context_manager import Message, MessageRole
+from .prompt_compressor import ExtractiveCompressor
+
+logger = logging.getLogger(__name__)
+
+_CHINESE_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+_WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# 每个策略缓存的前缀和序列数（约等于同时活跃的会话数）
+_MAX_LEDGERS = 1024
+
+class TokenCounter:
+    """token计数器：默认按字符规则估算（中文字符按1.5、英文单词按1计算）
+
+    name用于区分消息上缓存的计数，不同计数规则必须使用不同的name。
+    """
+    
+    name = 'estimate'
+    
+    def count(self, text: str) -> int:
+        chinese_chars = len(_CHINESE_CHAR_PATTERN.findall(text))
+        english_words = len(_WORD_PATTERN.findall(text))
+        return int(chinese_chars * 1.5 + english_words)
+
+
+class TokenizerCounter(TokenCounter):
+    """使用真实分词器计数
+    
+    Args:
+        encode: 文本 -> token序列
+        name: 分词器名称（如模型名）
+    """
+    
+    def __init__(self, encode: Callable[[str], Sequence[Any]], name: str):
+        self._encode = encode
+        self.name = name
+    
+    def count(self, text: str) -> int:
+        return len(self._encode(text))
+
+
+def create_token_counter(model: Optional[str] = None) -> TokenCounter:
+    """目标模型的分词器计数（需要tiktoken），未指定模型或不可用时退回估算"""
+    if not model:
+        return TokenCounter()
+    if tiktoken is None:
+        logger.warning(f"未安装tiktoken，模型 {model} 的token数改为估算")
+        return TokenCounter()
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.warning(f"tiktoken不支持模型 {model}，使用cl100k_base编码")
+        encoding = tiktoken.get_encoding('cl100k_base')
+    return TokenizerCounter(encoding.encode, f"tiktoken:{model}")
+
+
+class TokenLedger:
+    """消息序列的token前缀和
+    
+    sums[i]是前i条消息的token总数（按绝对位置），头部裁掉消息时只移动start，尾部追加时只计算新消息；
+    区间求和与按预算裁剪都是O(1)/O(log n)。已计入的消息视为不再修改（原地改写正文后需换一个新列表对象重新计算）。
+    """
+    
+    __slots__ = ('messages', 'sums', 'start')
+    
+    def __init__(self):
+        self.messages: List[Message] = []
+        self.sums: List[int] = [0]
+        self.start = 0
+    
+    def __len__(self) -> int:
+        return len(self.messages) - self.start
+    
+    @property
+    def total(self) -> int:
+        return self.sums[-1] - self.sums[self.start]
+    
+    def matches(self, messages: List[Message]) -> bool:
+        """messages是否为当前序列在尾部追加若干条（只核对首尾，消息列表只在尾部追加、头部裁剪）"""
+        size = len(self)
+        if len(messages) < size:
+            return False
+        return size == 0 or (messages[0] is self.messages[self.start] and messages[size - 1] is self.messages[-1])
+    
+    def extend(self, messages: List[Message], count_tokens: Callable[[Message], int]):
+        total = self.sums[-1]
+        for message in messages:
+            total += count_tokens(message)
+            self.messages.append(message)
+            self.sums.append(total)
+    
+    def suffix_start(self, budget: int) -> int:
+        """token总数不超过budget的最长后缀的起点（相对序号，等于长度时表示一条都放不下）"""
+        threshold = self.sums[-1] - budget
+        return bisect_left(self.sums, threshold, self.start, len(self.sums)) - self.start
+    
+    def drop_front(self, count: int):
+        """裁掉头部count条，裁掉的部分超过一半时再整体搬移"""
+        self.start += count
+        if self.start > 64 and self.start * 2 > len(self.messages):
+            base = self.sums[self.start]
+            del self.messages[:self.start]
+            self.sums = [value - base for value in self.sums[self.start:]]
+            self.start = 0
+
 
 @dataclass
 class StrategyConfig:
@@ -24,8 +136,11 @@ class StrategyConfig:
 class ContextStrategy(ABC):
     """上下文策略抽象基类"""
     
-    def __init__(self, config: Optional[StrategyConfig] = None):
+    def __init__(self, config: Optional[StrategyConfig] = None, token_counter: Optional[TokenCounter] = None):
         self.config = config or StrategyConfig()
+        self.token_counter = token_counter or TokenCounter()
+        # 序列首条消息的id -> 前缀和（上下文每轮只追加消息，下一轮直接续算）
+        self._ledgers: Dict[int, TokenLedger] = OrderedDict()
     
     @abstractmethod
     def apply(self, messages: List[Message]) -> List[Message]:
@@ -34,12 +149,40 @@ class ContextStrategy(ABC):
     
     def estimate_tokens(self, text: str) -> int:
         """估算文本的token数量"""
-        # 简单的token估算：中文字符按1.5计算，英文单词按1计算
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        english_words = len(re.findall(r'\b\w+\b', text))
-        return int(chinese_chars * 1.5 + english_words)
+        return self.token_counter.count(text)
+    
+    def message_tokens(self, message: Message) -> int:
+        """消息的token数（缓存在消息上）"""
+        return message.token_count(self.token_counter)
+    
+    def token_ledger(self, messages: List[Message]) -> TokenLedger:
+        """取messages的前缀和：与上次的序列相比只在尾部追加时复用，只计算新消息"""
+        ledger = self._ledgers.get(id(messages[0])) if messages else None
+        if ledger is not None and ledger.matches(messages):
+            ledger.extend(messages[len(ledger):], self.message_tokens)
+        else:
+            ledger = TokenLedger()
+            ledger.extend(messages, self.message_tokens)
+        self._remember_ledger(ledger)
+        return ledger
+    
+    def _remember_ledger(self, ledger: TokenLedger, previous_head: Optional[Message] = None):
+        if previous_head is not None:
+            self._ledgers.pop(id(previous_head), None)
+        if not len(ledger):
+            return
+        key = id(ledger.messages[ledger.start])
+        self._ledgers[key] = ledger
+        self._ledgers.move_to_end(key)
+        while len(self._ledgers) > _MAX_LEDGERS:
+            self._ledgers.popitem(last=False)
+    
+    def total_tokens(self, messages: List[Message]) -> int:
+        """消息列表的token总数"""
+        return self.token_ledger(messages).total if messages else 0
     
-    def calculate_message_importance(self, message: Message, context: List[Message]) -> float:
+    def calculate_message_importance(self, message: Message, context: List[Message],
+                                     latest_time: Optional[datetime] = None) -> float:
         """计算消息重要性"""
         importance = 0.0
         
@@ -60,9 +203,10 @@ class ContextStrategy(ABC):
         keyword_count = sum(1 for keyword in keywords if keyword in message.content)
         importance += min(0.3, keyword_count * 0.1)
         
-        # 基于时间的重要性（越新越重要）
-        if context:
+        # 基于时间的重要性（越新越重要）；批量计算时由调用方传入latest_time，避免每条消息都遍历上下文
+        if latest_time is None and context:
             latest_time = max(msg.timestamp for msg in context)
+        if latest_time is not None:
             time_diff = (latest_time - message.timestamp).total_seconds()
             time_score = math.exp(-time_diff / 3600)  # 1小时衰减
             importance += time_score * 0.2
@@ -105,7 +249,7 @@ class TokenLimitStrategy(ContextStrategy):
         self.max_tokens = max_tokens
     
     def apply(self, messages: List[Message]) -> List[Message]:
-        """基于token数量限制上下文"""
+        """基于token数量限制上下文：系统消息在前，其后是预算内最新的连续消息（按时间顺序）"""
         if not messages:
             return messages
         
@@ -116,35 +260,48 @@ class TokenLimitStrategy(ContextStrategy):
         if self.config.preserve_system:
             system_messages = [msg for msg in messages if msg.role == MessageRole.SYSTEM]
             for msg in system_messages:
-                tokens = self.estimate_tokens(msg.content)
+                tokens = self.message_tokens(msg)
                 if total_tokens + tokens <= self.max_tokens:
                     result.append(msg)
                     total_tokens += tokens
         
-        # 从最新消息开始添加
+        # 从最新消息往前，取放得下的最长后缀（前缀和上二分）
         non_system_messages = [msg for msg in messages if msg.role != MessageRole.SYSTEM]
+        if not non_system_messages:
+            return result
         
-        for msg in reversed(non_system_messages):
-            tokens = self.estimate_tokens(msg.content)
-            if total_tokens + tokens <= self.max_tokens:
-                result.insert(-len([m for m in result if m.role == MessageRole.SYSTEM]), msg)
-                total_tokens += tokens
-            else:
-                break
+        ledger = self.token_ledger(non_system_messages)
+        start = ledger.suffix_start(self.max_tokens - total_tokens)
+        result.extend(non_system_messages[start:])
+        
+        # 裁剪后的序列通常会成为下一轮的输入，前缀和跟着移到新的首条消息
+        if 0 < start < len(non_system_messages):
+            ledger.drop_front(start)
+            self._remember_ledger(ledger, previous_head=non_system_messages[0])
         
         return result
 
 class SemanticCompressionStrategy(ContextStrategy):
-    """语义压缩策略"""
+    """语义压缩策略
+    
+    默认抽取式压缩：token总数超过config.max_tokens时，系统消息和最近preserve_recent条消息原样保留，
+    更早的消息逐句去重并按显著性压缩到刚好放得下，但每条消息只压缩一次、最多压缩到compression_ratio（token比例）。
+    extractive=False时沿用按消息重要性整条丢弃（compression_ratio为保留的消息比例）。
+    """
     
-    def __init__(self, compression_ratio: float = 0.7, **kwargs):
+    def __init__(self, compression_ratio: float = 0.7, extractive: bool = True,
+                 redundancy_threshold: float = 0.6, **kwargs):
         super().__init__(**kwargs)
         self.compression_ratio = compression_ratio
+        self.extractive = extractive
+        self.compressor = ExtractiveCompressor(compression_ratio, redundancy_threshold, self.token_counter)
     
     def apply(self, messages: List[Message]) -> List[Message]:
         """基于语义重要性压缩上下文"""
         if not messages:
             return messages
+        if self.extractive:
+            return self._compress_sentences(messages)
         
         # 计算目标消息数量
         target_count = int(len(messages) * self.compression_ratio)
@@ -166,9 +323,10 @@ class SemanticCompressionStrategy(ContextStrategy):
             return result
         
         # 计算每条消息的重要性分数
+        latest_time = max(msg.timestamp for msg in messages)
         message_scores = []
         for msg in non_system_messages:
-            importance = self.calculate_message_importance(msg, messages)
+            importance = self.calculate_message_importance(msg, messages, latest_time)
             message_scores.append((msg, importance))
         
         # 按重要性排序
@@ -183,6 +341,52 @@ class SemanticCompressionStrategy(ContextStrategy):
         result.extend(selected_messages)
         
         return result
+    
+    def _compress_sentences(self, messages: List[Message]) -> List[Message]:
+        """抽取式压缩较早的消息，只压缩到刚好不超过config.max_tokens
+        
+        已压缩过的消息（metadata['compressed']）原样保留，只作为去重的参照，避免每轮反复压缩；
+        新压缩的消息最多压缩到compression_ratio，仍超出上限时从最早的历史消息开始整条去掉。
+        """
+        if self.total_tokens(messages) <= self.config.max_tokens:
+            return messages
+        
+        system_messages = [msg for msg in messages if msg.role == MessageRole.SYSTEM]
+        non_system_messages = [msg for msg in messages if msg.role != MessageRole.SYSTEM]
+        split = max(0, len(non_system_messages) - self.config.preserve_recent)
+        history, recent = non_system_messages[:split], non_system_messages[split:]
+        
+        result = list(system_messages) if self.config.preserve_system else []
+        protected = result + recent
+        available = self.config.max_tokens - self.total_tokens(protected)
+        
+        fresh = [msg for msg in history if not msg.metadata.get('compressed')]
+        done = [msg for msg in history if msg.metadata.get('compressed')]
+        compressed = {}
+        if fresh:
+            budget = max(0, available - self.total_tokens(done))
+            contents = self.compressor.compress([msg.content for msg in fresh],
+                                                [msg.content for msg in done + protected],
+                                                budget=budget)
+            compressed = {id(msg): content for msg, content in zip(fresh, contents)}
+        
+        kept = []
+        for msg in history:
+            content = compressed.get(id(msg), msg.content)
+            if content == msg.content:
+                kept.append(msg)
+            elif content:
+                kept.append(replace(msg, content=content, metadata={**msg.metadata, 'compressed': True}))
+        
+        # 压缩到compression_ratio仍放不下时，从最早的历史消息开始整条去掉
+        total = self.total_tokens(kept)
+        start = 0
+        while start < len(kept) and total > available:
+            total -= self.message_tokens(kept[start])
+            start += 1
+        result.extend(kept[start:])
+        result.extend(recent)
+        return result
 
 class AdaptiveStrategy(ContextStrategy):
     """自适应策略"""
@@ -197,10 +401,12 @@ class AdaptiveStrategy(ContextStrategy):
         self.window_size = window_size
         self.importance_threshold = importance_threshold
         
-        # 子策略
-        self.token_strategy = TokenLimitStrategy(token_limit)
-        self.window_strategy = SlidingWindowStrategy(window_size)
-        self.semantic_strategy = SemanticCompressionStrategy()
+        # 子策略（共用计数器，消息上的token缓存对它们同样有效）
+        self.token_strategy = TokenLimitStrategy(token_limit, token_counter=self.token_counter)
+        self.window_strategy = SlidingWindowStrategy(window_size, token_counter=self.token_counter)
+        self.semantic_strategy = SemanticCompressionStrategy(
+            config=replace(self.config, max_tokens=token_limit), token_counter=self.token_counter
+        )
     
     def apply(self, messages: List[Message]) -> List[Message]:
         """自适应选择最佳策略"""
@@ -208,7 +414,7 @@ class AdaptiveStrategy(ContextStrategy):
             return messages
         
         # 计算总token数
-        total_tokens = sum(self.estimate_tokens(msg.content) for msg in messages)
+        total_tokens = self.total_tokens(messages)
         
         # 根据情况选择策略
         if total_tokens <= self.token_limit:
@@ -259,9 +465,10 @@ class HierarchicalStrategy(ContextStrategy):
         historical_messages = non_system_messages[:-self.recent_count]
         if historical_messages:
             # 计算重要性并选择
+            latest_time = max(msg.timestamp for msg in messages)
             message_scores = []
             for msg in historical_messages:
-                importance = self.calculate_message_importance(msg, messages)
+                importance = self.calculate_message_importance(msg, messages, latest_time)
                 if importance >= self.config.importance_threshold:
                     message_scores.append((msg, importance))
             
@@ -344,12 +551,13 @@ class DynamicStrategy(ContextStrategy):
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        counter = self.token_counter
         self.strategies = {
-            'token_limit': TokenLimitStrategy(),
-            'sliding_window': SlidingWindowStrategy(),
-            'semantic_compression': SemanticCompressionStrategy(),
-            'adaptive': AdaptiveStrategy(),
-            'hierarchical': HierarchicalStrategy()
+            'token_limit': TokenLimitStrategy(token_counter=counter),
+            'sliding_window': SlidingWindowStrategy(token_counter=counter),
+            'semantic_compression': SemanticCompressionStrategy(token_counter=counter),
+            'adaptive': AdaptiveStrategy(token_counter=counter),
+            'hierarchical': HierarchicalStrategy(token_counter=counter)
         }
         self.strategy_usage = {name: 0 for name in self.strategies.keys()}
         self.strategy_performance = {name: [] for name in self.strategies.keys()}
@@ -377,7 +585,7 @@ class DynamicStrategy(ContextStrategy):
     def _analyze_message_features(self, messages: List[Message]) -> Dict[str, Any]:
         """分析消息特征"""
         total_messages = len(messages)
-        total_tokens = sum(self.estimate_tokens(msg.content) for msg in messages)
+        total_tokens = self.total_tokens(messages)
         avg_message_length = sum(len(msg.content) for msg in messages) / total_messages if total_messages > 0 else 0
         
         # 角色分布
@@ -472,7 +680,7 @@ class StrategyFactory:
         descriptions = {
             'sliding_window': '滑动窗口策略：保持最近N轮对话',
             'token_limit': 'Token限制策略：基于Token数量限制上下文长度',
-            'semantic_compression': '语义压缩策略：基于语义重要性压缩历史对话',
+            'semantic_compression': '语义压缩策略：抽取式压缩历史对话（分句去重、按显著性保留）',
             'adaptive': '自适应策略：根据上下文情况自动选择最佳策略',
             'hierarchical': '分层策略：分层保留不同重要性的消息',
             'conversation_aware': '对话感知策略：基于对话轮次管理上下文',
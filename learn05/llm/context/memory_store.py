@@ -5,14 +5,27 @@
 """
 
 from typing import Dict, List, Optional, Any, Union, Tuple
-from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
 import json
+import time
 import uuid
 import hashlib
+import heapq
+import logging
+import threading
 from collections import defaultdict
 
+from .storage import StorageBackend, create_storage
+from .text_index import BM25Index, tokenize
+
+try:
+    from ..components.minhash_lsh import MinHashLSH, estimate_jaccard, jaccard
+except (ImportError, ValueError):
+    from components.minhash_lsh import MinHashLSH, estimate_jaccard, jaccard
+
+logger = logging.getLogger(__name__)
+
 class MemoryType(Enum):
     """记忆类型"""
     SHORT_TERM = "short_term"  # 短期记忆
@@ -29,25 +42,103 @@ class MemoryImportance(Enum):
     HIGH = 3
     CRITICAL = 4
 
-@dataclass
+# 单调时钟相对墙上时钟的偏移，记忆项内部只保存单调时间戳
+_CLOCK_OFFSET = time.time() - time.monotonic()
+
+# 64位签名的估计误差约0.06，估计值低于阈值减去该余量的候选直接跳过精确比较
+_ESTIMATE_MARGIN = 0.15
+
+
+def _monotonic_from(value: Union[datetime, float, None]) -> float:
+    if value is None:
+        return time.monotonic()
+    if isinstance(value, datetime):
+        return value.timestamp() - _CLOCK_OFFSET
+    return float(value)
+
+
 class MemoryItem:
-    """记忆项"""
-    memory_id: str
-    content: str
-    memory_type: MemoryType
-    importance: MemoryImportance
-    created_at: datetime = field(default_factory=datetime.now)
-    last_accessed: datetime = field(default_factory=datetime.now)
-    access_count: int = 0
-    metadata: Dict[str, Any] = field(default_factory=dict)
-    tags: List[str] = field(default_factory=list)
-    related_memories: List[str] = field(default_factory=list)
-    decay_rate: float = 0.1  # 遗忘率
-    strength: float = 1.0  # 记忆强度
+    """记忆项（__slots__紧凑存储，created_at/last_accessed以单调时间戳保存）
+    
+    metadata/tags/related_memories为空时不分配容器（槽位为None），首次通过属性访问时才创建；
+    只读的内部路径直接读取槽位，避免为大多数没有标签和关联的记忆创建空容器。
+    """
+    
+    __slots__ = ('memory_id', 'content', 'memory_type', 'importance', 'created_ts', 'accessed_ts',
+                 'access_count', '_metadata', '_tags', '_related_memories', 'decay_rate', 'strength')
+    
+    def __init__(self, memory_id: str, content: str, memory_type: MemoryType,
+                 importance: MemoryImportance, created_at: Union[datetime, float, None] = None,
+                 last_accessed: Union[datetime, float, None] = None, access_count: int = 0,
+                 metadata: Optional[Dict[str, Any]] = None, tags: Optional[List[str]] = None,
+                 related_memories: Optional[List[str]] = None,
+                 decay_rate: float = 0.1, strength: float = 1.0):
+        self.memory_id = memory_id
+        self.content = content
+        self.memory_type = memory_type
+        self.importance = importance
+        self.created_ts = _monotonic_from(created_at)
+        self.accessed_ts = self.created_ts if last_accessed is None else _monotonic_from(last_accessed)
+        self.access_count = access_count
+        self._metadata = metadata or None
+        self._tags = tags or None
+        self._related_memories = related_memories or None
+        self.decay_rate = decay_rate  # 遗忘率
+        self.strength = strength  # 记忆强度
+    
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts + _CLOCK_OFFSET)
+    
+    @created_at.setter
+    def created_at(self, value: Union[datetime, float]):
+        self.created_ts = _monotonic_from(value)
+    
+    @property
+    def last_accessed(self) -> datetime:
+        return datetime.fromtimestamp(self.accessed_ts + _CLOCK_OFFSET)
+    
+    @last_accessed.setter
+    def last_accessed(self, value: Union[datetime, float]):
+        self.accessed_ts = _monotonic_from(value)
+    
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+    
+    @metadata.setter
+    def metadata(self, value: Dict[str, Any]):
+        self._metadata = value
+    
+    @property
+    def tags(self) -> List[str]:
+        if self._tags is None:
+            self._tags = []
+        return self._tags
+    
+    @tags.setter
+    def tags(self, value: List[str]):
+        self._tags = value
+    
+    @property
+    def related_memories(self) -> List[str]:
+        if self._related_memories is None:
+            self._related_memories = []
+        return self._related_memories
+    
+    @related_memories.setter
+    def related_memories(self, value: List[str]):
+        self._related_memories = value
+    
+    def seconds_since_access(self) -> float:
+        """距上次访问的秒数"""
+        return time.monotonic() - self.accessed_ts
     
     def access(self):
         """访问记忆，更新访问时间和次数"""
-        self.last_accessed = datetime.now()
+        self.accessed_ts = time.monotonic()
         self.access_count += 1
         # 增强记忆强度
         self.strength = min(1.0, self.strength + 0.1)
@@ -71,12 +162,12 @@ class MemoryItem:
             score += 0.5
         
         # 标签匹配
-        for tag in self.tags:
+        for tag in self._tags or ():
             if query_lower in tag.lower():
                 score += 0.3
         
         # 元数据匹配
-        for value in self.metadata.values():
+        for value in (self._metadata or {}).values():
             if isinstance(value, str) and query_lower in value.lower():
                 score += 0.2
         
@@ -96,9 +187,9 @@ class MemoryItem:
             'created_at': self.created_at.isoformat(),
             'last_accessed': self.last_accessed.isoformat(),
             'access_count': self.access_count,
-            'metadata': self.metadata,
-            'tags': self.tags,
-            'related_memories': self.related_memories,
+            'metadata': self._metadata or {},
+            'tags': self._tags or [],
+            'related_memories': self._related_memories or [],
             'decay_rate': self.decay_rate,
             'strength': self.strength
         }
@@ -120,27 +211,65 @@ class MemoryItem:
             decay_rate=data.get('decay_rate', 0.1),
             strength=data.get('strength', 1.0)
         )
+    
+    def __repr__(self) -> str:
+        return (f"MemoryItem(memory_id={self.memory_id!r}, memory_type={self.memory_type}, "
+                f"importance={self.importance}, strength={self.strength:.2f})")
 
 class MemoryStore:
     """内存存储"""
     
-    def __init__(self, config: Optional[Dict[str, Any]] = None):
+    def __init__(self, config: Optional[Dict[str, Any]] = None, storage: Optional[StorageBackend] = None):
         self.config = config or {}
         self.memories: Dict[str, MemoryItem] = {}
         self.type_index: Dict[MemoryType, List[str]] = defaultdict(list)
         self.tag_index: Dict[str, List[str]] = defaultdict(list)
         self.user_memories: Dict[str, List[str]] = defaultdict(list)
+        # 记忆ID -> 所属用户（过滤和删除时免遍历user_memories）
+        self._memory_owner: Dict[str, str] = {}
+        
+        # 全文索引：字段权重沿用原先子串匹配的0.5/0.3/0.2比例
+        self.search_index = BM25Index(
+            k1=self.config.get('search_bm25_k1', 1.2),
+            b=self.config.get('search_bm25_b', 0.75),
+            field_weights=self.config.get('search_field_weights',
+                                          {'content': 1.0, 'tags': 0.6, 'metadata': 0.4})
+        )
+        
+        # 记忆整合：MinHash签名按用户分桶，新增或修改的记忆进入待整合队列
+        self.consolidation_lsh = MinHashLSH(
+            num_perm=self.config.get('consolidation_num_perm', 64),
+            bands=self.config.get('consolidation_bands', 16)
+        )
+        self._consolidation_queue: Dict[str, None] = {}
         
         # 配置参数
         self.max_memories = self.config.get('max_memories', 10000)
         self.auto_decay = self.config.get('auto_decay', True)
         self.decay_interval = timedelta(hours=self.config.get('decay_interval_hours', 24))
         self.min_strength_threshold = self.config.get('min_strength_threshold', 0.1)
+        self.consolidation_threshold = self.config.get('consolidation_threshold', 0.7)
+        self.consolidation_interval = self.config.get('consolidation_interval_seconds', 60)
+        self.consolidation_max_pause = self.config.get('consolidation_max_pause_ms', 5) / 1000
         
-        # 统计信息
-        self.last_decay_time = datetime.now()
+        # 统计信息（last_decay_time与记忆项一样使用单调时间戳）
+        self.last_decay_time = time.monotonic()
         self.total_memories_created = 0
         self.total_memories_decayed = 0
+        self.total_memories_consolidated = 0
+        
+        # 后台线程与前台调用共用一把锁，后台每次持锁不超过consolidation_max_pause
+        self._lock = threading.RLock()
+        self._consolidation_thread: Optional[threading.Thread] = None
+        self._consolidation_stop = threading.Event()
+        
+        # 持久化：按用户懒加载，只有访问过的用户的记忆常驻内存（无主记忆启动时加载）
+        self.storage = storage if storage is not None else create_storage(self.config)
+        self._loaded_users = set()
+        self._load_user(None)
+        
+        if self.config.get('background_consolidation', False):
+            self.start_background_consolidation()
     
     def add_memory(self, 
                   content: str,
@@ -150,97 +279,183 @@ class MemoryStore:
                   metadata: Dict[str, Any] = None,
                   tags: List[str] = None) -> str:
         """添加记忆"""
-        memory_id = str(uuid.uuid4())
-        
-        memory = MemoryItem(
-            memory_id=memory_id,
-            content=content,
-            memory_type=memory_type,
-            importance=importance,
-            metadata=metadata or {},
-            tags=tags or []
-        )
+        with self._lock:
+            memory_id = str(uuid.uuid4())
+            
+            memory = MemoryItem(
+                memory_id=memory_id,
+                content=content,
+                memory_type=memory_type,
+                importance=importance,
+                metadata=metadata,
+                tags=tags
+            )
+            
+            # 先加载该用户已持久化的记忆，整合和容量清理才能看到全部
+            if user_id:
+                self._load_user(user_id)
+            self._register_memory(memory, user_id)
+            self._persist(memory)
+            self.total_memories_created += 1
+            
+            # 检查内存限制
+            if len(self.memories) > self.max_memories:
+                self._cleanup_old_memories()
+            
+            # 自动衰减
+            if self.auto_decay:
+                self._auto_decay()
+            
+            return memory_id
         
+    def _register_memory(self, memory: MemoryItem, user_id: Optional[str]):
+        """把记忆加入内存和各项索引"""
+        memory_id = memory.memory_id
         self.memories[memory_id] = memory
-        
-        # 更新索引
-        self.type_index[memory_type].append(memory_id)
-        
-        for tag in memory.tags:
+        self.type_index[memory.memory_type].append(memory_id)
+        for tag in memory._tags or ():
             self.tag_index[tag].append(memory_id)
-        
         if user_id:
             self.user_memories[user_id].append(memory_id)
-        
-        self.total_memories_created += 1
-        
-        # 检查内存限制
-        if len(self.memories) > self.max_memories:
-            self._cleanup_old_memories()
-        
-        # 自动衰减
-        if self.auto_decay:
-            self._auto_decay()
-        
-        return memory_id
+            self._memory_owner[memory_id] = user_id
+        self._index_memory(memory)
     
-    def get_memory(self, memory_id: str) -> Optional[MemoryItem]:
-        """获取记忆"""
+    def _persist(self, memory: MemoryItem):
+        """记忆有改动时交给存储后端（延迟批量写入）"""
+        if self.storage is not None:
+            self.storage.put('memory', memory.memory_id, memory, self._memory_owner.get(memory.memory_id))
+    
+    def _load_user(self, user_id: Optional[str]):
+        """从存储后端加载某个用户的全部记忆（每个用户只加载一次）"""
+        if self.storage is None or user_id in self._loaded_users:
+            return
+        with self._lock:
+            self._loaded_users.add(user_id)
+            loaded_count = 0
+            for memory_id, data in self.storage.load_user('memory', user_id):
+                if memory_id in self.memories:
+                    continue
+                try:
+                    self._register_memory(MemoryItem.from_dict(data), user_id)
+                    loaded_count += 1
+                except Exception as e:
+                    logger.error(f"加载记忆失败 {memory_id}: {e}")
+            if loaded_count:
+                logger.debug(f"从存储加载用户 {user_id} 的记忆 {loaded_count} 条")
+    
+    def _resident(self, memory_id: str) -> Optional[MemoryItem]:
+        """取内存中的记忆，不在内存时加载其所属用户"""
         memory = self.memories.get(memory_id)
-        if memory:
-            memory.access()
+        if memory is None and self.storage is not None:
+            record = self.storage.get('memory', memory_id)
+            if record is not None:
+                self._load_user(record[1])
+                memory = self.memories.get(memory_id)
         return memory
     
+    def get_memory(self, memory_id: str) -> Optional[MemoryItem]:
+        """获取记忆"""
+        with self._lock:
+            memory = self._resident(memory_id)
+            if memory:
+                memory.access()
+                self._persist(memory)
+            return memory
+    
     def update_memory(self, memory_id: str, **kwargs) -> bool:
         """更新记忆"""
-        memory = self.memories.get(memory_id)
-        if not memory:
-            return False
-        
-        # 更新索引（如果标签改变）
-        old_tags = memory.tags.copy()
-        
-        for key, value in kwargs.items():
-            if hasattr(memory, key):
-                setattr(memory, key, value)
+        with self._lock:
+            memory = self._resident(memory_id)
+            if not memory:
+                return False
+            
+            # 更新索引（如果标签或类型改变）
+            old_tags = list(memory._tags or ())
+            old_type = memory.memory_type
+            
+            for key, value in kwargs.items():
+                if hasattr(memory, key):
+                    setattr(memory, key, value)
+            
+            if memory.memory_type != old_type:
+                if memory_id in self.type_index[old_type]:
+                    self.type_index[old_type].remove(memory_id)
+                self.type_index[memory.memory_type].append(memory_id)
+            
+            if {'content', 'tags', 'metadata'} & kwargs.keys():
+                self._index_memory(memory)
+            
+            # 重新索引标签
+            if 'tags' in kwargs:
+                # 移除旧标签索引
+                for tag in old_tags:
+                    if memory_id in self.tag_index[tag]:
+                        self.tag_index[tag].remove(memory_id)
+                
+                # 添加新标签索引
+                for tag in memory._tags or ():
+                    if memory_id not in self.tag_index[tag]:
+                        self.tag_index[tag].append(memory_id)
+            
+            memory.access()
+            self._persist(memory)
+            return True
         
-        # 重新索引标签
-        if 'tags' in kwargs:
-            # 移除旧标签索引
-            for tag in old_tags:
+    def remove_memory(self, memory_id: str) -> bool:
+        """删除记忆"""
+        with self._lock:
+            memory = self._resident(memory_id)
+            if not memory:
+                return False
+            
+            # 从索引中移除
+            if memory_id in self.type_index[memory.memory_type]:
+                self.type_index[memory.memory_type].remove(memory_id)
+            
+            for tag in memory._tags or ():
                 if memory_id in self.tag_index[tag]:
                     self.tag_index[tag].remove(memory_id)
             
-            # 添加新标签索引
-            for tag in memory.tags:
-                if memory_id not in self.tag_index[tag]:
-                    self.tag_index[tag].append(memory_id)
+            # 从用户记忆中移除
+            user_id = self._memory_owner.pop(memory_id, None)
+            if user_id is not None and memory_id in self.user_memories.get(user_id, ()):
+                self.user_memories[user_id].remove(memory_id)
+            
+            self.search_index.remove(memory_id)
+            self.consolidation_lsh.remove(memory_id)
+            self._consolidation_queue.pop(memory_id, None)
+            
+            # 删除记忆
+            del self.memories[memory_id]
+            if self.storage is not None:
+                self.storage.delete('memory', memory_id)
+            return True
         
-        memory.access()
-        return True
+    def _index_memory(self, memory: MemoryItem):
+        """（重新）索引记忆的正文、标签和字符串元数据，并更新整合用的MinHash签名"""
+        memory_id = memory.memory_id
+        self.search_index.add(memory_id, {
+            'content': (memory.content,),
+            'tags': memory._tags or (),
+            'metadata': [value for value in (memory._metadata or {}).values() if isinstance(value, str)]
+        })
+        
+        signature = self.consolidation_lsh.signature(tokenize(memory.content))
+        if signature is None:
+            self.consolidation_lsh.remove(memory_id)
+            self._consolidation_queue.pop(memory_id, None)
+        elif signature != self.consolidation_lsh.get_signature(memory_id):
+            self.consolidation_lsh.insert(memory_id, signature, self._memory_owner.get(memory_id))
+            self._consolidation_queue[memory_id] = None
     
-    def remove_memory(self, memory_id: str) -> bool:
-        """删除记忆"""
-        memory = self.memories.get(memory_id)
-        if not memory:
-            return False
-        
-        # 从索引中移除
-        if memory_id in self.type_index[memory.memory_type]:
-            self.type_index[memory.memory_type].remove(memory_id)
-        
-        for tag in memory.tags:
-            if memory_id in self.tag_index[tag]:
-                self.tag_index[tag].remove(memory_id)
-        
-        # 从用户记忆中移除
-        for user_id, memory_ids in self.user_memories.items():
-            if memory_id in memory_ids:
-                memory_ids.remove(memory_id)
-        
-        # 删除记忆
-        del self.memories[memory_id]
-        return True
+    def reindex(self):
+        """重建全文索引（直接修改了记忆的content/tags/metadata而未调用update_memory时使用）"""
+        with self._lock:
+            self.search_index.clear()
+            self.consolidation_lsh.clear()
+            self._consolidation_queue.clear()
+            for memory in self.memories.values():
+                self._index_memory(memory)
     
     def search_memories(self, 
                        query: str,
@@ -249,50 +464,70 @@ class MemoryStore:
                        tags: Optional[List[str]] = None,
                        min_importance: Optional[MemoryImportance] = None,
                        limit: int = 10) -> List[Tuple[MemoryItem, float]]:
-        """搜索记忆"""
-        candidates = []
-        
-        # 确定搜索范围
-        if user_id:
-            search_ids = self.user_memories.get(user_id, [])
-        elif memory_type:
-            search_ids = self.type_index.get(memory_type, [])
-        else:
-            search_ids = list(self.memories.keys())
-        
-        # 过滤和评分
-        for memory_id in search_ids:
-            memory = self.memories.get(memory_id)
-            if not memory:
-                continue
+        """搜索记忆
+        
+        通过倒排索引按BM25打分，再乘以记忆强度和重要性权重；分数按本次最高BM25分归一化到0-1。
+        用户、类型和标签过滤下推到索引：候选范围比命中的倒排表短时直接遍历候选。
+        查询中没有可检索的词时，按强度和重要性返回过滤范围内的记忆。
+        有存储后端时先加载相关用户：指定user_id时加载该用户，否则加载FTS5命中记忆的所属用户。
+        """
+        with self._lock:
+            if user_id:
+                self._load_user(user_id)
+            elif self.storage is not None:
+                for _, owner in self.storage.search_memories(query, limit=max(limit * 10, 100)):
+                    self._load_user(owner)
             
-            # 类型过滤
-            if memory_type and memory.memory_type != memory_type:
-                continue
+            # 确定搜索范围（取最小的过滤集合）
+            scopes = []
+            if user_id:
+                scopes.append(self.user_memories.get(user_id, ()))
+            if memory_type:
+                scopes.append(self.type_index.get(memory_type, ()))
+            if tags:
+                scopes.append({mid for tag in tags for mid in self.tag_index.get(tag, ())})
+            candidates = min(scopes, key=len) if scopes else None
             
-            # 重要性过滤
-            if min_importance and memory.importance.value < min_importance.value:
-                continue
+            tag_filter = set(tags) if tags else None
+            filtered = bool(memory_type or user_id or min_importance or tag_filter)
             
-            # 标签过滤
-            if tags and not any(tag in memory.tags for tag in tags):
-                continue
+            def accept(memory_id: str) -> bool:
+                memory = self.memories.get(memory_id)
+                if memory is None:
+                    return False
+                if memory_type and memory.memory_type != memory_type:
+                    return False
+                if user_id and self._memory_owner.get(memory_id) != user_id:
+                    return False
+                if min_importance and memory.importance.value < min_importance.value:
+                    return False
+                if tag_filter and tag_filter.isdisjoint(memory._tags or ()):
+                    return False
+                return True
             
-            # 计算相关性分数
-            relevance_score = memory.get_relevance_score(query)
+            if tokenize(query):
+                scores = self.search_index.search(query, candidates, accept if filtered else None)
+            else:
+                search_ids = self.memories.keys() if candidates is None else candidates
+                scores = {memory_id: 1.0 for memory_id in search_ids if accept(memory_id)}
+            max_score = max(scores.values(), default=1.0)
+
+            candidates_with_score = []
+            for memory_id, score in scores.items():
+                memory = self.memories[memory_id]
+                relevance = score / max_score * memory.strength * (memory.importance.value / 4.0)
+                if relevance > 0:
+                    candidates_with_score.append((memory, relevance))
             
-            if relevance_score > 0:
-                candidates.append((memory, relevance_score))
-        
-        # 按相关性排序
-        candidates.sort(key=lambda x: x[1], reverse=True)
-        
-        # 访问找到的记忆
-        for memory, _ in candidates[:limit]:
-            memory.access()
+            results = heapq.nlargest(limit, candidates_with_score, key=lambda x: x[1])
+            
+            # 访问找到的记忆
+            for memory, _ in results:
+                memory.access()
+                self._persist(memory)
+            
+            return results
         
-        return candidates[:limit]
-    
     def get_memories_by_type(self, memory_type: MemoryType) -> List[MemoryItem]:
         """按类型获取记忆"""
         memory_ids = self.type_index.get(memory_type, [])
@@ -308,13 +543,14 @@ class MemoryStore:
     
     def get_user_memories(self, user_id: str) -> List[MemoryItem]:
         """获取用户记忆"""
+        self._load_user(user_id)
         memory_ids = self.user_memories.get(user_id, [])
         return [self.memories[mid] for mid in memory_ids if mid in self.memories]
     
     def add_memory_relation(self, memory_id1: str, memory_id2: str) -> bool:
         """添加记忆关联"""
-        memory1 = self.memories.get(memory_id1)
-        memory2 = self.memories.get(memory_id2)
+        memory1 = self._resident(memory_id1)
+        memory2 = self._resident(memory_id2)
         
         if not memory1 or not memory2:
             return False
@@ -325,6 +561,8 @@ class MemoryStore:
         if memory_id1 not in memory2.related_memories:
             memory2.related_memories.append(memory_id1)
         
+        self._persist(memory1)
+        self._persist(memory2)
         return True
     
     def get_related_memories(self, memory_id: str, depth: int = 1) -> List[MemoryItem]:
@@ -347,7 +585,7 @@ class MemoryStore:
             if not current_memory:
                 return
             
-            for related_id in current_memory.related_memories:
+            for related_id in current_memory._related_memories or ():
                 if related_id not in visited and related_id in self.memories:
                     visited.add(related_id)
                     related.append(self.memories[related_id])
@@ -357,51 +595,136 @@ class MemoryStore:
         return related
     
     def consolidate_memories(self, user_id: Optional[str] = None) -> int:
-        """记忆整合"""
-        memories_to_process = []
+        """记忆整合：合并同一用户内容相似的记忆
+        
+        每条记忆只与LSH同桶的候选做精确比较，不再两两比较全部记忆。
+        """
+        with self._lock:
+            if user_id:
+                self._load_user(user_id)
+                memory_ids = self.user_memories.get(user_id, [])
+            else:
+                memory_ids = list(self.memories)
+            for memory_id in memory_ids:
+                if memory_id in self.consolidation_lsh:
+                    self._consolidation_queue[memory_id] = None
+            
+            if user_id:
+                scope = set(memory_ids)
+                return self._consolidate_queue(lambda memory_id: memory_id in scope)
+            return self._consolidate_queue()
+    
+    def consolidate_pending(self, max_seconds: Optional[float] = None) -> int:
+        """整合新增或修改过的记忆，最多运行max_seconds秒（None表示处理完队列），返回合并次数"""
+        with self._lock:
+            return self._consolidate_queue(max_seconds=max_seconds)
+    
+    def _consolidate_queue(self, include=None, max_seconds: Optional[float] = None) -> int:
+        deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        queue = self._consolidation_queue
+        consolidated_count = 0
+        for memory_id in list(queue):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if include is not None and not include(memory_id):
+                continue
+            queue.pop(memory_id, None)
+            if self._consolidate_one(memory_id):
+                consolidated_count += 1
         
-        if user_id:
-            memory_ids = self.user_memories.get(user_id, [])
-            memories_to_process = [self.memories[mid] for mid in memory_ids if mid in self.memories]
-        else:
-            memories_to_process = list(self.memories.values())
+        self.total_memories_consolidated += consolidated_count
+        return consolidated_count
+    
+    def _consolidate_one(self, memory_id: str) -> bool:
+        """为一条记忆查找LSH候选，与最相似且达到阈值的记忆合并（保留较早的那条）"""
+        memory = self.memories.get(memory_id)
+        signature = self.consolidation_lsh.get_signature(memory_id)
+        if memory is None or signature is None:
+            return False
         
-        consolidated_count = 0
+        owner = self._memory_owner.get(memory_id)
+        candidates = self.consolidation_lsh.query(signature, owner)
+        candidates.discard(memory_id)
+        if not candidates:
+            return False
         
-        # 简单的记忆整合：合并相似内容
-        for i, memory1 in enumerate(memories_to_process):
-            for j, memory2 in enumerate(memories_to_process[i+1:], i+1):
-                if self._are_memories_similar(memory1, memory2):
-                    # 合并记忆
-                    if self._merge_memories(memory1, memory2):
-                        consolidated_count += 1
+        tokens = None
+        best, best_similarity = None, self.consolidation_threshold
+        lower_bound = self.consolidation_threshold - _ESTIMATE_MARGIN
+        for candidate_id in candidates:
+            candidate = self.memories.get(candidate_id)
+            if candidate is None or self._memory_owner.get(candidate_id) != owner:
+                continue
+            # 先用缓存的签名估计相似度，明显不够的候选不再切分正文
+            if estimate_jaccard(signature, self.consolidation_lsh.get_signature(candidate_id)) < lower_bound:
+                continue
+            if tokens is None:
+                tokens = set(tokenize(memory.content))
+            similarity = jaccard(tokens, set(tokenize(candidate.content)))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is None:
+            return False
         
-        return consolidated_count
+        if best.created_ts <= memory.created_ts:
+            return self._merge_memories(best, memory)
+        return self._merge_memories(memory, best)
+    
+    def start_background_consolidation(self):
+        """启动后台整合线程：每轮持锁处理一小段队列，队列为空时等待consolidation_interval秒"""
+        if self._consolidation_thread is not None and self._consolidation_thread.is_alive():
+            return
+        self._consolidation_stop.clear()
+        self._consolidation_thread = threading.Thread(
+            target=self._consolidation_loop, name='memory-consolidation', daemon=True
+        )
+        self._consolidation_thread.start()
+    
+    def stop_background_consolidation(self, timeout: Optional[float] = None):
+        """停止后台整合线程"""
+        self._consolidation_stop.set()
+        thread = self._consolidation_thread
+        if thread is not None:
+            thread.join(timeout)
+        self._consolidation_thread = None
+    
+    def _consolidation_loop(self):
+        while not self._consolidation_stop.is_set():
+            try:
+                self.consolidate_pending(max_seconds=self.consolidation_max_pause)
+            except Exception as e:
+                logger.error(f"后台记忆整合失败: {e}")
+            # 队列未处理完时只短暂让出锁，处理完则等待下一轮
+            wait = self.consolidation_max_pause if self._consolidation_queue else self.consolidation_interval
+            self._consolidation_stop.wait(wait)
     
     def decay_memories(self) -> int:
         """记忆衰减"""
-        current_time = datetime.now()
-        decayed_count = 0
-        memories_to_remove = []
-        
-        for memory in self.memories.values():
-            time_passed = current_time - memory.last_accessed
-            memory.decay(time_passed)
+        with self._lock:
+            current_time = time.monotonic()
+            decayed_count = 0
+            memories_to_remove = []
             
-            # 移除强度过低的记忆
-            if memory.strength < self.min_strength_threshold:
-                memories_to_remove.append(memory.memory_id)
-                decayed_count += 1
-        
-        # 删除衰减的记忆
-        for memory_id in memories_to_remove:
-            self.remove_memory(memory_id)
-        
-        self.total_memories_decayed += decayed_count
-        self.last_decay_time = current_time
+            for memory in self.memories.values():
+                time_passed = timedelta(seconds=current_time - memory.accessed_ts)
+                memory.decay(time_passed)
+                
+                # 移除强度过低的记忆
+                if memory.strength < self.min_strength_threshold:
+                    memories_to_remove.append(memory.memory_id)
+                    decayed_count += 1
+                else:
+                    self._persist(memory)
+            
+            # 删除衰减的记忆
+            for memory_id in memories_to_remove:
+                self.remove_memory(memory_id)
+            
+            self.total_memories_decayed += decayed_count
+            self.last_decay_time = current_time
+            
+            return decayed_count
         
-        return decayed_count
-    
     def get_memory_statistics(self) -> Dict[str, Any]:
         """获取记忆统计信息"""
         total_memories = len(self.memories)
@@ -428,7 +751,8 @@ class MemoryStore:
             'total_users': len(self.user_memories),
             'total_tags': len(self.tag_index),
             'total_created': self.total_memories_created,
-            'total_decayed': self.total_memories_decayed
+            'total_decayed': self.total_memories_decayed,
+            'stored_memories': self.storage.count('memory') if self.storage is not None else total_memories
         }
     
     def _cleanup_old_memories(self):
@@ -437,7 +761,7 @@ class MemoryStore:
         memories_with_score = []
         for memory in self.memories.values():
             # 计算清理分数（强度 + 重要性 - 时间衰减）
-            time_factor = (datetime.now() - memory.last_accessed).days
+            time_factor = int(memory.seconds_since_access() // 86400)
             score = memory.strength + (memory.importance.value / 4.0) - (time_factor * 0.1)
             memories_with_score.append((memory.memory_id, score))
         
@@ -451,24 +775,14 @@ class MemoryStore:
     
     def _auto_decay(self):
         """自动衰减"""
-        if datetime.now() - self.last_decay_time > self.decay_interval:
+        if time.monotonic() - self.last_decay_time > self.decay_interval.total_seconds():
             self.decay_memories()
     
     def _are_memories_similar(self, memory1: MemoryItem, memory2: MemoryItem) -> bool:
-        """判断两个记忆是否相似"""
-        # 简单的相似性判断
-        content1 = memory1.content.lower()
-        content2 = memory2.content.lower()
-        
-        # 内容相似度
-        common_words = set(content1.split()) & set(content2.split())
-        similarity = len(common_words) / max(len(content1.split()), len(content2.split()))
-        
-        # 标签相似度
-        common_tags = set(memory1.tags) & set(memory2.tags)
-        tag_similarity = len(common_tags) / max(len(memory1.tags), len(memory2.tags)) if memory1.tags or memory2.tags else 0
-        
-        return similarity > 0.7 or tag_similarity > 0.5
+        """判断两个记忆是否相似（正文词集合的Jaccard相似度达到整合阈值）"""
+        tokens1 = set(tokenize(memory1.content))
+        tokens2 = set(tokenize(memory2.content))
+        return jaccard(tokens1, tokens2) >= self.consolidation_threshold
     
     def _merge_memories(self, memory1: MemoryItem, memory2: MemoryItem) -> bool:
         """合并记忆"""
@@ -487,33 +801,52 @@ class MemoryStore:
             memory1.tags = merged_tags
             memory1.metadata = merged_metadata
             memory1.strength = max(memory1.strength, memory2.strength)
-            memory1.importance = max(memory1.importance, memory2.importance)
+            memory1.importance = max(memory1.importance, memory2.importance, key=lambda item: item.value)
             memory1.access_count += memory2.access_count
+            for tag in merged_tags:
+                if memory1.memory_id not in self.tag_index[tag]:
+                    self.tag_index[tag].append(memory1.memory_id)
+            for related_id in memory2.related_memories:
+                if related_id != memory1.memory_id and related_id not in memory1.related_memories:
+                    memory1.related_memories.append(related_id)
+            self._index_memory(memory1)
+            self._persist(memory1)
             
             # 删除第二个记忆
             self.remove_memory(memory2.memory_id)
             
             return True
-        except Exception:
+        except Exception as e:
+            logger.error(f"合并记忆失败: {e}")
             return False
     
     def export_memories(self, file_path: str, user_id: Optional[str] = None):
-        """导出记忆数据"""
+        """导出记忆数据（有存储后端时包括未加载用户的记忆）"""
         data = {
             'export_time': datetime.now().isoformat(),
             'memories': {},
             'statistics': self.get_memory_statistics()
         }
         
-        memories_to_export = []
-        if user_id:
-            memory_ids = self.user_memories.get(user_id, [])
-            memories_to_export = [self.memories[mid] for mid in memory_ids if mid in self.memories]
-        else:
-            memories_to_export = list(self.memories.values())
-        
-        for memory in memories_to_export:
-            data['memories'][memory.memory_id] = memory.to_dict()
+        with self._lock:
+            if user_id:
+                self._load_user(user_id)
+                memory_ids = self.user_memories.get(user_id, [])
+                memories_to_export = [self.memories[mid] for mid in memory_ids if mid in self.memories]
+            else:
+                memories_to_export = list(self.memories.values())
+            
+            for memory in memories_to_export:
+                data['memories'][memory.memory_id] = memory.to_dict()
+            
+            # 未加载用户的记忆直接从存储读取，不放入内存
+            if not user_id and self.storage is not None:
+                for memory_id in self.storage.keys_updated_since('memory', 0.0):
+                    if memory_id in data['memories']:
+                        continue
+                    record = self.storage.get('memory', memory_id)
+                    if record is not None:
+                        data['memories'][memory_id] = record[0]
         
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
@@ -532,8 +865,10 @@ class MemoryStore:
                     
                     # 重建索引
                     self.type_index[memory.memory_type].append(memory_id)
-                    for tag in memory.tags:
+                    for tag in memory._tags or ():
                         self.tag_index[tag].append(memory_id)
+                    self._index_memory(memory)
+                    self._persist(memory)
                     
                     imported_count += 1
                 except Exception as e:
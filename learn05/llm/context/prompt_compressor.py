@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+抽取式提示词压缩模块
+不调用LLM：中英文分句，按TF-IDF向量与整段对话中心的余弦相似度衡量句子显著性，
+去掉与已保留内容近似重复的句子，再按目标压缩比选出显著性最高的句子
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .text_index import tokenize
+
+try:
+    from ..components.minhash_lsh import MinHashLSH, jaccard
+except (ImportError, ValueError):
+    from components.minhash_lsh import MinHashLSH, jaccard
+
+# 句末标点（含其后的引号括号）、后接大写字母/汉字或位于结尾的英文句点（避免拆开e.g.和小数）、换行
+_SENTENCE_END = re.compile(r'[。！？；!?;]+[”’"」）)]*|\.+(?=\s+[A-Z\u4e00-\u9fff]|\s*$)|\n+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """中英文分句，句子保留句末标点"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def join_sentences(sentences: Sequence[str]) -> str:
+    """拼回文本：英文句子之间补空格，中文直接相连"""
+    parts = []
+    for sentence in sentences:
+        if parts and (parts[-1][-1].isascii() or sentence[0].isascii()):
+            parts.append(' ')
+        parts.append(sentence)
+    return ''.join(parts)
+
+
+def _numbers(terms: Iterable[str]) -> set:
+    return {term for term in terms if any(char.isdigit() for char in term)}
+
+
+class _Sentence:
+    __slots__ = ('text', 'owner', 'terms', 'tokens', 'score')
+
+    def __init__(self, text: str, owner: int, terms: List[str], tokens: int):
+        self.text = text
+        self.owner = owner
+        self.terms = terms
+        self.tokens = tokens
+        self.score = 0.0
+
+
+class ExtractiveCompressor:
+    """抽取式压缩器
+
+    Args:
+        ratio: 目标压缩比（保留的token数 / 原token数）
+        redundancy_threshold: 与已保留句子的词集合Jaccard相似度达到该值即视为重复
+        token_counter: token计数器（带count(text)方法），默认按字符估算
+    """
+
+    def __init__(self, ratio: float = 0.5, redundancy_threshold: float = 0.6, token_counter=None):
+        if not 0 < ratio <= 1:
+            raise ValueError("ratio必须在(0, 1]之间")
+        if token_counter is None:
+            from .context_strategies import TokenCounter
+            token_counter = TokenCounter()
+        self.ratio = ratio
+        self.redundancy_threshold = redundancy_threshold
+        self.token_counter = token_counter
+
+    def compress(self, texts: Sequence[str], context: Iterable[str] = (),
+                 ratio: Optional[float] = None, budget: Optional[float] = None) -> List[str]:
+        """压缩texts（按时间顺序的历史消息），返回与texts一一对应的压缩结果（可能为空串）
+
+        Args:
+            texts: 待压缩的文本
+            context: 原样保留的文本（系统提示、最近几轮），参与IDF和中心向量计算，
+                与其重复的句子会被去掉
+            ratio: 本次的目标压缩比，默认使用构造时的ratio
+            budget: 本次的token预算，给出时取ratio折算的预算与它中较大的一个
+        """
+        ratio = self.ratio if ratio is None else ratio
+        count = self.token_counter.count
+        sentences = [_Sentence(sentence, owner, tokenize(sentence), count(sentence))
+                     for owner, text in enumerate(texts) for sentence in split_sentences(text)]
+        if not sentences:
+            return ['' for _ in texts]
+        context_terms = [tokenize(sentence) for text in context for sentence in split_sentences(text)]
+
+        self._score(sentences, context_terms)
+        candidates = self._drop_redundant(sentences, context_terms)
+
+        # 按显著性从高到低装入预算，装不下的跳过继续尝试更短的句子
+        floor = ratio * sum(sentence.tokens for sentence in sentences)
+        budget = floor if budget is None else max(budget, floor)
+        kept = set()
+        used = 0
+        for sentence in sorted(candidates, key=lambda item: item.score, reverse=True):
+            if used + sentence.tokens <= budget:
+                kept.add(id(sentence))
+                used += sentence.tokens
+
+        selected: List[List[str]] = [[] for _ in texts]
+        for sentence in sentences:
+            if id(sentence) in kept:
+                selected[sentence.owner].append(sentence.text)
+        return [join_sentences(parts) for parts in selected]
+
+    def _score(self, sentences: List[_Sentence], context_terms: List[List[str]]):
+        """显著性 = 句子TF-IDF向量与全部句子（含保留上下文）中心向量的余弦相似度"""
+        documents = [sentence.terms for sentence in sentences] + context_terms
+        document_frequency = Counter(term for terms in documents for term in set(terms))
+        total = len(documents)
+        idf = {term: math.log(1 + total / frequency) for term, frequency in document_frequency.items()}
+
+        centroid: Dict[str, float] = Counter()
+        vectors = []
+        for terms in documents:
+            vector = {term: frequency * idf[term] for term, frequency in Counter(terms).items()}
+            vectors.append(vector)
+            for term, weight in vector.items():
+                centroid[term] += weight
+        centroid_norm = math.sqrt(sum(weight * weight for weight in centroid.values())) or 1.0
+
+        for sentence, vector in zip(sentences, vectors):
+            norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+            if norm:
+                dot = sum(weight * centroid[term] for term, weight in vector.items())
+                sentence.score = dot / (norm * centroid_norm)
+
+    def _drop_redundant(self, sentences: List[_Sentence], context_terms: List[List[str]]) -> List[_Sentence]:
+        """去掉与保留上下文或更早的句子近似重复的句子（MinHash-LSH找候选，再精确计算Jaccard）
+
+        只换了数字的句子（如不同题目的数据）不算重复：重复句子中的数字必须都在先前的句子里出现过。
+        """
+        # 32个哈希分16段：Jaccard为0.6的句子对成为候选的概率超过99.9%
+        lsh = MinHashLSH(num_perm=32, bands=16)
+        seen: List[tuple] = []
+
+        def remember(term_set: set, signature) -> None:
+            lsh.insert(len(seen), signature)
+            seen.append((term_set, _numbers(term_set)))
+
+        def is_duplicate(term_set: set, signature) -> bool:
+            numbers = _numbers(term_set)
+            for key in lsh.query(signature):
+                earlier_terms, earlier_numbers = seen[key]
+                if numbers <= earlier_numbers and jaccard(term_set, earlier_terms) >= self.redundancy_threshold:
+                    return True
+            return False
+
+        for terms in context_terms:
+            term_set = set(terms)
+            signature = lsh.signature(term_set)
+            if signature is not None:
+                remember(term_set, signature)
+
+        candidates = []
+        for sentence in sentences:
+            term_set = set(sentence.terms)
+            signature = lsh.signature(term_set)
+            if signature is None:
+                continue
+            if is_duplicate(term_set, signature):
+                continue
+            remember(term_set, signature)
+            candidates.append(sentence)
+        return candidates
@@ -4,13 +4,16 @@
 负责管理用户会话和会话信息
 """
 
-from typing import Dict, List, Optional, Any, Set
-from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Set, Union
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import json
+import time
 import uuid
 from enum import Enum
 
+from .storage import StorageBackend, create_storage
+
 class SessionStatus(Enum):
     """会话状态"""
     ACTIVE = "active"  # 活跃
@@ -25,39 +28,127 @@ class UserRole(Enum):
     ADMIN = "admin"  # 管理员
     GUEST = "guest"  # 访客
 
-@dataclass
+# 会话时间在内部以time.monotonic()保存，对外换算成datetime时加上该偏移
+_MONOTONIC_TO_WALL = time.time() - time.monotonic()
+
+
+def _as_monotonic(value: Union[datetime, float]) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp() - _MONOTONIC_TO_WALL
+    return float(value)
+
+
+def _as_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp + _MONOTONIC_TO_WALL)
+
+
 class SessionInfo:
-    """会话信息"""
-    session_id: str
-    user_id: str
-    user_role: UserRole
-    status: SessionStatus = SessionStatus.ACTIVE
-    created_at: datetime = field(default_factory=datetime.now)
-    last_activity: datetime = field(default_factory=datetime.now)
-    expires_at: Optional[datetime] = None
-    user_info: Dict[str, Any] = field(default_factory=dict)
-    session_data: Dict[str, Any] = field(default_factory=dict)
-    context_types: Set[str] = field(default_factory=set)
-    activity_count: int = 0
-    ip_address: Optional[str] = None
-    user_agent: Optional[str] = None
+    """会话信息（__slots__紧凑存储，时间以单调时间戳保存）
+    
+    user_info/session_data/context_types为空时不分配容器（槽位为None），首次通过属性访问时才创建。
+    """
+    
+    __slots__ = ('session_id', 'user_id', 'user_role', 'status', 'created_ts', 'activity_ts',
+                 'expires_ts', '_user_info', '_session_data', '_context_types', 'activity_count',
+                 'ip_address', 'user_agent')
+    
+    def __init__(self, session_id: str, user_id: str, user_role: UserRole,
+                 status: SessionStatus = SessionStatus.ACTIVE,
+                 created_at: Union[datetime, float, None] = None,
+                 last_activity: Union[datetime, float, None] = None,
+                 expires_at: Union[datetime, float, None] = None,
+                 user_info: Optional[Dict[str, Any]] = None,
+                 session_data: Optional[Dict[str, Any]] = None,
+                 context_types: Optional[Set[str]] = None,
+                 activity_count: int = 0,
+                 ip_address: Optional[str] = None,
+                 user_agent: Optional[str] = None):
+        now = time.monotonic()
+        self.session_id = session_id
+        self.user_id = user_id
+        self.user_role = user_role
+        self.status = status
+        self.created_ts = now if created_at is None else _as_monotonic(created_at)
+        self.activity_ts = self.created_ts if last_activity is None else _as_monotonic(last_activity)
+        self.expires_ts = None if expires_at is None else _as_monotonic(expires_at)
+        self._user_info = user_info or None
+        self._session_data = session_data or None
+        self._context_types = context_types or None
+        self.activity_count = activity_count
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+    
+    @property
+    def created_at(self) -> datetime:
+        return _as_datetime(self.created_ts)
+    
+    @created_at.setter
+    def created_at(self, value: Union[datetime, float]):
+        self.created_ts = _as_monotonic(value)
+    
+    @property
+    def last_activity(self) -> datetime:
+        return _as_datetime(self.activity_ts)
+    
+    @last_activity.setter
+    def last_activity(self, value: Union[datetime, float]):
+        self.activity_ts = _as_monotonic(value)
+    
+    @property
+    def expires_at(self) -> Optional[datetime]:
+        return None if self.expires_ts is None else _as_datetime(self.expires_ts)
+    
+    @expires_at.setter
+    def expires_at(self, value: Union[datetime, float, None]):
+        self.expires_ts = None if value is None else _as_monotonic(value)
+    
+    @property
+    def user_info(self) -> Dict[str, Any]:
+        if self._user_info is None:
+            self._user_info = {}
+        return self._user_info
+    
+    @user_info.setter
+    def user_info(self, value: Dict[str, Any]):
+        self._user_info = value
+    
+    @property
+    def session_data(self) -> Dict[str, Any]:
+        if self._session_data is None:
+            self._session_data = {}
+        return self._session_data
+    
+    @session_data.setter
+    def session_data(self, value: Dict[str, Any]):
+        self._session_data = value
+    
+    @property
+    def context_types(self) -> Set[str]:
+        if self._context_types is None:
+            self._context_types = set()
+        return self._context_types
+    
+    @context_types.setter
+    def context_types(self, value: Set[str]):
+        self._context_types = value
     
     def update_activity(self):
         """更新活动时间"""
-        self.last_activity = datetime.now()
+        self.activity_ts = time.monotonic()
         self.activity_count += 1
         if self.status == SessionStatus.IDLE:
             self.status = SessionStatus.ACTIVE
     
     def is_expired(self, timeout: timedelta) -> bool:
         """检查是否过期"""
-        if self.expires_at and datetime.now() > self.expires_at:
+        now = time.monotonic()
+        if self.expires_ts is not None and now > self.expires_ts:
             return True
-        return datetime.now() - self.last_activity > timeout
+        return now - self.activity_ts > timeout.total_seconds()
     
     def get_duration(self) -> timedelta:
         """获取会话持续时间"""
-        return self.last_activity - self.created_at
+        return timedelta(seconds=self.activity_ts - self.created_ts)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -69,9 +160,9 @@ class SessionInfo:
             'created_at': self.created_at.isoformat(),
             'last_activity': self.last_activity.isoformat(),
             'expires_at': self.expires_at.isoformat() if self.expires_at else None,
-            'user_info': self.user_info,
-            'session_data': self.session_data,
-            'context_types': list(self.context_types),
+            'user_info': self._user_info or {},
+            'session_data': self._session_data or {},
+            'context_types': list(self._context_types or ()),
             'activity_count': self.activity_count,
             'ip_address': self.ip_address,
             'user_agent': self.user_agent
@@ -80,7 +171,7 @@ class SessionInfo:
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'SessionInfo':
         """从字典创建"""
-        session = cls(
+        return cls(
             session_id=data['session_id'],
             user_id=data['user_id'],
             user_role=UserRole(data['user_role']),
@@ -88,22 +179,31 @@ class SessionInfo:
             created_at=datetime.fromisoformat(data['created_at']),
             last_activity=datetime.fromisoformat(data['last_activity']),
             expires_at=datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None,
-            user_info=data.get('user_info', {}),
-            session_data=data.get('session_data', {}),
+            user_info=data.get('user_info'),
+            session_data=data.get('session_data'),
+            context_types=set(data.get('context_types', ())),
             activity_count=data.get('activity_count', 0),
             ip_address=data.get('ip_address'),
             user_agent=data.get('user_agent')
         )
-        session.context_types = set(data.get('context_types', []))
-        return session
+    
+    def __repr__(self) -> str:
+        return (f"SessionInfo(session_id={self.session_id!r}, user_id={self.user_id!r}, "
+                f"status={self.status}, activity_count={self.activity_count})")
 
 class SessionManager:
     """会话管理器"""
     
-    def __init__(self, config: Optional[Dict[str, Any]] = None):
+    def __init__(self, config: Optional[Dict[str, Any]] = None, storage: Optional[StorageBackend] = None):
         self.config = config or {}
-        self.sessions: Dict[str, SessionInfo] = {}
-        self.user_sessions: Dict[str, Set[str]] = {}  # user_id -> session_ids
+        # 常驻内存的会话，按最近访问排序
+        self.sessions: Dict[str, SessionInfo] = OrderedDict()
+        self.user_sessions: Dict[str, Set[str]] = {}  # user_id -> session_ids（仅常驻会话）
+        
+        # 持久化：会话有改动时交给存储后端，不在内存中的会话访问时按ID或用户索引加载；
+        # 常驻数超过max_resident_sessions时淘汰最久未访问的（0表示不限制）
+        self.storage = storage if storage is not None else create_storage(self.config)
+        self.max_resident_sessions = self.config.get('max_resident_sessions', 0)
         
         # 配置参数
         self.session_timeout = timedelta(hours=self.config.get('session_timeout_hours', 24))
@@ -136,18 +236,14 @@ class SessionManager:
             session_id=session_id,
             user_id=user_id,
             user_role=user_role,
-            user_info=user_info or {},
+            user_info=user_info,
             expires_at=expires_at,
             ip_address=ip_address,
             user_agent=user_agent
         )
         
-        self.sessions[session_id] = session
-        
-        # 更新用户会话映射
-        if user_id not in self.user_sessions:
-            self.user_sessions[user_id] = set()
-        self.user_sessions[user_id].add(session_id)
+        self._make_resident(session)
+        self._persist(session)
         
         self.total_sessions_created += 1
         
@@ -157,18 +253,79 @@ class SessionManager:
         
         return session_id
     
+    def _persist(self, session: SessionInfo):
+        """会话有改动时交给存储后端（延迟批量写入）"""
+        if self.storage is not None:
+            self.storage.put('session', session.session_id, session, session.user_id)
+    
+    def _make_resident(self, session: SessionInfo):
+        """放入内存（未终止的会话计入用户映射），并淘汰超出上限的最久未访问会话"""
+        self.sessions[session.session_id] = session
+        self.sessions.move_to_end(session.session_id)
+        if session.status != SessionStatus.TERMINATED:
+            self.user_sessions.setdefault(session.user_id, set()).add(session.session_id)
+        if self.storage is not None and self.max_resident_sessions:
+            while len(self.sessions) > self.max_resident_sessions:
+                _, evicted = self.sessions.popitem(last=False)
+                self._unmap_user_session(evicted)
+    
+    def _unmap_user_session(self, session: SessionInfo):
+        user_session_ids = self.user_sessions.get(session.user_id)
+        if user_session_ids is not None:
+            user_session_ids.discard(session.session_id)
+            if not user_session_ids:
+                del self.user_sessions[session.user_id]
+    
+    def _load_session(self, session_id: str) -> Optional[SessionInfo]:
+        """取内存中的会话，不在内存时从存储后端加载"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.move_to_end(session_id)
+        elif self.storage is not None:
+            record = self.storage.get('session', session_id)
+            if record is not None:
+                session = SessionInfo.from_dict(record[0])
+                self._make_resident(session)
+        return session
+    
+    def _user_session_ids(self, user_id: str) -> Set[str]:
+        """用户未终止的会话ID（有存储后端时按user_id索引补全未加载的会话）"""
+        session_ids = set(self.user_sessions.get(user_id, ()))
+        if self.storage is not None:
+            for session_id in self.storage.keys_for_user('session', user_id):
+                if session_id not in session_ids and session_id not in self.sessions:
+                    session = self._load_session(session_id)
+                    if session is not None and session.status != SessionStatus.TERMINATED:
+                        session_ids.add(session_id)
+        return session_ids
+    
+    def _all_sessions(self, since: float = 0.0) -> List[SessionInfo]:
+        """常驻会话加上存储后端中更新时间（墙上时间戳）不早于since的未加载会话（只读取，不放入内存）"""
+        sessions = list(self.sessions.values())
+        if self.storage is not None:
+            for session_id in self.storage.keys_updated_since('session', since):
+                if session_id in self.sessions:
+                    continue
+                record = self.storage.get('session', session_id)
+                if record is not None:
+                    sessions.append(SessionInfo.from_dict(record[0]))
+        return sessions
+    
     def get_session(self, session_id: str) -> Optional[SessionInfo]:
         """获取会话信息"""
-        session = self.sessions.get(session_id)
+        session = self._load_session(session_id)
         
         if session:
             # 检查会话是否过期
             if session.is_expired(self.session_timeout):
-                session.status = SessionStatus.EXPIRED
+                if session.status != SessionStatus.EXPIRED:
+                    session.status = SessionStatus.EXPIRED
+                    self._persist(session)
                 return session
             
             # 更新活动时间
             session.update_activity()
+            self._persist(session)
         
         return session
     
@@ -183,58 +340,54 @@ class SessionManager:
                 setattr(session, key, value)
         
         session.update_activity()
+        self._persist(session)
         return True
     
     def terminate_session(self, session_id: str) -> bool:
         """终止会话"""
-        session = self.sessions.get(session_id)
+        session = self._load_session(session_id)
         if not session:
             return False
         
         session.status = SessionStatus.TERMINATED
         
         # 从用户会话映射中移除
-        if session.user_id in self.user_sessions:
-            self.user_sessions[session.user_id].discard(session_id)
-            if not self.user_sessions[session.user_id]:
-                del self.user_sessions[session.user_id]
+        self._unmap_user_session(session)
+        self._persist(session)
         
         return True
     
     def remove_session(self, session_id: str) -> bool:
         """删除会话"""
-        session = self.sessions.get(session_id)
+        session = self._load_session(session_id)
         if not session:
             return False
         
         # 从用户会话映射中移除
-        if session.user_id in self.user_sessions:
-            self.user_sessions[session.user_id].discard(session_id)
-            if not self.user_sessions[session.user_id]:
-                del self.user_sessions[session.user_id]
+        self._unmap_user_session(session)
         
         # 删除会话
         del self.sessions[session_id]
+        if self.storage is not None:
+            self.storage.delete('session', session_id)
         return True
     
     def get_user_sessions(self, user_id: str) -> List[SessionInfo]:
         """获取用户的所有会话"""
-        if user_id not in self.user_sessions:
-            return []
-        
         sessions = []
-        for session_id in self.user_sessions[user_id]:
-            session = self.sessions.get(session_id)
+        for session_id in self._user_session_ids(user_id):
+            session = self._load_session(session_id)
             if session:
                 sessions.append(session)
         
         return sessions
     
     def get_active_sessions(self) -> List[SessionInfo]:
-        """获取所有活跃会话"""
+        """获取所有活跃会话（有存储后端时包括未加载、超时时间内有更新的会话）"""
         active_sessions = []
         
-        for session in self.sessions.values():
+        since = time.time() - self.session_timeout.total_seconds()
+        for session in self._all_sessions(since):
             if not session.is_expired(self.session_timeout) and session.status == SessionStatus.ACTIVE:
                 active_sessions.append(session)
         
@@ -247,6 +400,7 @@ class SessionManager:
             return False
         
         session.context_types.add(context_type)
+        self._persist(session)
         return True
     
     def remove_context_type(self, session_id: str, context_type: str) -> bool:
@@ -255,7 +409,9 @@ class SessionManager:
         if not session:
             return False
         
-        session.context_types.discard(context_type)
+        if session._context_types:
+            session._context_types.discard(context_type)
+        self._persist(session)
         return True
     
     def validate_session(self, session_id: str, user_id: str = None) -> bool:
@@ -285,28 +441,31 @@ class SessionManager:
         else:
             session.expires_at = datetime.now() + duration
         
+        self._persist(session)
         return True
     
     def get_session_statistics(self) -> Dict[str, Any]:
-        """获取会话统计信息"""
-        total_sessions = len(self.sessions)
-        active_sessions = len(self.get_active_sessions())
+        """获取会话统计信息（有存储后端时包括未加载的会话）"""
+        sessions = self._all_sessions()
+        total_sessions = len(sessions)
+        active_sessions = sum(1 for session in sessions
+                              if not session.is_expired(self.session_timeout) and session.status == SessionStatus.ACTIVE)
         
         # 按状态统计
         status_counts = {}
-        for session in self.sessions.values():
+        for session in sessions:
             status = session.status.value
             status_counts[status] = status_counts.get(status, 0) + 1
         
         # 按用户角色统计
         role_counts = {}
-        for session in self.sessions.values():
+        for session in sessions:
             role = session.user_role.value
             role_counts[role] = role_counts.get(role, 0) + 1
         
         # 计算平均会话时长
         total_duration = timedelta()
-        for session in self.sessions.values():
+        for session in sessions:
             total_duration += session.get_duration()
         
         avg_duration = total_duration / total_sessions if total_sessions > 0 else timedelta()
@@ -314,11 +473,13 @@ class SessionManager:
         return {
             'total_sessions': total_sessions,
             'active_sessions': active_sessions,
-            'total_users': len(self.user_sessions),
+            'total_users': len({session.user_id for session in sessions
+                                if session.status != SessionStatus.TERMINATED}),
             'status_distribution': status_counts,
             'role_distribution': role_counts,
             'average_session_duration': str(avg_duration),
-            'total_sessions_created': self.total_sessions_created
+            'total_sessions_created': self.total_sessions_created,
+            'stored_sessions': self.storage.count('session') if self.storage is not None else total_sessions
         }
     
     def cleanup_expired_sessions(self) -> int:
@@ -334,28 +495,27 @@ class SessionManager:
         for session_id in expired_sessions:
             self.remove_session(session_id)
         
+        # 未加载的会话按最后活动时间索引批量删除
+        purged_count = 0
+        if self.storage is not None:
+            purged_count = self.storage.purge_before('session', time.time() - self.session_timeout.total_seconds())
+        
         self.last_cleanup = datetime.now()
-        return len(expired_sessions)
+        return len(expired_sessions) + purged_count
     
     def _check_user_session_limit(self, user_id: str) -> bool:
         """检查用户会话数量是否超限"""
-        if user_id not in self.user_sessions:
-            return False
-        
-        return len(self.user_sessions[user_id]) >= self.max_sessions_per_user
+        return len(self._user_session_ids(user_id)) >= self.max_sessions_per_user
     
     def _cleanup_user_sessions(self, user_id: str):
         """清理用户的旧会话"""
-        if user_id not in self.user_sessions:
-            return
-        
-        user_session_ids = list(self.user_sessions[user_id])
+        user_session_ids = list(self._user_session_ids(user_id))
         sessions_with_time = []
         
         for session_id in user_session_ids:
-            session = self.sessions.get(session_id)
+            session = self._load_session(session_id)
             if session:
-                sessions_with_time.append((session_id, session.last_activity))
+                sessions_with_time.append((session_id, session.activity_ts))
         
         # 按最后活动时间排序，保留最新的
         sessions_with_time.sort(key=lambda x: x[1], reverse=True)
@@ -378,8 +538,8 @@ class SessionManager:
             'statistics': self.get_session_statistics()
         }
         
-        for session_id, session in self.sessions.items():
-            data['sessions'][session_id] = session.to_dict()
+        for session in self._all_sessions():
+            data['sessions'][session.session_id] = session.to_dict()
         
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
@@ -394,12 +554,8 @@ class SessionManager:
             for session_id, session_data in data.get('sessions', {}).items():
                 try:
                     session = SessionInfo.from_dict(session_data)
-                    self.sessions[session_id] = session
-                    
-                    # 更新用户会话映射
-                    if session.user_id not in self.user_sessions:
-                        self.user_sessions[session.user_id] = set()
-                    self.user_sessions[session.user_id].add(session_id)
+                    self._make_resident(session)
+                    self._persist(session)
                     
                     imported_count += 1
                 except Exception as e:
@@ -415,7 +571,7 @@ class SessionManager:
         user_sessions = self.get_user_sessions(user_id)
         
         for session in user_sessions:
-            if (context_type in session.context_types and 
+            if (context_type in (session._context_types or ()) and 
                 session.status == SessionStatus.ACTIVE and
                 not session.is_expired(self.session_timeout)):
                 return session
@@ -424,9 +580,10 @@ class SessionManager:
     
     def refresh_session(self, session_id: str) -> bool:
         """刷新会话活动时间"""
-        session = self.sessions.get(session_id)
+        session = self._load_session(session_id)
         if not session:
             return False
         
         session.update_activity()
+        self._persist(session)
         return True
\ No newline at end of file
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+上下文持久化存储模块
+为MemoryStore、ContextManager和SessionManager提供可插拔的存储后端，内置SQLite实现：
+WAL日志、FTS5全文检索记忆正文、按用户和更新时间建索引，写入先合并到内存队列再由后台线程批量提交
+"""
+
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from .text_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# 记录类型 -> 表名
+_TABLES = {'memory': 'memories', 'context': 'contexts', 'session': 'sessions'}
+
+
+class StorageBackend(ABC):
+    """存储后端接口
+
+    记录按类型（'memory'/'context'/'session'）和键保存，record为带to_dict()的对象，
+    user_id和更新时间作为索引列，读取时返回to_dict()得到的字典。
+    """
+
+    @abstractmethod
+    def put(self, kind: str, key: str, record: Any, user_id: Optional[str] = None):
+        """保存记录（可以延迟写入）"""
+        pass
+
+    @abstractmethod
+    def delete(self, kind: str, key: str):
+        """删除记录（可以延迟写入）"""
+        pass
+
+    @abstractmethod
+    def get(self, kind: str, key: str) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        """读取记录，返回(数据, user_id)"""
+        pass
+
+    @abstractmethod
+    def load_user(self, kind: str, user_id: Optional[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """读取某个用户（None为无主记录）的全部记录，返回[(键, 数据)]"""
+        pass
+
+    @abstractmethod
+    def keys_for_user(self, kind: str, user_id: str) -> List[str]:
+        """某个用户的全部记录键"""
+        pass
+
+    @abstractmethod
+    def keys_updated_since(self, kind: str, timestamp: float) -> List[str]:
+        """更新时间（墙上时间戳）不早于timestamp的记录键"""
+        pass
+
+    @abstractmethod
+    def purge_before(self, kind: str, timestamp: float) -> int:
+        """删除更新时间早于timestamp的记录，返回删除数"""
+        pass
+
+    @abstractmethod
+    def search_memories(self, query: str, limit: int = 100) -> List[Tuple[str, Optional[str]]]:
+        """全文检索记忆正文，返回[(记忆ID, user_id)]"""
+        pass
+
+    @abstractmethod
+    def count(self, kind: str) -> int:
+        """记录数"""
+        pass
+
+    def flush(self) -> int:
+        """提交延迟的写入"""
+        return 0
+
+    def close(self):
+        """关闭后端"""
+        pass
+
+
+def _fts_terms(text: str) -> str:
+    """与内存检索相同的切分结果，空格分隔后交给FTS5的unicode61分词器"""
+    return ' '.join(dict.fromkeys(tokenize(text)))
+
+
+def _fts_query(query: str) -> str:
+    terms = []
+    for term in dict.fromkeys(tokenize(query)):
+        term = term.replace('"', '""')
+        # 单个汉字不在二元组词表中，按前缀匹配
+        terms.append(f'"{term}"*' if len(term) == 1 and not term.isascii() else f'"{term}"')
+    return ' OR '.join(terms)
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite存储后端
+
+    put/delete只把记录引用放入待写队列（同一记录合并为最后一次），热路径上不做序列化和IO；
+    后台线程每flush_interval秒或队列达到batch_size时在一个事务内写入。
+    读取先查待写队列，因此总能读到最新状态。
+
+    Args:
+        path: 数据库文件路径
+        flush_interval: 后台写入间隔（秒）
+        batch_size: 队列达到该长度时立即唤醒写入线程
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, batch_size: int = 1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        # (类型, 键) -> (记录或None表示删除, user_id, 墙上时间戳)
+        self._pending: Dict[Tuple[str, str], Tuple[Any, Optional[str], float]] = {}
+        self._inflight: Dict[Tuple[str, str], Tuple[Any, Optional[str], float]] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = self._connect()
+        self._create_schema()
+
+        self.total_flushes = 0
+        self.total_records_written = 0
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._writer_loop, name='sqlite-storage-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA busy_timeout=5000')
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        """每个线程一个只读连接，WAL下读取不阻塞后台写入"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _create_schema(self):
+        for table in _TABLES.values():
+            self._writer.executescript(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT NOT NULL UNIQUE,
+                    user_id TEXT,
+                    updated_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_{table}_user ON {table}(user_id);
+                CREATE INDEX IF NOT EXISTS idx_{table}_updated ON {table}(updated_at);
+            ''')
+        self._writer.execute('CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(terms)')
+
+    @staticmethod
+    def _table(kind: str) -> str:
+        table = _TABLES.get(kind)
+        if table is None:
+            raise ValueError(f"未知的记录类型: {kind}")
+        return table
+
+    def put(self, kind: str, key: str, record: Any, user_id: Optional[str] = None):
+        self._table(kind)
+        with self._pending_lock:
+            self._pending[(kind, key)] = (record, user_id, time.time())
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def delete(self, kind: str, key: str):
+        self._table(kind)
+        with self._pending_lock:
+            self._pending[(kind, key)] = (None, None, time.time())
+
+    def _overlay(self, kind: str) -> Dict[str, Tuple[Any, Optional[str], float]]:
+        """尚未提交的写入（较新的待写队列覆盖正在写入的批次）"""
+        with self._pending_lock:
+            overlay = {key: entry for (entry_kind, key), entry in self._inflight.items() if entry_kind == kind}
+            overlay.update((key, entry) for (entry_kind, key), entry in self._pending.items() if entry_kind == kind)
+        return overlay
+
+    def get(self, kind: str, key: str) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        table = self._table(kind)
+        with self._pending_lock:
+            entry = self._pending.get((kind, key)) or self._inflight.get((kind, key))
+        if entry is not None:
+            record, user_id, _ = entry
+            return None if record is None else (record.to_dict(), user_id)
+
+        row = self._reader().execute(f'SELECT data, user_id FROM {table} WHERE key = ?', (key,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def load_user(self, kind: str, user_id: Optional[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        table = self._table(kind)
+        overlay = self._overlay(kind)
+        rows = self._reader().execute(
+            f'SELECT key, data FROM {table} WHERE user_id IS ?', (user_id,)
+        ).fetchall()
+        records = {key: data for key, data in rows if key not in overlay}
+        result = [(key, json.loads(data)) for key, data in records.items()]
+        result.extend((key, record.to_dict()) for key, (record, owner, _) in overlay.items()
+                      if record is not None and owner == user_id)
+        return result
+
+    def keys_for_user(self, kind: str, user_id: str) -> List[str]:
+        table = self._table(kind)
+        overlay = self._overlay(kind)
+        rows = self._reader().execute(f'SELECT key FROM {table} WHERE user_id = ?', (user_id,)).fetchall()
+        keys = [key for key, in rows if key not in overlay]
+        keys.extend(key for key, (record, owner, _) in overlay.items() if record is not None and owner == user_id)
+        return keys
+
+    def keys_updated_since(self, kind: str, timestamp: float) -> List[str]:
+        table = self._table(kind)
+        overlay = self._overlay(kind)
+        rows = self._reader().execute(f'SELECT key FROM {table} WHERE updated_at >= ?', (timestamp,)).fetchall()
+        keys = [key for key, in rows if key not in overlay]
+        keys.extend(key for key, (record, _, updated_at) in overlay.items()
+                    if record is not None and updated_at >= timestamp)
+        return keys
+
+    def purge_before(self, kind: str, timestamp: float) -> int:
+        table = self._table(kind)
+        # 先提交待写队列，避免删掉刚更新过的记录后又被旧的批次写回
+        self.flush()
+        with self._flush_lock:
+            connection = self._writer
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if kind == 'memory':
+                    connection.execute('DELETE FROM memory_fts WHERE rowid IN '
+                                       '(SELECT id FROM memories WHERE updated_at < ?)', (timestamp,))
+                removed = connection.execute(f'DELETE FROM {table} WHERE updated_at < ?', (timestamp,)).rowcount
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return removed
+
+    def search_memories(self, query: str, limit: int = 100) -> List[Tuple[str, Optional[str]]]:
+        match = _fts_query(query)
+        if not match:
+            return []
+        rows = self._reader().execute(
+            'SELECT memories.key, memories.user_id FROM memory_fts '
+            'JOIN memories ON memories.id = memory_fts.rowid '
+            'WHERE memory_fts MATCH ? ORDER BY bm25(memory_fts) LIMIT ?', (match, limit)
+        ).fetchall()
+        return [(key, user_id) for key, user_id in rows]
+
+    def count(self, kind: str) -> int:
+        table = self._table(kind)
+        overlay = self._overlay(kind)
+        stored = self._reader().execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        if not overlay:
+            return stored
+        placeholders = ','.join('?' * len(overlay))
+        existing = self._reader().execute(
+            f'SELECT COUNT(*) FROM {table} WHERE key IN ({placeholders})', list(overlay)
+        ).fetchone()[0]
+        added = sum(1 for record, _, _ in overlay.values() if record is not None)
+        return stored - existing + added
+
+    def flush(self) -> int:
+        """把待写队列在一个事务内写入，返回写入的记录数"""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return 0
+                self._inflight, self._pending = self._pending, {}
+            batch = self._inflight
+
+            upserts: Dict[str, List[tuple]] = {}
+            deletes: Dict[str, List[tuple]] = {}
+            retry = {}
+            for (kind, key), (record, user_id, updated_at) in batch.items():
+                if record is None:
+                    deletes.setdefault(kind, []).append((key,))
+                    continue
+                try:
+                    data = record.to_dict()
+                    payload = json.dumps(data, ensure_ascii=False)
+                except RuntimeError:
+                    # 序列化时记录正被其他线程修改（字典大小变化），留到下一批
+                    retry[(kind, key)] = (record, user_id, updated_at)
+                    continue
+                upserts.setdefault(kind, []).append((key, user_id, updated_at, payload, data))
+
+            try:
+                self._write_batch(upserts, deletes)
+            except Exception:
+                self._requeue(batch)
+                raise
+            self._requeue(retry)
+            with self._pending_lock:
+                self._inflight = {}
+
+            written = len(batch) - len(retry)
+            self.total_flushes += 1
+            self.total_records_written += written
+            return written
+
+    def _write_batch(self, upserts: Dict[str, List[tuple]], deletes: Dict[str, List[tuple]]):
+        connection = self._writer
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for kind, keys in deletes.items():
+                table = _TABLES[kind]
+                if kind == 'memory':
+                    connection.executemany('DELETE FROM memory_fts WHERE rowid IN '
+                                           '(SELECT id FROM memories WHERE key = ?)', keys)
+                connection.executemany(f'DELETE FROM {table} WHERE key = ?', keys)
+
+            for kind, rows in upserts.items():
+                sql = (f'INSERT INTO {_TABLES[kind]}(key, user_id, updated_at, data) VALUES (?, ?, ?, ?) '
+                       'ON CONFLICT(key) DO UPDATE SET user_id = excluded.user_id, '
+                       'updated_at = excluded.updated_at, data = excluded.data')
+                if kind != 'memory':
+                    connection.executemany(sql, [row[:4] for row in rows])
+                    continue
+                # 记忆正文同步到FTS表（rowid与memories.id一致）
+                for key, user_id, updated_at, payload, data in rows:
+                    row_id = connection.execute(sql + ' RETURNING id', (key, user_id, updated_at, payload)).fetchone()[0]
+                    connection.execute('DELETE FROM memory_fts WHERE rowid = ?', (row_id,))
+                    connection.execute('INSERT INTO memory_fts(rowid, terms) VALUES (?, ?)',
+                                       (row_id, _fts_terms(data.get('content', ''))))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _requeue(self, entries: Dict[Tuple[str, str], Tuple[Any, Optional[str], float]]):
+        """写入失败的记录放回队列（队列中已有更新的写入时以新的为准）"""
+        if not entries:
+            return
+        with self._pending_lock:
+            for entry_key, entry in entries.items():
+                self._pending.setdefault(entry_key, entry)
+            self._inflight = {}
+
+    def _writer_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"写入SQLite存储失败: {e}")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """存储统计"""
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            'path': self.path,
+            'pending_writes': pending,
+            'total_flushes': self.total_flushes,
+            'total_records_written': self.total_records_written,
+            'records': {kind: self.count(kind) for kind in _TABLES}
+        }
+
+    def close(self):
+        """停止后台线程，提交剩余写入并关闭连接"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"关闭SQLite存储时写入失败: {e}")
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        atexit.unregister(self.close)
+
+
+def create_storage(config: Dict[str, Any]) -> Optional[StorageBackend]:
+    """按配置创建存储后端：配置了storage_path时使用SQLite，否则不持久化"""
+    path = config.get('storage_path')
+    if not path:
+        return None
+    return SQLiteStorage(
+        path,
+        flush_interval=config.get('storage_flush_interval', 1.0),
+        batch_size=config.get('storage_batch_size', 1000)
+    )
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+文本倒排索引模块
+中文按字二元组（bigram）切分、英文和数字按词切分，增量维护倒排表并按BM25打分
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Tuple
+
+# 中日韩统一表意文字（含扩展A区和兼容区）连续串，或字母数字词
+_CJK_RANGES = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_PATTERN = re.compile(rf'([{_CJK_RANGES}]+)|([^\W_{_CJK_RANGES}]+)')
+
+
+def tokenize(text: str) -> List[str]:
+    """切分文本：中文连续串取相邻二字（单字串保留单字），其余按词小写"""
+    tokens = []
+    for cjk, word in _TOKEN_PATTERN.findall(text.lower()):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """BM25倒排索引
+
+    文档由多个字段组成（如正文、标签、元数据），各字段词频按权重相加后参与打分（简化的BM25F）。
+    增删改都是增量的：每个文档只影响自己出现过的词的倒排表。
+
+    Args:
+        k1: 词频饱和参数
+        b: 文档长度归一化参数
+        field_weights: 字段权重，未列出的字段权重为1
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75,
+                 field_weights: Optional[Dict[str, float]] = None):
+        self.k1 = k1
+        self.b = b
+        self.field_weights = dict(field_weights or {})
+        # 词 -> {文档ID: 加权词频}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # 文档ID -> 文档包含的词（删除时据此清理倒排表）
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_lengths
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def add(self, doc_id: str, fields: Dict[str, Iterable[str]]):
+        """索引文档（已存在时先删除），fields为字段名 -> 文本列表"""
+        if doc_id in self._doc_lengths:
+            self.remove(doc_id)
+
+        frequencies: Dict[str, float] = Counter()
+        length = 0.0
+        for field_name, texts in fields.items():
+            weight = self.field_weights.get(field_name, 1.0)
+            if weight <= 0:
+                continue
+            for text in texts:
+                for term in tokenize(text):
+                    frequencies[term] += weight
+                    length += weight
+
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+            postings[doc_id] = frequency
+        self._doc_terms[doc_id] = tuple(frequencies)
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+
+    def remove(self, doc_id: str) -> bool:
+        """删除文档"""
+        length = self._doc_lengths.pop(doc_id, None)
+        if length is None:
+            return False
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        return True
+
+    def clear(self):
+        """清空索引"""
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._total_length = 0.0
+
+    def _query_terms(self, query: str) -> List[str]:
+        terms = []
+        for term in dict.fromkeys(tokenize(query)):
+            if term in self._postings:
+                terms.append(term)
+            elif len(term) == 1 and _TOKEN_PATTERN.match(term).group(1):
+                # 单个汉字的查询不在二元组倒排表中，扩展为包含该字的二元组（只在这种情况下遍历词表）
+                terms.extend(t for t in self._postings if len(t) == 2 and term in t)
+        return terms
+
+    def search(self, query: str, candidates: Optional[Collection[str]] = None,
+               accept: Optional[Callable[[str], bool]] = None) -> Dict[str, float]:
+        """按BM25为匹配任一查询词的文档打分
+
+        Args:
+            query: 查询文本
+            candidates: 候选文档范围（过滤下推），候选比倒排表短时改为遍历候选
+            accept: 额外的文档过滤条件
+
+        Returns:
+            文档ID -> BM25分数
+        """
+        document_count = len(self._doc_lengths)
+        if not document_count:
+            return {}
+        terms = self._query_terms(query)
+        if not terms:
+            return {}
+
+        average_length = self._total_length / document_count or 1.0
+        k1, b = self.k1, self.b
+        length_factor = k1 * (1 - b)
+        length_scale = k1 * b / average_length
+        doc_lengths = self._doc_lengths
+
+        scores: Dict[str, float] = {}
+        posting_lists = [self._postings[term] for term in terms]
+        scan_candidates = candidates is not None and len(candidates) < sum(map(len, posting_lists))
+        if candidates is not None and not scan_candidates and not isinstance(candidates, (set, frozenset, dict)):
+            candidates = set(candidates)
+        check_candidates = candidates is not None and not scan_candidates
+        rejected = set()
+        for postings in posting_lists:
+            df = len(postings)
+            weight = math.log(1 + (document_count - df + 0.5) / (df + 0.5)) * (k1 + 1)
+            if scan_candidates:
+                matches = [(doc_id, postings[doc_id]) for doc_id in candidates if doc_id in postings]
+            else:
+                matches = postings.items()
+
+            if not check_candidates and accept is None:
+                get = scores.get
+                for doc_id, frequency in matches:
+                    scores[doc_id] = get(doc_id, 0.0) + weight * frequency / (
+                        frequency + length_factor + length_scale * doc_lengths[doc_id])
+                continue
+
+            for doc_id, frequency in matches:
+                if doc_id not in scores:
+                    if doc_id in rejected:
+                        continue
+                    if (check_candidates and doc_id not in candidates) or (accept is not None and not accept(doc_id)):
+                        rejected.add(doc_id)
+                        continue
+                    scores[doc_id] = 0.0
+                scores[doc_id] += weight * frequency / (
+                    frequency + length_factor + length_scale * doc_lengths[doc_id])
+        return scores
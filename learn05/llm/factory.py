@@ -9,9 +9,14 @@ import logging
 from typing import Dict, Any, Optional, Type
 from enum import Enum
 
-from unified_interface import UnifiedLLMInterface, LLMProvider
-from providers import OpenAILLMClient, TongyiLLMClient
-from unified_client import UnifiedLLMClient
+try:
+    from .unified_interface import UnifiedLLMInterface, LLMProvider
+    from .providers import OpenAILLMClient, TongyiLLMClient
+    from .unified_client import UnifiedLLMClient
+except ImportError:
+    from unified_interface import UnifiedLLMInterface, LLMProvider
+    from providers import OpenAILLMClient, TongyiLLMClient
+    from unified_client import UnifiedLLMClient
 
 # 兼容旧接口
 try:
@@ -19,6 +19,7 @@ from .unified_client import UnifiedLLMClient
 from .factory import LLMFactory
 from .config import get_llm_config
 from .monitoring import get_performance_monitor, record_llm_request
+from .request_deadline import check_deadline
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +51,13 @@ class LLMManager:
                 fallback_providers=[LLMProvider.OPENAI]
             )
             
+            # 对冲请求阈值使用监控中按模型统计的滚动延迟分位数
+            fallback_manager = getattr(self._unified_client, 'fallback_manager', None)
+            if fallback_manager is not None:
+                fallback_manager.hedging.latency_source = (
+                    self.monitor.metrics_collector.get_latency_percentile
+                )
+            
             # 创建单独的客户端
             for provider in [LLMProvider.TONGYI, LLMProvider.OPENAI]:
                 try:
@@ -81,6 +89,8 @@ class LLMManager:
         Returns:
             LLMResponse: 生成结果
         """
+        # 请求截止时间已过时直接失败，不再占用提供商配额
+        check_deadline("LLM调用")
         start_time = time.time()
         request_id = kwargs.get('request_id', f"req_{int(time.time() * 1000)}")
         
@@ -152,6 +162,7 @@ class LLMManager:
         Returns:
             LLMResponse: 生成结果
         """
+        check_deadline("LLM调用")
         start_time = time.time()
         request_id = kwargs.get('request_id', f"chat_{int(time.time() * 1000)}")
         
@@ -223,6 +234,7 @@ class LLMManager:
         Yields:
             str: 生成的文本片段
         """
+        check_deadline("LLM调用")
         start_time = time.time()
         request_id = kwargs.get('request_id', f"stream_{int(time.time() * 1000)}")
         
@@ -301,6 +313,7 @@ class LLMManager:
         Yields:
             str: 生成的文本片段
         """
+        check_deadline("LLM调用")
         start_time = time.time()
         request_id = kwargs.get('request_id', f"stream_chat_{int(time.time() * 1000)}")
         
@@ -398,7 +411,17 @@ class LLMManager:
     
     def get_performance_report(self) -> Dict[str, Any]:
         """获取性能报告"""
-        return self.monitor.get_performance_report()
+        report = self.monitor.get_performance_report()
+        report['connection_pools'] = self.get_connection_pool_stats()
+        return report
+    
+    def get_connection_pool_stats(self) -> Dict[str, Any]:
+        """获取各提供商HTTP连接池的使用统计"""
+        pool_stats = {}
+        for provider_name, client in self._clients.items():
+            if hasattr(client, 'get_pool_stats'):
+                pool_stats[provider_name] = client.get_pool_stats()
+        return pool_stats
     
     def get_available_providers(self) -> List[str]:
         """获取可用的提供商列表"""
@@ -425,8 +448,10 @@ class LLMManager:
                 if hasattr(client, 'close'):
                     await client.close()
             
-            if hasattr(self._unified_client, 'close'):
-                await self._unified_client.close()
+            # 统一客户端与单独客户端可能共享同一实例，close可重复调用
+            unified_client = getattr(self, '_unified_client', None)
+            if unified_client is not None and hasattr(unified_client, 'close'):
+                await unified_client.close()
             
             logger.info("LLM管理器已关闭")
             
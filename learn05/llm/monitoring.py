@@ -13,7 +13,12 @@ from collections import defaultdict, deque
 from datetime import datetime, timedelta
 import json
 
-from .unified_interface import LLMProvider, LLMResponse
+from .unified_interface import LLMProvider, LLMResponse, LLM_LATENCY_BUCKETS
+from .components.histogram import LogHistogram, WindowedHistogram
+from .components.metrics_registry import get_registry, histogram_quantile
+from .components.stream_metrics import (
+    SCOPE_CLIENT, SCOPE_PROVIDER, OUTCOME_COMPLETED, StreamRecord, get_stream_tracker
+)
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +77,13 @@ class ProviderStats:
 class MetricsCollector:
     """指标收集器"""
     
+    # 管理器层端到端耗时（含路由与降级），与统一客户端的llm_request_duration_seconds区分
+    request_duration = get_registry().histogram(
+        'llm_manager_request_duration_seconds', 'LLM管理器请求端到端耗时（秒）',
+        ('provider', 'model', 'status'),
+        buckets=LLM_LATENCY_BUCKETS
+    )
+    
     def __init__(self, max_history: int = 10000, window_size: int = 3600):
         self.max_history = max_history
         self.window_size = window_size  # 时间窗口大小（秒）
@@ -84,6 +96,15 @@ class MetricsCollector:
         # 实时指标
         self.current_window_metrics: deque = deque()
         
+        # 成功请求的延迟分布（流式直方图，内存固定）
+        self.latency_histogram = WindowedHistogram(window_seconds=window_size)
+        self.provider_latency: Dict[LLMProvider, WindowedHistogram] = defaultdict(
+            lambda: WindowedHistogram(window_seconds=window_size)
+        )
+        self.model_latency: Dict[str, WindowedHistogram] = defaultdict(
+            lambda: WindowedHistogram(window_seconds=window_size)
+        )
+        
         # 线程锁
         self._lock = threading.RLock()
         
@@ -106,6 +127,15 @@ class MetricsCollector:
             model_stat = self.model_stats[metrics.model]
             self._update_stats(model_stat, metrics)
             
+            if metrics.success:
+                self.latency_histogram.record(metrics.latency, now=metrics.timestamp)
+                self.provider_latency[metrics.provider].record(metrics.latency, now=metrics.timestamp)
+                self.model_latency[metrics.model].record(metrics.latency, now=metrics.timestamp)
+            
+            self.request_duration.labels(
+                metrics.provider.value, metrics.model, 'success' if metrics.success else 'error'
+            ).observe(metrics.latency)
+            
             logger.debug(f"记录请求指标: {metrics.provider.value}, 成功: {metrics.success}, 延迟: {metrics.latency:.2f}s")
     
     def _update_stats(self, stats: ProviderStats, metrics: RequestMetrics):
@@ -151,19 +181,41 @@ class MetricsCollector:
                 'average_latency': total_latency / total_successful if total_successful > 0 else 0.0,
                 'total_tokens': total_tokens,
                 'tokens_per_second': total_tokens / total_latency if total_latency > 0 else 0.0,
+                **self._latency_percentiles(self.latency_histogram.total),
                 'providers': {
                     provider.value: {
                         'total_requests': stats.total_requests,
                         'success_rate': stats.success_rate,
                         'average_latency': stats.average_latency,
+                        **self._latency_percentiles(self.provider_latency[provider].total),
                         'total_tokens': stats.total_tokens,
                         'tokens_per_second': stats.tokens_per_second,
                         'error_counts': dict(stats.error_counts)
                     }
                     for provider, stats in self.provider_stats.items()
+                },
+                'models': {
+                    model: {
+                        'total_requests': stats.total_requests,
+                        'success_rate': stats.success_rate,
+                        'average_latency': stats.average_latency,
+                        **self._latency_percentiles(self.model_latency[model].total)
+                    }
+                    for model, stats in self.model_stats.items()
                 }
             }
     
+    @staticmethod
+    def _latency_percentiles(histogram: LogHistogram) -> Dict[str, float]:
+        """延迟分位数"""
+        summary = histogram.summary((0.5, 0.9, 0.99))
+        return {
+            'p50_latency': summary['p50'],
+            'p90_latency': summary['p90'],
+            'p99_latency': summary['p99'],
+            'max_latency': summary['max']
+        }
+    
     def get_window_stats(self, window_seconds: int = 300) -> Dict[str, Any]:
         """获取时间窗口内的统计"""
         current_time = time.time()
@@ -182,7 +234,8 @@ class MetricsCollector:
                     'success_rate': 0.0,
                     'average_latency': 0.0,
                     'requests_per_second': 0.0,
-                    'tokens_per_second': 0.0
+                    'tokens_per_second': 0.0,
+                    **self._latency_percentiles(LogHistogram())
                 }
             
             total_requests = len(window_metrics)
@@ -199,9 +252,44 @@ class MetricsCollector:
                 'success_rate': successful_requests / total_requests if total_requests > 0 else 0.0,
                 'average_latency': total_latency / successful_requests if successful_requests > 0 else 0.0,
                 'requests_per_second': total_requests / window_seconds,
-                'tokens_per_second': total_tokens / window_seconds if window_seconds > 0 else 0.0
+                'tokens_per_second': total_tokens / window_seconds if window_seconds > 0 else 0.0,
+                **self._latency_percentiles(self.latency_histogram.snapshot(window_seconds, now=current_time))
             }
     
+    def get_latency_percentile(self, model: str, percentile: float = 95.0,
+                               window_seconds: int = 300,
+                               min_samples: int = 20) -> Optional[float]:
+        """获取时间窗口内某模型成功请求的延迟分位数，样本不足时返回None"""
+        with self._lock:
+            histogram = self.model_latency.get(model)
+        if histogram is None:
+            return None
+        
+        snapshot = histogram.snapshot(window_seconds)
+        if snapshot.count < min_samples:
+            return None
+        return snapshot.quantile(percentile / 100)
+    
+    def get_fleet_stats(self) -> Dict[str, Any]:
+        """按"提供商/模型"汇总注册表中的累计请求（启用共享指标段时为全体worker）"""
+        metric = self.request_duration
+        fleet: Dict[str, Dict[str, Any]] = {}
+        for (provider, model, status), values in get_registry().values(metric.name).items():
+            entry = fleet.setdefault(f"{provider}/{model}", {
+                'provider': provider, 'model': model,
+                'total_requests': 0, 'failed_requests': 0, 'avg_latency': 0.0, 'p95_latency': 0.0
+            })
+            entry['total_requests'] += int(values[-1])
+            if status == 'success':
+                entry['avg_latency'] = values[-2] / values[-1] if values[-1] else 0.0
+                entry['p95_latency'] = histogram_quantile(0.95, metric.upper_bounds, values)
+            else:
+                entry['failed_requests'] += int(values[-1])
+        for entry in fleet.values():
+            total = entry['total_requests']
+            entry['success_rate'] = (total - entry['failed_requests']) / total if total else 0.0
+        return fleet
+    
     def get_error_analysis(self) -> Dict[str, Any]:
         """获取错误分析"""
         with self._lock:
@@ -260,19 +348,53 @@ class MetricsCollector:
             self.current_window_metrics.clear()
             self.provider_stats.clear()
             self.model_stats.clear()
+            self.latency_histogram.clear()
+            self.provider_latency.clear()
+            self.model_latency.clear()
             logger.info("指标统计已重置")
 
 
 class PerformanceMonitor:
     """性能监控器"""
     
-    def __init__(self, slow_request_threshold: float = 5.0):
+    def __init__(self, slow_request_threshold: float = 5.0, slow_first_token_threshold: float = 2.0):
         self.slow_request_threshold = slow_request_threshold
+        self.slow_first_token_threshold = slow_first_token_threshold
         self.metrics_collector = MetricsCollector()
+        self.stream_tracker = get_stream_tracker()
         
         # 性能警报
         self.alerts: List[Dict[str, Any]] = []
         self.max_alerts = 100
+        
+        # 统一客户端的流式请求结束时检查首token耗时和卡顿
+        self.stream_tracker.add_listener(self._on_stream_finished)
+    
+    def _on_stream_finished(self, record: StreamRecord):
+        """检查流式请求的首token耗时和分片间隔"""
+        if record.scope != SCOPE_CLIENT:
+            return
+        
+        if record.time_to_first_token is not None and \
+                record.time_to_first_token > self.slow_first_token_threshold:
+            self._add_alert({
+                'type': 'slow_first_token',
+                'timestamp': time.time(),
+                'provider': record.provider,
+                'model': record.model,
+                'time_to_first_token': record.time_to_first_token,
+                'threshold': self.slow_first_token_threshold
+            })
+        
+        if record.max_gap > self.slow_request_threshold:
+            self._add_alert({
+                'type': 'stream_stalled',
+                'timestamp': time.time(),
+                'provider': record.provider,
+                'model': record.model,
+                'max_gap': record.max_gap,
+                'threshold': self.slow_request_threshold
+            })
     
     def record_request(self, provider: LLMProvider, model: str, 
                       response: LLMResponse, latency: float, 
@@ -344,6 +466,13 @@ class PerformanceMonitor:
         if avg_latency > self.slow_request_threshold:
             health_score -= min(50, (avg_latency - self.slow_request_threshold) * 10)
         
+        # 流式首token耗时影响
+        streaming = self.stream_tracker.get_stats(SCOPE_CLIENT, window_seconds=300)
+        ttft_p95 = max((stats['time_to_first_token']['p95'] for stats in streaming.values()
+                        if stats['time_to_first_token']['count']), default=0.0)
+        if ttft_p95 > self.slow_first_token_threshold:
+            health_score -= min(30, (ttft_p95 - self.slow_first_token_threshold) * 10)
+        
         # 确保健康分数在0-100之间
         health_score = max(0.0, min(100.0, health_score))
         
@@ -368,6 +497,21 @@ class PerformanceMonitor:
                     'last_request_time': stats.last_request_time
                 }
                 for provider, stats in self.metrics_collector.provider_stats.items()
+            },
+            'streaming': {
+                'time_to_first_token_p95': ttft_p95,
+                'models': {
+                    name: {
+                        'streams': stats['streams'],
+                        'completed': stats['outcomes'][OUTCOME_COMPLETED],
+                        'time_to_first_token_p50': stats['time_to_first_token']['p50'],
+                        'time_to_first_token_p95': stats['time_to_first_token']['p95'],
+                        'inter_chunk_p95': stats['inter_chunk']['p95'],
+                        'duration_p95': stats['duration']['p95'],
+                        'tokens_per_second_p50': stats['tokens_per_second']['p50']
+                    }
+                    for name, stats in streaming.items()
+                }
             }
         }
     
@@ -383,6 +527,11 @@ class PerformanceMonitor:
                 '1hour': self.metrics_collector.get_window_stats(3600)
             },
             'error_analysis': self.metrics_collector.get_error_analysis(),
+            'fleet': self.metrics_collector.get_fleet_stats(),
+            'streaming': {
+                'client': self.stream_tracker.get_stats(SCOPE_CLIENT),
+                'provider': self.stream_tracker.get_stats(SCOPE_PROVIDER)
+            },
             'alerts_summary': {
                 'total_alerts': len(self.alerts),
                 'recent_alerts': self.alerts[-20:]
@@ -24,7 +24,9 @@ from .concurrent_processor import (
     TaskStatus,
     ProcessingConfig,
     ThreadPoolProcessor,
-    AsyncProcessor
+    ProcessPoolProcessor,
+    AsyncProcessor,
+    LLMBatchProcessor
 )
 
 from .performance_monitor import (
@@ -58,7 +60,9 @@ __all__ = [
     'TaskStatus',
     'ProcessingConfig',
     'ThreadPoolProcessor',
+    'ProcessPoolProcessor',
     'AsyncProcessor',
+    'LLMBatchProcessor',
     
     # 性能监控
     'PerformanceMonitor',
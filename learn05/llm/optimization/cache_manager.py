@@ -4,9 +4,11 @@
 实现多种缓存策略和缓存管理功能
 """
 
+import sys
 import time
 import json
 import hashlib
+import itertools
 import threading
 from typing import Any, Dict, List, Optional, Union, Callable
 from abc import ABC, abstractmethod
@@ -30,38 +32,108 @@ class CacheConfig:
     persistence_file: Optional[str] = None
     redis_url: Optional[str] = None
     redis_db: int = 0
+    max_memory_bytes: Optional[int] = None  # 按估算字节数限制内存缓存，None表示不限制
+    eviction_policy: str = 'lru'  # 内存缓存淘汰策略：lru 或 w-tinylfu
+    expiry_resolution: float = 1.0  # 过期时间轮精度(秒)
+
+# 估算容器大小时抽样的元素数
+_SIZE_SAMPLE = 8
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """粗略估算对象占用的内存字节数
+    
+    不做序列化：容器只抽样前几个元素按比例推算，嵌套超过两层不再展开。
+    """
+    try:
+        size = sys.getsizeof(value)
+    except TypeError:
+        return 0
+    if isinstance(value, (str, bytes, bytearray)) or _depth >= 2:
+        return size
+    
+    if isinstance(value, dict):
+        count = len(value)
+        sample = list(itertools.islice(value.items(), _SIZE_SAMPLE))
+        sampled = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in sample)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        count = len(value)
+        sample = list(itertools.islice(value, _SIZE_SAMPLE))
+        sampled = sum(estimate_size(v, _depth + 1) for v in sample)
+    elif hasattr(value, '__dict__'):
+        return size + estimate_size(vars(value), _depth + 1)
+    else:
+        return size
+    
+    if not sample:
+        return size
+    return size + sampled * count // len(sample)
+
+
+# time.monotonic()与墙上时钟的差值，用于把单调时间戳换算为datetime
+_MONOTONIC_OFFSET = time.time() - time.monotonic()
+
+
+def _to_monotonic(value: Union[datetime, float, None]) -> float:
+    """datetime（或单调时间戳）转换为单调时间戳"""
+    if value is None:
+        return time.monotonic()
+    if isinstance(value, datetime):
+        return value.timestamp() - _MONOTONIC_OFFSET
+    return float(value)
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    """单调时间戳转换为datetime"""
+    return datetime.fromtimestamp(timestamp + _MONOTONIC_OFFSET)
+
 
-@dataclass
 class CacheItem:
-    """缓存项"""
-    key: str
-    value: Any
-    created_at: datetime
-    accessed_at: datetime
-    access_count: int = 0
-    ttl_seconds: Optional[int] = None
-    size_bytes: int = 0
-    
-    def __post_init__(self):
-        if isinstance(self.value, (str, bytes)):
-            self.size_bytes = len(self.value)
-        else:
-            try:
-                self.size_bytes = len(pickle.dumps(self.value))
-            except:
-                self.size_bytes = 0
+    """缓存项
+    
+    使用__slots__和time.monotonic()浮点时间戳，避免每项携带__dict__和两个datetime对象；
+    created_at/accessed_at属性仍以datetime形式读写。
+    """
+    
+    __slots__ = ('key', 'value', 'created_ts', 'accessed_ts', 'access_count', 'ttl_seconds', 'size_bytes')
+    
+    def __init__(self, key: str, value: Any, created_at: Union[datetime, float, None] = None,
+                 accessed_at: Union[datetime, float, None] = None, access_count: int = 0,
+                 ttl_seconds: Optional[float] = None, size_bytes: int = 0):
+        self.key = key
+        self.value = value
+        self.created_ts = _to_monotonic(created_at)
+        self.accessed_ts = self.created_ts if accessed_at is None else _to_monotonic(accessed_at)
+        self.access_count = access_count
+        self.ttl_seconds = ttl_seconds
+        self.size_bytes = size_bytes or estimate_size(value)
+    
+    @property
+    def created_at(self) -> datetime:
+        return _to_datetime(self.created_ts)
+    
+    @created_at.setter
+    def created_at(self, value: Union[datetime, float]):
+        self.created_ts = _to_monotonic(value)
+    
+    @property
+    def accessed_at(self) -> datetime:
+        return _to_datetime(self.accessed_ts)
+    
+    @accessed_at.setter
+    def accessed_at(self, value: Union[datetime, float]):
+        self.accessed_ts = _to_monotonic(value)
     
     def is_expired(self) -> bool:
         """检查是否过期"""
         if self.ttl_seconds is None:
             return False
         
-        expiry_time = self.created_at + timedelta(seconds=self.ttl_seconds)
-        return datetime.now() > expiry_time
+        return time.monotonic() > self.created_ts + self.ttl_seconds
     
     def access(self):
         """记录访问"""
-        self.accessed_at = datetime.now()
+        self.accessed_ts = time.monotonic()
         self.access_count += 1
     
     def to_dict(self) -> Dict[str, Any]:
@@ -75,6 +147,23 @@ class CacheItem:
             'ttl_seconds': self.ttl_seconds,
             'size_bytes': self.size_bytes
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CacheItem':
+        """从字典创建"""
+        return cls(
+            key=data['key'],
+            value=data['value'],
+            created_at=datetime.fromisoformat(data['created_at']),
+            accessed_at=datetime.fromisoformat(data['accessed_at']),
+            access_count=data.get('access_count', 0),
+            ttl_seconds=data.get('ttl_seconds'),
+            size_bytes=data.get('size_bytes', 0)
+        )
+    
+    def __repr__(self) -> str:
+        return (f"CacheItem(key={self.key!r}, access_count={self.access_count}, "
+                f"ttl_seconds={self.ttl_seconds}, size_bytes={self.size_bytes})")
 
 class CacheStrategy(ABC):
     """缓存策略抽象基类"""
@@ -140,52 +229,339 @@ class CacheStrategy(ABC):
             logger.error(f"反序列化失败: {e}")
             return None
 
+class TimerWheel:
+    """哈希时间轮
+    
+    按到期时间把键分到固定数量的桶中，推进时只检查已经走过的桶，
+    过期清理的开销与到期键数量成正比，而不是与缓存总量成正比。
+    """
+    
+    def __init__(self, resolution: float = 1.0, slots: int = 1024):
+        """初始化时间轮
+        
+        Args:
+            resolution: 每个桶覆盖的时间跨度(秒)
+            slots: 桶数量，超过一圈的到期时间在转到对应圈时才会过期
+        """
+        self.resolution = resolution
+        self.slots = slots
+        self._buckets: List[Dict[str, float]] = [{} for _ in range(slots)]
+        self._current_tick = self._tick(time.monotonic())
+    
+    def _tick(self, timestamp: float) -> int:
+        return int(timestamp / self.resolution)
+    
+    def schedule(self, key: str, expire_at: float):
+        """登记键的到期时间（time.monotonic()时间戳）"""
+        tick = max(self._tick(expire_at), self._current_tick)
+        self._buckets[tick % self.slots][key] = expire_at
+    
+    def cancel(self, key: str, expire_at: float):
+        """取消键的到期登记"""
+        tick = max(self._tick(expire_at), self._current_tick)
+        self._buckets[tick % self.slots].pop(key, None)
+        # 登记后时间轮已推进时，键可能落在当前桶
+        self._buckets[self._current_tick % self.slots].pop(key, None)
+    
+    def advance(self, now: float) -> List[str]:
+        """推进到当前时间，返回已到期的键"""
+        target_tick = self._tick(now)
+        if target_tick < self._current_tick:
+            return []
+        
+        expired = []
+        ticks = min(target_tick - self._current_tick + 1, self.slots)
+        for tick in range(self._current_tick, self._current_tick + ticks):
+            bucket = self._buckets[tick % self.slots]
+            if not bucket:
+                continue
+            due = [key for key, expire_at in bucket.items() if expire_at <= now]
+            for key in due:
+                del bucket[key]
+            expired.extend(due)
+        
+        self._current_tick = target_tick
+        return expired
+    
+    def clear(self):
+        """清空时间轮"""
+        for bucket in self._buckets:
+            bucket.clear()
+
+
+class FrequencySketch:
+    """Count-Min Sketch频率估计（TinyLFU准入使用）
+    
+    计数达到上限后停止增长，记录次数达到采样规模时所有计数减半，使频率随时间衰减。
+    """
+    
+    _SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+    
+    def __init__(self, capacity: int, max_count: int = 15):
+        width = 1
+        while width < max(16, capacity):
+            width <<= 1
+        self._mask = width - 1
+        self._table = [[0] * width for _ in self._SEEDS]
+        self.max_count = max_count
+        self.sample_size = 10 * max(16, capacity)
+        self._additions = 0
+    
+    def _indexes(self, key: str):
+        key_hash = hash(key)
+        for seed in self._SEEDS:
+            yield ((key_hash * seed) >> 16 ^ key_hash) & self._mask
+    
+    def increment(self, key: str):
+        """记录一次访问"""
+        added = False
+        for row, index in zip(self._table, self._indexes(key)):
+            if row[index] < self.max_count:
+                row[index] += 1
+                added = True
+        if added:
+            self._additions += 1
+            if self._additions >= self.sample_size:
+                self._reset()
+    
+    def frequency(self, key: str) -> int:
+        """估计访问频率"""
+        return min(row[index] for row, index in zip(self._table, self._indexes(key)))
+    
+    def _reset(self):
+        """所有计数减半（衰减）"""
+        for row in self._table:
+            for index, count in enumerate(row):
+                row[index] = count >> 1
+        self._additions //= 2
+    
+    def clear(self):
+        """清空计数"""
+        for row in self._table:
+            row[:] = [0] * len(row)
+        self._additions = 0
+
+
+class LRUEvictionPolicy:
+    """LRU淘汰策略（O(1)）"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._order: OrderedDict[str, None] = OrderedDict()
+    
+    def on_access(self, key: str):
+        """命中时移动到最近使用位置"""
+        self._order.move_to_end(key)
+    
+    def on_miss(self, key: str):
+        """未命中（LRU不需要处理）"""
+        pass
+    
+    def on_insert(self, key: str) -> List[str]:
+        """插入新键，返回因容量限制被淘汰的键"""
+        self._order[key] = None
+        evicted = []
+        while len(self._order) > self.max_size:
+            evicted.append(self._order.popitem(last=False)[0])
+        return evicted
+    
+    def on_remove(self, key: str):
+        """键被删除或过期"""
+        self._order.pop(key, None)
+    
+    def victim(self) -> Optional[str]:
+        """按字节上限淘汰时的候选键"""
+        return next(iter(self._order), None)
+    
+    def resize(self, max_size: int):
+        """调整容量（超出部分由调用方通过victim逐个淘汰）"""
+        self.max_size = max_size
+    
+    def clear(self):
+        self._order.clear()
+
+
+class WTinyLFUEvictionPolicy:
+    """W-TinyLFU淘汰策略
+    
+    新键先进入窗口LRU（约1%容量），被挤出窗口时与主区（SLRU：试用区+保护区）
+    最久未使用的键比较历史访问频率，频率更高者留下，
+    避免一次性扫描流量把热点数据挤出缓存。
+    """
+    
+    def __init__(self, max_size: int, window_ratio: float = 0.01, protected_ratio: float = 0.8):
+        self.window_ratio = window_ratio
+        self.protected_ratio = protected_ratio
+        self._set_sizes(max_size)
+        self.sketch = FrequencySketch(max_size)
+        
+        self._window: OrderedDict[str, None] = OrderedDict()
+        self._probation: OrderedDict[str, None] = OrderedDict()
+        self._protected: OrderedDict[str, None] = OrderedDict()
+        self.rejected_count = 0
+    
+    def _set_sizes(self, max_size: int):
+        self.max_size = max_size
+        self.window_size = max(1, int(max_size * self.window_ratio))
+        self.main_size = max(1, max_size - self.window_size)
+        self.protected_size = max(1, int(self.main_size * self.protected_ratio))
+    
+    def on_access(self, key: str):
+        """命中：窗口内更新顺序，试用区晋升到保护区"""
+        self.sketch.increment(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        elif key in self._probation:
+            del self._probation[key]
+            self._protected[key] = None
+            if len(self._protected) > self.protected_size:
+                demoted = self._protected.popitem(last=False)[0]
+                self._probation[demoted] = None
+    
+    def on_miss(self, key: str):
+        """未命中也计入频率，使反复请求的新键更容易被准入"""
+        self.sketch.increment(key)
+    
+    def on_insert(self, key: str) -> List[str]:
+        """插入新键，返回被淘汰的键（可能是被拒绝准入的候选键）"""
+        self._window[key] = None
+        if len(self._window) <= self.window_size:
+            return []
+        
+        candidate = self._window.popitem(last=False)[0]
+        if len(self._probation) + len(self._protected) < self.main_size:
+            self._probation[candidate] = None
+            return []
+        
+        victim_queue = self._probation if self._probation else self._protected
+        victim = next(iter(victim_queue))
+        if self.sketch.frequency(candidate) > self.sketch.frequency(victim):
+            del victim_queue[victim]
+            self._probation[candidate] = None
+            return [victim]
+        
+        self.rejected_count += 1
+        return [candidate]
+    
+    def on_remove(self, key: str):
+        """键被删除或过期"""
+        self._window.pop(key, None) or self._probation.pop(key, None) or self._protected.pop(key, None)
+    
+    def victim(self) -> Optional[str]:
+        """按字节上限淘汰时的候选键：试用区、窗口、保护区依次取最久未使用的键"""
+        for queue in (self._probation, self._window, self._protected):
+            if queue:
+                return next(iter(queue))
+        return None
+    
+    def resize(self, max_size: int):
+        """调整容量：窗口和保护区超出的键降到试用区，总数超出部分由调用方逐个淘汰"""
+        self._set_sizes(max_size)
+        while len(self._window) > self.window_size:
+            self._probation[self._window.popitem(last=False)[0]] = None
+        while len(self._protected) > self.protected_size:
+            self._probation[self._protected.popitem(last=False)[0]] = None
+    
+    def clear(self):
+        self._window.clear()
+        self._probation.clear()
+        self._protected.clear()
+        self.sketch.clear()
+
+
 class MemoryCache(CacheStrategy):
-    """内存缓存策略"""
+    """内存缓存策略
+    
+    - O(1)淘汰：LRU，或可选的W-TinyLFU准入策略（config.eviction_policy='w-tinylfu'）
+    - 惰性过期：访问时检查，后台由时间轮按到期时间批量清理
+    - 同时按条目数和估算字节数（config.max_memory_bytes）限制容量
+    - 统计信息由运行计数器维护，获取为O(1)
+    """
     
     def __init__(self, config: CacheConfig):
         super().__init__(config)
         self._cache: Dict[str, CacheItem] = {}
-        self._last_cleanup = time.time()
+        self._expire_at: Dict[str, float] = {}
+        self._wheel = TimerWheel(resolution=config.expiry_resolution)
+        if config.eviction_policy == 'w-tinylfu':
+            self._policy = WTinyLFUEvictionPolicy(config.max_size)
+        elif config.eviction_policy == 'lru':
+            self._policy = LRUEvictionPolicy(config.max_size)
+        else:
+            raise ValueError(f"不支持的淘汰策略: {config.eviction_policy}")
+        
+        # 运行计数器
+        self._total_bytes = 0
+        self._total_accesses = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
     
     def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
         with self._lock:
-            self._cleanup_if_needed()
+            now = time.monotonic()
+            self._expire_due(now)
             
             cache_key = self._generate_key(key)
             item = self._cache.get(cache_key)
             
-            if item is None:
-                return None
-            
-            if item.is_expired():
-                del self._cache[cache_key]
+            if item is None or self._is_expired(cache_key, now):
+                if item is not None:
+                    self._remove(cache_key)
+                    self._expirations += 1
+                self._misses += 1
+                self._policy.on_miss(cache_key)
                 return None
             
             item.access()
+            self._hits += 1
+            self._total_accesses += 1
+            self._policy.on_access(cache_key)
             return item.value
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """设置缓存值"""
         with self._lock:
             try:
+                now = time.monotonic()
+                self._expire_due(now)
+                
                 cache_key = self._generate_key(key)
                 ttl = ttl or self.config.ttl_seconds
                 
                 item = CacheItem(
                     key=cache_key,
                     value=value,
-                    created_at=datetime.now(),
-                    accessed_at=datetime.now(),
                     ttl_seconds=ttl
                 )
                 
-                # 检查缓存大小限制
-                if len(self._cache) >= self.config.max_size:
-                    self._evict_items()
+                if self.config.max_memory_bytes and item.size_bytes > self.config.max_memory_bytes:
+                    logger.warning(f"缓存值过大({item.size_bytes}字节)，超过内存上限，不予缓存")
+                    return False
                 
-                self._cache[cache_key] = item
+                if cache_key in self._cache:
+                    # 更新已有键：替换值，保留其在淘汰队列中的位置
+                    self._unschedule(cache_key)
+                    self._total_bytes -= self._cache[cache_key].size_bytes
+                    self._cache[cache_key] = item
+                    self._policy.on_access(cache_key)
+                else:
+                    self._cache[cache_key] = item
+                    for evicted_key in self._policy.on_insert(cache_key):
+                        self._discard(evicted_key)
+                        self._evictions += 1
+                
+                if cache_key in self._cache:
+                    self._total_bytes += item.size_bytes
+                    if ttl:
+                        self._expire_at[cache_key] = now + ttl
+                        self._wheel.schedule(cache_key, now + ttl)
+                
+                self._enforce_memory_limit()
                 return True
                 
             except Exception as e:
@@ -197,7 +573,7 @@ class MemoryCache(CacheStrategy):
         with self._lock:
             cache_key = self._generate_key(key)
             if cache_key in self._cache:
-                del self._cache[cache_key]
+                self._remove(cache_key)
                 return True
             return False
     
@@ -205,19 +581,22 @@ class MemoryCache(CacheStrategy):
         """清空缓存"""
         with self._lock:
             self._cache.clear()
+            self._expire_at.clear()
+            self._wheel.clear()
+            self._policy.clear()
+            self._total_bytes = 0
             return True
     
     def exists(self, key: str) -> bool:
         """检查键是否存在"""
         with self._lock:
             cache_key = self._generate_key(key)
-            item = self._cache.get(cache_key)
-            
-            if item is None:
+            if cache_key not in self._cache:
                 return False
             
-            if item.is_expired():
-                del self._cache[cache_key]
+            if self._is_expired(cache_key, time.monotonic()):
+                self._remove(cache_key)
+                self._expirations += 1
                 return False
             
             return True
@@ -232,58 +611,98 @@ class MemoryCache(CacheStrategy):
         with self._lock:
             return list(self._cache.keys())
     
-    def _cleanup_if_needed(self):
-        """按需清理过期项"""
-        current_time = time.time()
-        if current_time - self._last_cleanup > self.config.cleanup_interval:
-            self._cleanup_expired()
-            self._last_cleanup = current_time
+    def cleanup_expired(self) -> int:
+        """清理已到期的缓存项，返回清理数量"""
+        with self._lock:
+            expirations = self._expirations
+            self._expire_due(time.monotonic())
+            return self._expirations - expirations
     
-    def _cleanup_expired(self):
-        """清理过期项"""
-        expired_keys = []
-        for key, item in self._cache.items():
-            if item.is_expired():
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            del self._cache[key]
+    def resize(self, max_size: int) -> int:
+        """调整最大条目数，返回因缩容被淘汰的条目数"""
+        with self._lock:
+            self.config.max_size = max_size
+            self._policy.resize(max_size)
+            
+            evicted = 0
+            while len(self._cache) > max_size:
+                victim = self._policy.victim()
+                if victim is None:
+                    break
+                self._remove(victim)
+                evicted += 1
+            
+            self._evictions += evicted
+            return evicted
+    
+    def _is_expired(self, cache_key: str, now: float) -> bool:
+        expire_at = self._expire_at.get(cache_key)
+        return expire_at is not None and now >= expire_at
+    
+    def _expire_due(self, now: float):
+        """推进时间轮，清理已到期的项"""
+        expired_keys = self._wheel.advance(now)
+        for cache_key in expired_keys:
+            if cache_key in self._cache and self._is_expired(cache_key, now):
+                self._remove(cache_key, unschedule=False)
+                self._expirations += 1
         
-        if expired_keys:
+        if len(expired_keys) > 100:
             logger.info(f"清理了 {len(expired_keys)} 个过期缓存项")
     
-    def _evict_items(self):
-        """驱逐缓存项（LRU策略）"""
-        if not self._cache:
+    def _unschedule(self, cache_key: str):
+        expire_at = self._expire_at.pop(cache_key, None)
+        if expire_at is not None:
+            self._wheel.cancel(cache_key, expire_at)
+    
+    def _discard(self, cache_key: str, unschedule: bool = True):
+        """从存储中移除（不通知淘汰策略）"""
+        item = self._cache.pop(cache_key, None)
+        if item is not None:
+            self._total_bytes -= item.size_bytes
+        if unschedule:
+            self._unschedule(cache_key)
+        else:
+            self._expire_at.pop(cache_key, None)
+    
+    def _remove(self, cache_key: str, unschedule: bool = True):
+        """移除缓存项"""
+        self._discard(cache_key, unschedule)
+        self._policy.on_remove(cache_key)
+    
+    def _enforce_memory_limit(self):
+        """超过内存上限时逐个淘汰"""
+        max_bytes = self.config.max_memory_bytes
+        if not max_bytes:
             return
         
-        # 按访问时间排序，删除最久未访问的项
-        sorted_items = sorted(
-            self._cache.items(),
-            key=lambda x: x[1].accessed_at
-        )
-        
-        # 删除最旧的25%项目
-        evict_count = max(1, len(sorted_items) // 4)
-        for i in range(evict_count):
-            key, _ = sorted_items[i]
-            del self._cache[key]
-        
-        logger.info(f"驱逐了 {evict_count} 个缓存项")
+        while self._total_bytes > max_bytes:
+            victim = self._policy.victim()
+            if victim is None:
+                break
+            self._remove(victim)
+            self._evictions += 1
     
     def get_statistics(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
         with self._lock:
-            total_size = sum(item.size_bytes for item in self._cache.values())
-            total_accesses = sum(item.access_count for item in self._cache.values())
-            
-            return {
+            lookups = self._hits + self._misses
+            stats = {
                 'total_items': len(self._cache),
-                'total_size_bytes': total_size,
-                'total_accesses': total_accesses,
+                'total_size_bytes': self._total_bytes,
+                'total_accesses': self._total_accesses,
                 'max_size': self.config.max_size,
-                'hit_rate': 0.0  # 需要额外跟踪命中率
+                'max_memory_bytes': self.config.max_memory_bytes,
+                'eviction_policy': self.config.eviction_policy,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'hit_rate': self._hits / lookups if lookups else 0.0
             }
+            if isinstance(self._policy, WTinyLFUEvictionPolicy):
+                stats['admission_rejections'] = self._policy.rejected_count
+            return stats
 
 class LRUCache(CacheStrategy):
     """LRU缓存策略"""
@@ -322,8 +741,6 @@ class LRUCache(CacheStrategy):
                 item = CacheItem(
                     key=cache_key,
                     value=value,
-                    created_at=datetime.now(),
-                    accessed_at=datetime.now(),
                     ttl_seconds=ttl
                 )
                 
@@ -421,8 +838,6 @@ class TTLCache(CacheStrategy):
                 item = CacheItem(
                     key=cache_key,
                     value=value,
-                    created_at=datetime.now(),
-                    accessed_at=datetime.now(),
                     ttl_seconds=ttl
                 )
                 
@@ -682,6 +1097,20 @@ class CacheManager:
         """获取所有键"""
         return self.strategy.keys()
     
+    def cleanup_expired(self) -> int:
+        """清理已到期的缓存项，返回清理数量"""
+        if hasattr(self.strategy, 'cleanup_expired'):
+            return self.strategy.cleanup_expired()
+        return 0
+    
+    def resize(self, max_size: int) -> int:
+        """调整缓存容量上限，返回因缩容被淘汰的条目数"""
+        with self._lock:
+            self.config.max_size = max_size
+            if hasattr(self.strategy, 'resize'):
+                return self.strategy.resize(max_size)
+            return 0
+    
     def get_hit_rate(self) -> float:
         """获取命中率"""
         with self._lock:
@@ -5,6 +5,7 @@
 """
 
 import asyncio
+import json
 import threading
 import time
 import uuid
@@ -14,9 +15,25 @@ from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed
+from concurrent.futures import wait as wait_futures
 import logging
 import queue
+import pickle
+import sys
 import multiprocessing
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from ..components.rate_limiter import estimate_tokens
+    from ..request_deadline import DeadlineExceededError
+except (ImportError, ValueError):
+    from components.rate_limiter import estimate_tokens
+    from request_deadline import DeadlineExceededError
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -69,6 +86,8 @@ class ProcessingConfig:
     queue_size: int = 1000
     batch_size: int = 10
     use_process_pool: bool = False
+    max_tasks_per_child: Optional[int] = None  # 进程池中每个工作进程处理多少个任务后重启
+    shared_memory_threshold: int = 1024 * 1024  # 超过该字节数的NumPy数组参数通过共享内存传递
 
 class ConcurrentProcessor(ABC):
     """并发处理器抽象基类"""
@@ -99,6 +118,11 @@ class ConcurrentProcessor(ABC):
         """关闭处理器"""
         pass
     
+    @abstractmethod
+    def resize(self, max_workers: int):
+        """调整工作线程/进程数"""
+        pass
+    
     def _generate_task_id(self) -> str:
         """生成任务ID"""
         return str(uuid.uuid4())
@@ -321,6 +345,373 @@ class ThreadPoolProcessor(ConcurrentProcessor):
             results.append(result)
         
         return results
+    
+    def resize(self, max_workers: int):
+        """调整工作线程数
+
+        新任务提交到新大小的执行器，旧执行器在已提交任务完成后自行退出。
+        """
+        with self._lock:
+            if max_workers == self.config.max_workers:
+                return
+            old_executor = self._executor
+            self._executor = type(old_executor)(max_workers=max_workers)
+            self.config.max_workers = max_workers
+        old_executor.shutdown(wait=False)
+        
+        if self.config.enable_logging:
+            logger.info(f"工作线程数调整为 {max_workers}")
+
+class _SharedArray:
+    """经共享内存传递的NumPy数组引用"""
+
+    __slots__ = ('name', 'shape', 'dtype')
+
+    def __init__(self, name: str, shape: tuple, dtype: Any):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def _attach_shared_arrays(values, blocks: list) -> list:
+    """在工作进程中把共享内存引用还原为数组（零拷贝视图）"""
+    restored = []
+    for value in values:
+        if isinstance(value, _SharedArray):
+            block = shared_memory.SharedMemory(name=value.name)
+            blocks.append(block)
+            value = np.ndarray(value.shape, dtype=value.dtype, buffer=block.buf)
+        restored.append(value)
+    return restored
+
+
+def _run_in_worker(func: Callable, args: tuple, kwargs: Dict[str, Any],
+                   retry_count: int, retry_delay: float) -> tuple:
+    """在工作进程中执行任务（带重试）
+
+    Returns:
+        tuple: (结果, 开始时间戳, 结束时间戳)
+    """
+    blocks = []
+    started_at = time.time()
+    try:
+        args = _attach_shared_arrays(args, blocks)
+        kwargs = dict(zip(kwargs, _attach_shared_arrays(kwargs.values(), blocks)))
+
+        for attempt in range(retry_count + 1):
+            try:
+                result = func(*args, **kwargs)
+                break
+            except Exception:
+                if attempt >= retry_count:
+                    raise
+                time.sleep(retry_delay)
+
+        # 返回值若是共享内存上的视图，关闭共享内存后会失效，先复制一份
+        if blocks and isinstance(result, np.ndarray) and not result.flags.owndata:
+            result = result.copy()
+        return result, started_at, time.time()
+    finally:
+        del args, kwargs
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass  # 返回值仍引用共享内存，随对象回收释放
+
+
+def _run_chunk(calls: List[tuple], retry_count: int, retry_delay: float) -> List[tuple]:
+    """在工作进程中依次执行一块任务，单个任务失败不影响同块其他任务
+
+    Returns:
+        List[tuple]: 每个任务的(是否成功, 结果或异常, 开始时间戳, 结束时间戳)
+    """
+    outcomes = []
+    for func, args, kwargs in calls:
+        try:
+            outcomes.append((True,) + _run_in_worker(func, args, kwargs, retry_count, retry_delay))
+        except Exception as e:
+            outcomes.append((False, e, None, None))
+    return outcomes
+
+
+class ProcessPoolProcessor(ConcurrentProcessor):
+    """进程池处理器
+
+    用于成绩统计、大段模型输出的JSON解析、文档切分等CPU密集型任务，不受GIL限制。
+    任务函数和参数必须可pickle（模块级函数），提交时即检查；
+    超过shared_memory_threshold的NumPy数组参数经共享内存传递，不做整块序列化。
+    """
+
+    def __init__(self, config: Optional[ProcessingConfig] = None):
+        super().__init__(config)
+
+        self._executor = self._create_executor(self.config.max_workers)
+
+        self._futures: Dict[str, Future] = {}
+        # 分块提交时多个任务共用一个future
+        self._future_tasks: Dict[Future, List[str]] = {}
+        self._future_blocks: Dict[Future, List[shared_memory.SharedMemory]] = {}
+
+        # 统计信息
+        self.chunks_submitted = 0
+        self.shared_memory_bytes = 0
+
+    def _create_executor(self, max_workers: int) -> ProcessPoolExecutor:
+        """创建进程池执行器"""
+        executor_kwargs = {}
+        if self.config.max_tasks_per_child:
+            if sys.version_info >= (3, 11):
+                # 工作进程处理指定数量的任务后重启，限制内存增长（默认改用spawn启动方式）
+                executor_kwargs['max_tasks_per_child'] = self.config.max_tasks_per_child
+            else:
+                logger.warning("当前Python版本不支持max_tasks_per_child，工作进程不会被回收")
+
+        return ProcessPoolExecutor(max_workers=max_workers, **executor_kwargs)
+
+    def _share_arrays(self, values, blocks: list) -> list:
+        """把大数组参数复制到共享内存，只传递引用"""
+        shared = []
+        for value in values:
+            if (np is not None and isinstance(value, np.ndarray) and value.dtype != object
+                    and value.nbytes and value.nbytes >= self.config.shared_memory_threshold):
+                block = shared_memory.SharedMemory(create=True, size=value.nbytes)
+                np.ndarray(value.shape, dtype=value.dtype, buffer=block.buf)[...] = value
+                blocks.append(block)
+                self.shared_memory_bytes += value.nbytes
+                value = _SharedArray(block.name, value.shape, value.dtype)
+            shared.append(value)
+        return shared
+
+    @staticmethod
+    def _release_blocks(blocks: list):
+        """释放父进程持有的共享内存"""
+        for block in blocks:
+            try:
+                block.close()
+                block.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _prepare_call(self, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> tuple:
+        """替换大数组参数并检查任务能否序列化到工作进程
+
+        Returns:
+            tuple: ((func, args, kwargs), 共享内存块列表)
+        """
+        blocks = []
+        args = tuple(self._share_arrays(args, blocks))
+        kwargs = dict(zip(kwargs, self._share_arrays(kwargs.values(), blocks)))
+
+        try:
+            pickle.dumps((func, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self._release_blocks(blocks)
+            raise TypeError(f"任务函数或参数无法序列化，不能提交到进程池（需使用模块级函数）: {e}") from e
+
+        return (func, args, kwargs), blocks
+
+    def _submit(self, task_ids: List[str], calls: List[tuple], blocks: list):
+        """提交一个任务或一块任务到进程池"""
+        with self._lock:
+            try:
+                if len(calls) == 1:
+                    future = self._executor.submit(
+                        _run_in_worker, *calls[0], self.config.retry_count, self.config.retry_delay
+                    )
+                else:
+                    future = self._executor.submit(
+                        _run_chunk, calls, self.config.retry_count, self.config.retry_delay
+                    )
+                    self.chunks_submitted += 1
+            except Exception:
+                self._release_blocks(blocks)
+                raise
+
+            for task_id in task_ids:
+                self._tasks[task_id] = self._create_task_result(task_id)
+                self._futures[task_id] = future
+            self._future_tasks[future] = task_ids
+            self._future_blocks[future] = blocks
+
+        future.add_done_callback(self._handle_completion)
+
+    def submit_task(self, func: Callable, *args, **kwargs) -> str:
+        """提交任务"""
+        if self._shutdown:
+            raise RuntimeError("处理器已关闭")
+
+        call, blocks = self._prepare_call(func, args, kwargs)
+        task_id = self._generate_task_id()
+        self._submit([task_id], [call], blocks)
+
+        if self.config.enable_logging:
+            logger.info(f"任务 {task_id} 已提交到进程池")
+
+        return task_id
+
+    def submit_batch(self, tasks: List[tuple], chunk_size: Optional[int] = None) -> List[str]:
+        """分块批量提交任务
+
+        每chunk_size个任务（默认config.batch_size）打包成一次进程间调用，减少小任务的序列化和调度开销。
+
+        Args:
+            tasks: (func, args, kwargs)元组列表
+            chunk_size: 每块任务数
+        """
+        if self._shutdown:
+            raise RuntimeError("处理器已关闭")
+
+        tasks = list(tasks)
+        chunk_size = max(1, chunk_size or self.config.batch_size)
+        task_ids = []
+
+        for start in range(0, len(tasks), chunk_size):
+            calls = []
+            blocks = []
+            try:
+                for task in tasks[start:start + chunk_size]:
+                    func = task[0]
+                    args = task[1] if len(task) > 1 else ()
+                    kwargs = task[2] if len(task) > 2 else {}
+
+                    if not isinstance(args, (list, tuple)):
+                        args = (args,)
+
+                    call, call_blocks = self._prepare_call(func, tuple(args), kwargs)
+                    calls.append(call)
+                    blocks.extend(call_blocks)
+            except Exception:
+                self._release_blocks(blocks)
+                raise
+
+            chunk_ids = [self._generate_task_id() for _ in calls]
+            self._submit(chunk_ids, calls, blocks)
+            task_ids.extend(chunk_ids)
+
+        if self.config.enable_logging:
+            logger.info(f"批量提交了 {len(task_ids)} 个任务到进程池")
+
+        return task_ids
+
+    def _handle_completion(self, future: Future):
+        """处理任务完成（回调和等待方都可能调用，只生效一次）"""
+        with self._lock:
+            task_ids = self._future_tasks.pop(future, None)
+            if task_ids is None:
+                return
+            self._release_blocks(self._future_blocks.pop(future, []))
+            for task_id in task_ids:
+                self._futures.pop(task_id, None)
+
+            if future.cancelled():
+                for task_id in task_ids:
+                    self._update_task_result(task_id, TaskStatus.CANCELLED)
+                return
+
+            error = future.exception()
+            if error is not None:
+                for task_id in task_ids:
+                    self._update_task_result(task_id, TaskStatus.FAILED, error=error)
+                return
+
+            outcome = future.result()
+            outcomes = outcome if isinstance(outcome, list) else [(True,) + outcome]
+            for task_id, (ok, payload, started_at, finished_at) in zip(task_ids, outcomes):
+                if ok:
+                    self._update_task_result(task_id, TaskStatus.COMPLETED, result=payload)
+                else:
+                    self._update_task_result(task_id, TaskStatus.FAILED, error=payload)
+
+                # 使用工作进程中记录的实际执行时间
+                if started_at is not None:
+                    task_result = self._tasks[task_id]
+                    task_result.start_time = datetime.fromtimestamp(started_at)
+                    task_result.end_time = datetime.fromtimestamp(finished_at)
+                    task_result.execution_time = finished_at - started_at
+
+    def get_result(self, task_id: str, timeout: Optional[float] = None) -> TaskResult:
+        """获取任务结果"""
+        with self._lock:
+            if task_id not in self._tasks:
+                raise ValueError(f"任务 {task_id} 不存在")
+
+            task_result = self._tasks[task_id]
+            future = self._futures.get(task_id)
+
+        if future is not None:
+            try:
+                future.result(timeout=timeout or self.config.timeout)
+            except Exception:
+                pass  # 错误在_handle_completion中记录
+            if future.done():
+                self._handle_completion(future)
+
+        return task_result
+
+    def cancel_task(self, task_id: str) -> bool:
+        """取消尚未开始的任务（分块提交的任务会与同块任务一起取消）"""
+        with self._lock:
+            future = self._futures.get(task_id)
+            if future is None or not future.cancel():
+                return False
+
+        self._handle_completion(future)
+        return True
+
+    def wait_for_completion(self, task_ids: List[str], timeout: Optional[float] = None) -> List[TaskResult]:
+        """等待任务完成"""
+        with self._lock:
+            futures = {self._futures[task_id] for task_id in task_ids if task_id in self._futures}
+
+        wait_futures(futures, timeout=timeout or self.config.timeout)
+        for future in futures:
+            if future.done():
+                self._handle_completion(future)
+
+        with self._lock:
+            return [self._tasks[task_id] for task_id in task_ids]
+
+    def resize(self, max_workers: int):
+        """调整工作进程数，旧进程池在已提交任务完成后退出"""
+        with self._lock:
+            if max_workers == self.config.max_workers:
+                return
+            old_executor = self._executor
+            self._executor = self._create_executor(max_workers)
+            self.config.max_workers = max_workers
+        old_executor.shutdown(wait=False)
+
+        if self.config.enable_logging:
+            logger.info(f"工作进程数调整为 {max_workers}")
+
+    def shutdown(self, wait: bool = True):
+        """关闭处理器"""
+        self._shutdown = True
+
+        # 取消所有尚未开始的任务
+        with self._lock:
+            futures = list(self._future_tasks)
+        for future in futures:
+            future.cancel()
+
+        self._executor.shutdown(wait=wait)
+
+        if self.config.enable_logging:
+            logger.info("进程池处理器已关闭")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        stats = super().get_statistics()
+        with self._lock:
+            stats.update({
+                'max_workers': self.config.max_workers,
+                'max_tasks_per_child': self.config.max_tasks_per_child,
+                'pending_futures': len(self._future_tasks),
+                'chunks_submitted': self.chunks_submitted,
+                'shared_memory_bytes': self.shared_memory_bytes
+            })
+        return stats
 
 class AsyncProcessor(ConcurrentProcessor):
     """异步处理器"""
@@ -507,6 +898,16 @@ class AsyncProcessor(ConcurrentProcessor):
         
         if self.config.enable_logging:
             logger.info("异步处理器已关闭")
+    
+    def resize(self, max_workers: int):
+        """调整并发数（已在执行的任务仍按旧信号量释放）"""
+        with self._lock:
+            self.config.max_workers = max_workers
+            if self._semaphore is not None:
+                self._semaphore = asyncio.Semaphore(max_workers)
+        
+        if self.config.enable_logging:
+            logger.info(f"异步并发数调整为 {max_workers}")
 
 class BatchProcessor:
     """批处理器"""
@@ -560,6 +961,234 @@ class BatchProcessor:
             except Exception as e:
                 logger.error(f"批处理错误: {e}")
 
+class _PendingLLMBatch:
+    """等待发送的一批LLM请求"""
+
+    __slots__ = ('instruction', 'llm_kwargs', 'items', 'tokens', 'timer')
+
+    def __init__(self, instruction: str, llm_kwargs: Dict[str, Any]):
+        self.instruction = instruction
+        self.llm_kwargs = llm_kwargs
+        self.items: List[tuple] = []  # (prompt, future)
+        self.tokens = 0
+        self.timer = None
+
+
+class LLMBatchProcessor:
+    """LLM微批处理器
+
+    把指令和调用参数相同的短提示词（如逐题批改简答题、逐个学生写评语）打包成一次带编号JSON信封的LLM请求，
+    再把响应拆回各自的调用方。凑满max_batch_size、超出max_batch_tokens或等待max_wait秒后发送；
+    响应无法解析或缺少某些条目时，缺失的条目改为逐条调用。批量调用本身失败（限流、超时、网络错误等）时
+    不再逐条重试，以免在上游已经出错时放大成N个并发请求，异常直接交给该批的全部调用方。
+    """
+
+    BATCH_TEMPLATE = (
+        "{instruction}\n\n"
+        "下面是{count}条相互独立的待处理条目，请逐条按上述要求处理。\n"
+        "只输出一个JSON数组，每条对应一个元素{{\"id\": 条目编号, \"result\": \"该条的处理结果\"}}，"
+        "不要输出其他内容。\n\n"
+        "待处理条目：\n{items}"
+    )
+
+    def __init__(self, llm_call: Callable[..., Awaitable[Any]], max_batch_size: int = 20,
+                 max_wait: float = 0.05, max_batch_tokens: int = 2000, max_item_tokens: int = 500):
+        """
+        Args:
+            llm_call: 异步LLM调用函数，签名为llm_call(prompt, **llm_kwargs)，返回文本或LLMResponse
+            max_batch_size: 每批最多条目数
+            max_wait: 第一条进入批次后最多等待的秒数
+            max_batch_tokens: 每批条目的估算token总数上限
+            max_item_tokens: 超过该token数的提示词不参与打包，直接单独调用
+        """
+        self.llm_call = llm_call
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_batch_tokens = max_batch_tokens
+        self.max_item_tokens = max_item_tokens
+
+        self._pending: Dict[str, _PendingLLMBatch] = {}
+        self._running: set = set()
+        self._closed = False
+
+        # 统计信息
+        self.batches_sent = 0
+        self.batched_items = 0
+        self.single_calls = 0
+        self.fallback_items = 0
+        self.parse_failures = 0
+
+    async def submit(self, prompt: str, instruction: str = "", **llm_kwargs) -> str:
+        """提交一条提示词，返回该条的处理结果
+
+        Args:
+            prompt: 单条内容（如一道学生答案）
+            instruction: 同批条目共享的处理要求，相同的指令和参数才会打包到一起
+            **llm_kwargs: 传给llm_call的其他参数
+        """
+        if self._closed:
+            raise RuntimeError("批处理器已关闭")
+
+        tokens = estimate_tokens(prompt)
+        if self.max_batch_size <= 1 or tokens > self.max_item_tokens:
+            self.single_calls += 1
+            return await self._call_single(prompt, instruction, llm_kwargs)
+
+        loop = asyncio.get_running_loop()
+        key = json.dumps([instruction, llm_kwargs], sort_keys=True, ensure_ascii=False, default=str)
+
+        batch = self._pending.get(key)
+        if batch is not None and batch.tokens + tokens > self.max_batch_tokens:
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = self._pending[key] = _PendingLLMBatch(instruction, llm_kwargs)
+            batch.timer = loop.call_later(self.max_wait, self._flush, key)
+
+        future = loop.create_future()
+        batch.items.append((prompt, future))
+        batch.tokens += tokens
+        if len(batch.items) >= self.max_batch_size:
+            self._flush(key)
+
+        return await future
+
+    def _flush(self, key: str):
+        """发送指定批次"""
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: _PendingLLMBatch):
+        """发送一批请求并把结果分发给各调用方"""
+        # 调用方已取消的条目不再发送
+        items = [(prompt, future) for prompt, future in batch.items if not future.done()]
+        if not items:
+            return
+        if len(items) == 1:
+            self.single_calls += 1
+            await self._resolve_single(items[0][0], items[0][1], batch)
+            return
+
+        try:
+            text = await self._call(self._build_batch_prompt(batch.instruction, items), batch.llm_kwargs)
+        except Exception as e:
+            logger.warning(f"批量LLM调用失败，{len(items)} 条全部返回该错误: {e}")
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            if isinstance(e, DeadlineExceededError):
+                raise
+            return
+
+        self.batches_sent += 1
+        try:
+            results = self._parse_batch_response(text, len(items))
+        except ValueError as e:
+            self.parse_failures += 1
+            results = {}
+            logger.warning(f"批量响应解析失败，{len(items)} 条改为逐条调用: {e}")
+
+        missing = []
+        for index, (prompt, future) in enumerate(items):
+            if index in results:
+                self.batched_items += 1
+                if not future.done():
+                    future.set_result(results[index])
+            else:
+                missing.append((prompt, future))
+
+        if missing:
+            self.fallback_items += len(missing)
+            await asyncio.gather(*(self._resolve_single(prompt, future, batch) for prompt, future in missing))
+
+    async def _resolve_single(self, prompt: str, future: asyncio.Future, batch: _PendingLLMBatch):
+        """单独调用一条并设置其结果"""
+        try:
+            result = await self._call_single(prompt, batch.instruction, batch.llm_kwargs)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def _call_single(self, prompt: str, instruction: str, llm_kwargs: Dict[str, Any]) -> str:
+        """单条调用"""
+        return await self._call(f"{instruction}\n\n{prompt}" if instruction else prompt, llm_kwargs)
+
+    async def _call(self, prompt: str, llm_kwargs: Dict[str, Any]) -> str:
+        """调用LLM并取出文本，失败的LLMResponse转为异常"""
+        response = await self.llm_call(prompt, **llm_kwargs)
+        if getattr(response, 'success', True) is False:
+            raise RuntimeError(getattr(response, 'error', None) or "LLM调用失败")
+        return getattr(response, 'content', response)
+
+    def _build_batch_prompt(self, instruction: str, items: List[tuple]) -> str:
+        """构建带编号JSON信封的批量提示词"""
+        entries = [{'id': index + 1, 'input': prompt} for index, (prompt, _) in enumerate(items)]
+        return self.BATCH_TEMPLATE.format(
+            instruction=instruction or "请处理下列条目。",
+            count=len(items),
+            items=json.dumps(entries, ensure_ascii=False, indent=1)
+        )
+
+    @staticmethod
+    def _parse_batch_response(text: str, count: int) -> Dict[int, str]:
+        """解析批量响应
+
+        Returns:
+            Dict[int, str]: 条目下标到结果的映射，缺失或格式不对的条目不在其中
+        """
+        start = text.find('[')
+        end = text.rfind(']')
+        if start < 0 or end < start:
+            raise ValueError("响应中没有JSON数组")
+        data = json.loads(text[start:end + 1])
+        if not isinstance(data, list):
+            raise ValueError("响应不是JSON数组")
+
+        results = {}
+        for entry in data:
+            if not isinstance(entry, dict) or 'result' not in entry:
+                continue
+            try:
+                index = int(entry.get('id')) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < count:
+                value = entry['result']
+                results[index] = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        return results
+
+    async def flush(self):
+        """立即发送所有等待中的批次并等待完成"""
+        for key in list(self._pending):
+            self._flush(key)
+        if self._running:
+            await asyncio.gather(*list(self._running), return_exceptions=True)
+
+    async def close(self):
+        """关闭批处理器，发送剩余批次"""
+        self._closed = True
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            'batches_sent': self.batches_sent,
+            'batched_items': self.batched_items,
+            'single_calls': self.single_calls,
+            'fallback_items': self.fallback_items,
+            'parse_failures': self.parse_failures,
+            'requests_saved': self.batched_items - self.batches_sent,
+            'pending_items': sum(len(batch.items) for batch in self._pending.values())
+        }
+
 # 工厂函数
 def create_thread_pool_processor(max_workers: int = 4, **kwargs) -> ThreadPoolProcessor:
     """创建线程池处理器"""
@@ -571,13 +1200,17 @@ def create_async_processor(max_workers: int = 4, **kwargs) -> AsyncProcessor:
     config = ProcessingConfig(max_workers=max_workers, **kwargs)
     return AsyncProcessor(config)
 
-def create_process_pool_processor(max_workers: int = None, **kwargs) -> ThreadPoolProcessor:
+def create_llm_batch_processor(llm_call: Callable[..., Awaitable[Any]], **kwargs) -> LLMBatchProcessor:
+    """创建LLM微批处理器"""
+    return LLMBatchProcessor(llm_call, **kwargs)
+
+def create_process_pool_processor(max_workers: int = None, **kwargs) -> ProcessPoolProcessor:
     """创建进程池处理器"""
     if max_workers is None:
         max_workers = multiprocessing.cpu_count()
     
     config = ProcessingConfig(max_workers=max_workers, use_process_pool=True, **kwargs)
-    return ThreadPoolProcessor(config)
+    return ProcessPoolProcessor(config)
 
 # 装饰器
 def concurrent_task(processor: ConcurrentProcessor, timeout: Optional[float] = None):
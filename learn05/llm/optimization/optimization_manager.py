@@ -5,8 +5,10 @@
 """
 
 import time
+import math
 import asyncio
 import threading
+from collections import deque
 from typing import Any, Dict, List, Optional, Callable, Union, Tuple
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
@@ -17,7 +19,7 @@ import json
 import functools
 
 from .cache_manager import CacheManager, CacheConfig
-from .concurrent_processor import ConcurrentProcessor, ThreadPoolProcessor, AsyncProcessor, ProcessingConfig
+from .concurrent_processor import ConcurrentProcessor, ThreadPoolProcessor, AsyncProcessor, ProcessingConfig, TaskStatus
 from .performance_monitor import PerformanceMonitor, MonitorConfig, MetricType
 
 # 配置日志
@@ -58,6 +60,14 @@ class OptimizationConfig:
     enable_auto_optimization: bool = True
     optimization_interval: int = 300  # 优化检查间隔（秒）
     
+    # 自动调参
+    autotune_cooldown: int = 900  # 同一参数两次调整的最短间隔（秒）
+    autotune_rollback_tolerance: float = 0.2  # 调整后p95延迟变差超过该比例则回滚
+    autotune_min_samples: int = 20  # 计算p95所需的最少延迟样本数
+    cache_size_bounds: Tuple[int, int] = (100, 10000)
+    cache_ttl_bounds: Tuple[int, int] = (60, 7200)
+    worker_bounds: Tuple[int, int] = (1, 16)
+    
     def __post_init__(self):
         """初始化后处理"""
         if self.cache_config is None:
@@ -110,11 +120,29 @@ class CacheOptimizationRule(OptimizationRule):
     def apply(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """应用缓存优化"""
         optimizations = []
+        adjustments = []
         
         cache_hit_rate = context.get('cache_hit_rate', 0)
         if cache_hit_rate < 0.5:
             optimizations.append("增加缓存TTL时间")
             optimizations.append("扩大缓存容量")
+            
+            # 内存紧张时由内存优化规则收紧缓存，这里不再放宽
+            if context.get('memory_usage', 0) < 75:
+                if 'cache_ttl' in context:
+                    adjustments.append({
+                        'knob': 'cache_ttl',
+                        'target': context['cache_ttl'] * 1.5,
+                        'reason': f"缓存命中率 {cache_hit_rate:.0%}"
+                    })
+                max_size = context.get('cache_max_size')
+                # 缓存未满时命中率低与容量无关
+                if max_size and context.get('cache_items', 0) >= max_size * 0.9:
+                    adjustments.append({
+                        'knob': 'cache_max_size',
+                        'target': max_size * 1.5,
+                        'reason': f"缓存已满且命中率 {cache_hit_rate:.0%}"
+                    })
         
         response_time = context.get('avg_response_time', 0)
         if response_time > 3.0:
@@ -124,6 +152,7 @@ class CacheOptimizationRule(OptimizationRule):
         return {
             'rule': self.name,
             'optimizations': optimizations,
+            'adjustments': adjustments,
             'estimated_improvement': '20-40%'
         }
 
@@ -145,14 +174,25 @@ class ConcurrencyOptimizationRule(OptimizationRule):
     def apply(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """应用并发优化"""
         optimizations = []
+        adjustments = []
         
         cpu_usage = context.get('cpu_usage', 0)
         current_workers = context.get('current_workers', 1)
+        active_requests = context.get('active_requests', 0)
+        queue_length = context.get('queue_length', 0)
         
-        if cpu_usage < 30 and current_workers < 8:
-            optimizations.append(f"增加工作线程数到 {min(current_workers * 2, 8)}")
+        # 只有任务在排队或工作线程接近占满时才扩容，CPU空闲但没有负载时不能一路翻倍
+        saturated = queue_length > 0 or active_requests >= current_workers * 0.8
+        if cpu_usage < 30 and current_workers < 8 and saturated:
+            target = min(current_workers * 2, 8)
+            optimizations.append(f"增加工作线程数到 {target}")
+            adjustments.append({
+                'knob': 'max_workers',
+                'target': target,
+                'reason': (f"CPU使用率 {cpu_usage:.0f}%，{queue_length} 个任务排队，"
+                           f"{active_requests}/{current_workers} 个工作线程忙碌")
+            })
         
-        queue_length = context.get('queue_length', 0)
         if queue_length > 20:
             optimizations.append("启用异步处理模式")
             optimizations.append("实现请求批处理")
@@ -160,6 +200,7 @@ class ConcurrencyOptimizationRule(OptimizationRule):
         return {
             'rule': self.name,
             'optimizations': optimizations,
+            'adjustments': adjustments,
             'estimated_improvement': '30-50%'
         }
 
@@ -180,12 +221,27 @@ class MemoryOptimizationRule(OptimizationRule):
     def apply(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """应用内存优化"""
         optimizations = []
+        adjustments = []
         
         memory_usage = context.get('memory_usage', 0)
+        if memory_usage > 75 and 'cache_ttl' in context:
+            optimizations.append("缩短缓存TTL")
+            adjustments.append({
+                'knob': 'cache_ttl',
+                'target': context['cache_ttl'] * 0.5,
+                'reason': f"内存使用率 {memory_usage:.0f}%"
+            })
+        
         if memory_usage > 85:
             optimizations.append("清理过期缓存")
             optimizations.append("减少缓存容量")
             optimizations.append("启用内存压缩")
+            if 'cache_max_size' in context:
+                adjustments.append({
+                    'knob': 'cache_max_size',
+                    'target': context['cache_max_size'] * 0.5,
+                    'reason': f"内存使用率 {memory_usage:.0f}%"
+                })
         
         cache_size = context.get('cache_size', 0)
         if cache_size > 2000000:  # 2MB
@@ -195,9 +251,200 @@ class MemoryOptimizationRule(OptimizationRule):
         return {
             'rule': self.name,
             'optimizations': optimizations,
+            'adjustments': adjustments,
             'estimated_improvement': '15-30%'
         }
 
+@dataclass
+class TunableKnob:
+    """可自动调整的运行参数"""
+    name: str
+    getter: Callable[[], float]
+    setter: Callable[[float], Any]
+    min_value: float
+    max_value: float
+    cooldown: float = 900.0
+    integer: bool = True
+    last_changed: Optional[float] = None  # time.monotonic()
+
+@dataclass
+class TuningAdjustment:
+    """一次参数调整的审计记录"""
+    knob: str
+    rule: str
+    reason: str
+    old_value: float
+    new_value: float
+    applied_at: float  # time.monotonic()
+    timestamp: datetime = field(default_factory=datetime.now)
+    metrics_before: Dict[str, Any] = field(default_factory=dict)
+    metrics_after: Dict[str, Any] = field(default_factory=dict)
+    status: str = 'applied'  # applied: 待评估 / kept: 保留 / rolled_back: 已回滚
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'knob': self.knob,
+            'rule': self.rule,
+            'reason': self.reason,
+            'old_value': self.old_value,
+            'new_value': self.new_value,
+            'timestamp': self.timestamp.isoformat(),
+            'metrics_before': self.metrics_before,
+            'metrics_after': self.metrics_after,
+            'status': self.status
+        }
+
+class AutoTuner:
+    """闭环自动调参器
+    
+    规则给出目标值后，在参数边界内、冷却期外小步调整（单步不超过max_step_ratio倍，
+    变化不足min_change_ratio视为抖动忽略），每次调整记录调整前后的指标；
+    下一轮比较调整前后的p95延迟，变差超过rollback_tolerance则回滚并重新计算冷却期。
+    """
+    
+    def __init__(self, window: float = 300.0, rollback_tolerance: float = 0.2,
+                 min_samples: int = 20, max_step_ratio: float = 2.0,
+                 min_change_ratio: float = 0.1, max_latency_samples: int = 5000,
+                 max_audit_records: int = 200):
+        self.window = window
+        self.rollback_tolerance = rollback_tolerance
+        self.min_samples = min_samples
+        self.max_step_ratio = max_step_ratio
+        self.min_change_ratio = min_change_ratio
+        
+        self.knobs: Dict[str, TunableKnob] = {}
+        self._latencies: deque = deque(maxlen=max_latency_samples)  # (time.monotonic(), 秒)
+        self._pending: Dict[str, TuningAdjustment] = {}
+        self._audit_log: deque = deque(maxlen=max_audit_records)
+        self._lock = threading.RLock()
+        
+        # 统计信息
+        self.adjustments_applied = 0
+        self.rollbacks = 0
+    
+    def register_knob(self, knob: TunableKnob):
+        """注册可调参数"""
+        with self._lock:
+            self.knobs[knob.name] = knob
+    
+    def record_latency(self, seconds: float):
+        """记录一次请求延迟，用于评估调整效果"""
+        self._latencies.append((time.monotonic(), seconds))
+    
+    def latency_p95(self, since: Optional[float] = None, until: Optional[float] = None) -> Optional[float]:
+        """计算时间段内的p95延迟，样本不足时返回None"""
+        samples = sorted(
+            value for timestamp, value in list(self._latencies)
+            if (since is None or timestamp >= since) and (until is None or timestamp < until)
+        )
+        if len(samples) < self.min_samples:
+            return None
+        return samples[math.ceil(len(samples) * 0.95) - 1]
+    
+    def propose(self, knob_name: str, target: float, rule: str = "", reason: str = "",
+                metrics: Optional[Dict[str, Any]] = None) -> Optional[TuningAdjustment]:
+        """按规则给出的目标值调整参数
+        
+        Returns:
+            Optional[TuningAdjustment]: 实际发生的调整，被边界、冷却或迟滞拦下时返回None
+        """
+        with self._lock:
+            knob = self.knobs.get(knob_name)
+            if knob is None or knob_name in self._pending:
+                # 上一次调整尚未评估完，不叠加新的调整
+                return None
+            
+            now = time.monotonic()
+            if knob.last_changed is not None and now - knob.last_changed < knob.cooldown:
+                return None
+            
+            current = knob.getter()
+            lower = max(knob.min_value, current / self.max_step_ratio)
+            upper = min(knob.max_value, current * self.max_step_ratio)
+            target = min(max(target, lower), upper)
+            target = min(max(target, knob.min_value), knob.max_value)
+            if knob.integer:
+                target = int(round(target))
+            
+            if target == current or (current and abs(target - current) / abs(current) < self.min_change_ratio):
+                return None
+            
+            metrics_before = dict(metrics or {})
+            metrics_before['p95_latency'] = self.latency_p95(since=now - self.window, until=now)
+            
+            knob.setter(target)
+            knob.last_changed = now
+            
+            adjustment = TuningAdjustment(
+                knob=knob_name,
+                rule=rule,
+                reason=reason,
+                old_value=current,
+                new_value=target,
+                applied_at=now,
+                metrics_before=metrics_before
+            )
+            self._pending[knob_name] = adjustment
+            self._audit_log.append(adjustment)
+            self.adjustments_applied += 1
+        
+        logger.info(f"自动调参 {knob_name}: {current} -> {target}（{rule}: {reason}）")
+        return adjustment
+    
+    def evaluate(self, metrics: Optional[Dict[str, Any]] = None) -> List[TuningAdjustment]:
+        """评估待定的调整，p95延迟变差的回滚
+        
+        Returns:
+            List[TuningAdjustment]: 本次完成评估的调整
+        """
+        evaluated = []
+        
+        with self._lock:
+            for knob_name, adjustment in list(self._pending.items()):
+                after = self.latency_p95(since=adjustment.applied_at)
+                if after is None:
+                    continue  # 调整后的样本不足，下一轮再评估
+                
+                del self._pending[knob_name]
+                adjustment.metrics_after = dict(metrics or {})
+                adjustment.metrics_after['p95_latency'] = after
+                
+                before = adjustment.metrics_before.get('p95_latency')
+                if before is not None and after > before * (1 + self.rollback_tolerance):
+                    knob = self.knobs[knob_name]
+                    knob.setter(adjustment.old_value)
+                    knob.last_changed = time.monotonic()
+                    adjustment.status = 'rolled_back'
+                    self.rollbacks += 1
+                    logger.warning(f"自动调参回滚 {knob_name}: {adjustment.new_value} -> {adjustment.old_value}，"
+                                   f"p95延迟 {before:.3f}s -> {after:.3f}s")
+                else:
+                    adjustment.status = 'kept'
+                
+                evaluated.append(adjustment)
+        
+        return evaluated
+    
+    def get_audit_log(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取调整审计日志（按时间顺序）"""
+        with self._lock:
+            records = list(self._audit_log)
+        if limit:
+            records = records[-limit:]
+        return [record.to_dict() for record in records]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调参统计"""
+        with self._lock:
+            return {
+                'knobs': {name: knob.getter() for name, knob in self.knobs.items()},
+                'pending': list(self._pending),
+                'adjustments_applied': self.adjustments_applied,
+                'rollbacks': self.rollbacks,
+                'p95_latency': self.latency_p95(since=time.monotonic() - self.window)
+            }
+
 class OptimizationManager:
     """优化管理器"""
     
@@ -210,7 +457,7 @@ class OptimizationManager:
         self.monitor = None
         
         if self.config.enable_cache:
-            self.cache_manager = CacheManager(self.config.cache_config)
+            self.cache_manager = CacheManager(config=self.config.cache_config)
         
         if self.config.enable_concurrent:
             self.processor = ThreadPoolProcessor(self.config.processing_config)
@@ -226,6 +473,14 @@ class OptimizationManager:
             MemoryOptimizationRule()
         ]
         
+        # 自动调参
+        self.autotuner = AutoTuner(
+            window=self.config.optimization_interval,
+            rollback_tolerance=self.config.autotune_rollback_tolerance,
+            min_samples=self.config.autotune_min_samples
+        )
+        self._register_default_knobs()
+        
         # 自动优化
         self._auto_optimization_enabled = self.config.enable_auto_optimization
         self._optimization_thread = None
@@ -234,6 +489,48 @@ class OptimizationManager:
         if self._auto_optimization_enabled:
             self.start_auto_optimization()
     
+    def _register_default_knobs(self):
+        """注册缓存容量、缓存TTL和工作线程数三个可调参数"""
+        cooldown = self.config.autotune_cooldown
+        
+        if self.cache_manager:
+            self.autotuner.register_knob(TunableKnob(
+                name='cache_max_size',
+                getter=lambda: self.cache_manager.config.max_size,
+                setter=self.cache_manager.resize,
+                min_value=self.config.cache_size_bounds[0],
+                max_value=self.config.cache_size_bounds[1],
+                cooldown=cooldown
+            ))
+            self.autotuner.register_knob(TunableKnob(
+                name='cache_ttl',
+                getter=lambda: self.config.cache_ttl,
+                setter=self._set_cache_ttl,
+                min_value=self.config.cache_ttl_bounds[0],
+                max_value=self.config.cache_ttl_bounds[1],
+                cooldown=cooldown
+            ))
+        
+        if self.processor:
+            self.autotuner.register_knob(TunableKnob(
+                name='max_workers',
+                getter=lambda: self.processor.config.max_workers,
+                setter=self.processor.resize,
+                min_value=self.config.worker_bounds[0],
+                max_value=self.config.worker_bounds[1],
+                cooldown=cooldown
+            ))
+    
+    def _set_cache_ttl(self, ttl: int):
+        """调整默认缓存TTL（对之后写入的缓存项生效）"""
+        self.config.cache_ttl = ttl
+        if self.cache_manager:
+            self.cache_manager.config.ttl_seconds = ttl
+    
+    def record_latency(self, seconds: float):
+        """记录请求延迟，供自动调参评估调整效果"""
+        self.autotuner.record_latency(seconds)
+    
     def start_auto_optimization(self):
         """启动自动优化"""
         if self._running:
@@ -259,45 +556,65 @@ class OptimizationManager:
         """自动优化循环"""
         while self._running:
             try:
-                # 收集系统状态
-                context = self._collect_optimization_context()
-                
-                # 应用优化规则
-                optimizations = self.analyze_and_optimize(context)
-                
-                if optimizations:
-                    logger.info(f"自动优化建议: {optimizations}")
-                    
-                    # 应用自动优化
-                    self._apply_auto_optimizations(optimizations)
-                
+                self.run_optimization_cycle()
             except Exception as e:
                 logger.error(f"自动优化错误: {e}")
             
             time.sleep(self.config.optimization_interval)
     
+    def run_optimization_cycle(self, context: Optional[Dict[str, Any]] = None) -> List[TuningAdjustment]:
+        """执行一轮自动优化：先评估上一轮的调整，再按规则调整参数
+        
+        Args:
+            context: 覆盖采集到的系统状态（用于测试或外部指标）
+            
+        Returns:
+            List[TuningAdjustment]: 本轮新发生的调整
+        """
+        # 收集系统状态
+        context = {**self._collect_optimization_context(), **(context or {})}
+        
+        # 评估上一轮调整，延迟变差的回滚
+        self.autotuner.evaluate(context)
+        
+        # 应用优化规则
+        optimizations = self.analyze_and_optimize(context)
+        if not optimizations:
+            return []
+        
+        logger.info(f"自动优化建议: {optimizations}")
+        
+        # 应用自动优化
+        return self._apply_auto_optimizations(optimizations, context)
+    
     def _collect_optimization_context(self) -> Dict[str, Any]:
         """收集优化上下文信息"""
         context = {}
         
         # 缓存信息
         if self.cache_manager:
-            cache_stats = self.cache_manager.get_stats()
+            cache_stats = self.cache_manager.get_statistics()
             context.update({
                 'cache_hit_rate': cache_stats.get('hit_rate', 0),
-                'cache_size': cache_stats.get('size', 0),
-                'cache_memory_usage': cache_stats.get('memory_usage', 0)
+                'cache_size': cache_stats.get('total_size_bytes', 0),
+                'cache_items': cache_stats.get('cache_size', 0),
+                'cache_max_size': self.cache_manager.config.max_size,
+                'cache_ttl': self.config.cache_ttl
             })
         
         # 处理器信息
         if self.processor:
-            processor_stats = self.processor.get_stats()
+            status_counts = self.processor.get_statistics().get('status_counts', {})
             context.update({
-                'active_requests': processor_stats.get('active_tasks', 0),
-                'queue_length': processor_stats.get('pending_tasks', 0),
-                'current_workers': processor_stats.get('worker_count', 1)
+                'active_requests': status_counts.get(TaskStatus.RUNNING.value, 0),
+                'queue_length': status_counts.get(TaskStatus.PENDING.value, 0),
+                'current_workers': self.processor.config.max_workers
             })
         
+        p95_latency = self.autotuner.latency_p95(since=time.monotonic() - self.config.optimization_interval)
+        if p95_latency is not None:
+            context['p95_response_time'] = p95_latency
+        
         # 系统监控信息
         if self.monitor:
             system_stats = self.monitor.get_system_stats()
@@ -347,10 +664,25 @@ class OptimizationManager:
         
         return optimizations
     
-    def _apply_auto_optimizations(self, optimizations: List[Dict[str, Any]]):
-        """应用自动优化"""
+    def _apply_auto_optimizations(self, optimizations: List[Dict[str, Any]],
+                                  context: Optional[Dict[str, Any]] = None) -> List[TuningAdjustment]:
+        """应用自动优化：参数调整交给自动调参器，其余建议逐条执行"""
+        applied = []
+        
         for optimization in optimizations:
             rule_name = optimization.get('rule')
+            
+            for adjustment in optimization.get('adjustments', []):
+                try:
+                    result = self.autotuner.propose(
+                        adjustment['knob'], adjustment['target'],
+                        rule=rule_name, reason=adjustment.get('reason', ''), metrics=context
+                    )
+                    if result:
+                        applied.append(result)
+                except Exception as e:
+                    logger.error(f"调整参数 {adjustment.get('knob')} 失败: {e}")
+            
             optimizations_list = optimization.get('optimizations', [])
             
             for opt in optimizations_list:
@@ -358,24 +690,15 @@ class OptimizationManager:
                     self._execute_optimization(opt)
                 except Exception as e:
                     logger.error(f"执行优化 '{opt}' 失败: {e}")
+        
+        return applied
     
     def _execute_optimization(self, optimization: str):
-        """执行具体的优化操作"""
-        if "增加缓存TTL" in optimization and self.cache_manager:
-            # 动态调整缓存TTL
-            current_ttl = self.config.cache_ttl
-            new_ttl = min(current_ttl * 1.5, 7200)  # 最大2小时
-            self.config.cache_ttl = int(new_ttl)
-            logger.info(f"缓存TTL调整为: {new_ttl}秒")
-        
-        elif "清理过期缓存" in optimization and self.cache_manager:
-            # 清理缓存
-            self.cache_manager.clear()
-            logger.info("已清理过期缓存")
-        
-        elif "增加工作线程" in optimization and self.processor:
-            # 动态调整线程数（这里只是示例，实际实现可能需要重新创建处理器）
-            logger.info(f"建议增加工作线程数: {optimization}")
+        """执行具体的优化操作（缓存容量、TTL和线程数由自动调参器调整）"""
+        if "清理过期缓存" in optimization and self.cache_manager:
+            # 只清理已过期的项，容量由自动调参器收缩
+            removed = self.cache_manager.cleanup_expired()
+            logger.info(f"已清理 {removed} 个过期缓存项")
         
         else:
             logger.info(f"优化建议: {optimization}")
@@ -416,6 +739,10 @@ class OptimizationManager:
             'system_context': context,
             'optimization_suggestions': optimizations,
             'active_rules': [r.name for r in self.rules if r.enabled],
+            'autotune': {
+                **self.autotuner.get_stats(),
+                'recent_adjustments': self.autotuner.get_audit_log(limit=20)
+            },
             'performance_summary': self._generate_performance_summary(context)
         }
         
@@ -503,8 +830,10 @@ class OptimizationManager:
                     
                 finally:
                     # 记录性能指标
-                    if monitor_performance and start_time and self.monitor:
+                    if monitor_performance and start_time:
                         execution_time = time.time() - start_time
+                        self.autotuner.record_latency(execution_time)
+                    if monitor_performance and start_time and self.monitor:
                         self.monitor.add_custom_metric(
                             f"function_execution_time",
                             execution_time,
@@ -5,9 +5,11 @@
 """
 
 import time
+import bisect
 import psutil
 import threading
 import statistics
+from array import array
 from typing import Any, Dict, List, Optional, Callable, Union
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
@@ -18,6 +20,13 @@ import logging
 import json
 import functools
 
+try:
+    from ..components.histogram import WindowedHistogram
+    from ..components.metrics_registry import get_registry, render_family
+except (ImportError, ValueError):
+    from components.histogram import WindowedHistogram
+    from components.metrics_registry import get_registry, render_family
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -62,12 +71,239 @@ class MonitorConfig:
     enable_custom_metrics: bool = True
     alert_thresholds: Dict[str, float] = field(default_factory=dict)
 
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_micros(timestamp: datetime) -> int:
+    """datetime转为整数微秒（整数运算，往返无精度损失）
+
+    不带时区的时间按本地时间处理（与datetime.now()一致），带时区的时间先换算成本地时间。
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+class MetricRingBuffer:
+    """按列存储的指标环形缓冲区
+
+    时间戳、指标名ID、数值、标签集ID等分列存放在预分配的数组中，名称、类型、单位、说明和标签集只保存一份。
+    按时间查询用二分查找，按名称查询走每个名称的序号索引；淘汰旧数据只移动头指针。
+    驻留表过大时重建，只保留仍被缓冲区中指标引用的条目，避免高基数标签让驻留表无限增长。
+    """
+
+    # 驻留表允许超出存活指标数的余量
+    _COMPACT_SLACK = 1024
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._times = array('q', [0]) * self.capacity       # 原始时间戳（微秒）
+        self._index_times = array('q', [0]) * self.capacity  # 单调不减的时间戳，用于二分查找
+        self._values = array('d', [0.0]) * self.capacity
+        self._is_int = bytearray(self.capacity)
+        self._is_aware = bytearray(self.capacity)          # 写入时是否带时区，取出时按本地时区还原
+        self._series_ids = array('l', [0]) * self.capacity
+        self._label_ids = array('l', [0]) * self.capacity
+
+        # 逻辑序号区间[_head, _tail)，物理位置为序号对容量取模
+        self._head = 0
+        self._tail = 0
+        # 原始时间戳落后于索引时间的最大值（乱序程度），按结束时间查找时据此放宽上界
+        self._max_lag = 0
+
+        # 驻留表：(名称, 类型, 单位, 说明) 与 标签集
+        self._series: List[tuple] = []
+        self._series_lookup: Dict[tuple, int] = {}
+        self._label_sets: List[Dict[str, str]] = []
+        self._label_lookup: Dict[tuple, int] = {}
+        # 新驻留条目的ID达到该值时压缩驻留表
+        self._compact_at = self._COMPACT_SLACK
+
+        # 名称 -> 升序的逻辑序号列表（头部可能含已淘汰的序号，查询时跳过、追加时批量清理）
+        self._name_index: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    def _intern_series(self, metric: PerformanceMetric) -> int:
+        # 枚举的哈希较慢，键里用枚举值
+        key = (metric.name, metric.metric_type.value, metric.unit, metric.description)
+        series_id = self._series_lookup.get(key)
+        if series_id is None:
+            series_id = self._series_lookup[key] = len(self._series)
+            self._series.append((metric.name, metric.metric_type, metric.unit, metric.description))
+        return series_id
+
+    def _intern_labels(self, labels: Dict[str, str]) -> int:
+        # 按插入顺序作键：同一调用点的标签顺序固定，不必每次排序
+        key = tuple(labels.items())
+        label_id = self._label_lookup.get(key)
+        if label_id is None:
+            label_id = self._label_lookup[key] = len(self._label_sets)
+            self._label_sets.append(dict(labels))
+        return label_id
+
+    def _compact_tables(self):
+        """重建驻留表，只保留缓冲区中存活指标引用的名称和标签集并重新编号
+
+        下次压缩前驻留表至少还要新增（存活指标数 + 余量）个条目，压缩的开销均摊到每次写入是常数。
+        """
+        capacity = self.capacity
+        series_ids = self._series_ids
+        label_ids = self._label_ids
+        series_map: Dict[int, int] = {}
+        label_map: Dict[int, int] = {}
+        series: List[tuple] = []
+        label_sets: List[Dict[str, str]] = []
+        for seq in range(self._head, self._tail):
+            position = seq % capacity
+            old_id = series_ids[position]
+            new_id = series_map.get(old_id)
+            if new_id is None:
+                new_id = series_map[old_id] = len(series)
+                series.append(self._series[old_id])
+            series_ids[position] = new_id
+
+            old_id = label_ids[position]
+            new_id = label_map.get(old_id)
+            if new_id is None:
+                new_id = label_map[old_id] = len(label_sets)
+                label_sets.append(self._label_sets[old_id])
+            label_ids[position] = new_id
+
+        self._series = series
+        self._series_lookup = {(name, metric_type.value, unit, description): series_id
+                               for series_id, (name, metric_type, unit, description) in enumerate(series)}
+        self._label_sets = label_sets
+        self._label_lookup = {tuple(labels.items()): label_id for label_id, labels in enumerate(label_sets)}
+        self._compact_at = 2 * len(self) + self._COMPACT_SLACK
+
+    def append(self, metric: PerformanceMetric):
+        """追加一个指标，缓冲区满时覆盖最旧的指标"""
+        seq = self._tail
+        capacity = self.capacity
+        if seq - self._head == capacity:
+            self._head += 1
+
+        position = seq % capacity
+        micros = _to_micros(metric.timestamp)
+        if seq > self._head:
+            # 多线程下时间戳可能略有乱序，索引时间取单调不减值
+            previous = self._index_times[(seq - 1) % capacity]
+            if micros >= previous:
+                self._index_times[position] = micros
+            else:
+                self._index_times[position] = previous
+                if previous - micros > self._max_lag:
+                    self._max_lag = previous - micros
+        else:
+            self._index_times[position] = micros
+
+        value = metric.value
+        self._times[position] = micros
+        self._is_aware[position] = metric.timestamp.tzinfo is not None
+        self._values[position] = value
+        self._is_int[position] = type(value) is int
+        series_id = self._series_ids[position] = self._intern_series(metric)
+        label_id = self._label_ids[position] = self._intern_labels(metric.labels)
+        self._tail = seq + 1
+        if series_id >= self._compact_at or label_id >= self._compact_at:
+            self._compact_tables()
+
+        seqs = self._name_index.get(metric.name)
+        if seqs is None:
+            seqs = self._name_index[metric.name] = []
+        seqs.append(seq)
+        # 每64次检查一次，过半已淘汰时批量清理
+        if not len(seqs) & 63 and seqs[len(seqs) // 2] < self._head:
+            del seqs[:bisect.bisect_left(seqs, self._head)]
+
+    def _seq_at_or_after(self, micros: int, lo: int, hi: int) -> int:
+        """[lo, hi)内第一个索引时间 >= micros 的序号"""
+        return bisect.bisect_left(range(lo, hi), micros,
+                                  key=lambda seq: self._index_times[seq % self.capacity]) + lo
+
+    def _seq_after(self, micros: int, lo: int, hi: int) -> int:
+        """[lo, hi)内第一个索引时间 > micros 的序号"""
+        return bisect.bisect_right(range(lo, hi), micros,
+                                   key=lambda seq: self._index_times[seq % self.capacity]) + lo
+
+    def _materialize(self, seq: int) -> PerformanceMetric:
+        position = seq % self.capacity
+        name, metric_type, unit, description = self._series[self._series_ids[position]]
+        value = self._values[position]
+        timestamp = _EPOCH + timedelta(microseconds=self._times[position])
+        if self._is_aware[position]:
+            timestamp = timestamp.astimezone()
+        return PerformanceMetric(
+            name=name,
+            metric_type=metric_type,
+            value=int(value) if self._is_int[position] else value,
+            timestamp=timestamp,
+            labels=dict(self._label_sets[self._label_ids[position]]),
+            unit=unit,
+            description=description
+        )
+
+    def query(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+              metric_names: Optional[List[str]] = None) -> List[PerformanceMetric]:
+        """按时间区间（闭区间）和名称查询，结果按写入顺序排列"""
+        lo, hi = self._head, self._tail
+        start = end = None
+        if start_time is not None:
+            start = _to_micros(start_time)
+            lo = self._seq_at_or_after(start, lo, hi)
+        if end_time is not None:
+            end = _to_micros(end_time)
+            hi = self._seq_after(end + self._max_lag, lo, hi)
+
+        if metric_names:
+            selected = []
+            for name in set(metric_names):
+                seqs = self._name_index.get(name)
+                if seqs:
+                    selected.extend(seqs[bisect.bisect_left(seqs, lo):bisect.bisect_left(seqs, hi)])
+            selected.sort()
+        else:
+            selected = range(lo, hi)
+
+        if start is not None or end is not None:
+            # 乱序写入的少量指标按原始时间戳精确过滤（统一用微秒比较，带不带时区都可以）
+            times = self._times
+            capacity = self.capacity
+            selected = [seq for seq in selected
+                        if (start is None or times[seq % capacity] >= start)
+                        and (end is None or times[seq % capacity] <= end)]
+        return [self._materialize(seq) for seq in selected]
+
+    def drop_before(self, cutoff_time: datetime) -> int:
+        """淘汰早于cutoff_time的指标（只移动头指针），返回淘汰数量"""
+        new_head = self._seq_at_or_after(_to_micros(cutoff_time), self._head, self._tail)
+        dropped = new_head - self._head
+        self._head = new_head
+        # 已全部淘汰的名称不再保留索引
+        for name in [name for name, seqs in self._name_index.items() if seqs[-1] < new_head]:
+            del self._name_index[name]
+        if max(len(self._series), len(self._label_sets)) > 2 * len(self) + self._COMPACT_SLACK:
+            self._compact_tables()
+        return dropped
+
+    def clear(self):
+        """清空"""
+        self._head = self._tail = 0
+        self._max_lag = 0
+        self._name_index.clear()
+        self._compact_tables()
+
 class MetricCollector(ABC):
     """指标收集器抽象基类"""
     
     def __init__(self, config: MonitorConfig):
         self.config = config
-        self._metrics: deque = deque(maxlen=config.max_metrics)
+        self._metrics = MetricRingBuffer(config.max_metrics)
+        # 每个(名称, 标签)的最新指标，供抓取时导出；按最近更新排序，最旧的在前
+        self._latest: Dict[tuple, PerformanceMetric] = {}
         self._lock = threading.RLock()
     
     @abstractmethod
@@ -77,8 +313,19 @@ class MetricCollector(ABC):
     
     def add_metric(self, metric: PerformanceMetric):
         """添加指标"""
+        key = (metric.name, tuple(metric.labels.items()))
         with self._lock:
             self._metrics.append(metric)
+            self._latest.pop(key, None)
+            self._latest[key] = metric
+            # 比它新的(名称, 标签)已超过缓冲区容量时，最旧条目的指标必已被覆盖
+            if len(self._latest) > self._metrics.capacity:
+                del self._latest[next(iter(self._latest))]
+    
+    def get_latest_metrics(self) -> List[PerformanceMetric]:
+        """获取每个(名称, 标签)的最新指标"""
+        with self._lock:
+            return list(self._latest.values())
     
     def get_metrics(self, 
                    start_time: Optional[datetime] = None,
@@ -86,32 +333,18 @@ class MetricCollector(ABC):
                    metric_names: Optional[List[str]] = None) -> List[PerformanceMetric]:
         """获取指标"""
         with self._lock:
-            metrics = list(self._metrics)
-        
-        # 时间过滤
-        if start_time:
-            metrics = [m for m in metrics if m.timestamp >= start_time]
-        if end_time:
-            metrics = [m for m in metrics if m.timestamp <= end_time]
-        
-        # 名称过滤
-        if metric_names:
-            metrics = [m for m in metrics if m.name in metric_names]
-        
-        return metrics
+            return self._metrics.query(start_time, end_time, metric_names)
     
     def clear_old_metrics(self):
         """清理旧指标"""
         cutoff_time = datetime.now() - timedelta(seconds=self.config.retention_period)
         
         with self._lock:
-            # 转换为列表以便修改
-            metrics_list = list(self._metrics)
-            # 过滤掉旧指标
-            filtered_metrics = [m for m in metrics_list if m.timestamp >= cutoff_time]
-            # 重新创建deque
-            self._metrics.clear()
-            self._metrics.extend(filtered_metrics)
+            self._metrics.drop_before(cutoff_time)
+            # 指标已全部淘汰的(名称, 标签)不再导出
+            cutoff = _to_micros(cutoff_time)
+            for key in [key for key, metric in self._latest.items() if _to_micros(metric.timestamp) < cutoff]:
+                del self._latest[key]
 
 class SystemMetricsCollector(MetricCollector):
     """系统指标收集器"""
@@ -206,7 +439,10 @@ class APIMetricsCollector(MetricCollector):
     def __init__(self, config: MonitorConfig):
         super().__init__(config)
         self._request_counts = defaultdict(int)
-        self._response_times = defaultdict(list)
+        # 每个端点一个流式直方图，内存固定，不保留原始样本
+        self._response_times: Dict[str, WindowedHistogram] = defaultdict(
+            lambda: WindowedHistogram(window_seconds=config.retention_period)
+        )
         self._error_counts = defaultdict(int)
         self._active_requests = defaultdict(int)
     
@@ -229,7 +465,7 @@ class APIMetricsCollector(MetricCollector):
     def record_response(self, endpoint: str, method: str, response_time: float, status_code: int):
         """记录响应"""
         key = f"{method}:{endpoint}"
-        self._response_times[key].append(response_time)
+        self._response_times[key].record(response_time)
         self._active_requests[key] = max(0, self._active_requests[key] - 1)
         
         # 记录错误
@@ -277,20 +513,29 @@ class APIMetricsCollector(MetricCollector):
                 description="活跃API请求数"
             ))
         
-        # 平均响应时间
-        for key, times in self._response_times.items():
-            if times:
+        # 平均响应时间和p99响应时间
+        for key, histogram in list(self._response_times.items()):
+            total = histogram.total
+            if total.count:
                 method, endpoint = key.split(':', 1)
-                avg_time = statistics.mean(times)
                 metrics.append(PerformanceMetric(
                     name="api_avg_response_time",
                     metric_type=MetricType.GAUGE,
-                    value=avg_time,
+                    value=total.mean,
                     timestamp=timestamp,
                     labels={"endpoint": endpoint, "method": method},
                     unit="seconds",
                     description="API平均响应时间"
                 ))
+                metrics.append(PerformanceMetric(
+                    name="api_p99_response_time",
+                    metric_type=MetricType.GAUGE,
+                    value=total.quantile(0.99),
+                    timestamp=timestamp,
+                    labels={"endpoint": endpoint, "method": method},
+                    unit="seconds",
+                    description="API响应时间p99"
+                ))
         
         return metrics
     
@@ -298,15 +543,23 @@ class APIMetricsCollector(MetricCollector):
         """获取端点统计信息"""
         key = f"{method}:{endpoint}"
         
-        response_times = self._response_times.get(key, [])
+        histogram = self._response_times.get(key)
+        summary = histogram.summary() if histogram else {}
         
         stats = {
             'request_count': self._request_counts.get(key, 0),
             'error_count': self._error_counts.get(key, 0),
             'active_requests': self._active_requests.get(key, 0),
-            'avg_response_time': statistics.mean(response_times) if response_times else 0,
-            'min_response_time': min(response_times) if response_times else 0,
-            'max_response_time': max(response_times) if response_times else 0,
+            'avg_response_time': summary.get('mean', 0),
+            'min_response_time': summary.get('min', 0),
+            'max_response_time': summary.get('max', 0),
+            'p50_response_time': summary.get('p50', 0),
+            'p90_response_time': summary.get('p90', 0),
+            'p99_response_time': summary.get('p99', 0),
+            'windows': {
+                label: histogram.summary(seconds)
+                for label, seconds in (('1m', 60), ('5m', 300), ('1h', 3600))
+            } if histogram else {},
             'error_rate': 0
         }
         
@@ -396,12 +649,15 @@ class PerformanceMonitor:
         self._monitor_thread = threading.Thread(target=self._monitor_loop)
         self._monitor_thread.daemon = True
         self._monitor_thread.start()
+        # 运行期间随/metrics一并导出
+        get_registry().register_collector(self.render_prometheus)
         
         logger.info("性能监控已启动")
     
     def stop(self):
         """停止监控"""
         self._running = False
+        get_registry().unregister_collector(self.render_prometheus)
         
         if self._monitor_thread:
             self._monitor_thread.join(timeout=5.0)
@@ -514,26 +770,33 @@ class PerformanceMonitor:
         
         return endpoints_stats
     
+    def render_prometheus(self) -> str:
+        """按Prometheus文本格式导出计数器和仪表的最新值
+        
+        计时器和直方图的单次观测值不导出，其分布由指标注册表中的直方图提供。
+        """
+        families: Dict[str, tuple] = {}
+        for collector in self._collectors:
+            for metric in collector.get_latest_metrics():
+                if metric.metric_type not in (MetricType.COUNTER, MetricType.GAUGE):
+                    continue
+                family = families.get(metric.name)
+                if family is None:
+                    family = families[metric.name] = (metric.metric_type.value, metric.description or metric.name, [])
+                family[2].append((metric.labels, metric.value))
+        
+        return "".join(render_family(name, metric_type, description, samples)
+                       for name, (metric_type, description, samples) in families.items())
+    
     def export_metrics(self, format_type: str = "json") -> str:
         """导出指标"""
-        metrics = self.get_metrics()
-        
         if format_type.lower() == "json":
+            metrics = self.get_metrics()
             metrics_data = [metric.to_dict() for metric in metrics]
             return json.dumps(metrics_data, indent=2, ensure_ascii=False)
         
         elif format_type.lower() == "prometheus":
-            # Prometheus格式
-            lines = []
-            for metric in metrics:
-                labels_str = ""
-                if metric.labels:
-                    label_pairs = [f'{k}="{v}"' for k, v in metric.labels.items()]
-                    labels_str = "{" + ",".join(label_pairs) + "}"
-                
-                lines.append(f"{metric.name}{labels_str} {metric.value}")
-            
-            return "\n".join(lines)
+            return self.render_prometheus()
         
         else:
             raise ValueError(f"不支持的格式: {format_type}")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP连接池管理
+为各提供商客户端提供长连接复用的共享aiohttp会话
+"""
+
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPSessionPool:
+    """共享HTTP会话（连接池）"""
+
+    def __init__(self, name: str, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.name = name
+        self.limit = config.get('connection_pool_size', 100)
+        self.limit_per_host = config.get('connection_pool_per_host', 20)
+        self.keepalive_timeout = config.get('keepalive_timeout', 30)
+        self.dns_cache_ttl = config.get('dns_cache_ttl', 300)
+
+        self._session = None
+        self._connector = None
+        self._loop = None
+
+        # 统计信息（借出/归还计数由连接池自己维护，不读取aiohttp连接器的私有属性）
+        self.sessions_created = 0
+        self.requests_served = 0
+        self.acquired_count = 0
+        self.released_count = 0
+        self.peak_borrows = 0
+        self.created_at = None
+
+    def get_session(self):
+        """获取共享会话，不存在或已失效时重新创建"""
+        if not aiohttp:
+            raise ImportError("需要安装aiohttp库")
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # aiohttp会话绑定事件循环，事件循环变化后旧会话无法复用
+            self._connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(connector=self._connector)
+            self._loop = loop
+            self.sessions_created += 1
+            self.created_at = time.time()
+            logger.info(f"创建{self.name}连接池: limit={self.limit}, "
+                        f"limit_per_host={self.limit_per_host}")
+
+        self.requests_served += 1
+        return self._session
+
+    @asynccontextmanager
+    async def acquire(self):
+        """借出共享会话，在用期间计为一次借出
+
+        借出数是正在使用会话的请求数，不是打开的套接字数（aiohttp不公开后者）。
+
+        用法: async with pool.acquire() as session, session.post(...) as response
+        """
+        session = self.get_session()
+        self.acquired_count += 1
+        self.peak_borrows = max(self.peak_borrows, self.acquired_count - self.released_count)
+        try:
+            yield session
+        finally:
+            self.released_count += 1
+
+    async def close(self):
+        """关闭共享会话"""
+        session = self._session
+        self._session = None
+        self._connector = None
+        self._loop = None
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info(f"{self.name}连接池已关闭")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池使用统计"""
+        connector = self._connector
+        limit = connector.limit if connector is not None else self.limit
+        limit_per_host = connector.limit_per_host if connector is not None else self.limit_per_host
+        borrows = self.acquired_count - self.released_count
+
+        return {
+            'name': self.name,
+            'open': self._session is not None and not self._session.closed,
+            'limit': limit,
+            'limit_per_host': limit_per_host,
+            'keepalive_timeout': self.keepalive_timeout,
+            'dns_cache_ttl': self.dns_cache_ttl,
+            'active_borrows': borrows,
+            'peak_active_borrows': self.peak_borrows,
+            'acquired': self.acquired_count,
+            'released': self.released_count,
+            'borrow_utilization': borrows / limit if limit else 0.0,
+            'sessions_created': self.sessions_created,
+            'requests_served': self.requests_served,
+            'uptime': time.time() - self.created_at if self.created_at else 0.0
+        }
@@ -10,6 +10,7 @@ import json
 import os
 from typing import Dict, List, Optional, Any, AsyncIterator
 import logging
+from contextlib import aclosing
 
 try:
     import aiohttp
@@ -21,15 +22,26 @@ try:
 except ImportError:
     AsyncOpenAI = None
 
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from .http_pool import HTTPSessionPool
 
-from unified_interface import (
-    UnifiedLLMInterface, LLMRequest, LLMResponse, LLMProvider, LLMUsage,
-    LLMNetworkException, LLMAuthenticationException, LLMRateLimitException, 
-    LLMModelException, LLMTimeoutException, LLMQuotaExceededException
-)
+try:
+    from ..unified_interface import (
+        UnifiedLLMInterface, LLMRequest, LLMResponse, LLMProvider, LLMUsage,
+        LLMNetworkException, LLMAuthenticationException, LLMRateLimitException, 
+        LLMModelException, LLMTimeoutException, LLMQuotaExceededException
+    )
+    from ..components.rate_limiter import AsyncLLMRateLimiter, estimate_tokens
+    from ..components.stream_metrics import OUTCOME_CANCELLED, OUTCOME_ERROR, SCOPE_PROVIDER, StreamTimer
+    from ..request_deadline import DeadlineExceededError
+except (ImportError, ValueError):
+    from unified_interface import (
+        UnifiedLLMInterface, LLMRequest, LLMResponse, LLMProvider, LLMUsage,
+        LLMNetworkException, LLMAuthenticationException, LLMRateLimitException, 
+        LLMModelException, LLMTimeoutException, LLMQuotaExceededException
+    )
+    from components.rate_limiter import AsyncLLMRateLimiter, estimate_tokens
+    from components.stream_metrics import OUTCOME_CANCELLED, OUTCOME_ERROR, SCOPE_PROVIDER, StreamTimer
+    from request_deadline import DeadlineExceededError
 
 logger = logging.getLogger(__name__)
 
@@ -71,23 +83,24 @@ class TongyiLLMClient(UnifiedLLMInterface):
             'qwen-max-longcontext': {'max_tokens': 28000, 'context_length': 28000}
         }
         
-        # 速率限制配置
-        self.rate_limit = {
-            'requests_per_minute': self.config.get('requests_per_minute', 60),
-            'tokens_per_minute': self.config.get('tokens_per_minute', 150000),
-            'last_request_time': 0,
-            'request_count': 0,
-            'token_count': 0,
-            'window_start': time.time()
-        }
+        # HTTP连接池（长连接复用，避免每次请求重新握手）
+        self.http_pool = HTTPSessionPool(self.provider.value, self.config)
+        
+        # 速率限制（RPM + TPM双桶，异步等待不阻塞事件循环）
+        self.rate_limiter = AsyncLLMRateLimiter(
+            requests_per_minute=self.config.get('requests_per_minute', 60),
+            tokens_per_minute=self.config.get('tokens_per_minute', 150000)
+        )
     
     async def generate(self, request: LLMRequest) -> LLMResponse:
         """生成文本响应"""
         start_time = time.time()
+        reserved_tokens = 0
+        used_tokens = 0
         
         try:
-            # 检查速率限制
-            await self._check_rate_limit()
+            # 检查速率限制（按估算的提示词token数预留配额）
+            reserved_tokens = await self._check_rate_limit(request)
             
             # 准备请求参数
             model = request.model or self.default_model
@@ -104,9 +117,7 @@ class TongyiLLMClient(UnifiedLLMInterface):
                 response = await self._call_http_api(model, messages, request)
             
             latency = time.time() - start_time
-            
-            # 更新速率限制计数
-            self._update_rate_limit(response.usage.total_tokens)
+            used_tokens = response.usage.total_tokens
             
             return self._create_success_response(
                 content=response.content,
@@ -120,6 +131,10 @@ class TongyiLLMClient(UnifiedLLMInterface):
             latency = time.time() - start_time
             logger.error(f"通义千问生成失败: {e}")
             return self._create_error_response(request, e, latency)
+        finally:
+            # 按实际用量修正速率限制配额；调用失败时没有消耗token，预留的配额全部返还，
+            # 否则重试时每次重新预留，上游故障期间会耗尽本地配额
+            self._update_rate_limit(used_tokens, reserved_tokens)
     
     async def chat(self, request: LLMRequest) -> LLMResponse:
         """进行对话"""
@@ -129,7 +144,8 @@ class TongyiLLMClient(UnifiedLLMInterface):
     async def stream_generate(self, request: LLMRequest) -> AsyncIterator[str]:
         """流式生成文本"""
         try:
-            await self._check_rate_limit()
+            reserved_tokens = await self._check_rate_limit(request)
+            streamed_tokens = 0
             
             model = request.model or self.default_model
             
@@ -139,25 +155,55 @@ class TongyiLLMClient(UnifiedLLMInterface):
                 messages = request.messages or []
             
             if self.client:
-                async for chunk in self._stream_openai_api(model, messages, request):
-                    yield chunk
+                stream = self._stream_openai_api(model, messages, request)
             else:
-                async for chunk in self._stream_http_api(model, messages, request):
-                    yield chunk
+                stream = self._stream_http_api(model, messages, request)
+            
+            # 上游计时从限流等待之后开始
+            timer = StreamTimer(self.provider.value, model, SCOPE_PROVIDER)
+            try:
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        tokens = estimate_tokens(chunk)
+                        streamed_tokens += tokens
+                        timer.on_chunk(tokens)
+                        yield chunk
+                timer.finish()
+            except (GeneratorExit, asyncio.CancelledError):
+                timer.finish(OUTCOME_CANCELLED)
+                raise
+            except Exception:
+                timer.finish(OUTCOME_ERROR)
+                raise
+            finally:
+                # 流式响应没有usage信息，按估算的输出token数修正配额
+                self._update_rate_limit(reserved_tokens + streamed_tokens, reserved_tokens)
                     
         except Exception as e:
             logger.error(f"通义千问流式生成失败: {e}")
-            yield f"错误: {str(e)}"
+            # 抛出异常而不是输出错误文本，避免错误内容被当作正常回答缓存或展示
+            raise
     
     async def stream_chat(self, request: LLMRequest) -> AsyncIterator[str]:
         """流式对话"""
-        async for chunk in self.stream_generate(request):
-            yield chunk
+        async with aclosing(self.stream_generate(request)) as stream:
+            async for chunk in stream:
+                yield chunk
     
     def get_available_models(self) -> List[str]:
         """获取可用模型列表"""
         return list(self.model_configs.keys())
     
+    async def close(self):
+        """关闭客户端，释放连接池"""
+        await self.http_pool.close()
+        if self.client and hasattr(self.client, 'close'):
+            await self.client.close()
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池统计"""
+        return self.http_pool.get_stats()
+    
     async def health_check(self) -> bool:
         """健康检查"""
         try:
@@ -175,6 +221,7 @@ class TongyiLLMClient(UnifiedLLMInterface):
     async def _call_openai_api(self, model: str, messages: List[Dict], 
                               request: LLMRequest) -> LLMResponse:
         """使用OpenAI客户端调用API"""
+        timeout = self._request_timeout()
         try:
             response = await self.client.chat.completions.create(
                 model=model,
@@ -185,7 +232,8 @@ class TongyiLLMClient(UnifiedLLMInterface):
                 frequency_penalty=request.frequency_penalty,
                 presence_penalty=request.presence_penalty,
                 stop=request.stop,
-                stream=False
+                stream=False,
+                timeout=timeout
             )
             
             usage = LLMUsage(
@@ -232,36 +280,39 @@ class TongyiLLMClient(UnifiedLLMInterface):
         if request.stop:
             data['stop'] = request.stop
         
+        timeout = self._request_timeout()
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.post(f"{self.base_url}/chat/completions", 
-                                       headers=headers, json=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
+            async with self.http_pool.acquire() as session, \
+                    session.post(f"{self.base_url}/chat/completions",
+                                 headers=headers, json=data,
+                                 timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 200:
+                    result = await response.json()
                         
-                        usage = LLMUsage(
-                            prompt_tokens=result['usage']['prompt_tokens'],
-                            completion_tokens=result['usage']['completion_tokens'],
-                            total_tokens=result['usage']['total_tokens']
-                        )
+                    usage = LLMUsage(
+                        prompt_tokens=result['usage']['prompt_tokens'],
+                        completion_tokens=result['usage']['completion_tokens'],
+                        total_tokens=result['usage']['total_tokens']
+                    )
                         
-                        return type('Response', (), {
-                            'content': result['choices'][0]['message']['content'],
-                            'usage': usage,
-                            'request_id': result.get('id')
-                        })()
-                    else:
-                        error_text = await response.text()
-                        self._handle_http_error(response.status, error_text)
+                    return type('Response', (), {
+                        'content': result['choices'][0]['message']['content'],
+                        'usage': usage,
+                        'request_id': result.get('id')
+                    })()
+                else:
+                    error_text = await response.text()
+                    self._handle_http_error(response.status, error_text)
                         
         except asyncio.TimeoutError:
-            raise TimeoutException("请求超时", LLMProvider.TONGYI)
+            raise LLMTimeoutException("请求超时", LLMProvider.TONGYI)
         except aiohttp.ClientError as e:
-            raise NetworkException(f"网络错误: {e}", LLMProvider.TONGYI)
+            raise LLMNetworkException(f"网络错误: {e}", LLMProvider.TONGYI)
     
     async def _stream_openai_api(self, model: str, messages: List[Dict],
                                request: LLMRequest) -> AsyncIterator[str]:
         """使用OpenAI客户端进行流式调用"""
+        timeout = self._request_timeout()
         try:
             stream = await self.client.chat.completions.create(
                 model=model,
@@ -272,12 +323,18 @@ class TongyiLLMClient(UnifiedLLMInterface):
                 frequency_penalty=request.frequency_penalty,
                 presence_penalty=request.presence_penalty,
                 stop=request.stop,
-                stream=True
+                stream=True,
+                timeout=timeout
             )
             
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except (GeneratorExit, asyncio.CancelledError):
+                # 调用方已断开，立即关闭上游连接，服务端随之停止生成
+                await stream.close()
+                raise
                     
         except Exception as e:
             self._handle_api_error(e)
@@ -303,11 +360,14 @@ class TongyiLLMClient(UnifiedLLMInterface):
         if request.max_tokens:
             data['max_tokens'] = request.max_tokens
         
+        timeout = self._request_timeout()
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.post(f"{self.base_url}/chat/completions",
-                                       headers=headers, json=data) as response:
-                    if response.status == 200:
+            async with self.http_pool.acquire() as session, \
+                    session.post(f"{self.base_url}/chat/completions",
+                                 headers=headers, json=data,
+                                 timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 200:
+                    try:
                         async for line in response.content:
                             line = line.decode('utf-8').strip()
                             if line.startswith('data: '):
@@ -323,51 +383,41 @@ class TongyiLLMClient(UnifiedLLMInterface):
                                             yield content
                                 except json.JSONDecodeError:
                                     continue
-                    else:
-                        error_text = await response.text()
-                        self._handle_http_error(response.status, error_text)
+                    except (GeneratorExit, asyncio.CancelledError):
+                        # 调用方已断开，直接关闭连接而不是读完剩余响应，服务端随之停止生成
+                        response.close()
+                        raise
+                else:
+                    error_text = await response.text()
+                    self._handle_http_error(response.status, error_text)
                         
         except asyncio.TimeoutError:
-            raise TimeoutException("流式请求超时", LLMProvider.TONGYI)
+            raise LLMTimeoutException("流式请求超时", LLMProvider.TONGYI)
         except aiohttp.ClientError as e:
-            raise NetworkException(f"流式网络错误: {e}", LLMProvider.TONGYI)
+            raise LLMNetworkException(f"流式网络错误: {e}", LLMProvider.TONGYI)
     
-    async def _check_rate_limit(self):
-        """检查速率限制"""
-        current_time = time.time()
-        
-        # 重置窗口
-        if current_time - self.rate_limit['window_start'] >= 60:
-            self.rate_limit['request_count'] = 0
-            self.rate_limit['token_count'] = 0
-            self.rate_limit['window_start'] = current_time
-        
-        # 检查请求频率
-        if self.rate_limit['request_count'] >= self.rate_limit['requests_per_minute']:
-            wait_time = 60 - (current_time - self.rate_limit['window_start'])
-            if wait_time > 0:
-                raise RateLimitException(f"请求频率超限，需等待{wait_time:.1f}秒", 
-                                       LLMProvider.TONGYI, int(wait_time))
-        
-        # 检查Token频率
-        if self.rate_limit['token_count'] >= self.rate_limit['tokens_per_minute']:
-            wait_time = 60 - (current_time - self.rate_limit['window_start'])
-            if wait_time > 0:
-                raise RateLimitException(f"Token使用超限，需等待{wait_time:.1f}秒",
-                                       LLMProvider.TONGYI, int(wait_time))
+    async def _check_rate_limit(self, request: LLMRequest) -> int:
+        """等待速率限制配额，返回预留的token数
         
-        # 请求间隔控制
-        time_since_last = current_time - self.rate_limit['last_request_time']
-        min_interval = 60 / self.rate_limit['requests_per_minute']
-        if time_since_last < min_interval:
-            await asyncio.sleep(min_interval - time_since_last)
-        
-        self.rate_limit['last_request_time'] = time.time()
-        self.rate_limit['request_count'] += 1
+        等待时间超过请求超时时间时抛出限流异常，而不是无限期等待。
+        """
+        estimated_tokens = self.rate_limiter.estimate_request_tokens(
+            request.prompt, request.messages
+        )
+        timeout = self._request_timeout()
+        try:
+            return await asyncio.wait_for(
+                self.rate_limiter.acquire(estimated_tokens), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            if timeout < self.timeout:
+                raise DeadlineExceededError("等待速率限制配额时已超过请求截止时间")
+            raise LLMRateLimitException(f"本地速率限制等待超过{self.timeout}秒",
+                                        LLMProvider.TONGYI, int(self.timeout))
     
-    def _update_rate_limit(self, tokens_used: int):
-        """更新速率限制计数"""
-        self.rate_limit['token_count'] += tokens_used
+    def _update_rate_limit(self, tokens_used: int, reserved_tokens: int = 0):
+        """按实际用量修正速率限制配额"""
+        self.rate_limiter.record_usage(reserved_tokens, tokens_used)
     
     def _handle_api_error(self, error: Exception):
         """处理API错误"""
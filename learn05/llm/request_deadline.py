@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求截止时间传播
+在API入口设置请求级截止时间，通过contextvars贯穿智能体、LLM管理器、统一客户端、重试和提供商调用，
+各层据此收缩超时、跳过来不及完成的重试与降级，并在超时后立即失败
+
+截止时间保存在模块级上下文变量中，包内以相对导入引用、包外以llm.request_deadline导入，
+不要再以顶层名request_deadline导入，否则会得到另一份互不相通的上下文变量
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class DeadlineExceededError(TimeoutError):
+    """请求截止时间已过"""
+    pass
+
+
+# 截止时间（time.monotonic()时间戳），None表示不限制
+_request_deadline: ContextVar[Optional[float]] = ContextVar('llm_request_deadline', default=None)
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]) -> Iterator[Optional[float]]:
+    """在当前上下文中设置截止时间（只会收紧，不会放宽外层截止时间）
+
+    Args:
+        timeout: 从现在起的剩余秒数，None表示沿用外层截止时间
+
+    Yields:
+        Optional[float]: 生效的截止时间
+    """
+    deadline = _request_deadline.get()
+    if timeout is not None:
+        new_deadline = time.monotonic() + timeout
+        deadline = new_deadline if deadline is None else min(deadline, new_deadline)
+    token = _request_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _request_deadline.reset(token)
+
+
+def get_deadline() -> Optional[float]:
+    """获取当前截止时间"""
+    return _request_deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    """获取剩余时间（秒），未设置截止时间时返回None"""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(operation: str = "请求") -> None:
+    """截止时间已过时抛出DeadlineExceededError
+
+    Args:
+        operation: 操作描述，用于错误信息
+    """
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceededError(f"{operation}已超过截止时间")
+
+
+def effective_timeout(timeout: Optional[float], operation: str = "请求") -> Optional[float]:
+    """按剩余时间收缩超时时间
+
+    Args:
+        timeout: 本层配置的超时时间
+        operation: 操作描述，用于错误信息
+
+    Returns:
+        Optional[float]: 不超过剩余时间的超时时间
+    """
+    check_deadline(operation)
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
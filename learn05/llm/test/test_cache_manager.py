@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+内存缓存单元测试
+测试MemoryCache的O(1)淘汰、W-TinyLFU准入、时间轮过期和内存上限
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import time
+
+from llm.optimization.cache_manager import (
+    CacheConfig,
+    CacheManager,
+    MemoryCache,
+    TimerWheel,
+    estimate_size
+)
+
+
+class TestMemoryCacheLRU:
+    """测试LRU淘汰"""
+
+    def test_evicts_single_least_recently_used_item(self):
+        """测试容量满时只淘汰一个最久未使用的项"""
+        cache = MemoryCache(CacheConfig(max_size=3))
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+        cache.get("a")
+        cache.set("d", "d")
+
+        assert cache.size() == 3
+        assert cache.exists("a")
+        assert not cache.exists("b")
+        assert cache.get_statistics()['evictions'] == 1
+
+    def test_memory_limit_in_bytes(self):
+        """测试按估算字节数限制容量"""
+        value = "x" * 1000
+        limit = estimate_size(value) * 3
+        cache = MemoryCache(CacheConfig(max_size=100, max_memory_bytes=limit))
+        for index in range(10):
+            cache.set(f"key{index}", value)
+
+        stats = cache.get_statistics()
+        assert stats['total_size_bytes'] <= limit
+        assert stats['total_items'] == 3
+        assert cache.exists("key9")
+
+    def test_statistics_track_hits_and_misses(self):
+        """测试统计信息由运行计数器维护"""
+        cache = MemoryCache(CacheConfig(max_size=10))
+        cache.set("a", [1, 2, 3])
+        cache.get("a")
+        cache.get("a")
+        cache.get("missing")
+
+        stats = cache.get_statistics()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['total_accesses'] == 2
+        assert abs(stats['hit_rate'] - 2 / 3) < 1e-9
+
+        cache.delete("a")
+        assert cache.get_statistics()['total_size_bytes'] == 0
+
+
+class TestMemoryCacheExpiry:
+    """测试过期处理"""
+
+    def test_expired_items_are_removed_by_timer_wheel(self):
+        """测试到期的项在后续操作时被时间轮批量清理"""
+        cache = MemoryCache(CacheConfig(max_size=100, expiry_resolution=0.01))
+        for index in range(5):
+            cache.set(f"short{index}", index, ttl=0.05)
+        cache.set("long", "value", ttl=60)
+
+        time.sleep(0.1)
+        cache.get("long")
+
+        assert cache.size() == 1
+        assert cache.get_statistics()['expirations'] == 5
+
+    def test_timer_wheel_handles_multiple_rounds(self):
+        """测试超过一圈的到期时间不会提前过期"""
+        wheel = TimerWheel(resolution=1.0, slots=4)
+        now = time.monotonic()
+        wheel.schedule("far", now + 10)
+
+        assert wheel.advance(now + 5) == []
+        assert wheel.advance(now + 11) == ["far"]
+
+
+class TestWTinyLFU:
+    """测试W-TinyLFU准入策略"""
+
+    def test_scan_does_not_flush_hot_items(self):
+        """测试一次性扫描流量不会挤出热点数据"""
+        cache = CacheManager('memory', CacheConfig(max_size=100, eviction_policy='w-tinylfu'))
+        hot_keys = [f"hot{index}" for index in range(50)]
+        for key in hot_keys:
+            cache.set(key, key)
+        for _ in range(5):
+            for key in hot_keys:
+                cache.get(key)
+
+        for index in range(1000):
+            cache.set(f"scan{index}", index)
+
+        retained = sum(1 for key in hot_keys if cache.exists(key))
+        assert retained == len(hot_keys)
+        assert cache.size() <= 100
+        assert cache.get_statistics()['admission_rejections'] > 0
+
+    def test_resize_keeps_hot_items(self):
+        """测试运行时缩容优先淘汰试用区的冷数据"""
+        cache = CacheManager('memory', CacheConfig(max_size=100, eviction_policy='w-tinylfu'))
+        for index in range(100):
+            cache.set(f"key{index}", index)
+        hot_keys = [f"key{index}" for index in range(20)]
+        for key in hot_keys:
+            cache.get(key)
+
+        assert cache.resize(50) == 50
+        assert cache.size() == 50
+        assert all(cache.exists(key) for key in hot_keys)
+
+        for index in range(100, 200):
+            cache.set(f"key{index}", index)
+        assert cache.size() == 50
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+并发处理器单元测试
+测试进程池处理器的提交、分块批处理、共享内存传参和工作进程回收，以及LLM微批处理
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import asyncio
+import json
+import math
+import operator
+import os
+
+import numpy as np
+import pytest
+
+from llm.optimization.concurrent_processor import (
+    LLMBatchProcessor,
+    ProcessPoolProcessor,
+    ProcessingConfig,
+    TaskStatus,
+    create_process_pool_processor
+)
+from llm.request_deadline import DeadlineExceededError
+
+
+@pytest.fixture
+def processor():
+    processor = create_process_pool_processor(max_workers=2, enable_logging=False)
+    yield processor
+    processor.shutdown()
+
+
+class TestProcessPoolProcessor:
+    """测试进程池处理器"""
+
+    def test_runs_in_worker_process(self, processor):
+        """测试任务在独立进程中执行"""
+        assert isinstance(processor, ProcessPoolProcessor)
+        task_id = processor.submit_task(os.getpid)
+        result = processor.get_result(task_id, timeout=30)
+
+        assert result.status == TaskStatus.COMPLETED
+        assert result.result != os.getpid()
+        assert result.execution_time is not None
+
+    def test_rejects_unpicklable_task(self, processor):
+        """测试不可序列化的任务在提交时被拒绝"""
+        with pytest.raises(TypeError):
+            processor.submit_task(lambda: 1)
+        assert processor.list_tasks() == []
+
+    def test_chunked_batch(self, processor):
+        """测试分块批量提交，单个任务失败不影响同块其他任务"""
+        tasks = [(math.factorial, (n,)) for n in range(5)] + [(json.loads, ('{bad',))]
+        task_ids = processor.submit_batch(tasks, chunk_size=4)
+        results = processor.wait_for_completion(task_ids, timeout=30)
+
+        assert [r.result for r in results[:5]] == [1, 1, 2, 6, 24]
+        assert results[5].status == TaskStatus.FAILED
+        assert isinstance(results[5].error, json.JSONDecodeError)
+        assert processor.get_statistics()['chunks_submitted'] == 2
+
+    def test_large_array_uses_shared_memory(self):
+        """测试大数组参数经共享内存传递"""
+        config = ProcessingConfig(max_workers=1, enable_logging=False, shared_memory_threshold=1024)
+        processor = ProcessPoolProcessor(config)
+        try:
+            scores = np.arange(100000, dtype=np.float64)
+            task_id = processor.submit_task(operator.mul, scores, 2)
+            result = processor.get_result(task_id, timeout=30)
+
+            assert result.status == TaskStatus.COMPLETED
+            np.testing.assert_array_equal(result.result, scores * 2)
+            assert processor.get_statistics()['shared_memory_bytes'] == scores.nbytes
+        finally:
+            processor.shutdown()
+
+    def test_worker_recycling(self):
+        """测试工作进程处理指定数量任务后被替换"""
+        config = ProcessingConfig(max_workers=1, enable_logging=False, max_tasks_per_child=1)
+        processor = ProcessPoolProcessor(config)
+        try:
+            task_ids = [processor.submit_task(os.getpid) for _ in range(3)]
+            pids = {r.result for r in processor.wait_for_completion(task_ids, timeout=60)}
+            assert len(pids) == 3
+        finally:
+            processor.shutdown()
+
+
+class FakeGrader:
+    """模拟LLM：批量请求按JSON信封逐条作答，单条请求直接作答"""
+
+    def __init__(self, garble: bool = False, batch_error: Exception = None):
+        self.garble = garble
+        self.batch_error = batch_error
+        self.prompts = []
+
+    async def __call__(self, prompt: str, **kwargs) -> str:
+        self.prompts.append(prompt)
+        if '待处理条目：' not in prompt:
+            return f"评分:{prompt.rsplit(chr(10), 1)[-1]}"
+        if self.batch_error is not None:
+            raise self.batch_error
+        if self.garble:
+            return "抱歉，我无法按格式输出"
+        entries = json.loads(prompt.split('待处理条目：', 1)[1])
+        # 模拟模型漏掉最后一条
+        return json.dumps([{'id': e['id'], 'result': f"评分:{e['input']}"} for e in entries[:-1]],
+                          ensure_ascii=False)
+
+
+class TestLLMBatchProcessor:
+    """测试LLM微批处理"""
+
+    def test_packs_prompts_and_falls_back_for_missing_items(self):
+        """测试多条提示词打包为一次请求，漏答的条目单独补调"""
+        llm = FakeGrader()
+        batcher = LLMBatchProcessor(llm, max_batch_size=10, max_wait=0.01)
+
+        async def run():
+            return await asyncio.gather(*(batcher.submit(f"答案{i}", instruction="批改") for i in range(5)))
+
+        assert asyncio.run(run()) == [f"评分:答案{i}" for i in range(5)]
+        assert len(llm.prompts) == 2
+        stats = batcher.get_stats()
+        assert stats['batches_sent'] == 1
+        assert stats['batched_items'] == 4
+        assert stats['fallback_items'] == 1
+
+    def test_token_budget_and_batch_size_split_batches(self):
+        """测试按批大小和token预算分批，不同指令不混批"""
+        llm = FakeGrader()
+        batcher = LLMBatchProcessor(llm, max_batch_size=3, max_wait=0.01, max_batch_tokens=10)
+
+        async def run():
+            return await asyncio.gather(
+                *(batcher.submit("短答案", instruction="批改") for _ in range(4)),
+                batcher.submit("同学表现", instruction="写评语")
+            )
+
+        asyncio.run(run())
+        batch_prompts = [p for p in llm.prompts if '待处理条目：' in p]
+        # 每条约3个token，预算10只能装3条；第4条和“写评语”各自单独调用
+        assert len(batch_prompts) == 1
+        assert batcher.get_stats()['single_calls'] == 2
+
+    def test_unparseable_response_falls_back_to_single_calls(self):
+        """测试批量响应无法解析时全部改为逐条调用"""
+        llm = FakeGrader(garble=True)
+        batcher = LLMBatchProcessor(llm, max_wait=0.01)
+
+        async def run():
+            return await asyncio.gather(*(batcher.submit(f"答案{i}", instruction="批改") for i in range(3)))
+
+        assert asyncio.run(run()) == [f"评分:答案{i}" for i in range(3)]
+        assert batcher.get_stats()['parse_failures'] == 1
+        assert batcher.get_stats()['fallback_items'] == 3
+
+    @pytest.mark.parametrize('error', [TimeoutError("上游超时"), DeadlineExceededError("已超过请求截止时间")])
+    def test_failed_batch_call_is_not_retried_per_item(self, error):
+        """测试批量调用本身失败时不逐条重试，各调用方都收到该异常"""
+        llm = FakeGrader(batch_error=error)
+        batcher = LLMBatchProcessor(llm, max_wait=0.01)
+
+        async def run():
+            return await asyncio.gather(*(batcher.submit(f"答案{i}", instruction="批改") for i in range(3)),
+                                        return_exceptions=True)
+
+        assert asyncio.run(run()) == [error] * 3
+        assert len(llm.prompts) == 1
+        assert batcher.get_stats()['fallback_items'] == 0
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+上下文策略单元测试
+测试消息token计数缓存、可插拔分词器、基于前缀和的token预算裁剪和抽取式压缩
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from llm.context.context_manager import ContextManager, ContextType, Message, MessageRole
+from llm.context.context_strategies import (
+    AdaptiveStrategy,
+    SemanticCompressionStrategy,
+    StrategyConfig,
+    TokenCounter,
+    TokenizerCounter,
+    TokenLimitStrategy,
+)
+from llm.context.prompt_compressor import ExtractiveCompressor, split_sentences
+
+
+class CountingCounter(TokenCounter):
+    """记录调用次数的估算计数器"""
+
+    name = 'counting'
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return super().count(text)
+
+
+def reference_token_limit(strategy: TokenLimitStrategy, messages):
+    """改造前的逐条估算（系统消息在前，按时间顺序）"""
+    result = [msg for msg in messages if msg.role == MessageRole.SYSTEM]
+    total = sum(strategy.estimate_tokens(msg.content) for msg in result)
+    kept = []
+    for msg in reversed([msg for msg in messages if msg.role != MessageRole.SYSTEM]):
+        tokens = strategy.estimate_tokens(msg.content)
+        if total + tokens > strategy.max_tokens:
+            break
+        kept.insert(0, msg)
+        total += tokens
+    return result + kept
+
+
+class TestTokenAccounting:
+    """测试token计数缓存与前缀和裁剪"""
+
+    def test_message_tokens_are_counted_once(self):
+        """测试每条消息只计数一次，正文被替换后重新计数"""
+        counter = CountingCounter()
+        strategy = AdaptiveStrategy(token_limit=50, window_size=10, token_counter=counter)
+        messages = [Message(MessageRole.USER, f'第{index}个问题：光合作用需要哪些条件') for index in range(6)]
+
+        for _ in range(3):
+            strategy.apply(messages)
+        assert counter.calls == 6
+
+        messages[0].content = '改写后的问题'
+        assert strategy.message_tokens(messages[0]) == 10
+        assert counter.calls == 7
+
+    def test_token_limit_matches_per_message_estimation(self):
+        """测试逐轮追加并裁剪时与逐条估算的结果一致，系统消息保持在最前"""
+        strategy = TokenLimitStrategy(max_tokens=80)
+        messages = [Message(MessageRole.SYSTEM, '你是一名耐心的数学辅导老师')]
+        for index in range(40):
+            role = MessageRole.USER if index % 2 == 0 else MessageRole.ASSISTANT
+            messages.append(Message(role, f'第{index}轮：一元二次方程 x^2 - {index}x + 1 = 0 怎么解'))
+            expected = reference_token_limit(strategy, messages)
+            messages = strategy.apply(messages)
+            assert messages == expected
+        assert messages[0].role == MessageRole.SYSTEM
+        assert strategy.total_tokens(messages) <= 80
+
+    def test_pluggable_tokenizer(self):
+        """测试自定义分词器计数，并通过上下文管理器生效"""
+        counter = TokenizerCounter(list, 'chars')
+        strategy = TokenLimitStrategy(max_tokens=10, token_counter=counter)
+        messages = [Message(MessageRole.USER, '12345'), Message(MessageRole.USER, '678901')]
+        assert strategy.message_tokens(messages[1]) == 6
+        assert strategy.apply(messages) == messages[1:]
+
+        manager = ContextManager({'strategy': 'token_limit',
+                                  'strategy_config': {'max_tokens': 10, 'token_counter': counter}})
+        manager.create_context('s1', ContextType.TUTORING)
+        manager.add_message('s1', MessageRole.USER, '12345')
+        manager.add_message('s1', MessageRole.USER, '678901')
+        assert [msg['content'] for msg in manager.get_context_for_llm('s1')] == ['678901']
+
+
+class TestExtractiveCompression:
+    """测试抽取式提示词压缩"""
+
+    def test_split_sentences(self):
+        """测试中英文分句，不拆开小数和缩写"""
+        text = '光合作用需要光照。你知道吗？The value is 3.14, e.g. pi. Next one!\n换行后的内容'
+        assert split_sentences(text) == ['光合作用需要光照。', '你知道吗？', 'The value is 3.14, e.g. pi.',
+                                         'Next one!', '换行后的内容']
+
+    def test_redundant_sentences_removed_within_ratio(self):
+        """测试重复句子被去掉（只换了数字的不算重复），结果不超过目标压缩比"""
+        compressor = ExtractiveCompressor(ratio=1.0)
+        texts = [
+            '欧姆定律说明电流与电压成正比。电阻为10欧时电流是0.3安。',
+            '欧姆定律说明电流与电压成正比！电阻为20欧时电流是0.6安。好的，我明白了。',
+        ]
+        compressed = compressor.compress(texts, context=['好的，我明白了。'])
+        assert compressed[0] == texts[0]
+        assert compressed[1] == '电阻为20欧时电流是0.6安。'
+
+        count = compressor.token_counter.count
+        long_texts = [f'第{index}题：串联电路中{index}欧和{index + 1}欧的电阻串联后总电阻是{2 * index + 1}欧。'
+                      for index in range(20)]
+        result = compressor.compress(long_texts, ratio=0.6)
+        assert 0 < sum(map(count, result)) <= 0.6 * sum(map(count, long_texts))
+
+    def test_strategy_keeps_system_and_recent_messages(self):
+        """测试超过token上限时只压缩较早的消息，系统消息和最近的消息原样保留"""
+        config = StrategyConfig(max_tokens=250, preserve_recent=2)
+        strategy = SemanticCompressionStrategy(0.5, config=config)
+        messages = [Message(MessageRole.SYSTEM, '你是物理辅导老师。')]
+        for index in range(6):
+            messages.append(Message(MessageRole.USER, f'电阻为{index}0欧时电流是多少？我还是有点糊涂。'))
+            messages.append(Message(MessageRole.ASSISTANT, f'电流等于电压除以电阻，是{index}安。好的，我们继续往下看。'))
+
+        result = strategy.apply(messages)
+        assert result[0] is messages[0]
+        assert result[-2:] == messages[-2:]
+        originals = {msg.message_id: msg for msg in messages}
+        compressed = [msg for msg in result[1:-2] if msg.metadata.get('compressed')]
+        assert compressed
+        assert all(len(msg.content) < len(originals[msg.message_id].content) for msg in compressed)
+        assert strategy.total_tokens(result) <= config.max_tokens
+
+        assert strategy.apply(messages[:3]) == messages[:3]
+
+    def test_long_session_stays_near_budget_without_recompressing(self):
+        """测试长会话逐轮压缩：上下文贴近max_tokens，已压缩的消息不再被反复压缩"""
+        config = StrategyConfig(max_tokens=400, preserve_recent=4)
+        strategy = SemanticCompressionStrategy(0.5, config=config)
+        context = [Message(MessageRole.SYSTEM, '你是物理辅导老师。')]
+        first_compressed = {}
+        for index in range(150):
+            context.append(Message(MessageRole.USER, f'第{index}题：{index}欧和{index + 1}欧的电阻串联后总电阻是多少？请讲一下。'))
+            context.append(Message(MessageRole.ASSISTANT, f'串联电阻直接相加。总电阻是{2 * index + 1}欧。记得检查单位。'))
+            context = strategy.apply(context)
+            for msg in context:
+                if msg.metadata.get('compressed'):
+                    assert first_compressed.setdefault(msg.message_id, msg.content) == msg.content
+
+        total = strategy.total_tokens(context)
+        assert 0.8 * config.max_tokens <= total <= config.max_tokens
+        assert context[0].role == MessageRole.SYSTEM
+        assert context[-1].content.endswith('记得检查单位。')
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+流式直方图单元测试
+测试分位数精度、内存上限、滑动窗口以及监控模块的接入
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import random
+
+import pytest
+
+from llm.components.histogram import LogHistogram, WindowedHistogram
+from llm.optimization.performance_monitor import APIMetricsCollector, MonitorConfig
+
+
+class TestLogHistogram:
+    """测试对数分桶直方图"""
+
+    def test_quantiles_within_relative_accuracy(self):
+        """测试分位数相对误差不超过设定精度"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(-1, 1) for _ in range(50000)]
+        histogram = LogHistogram(relative_accuracy=0.01)
+        for value in values:
+            histogram.record(value)
+
+        values.sort()
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * len(values)) - 1]
+            assert histogram.quantile(q) == pytest.approx(exact, rel=0.021)
+        assert histogram.max == values[-1]
+        assert histogram.mean == pytest.approx(sum(values) / len(values))
+
+    def test_bucket_count_is_bounded(self):
+        """测试桶数量与样本数无关"""
+        histogram = LogHistogram(relative_accuracy=0.01, min_value=1e-3, max_value=10)
+        for index in range(200000):
+            histogram.record((index % 1000) / 50 + 1e-6)
+
+        assert histogram.count == 200000
+        assert len(histogram.buckets) <= 470
+        assert histogram.summary()['max'] == pytest.approx(999 / 50 + 1e-6)
+
+
+class TestWindowedHistogram:
+    """测试滑动窗口直方图"""
+
+    def test_windows_expire_old_slots(self):
+        """测试窗口只包含最近的子直方图"""
+        histogram = WindowedHistogram(window_seconds=300, slot_seconds=10)
+        histogram.record(5.0, now=1000)
+        histogram.record(1.0, now=1250)
+        histogram.record(2.0, now=1295)
+
+        assert histogram.snapshot(60, now=1299).count == 2
+        assert histogram.snapshot(300, now=1299).count == 3
+        # 超出环的时间片被覆盖，全量直方图仍保留
+        histogram.record(3.0, now=1600)
+        assert histogram.snapshot(300, now=1600).count == 1
+        assert histogram.snapshot().count == 4
+
+
+class TestAPIMetricsCollector:
+    """测试API监控接入直方图"""
+
+    def test_endpoint_statistics(self):
+        """测试端点统计包含分位数和时间窗口"""
+        collector = APIMetricsCollector(MonitorConfig())
+        for index in range(1, 101):
+            collector.record_request("/chat", "POST")
+            collector.record_response("/chat", "POST", index / 100, 200)
+
+        stats = collector.get_endpoint_statistics("/chat", "POST")
+        assert stats['avg_response_time'] == pytest.approx(0.505)
+        assert stats['max_response_time'] == 1.0
+        assert stats['p99_response_time'] == pytest.approx(0.99, rel=0.02)
+        assert stats['windows']['1m']['count'] == 100
+        names = {metric.name for metric in collector.collect()}
+        assert 'api_p99_response_time' in names
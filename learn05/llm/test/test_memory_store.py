@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+记忆存储与会话记录单元测试
+测试紧凑记录类型的序列化兼容性、记忆全文检索与整合
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from llm.context.memory_store import MemoryItem, MemoryStore, MemoryType, MemoryImportance
+from llm.components.minhash_lsh import MinHashLSH
+from llm.context.text_index import BM25Index, tokenize
+from llm.context.session_manager import SessionInfo, SessionStatus, UserRole
+from llm.optimization.cache_manager import CacheItem
+
+
+def assert_same_time(first: str, second: str):
+    """序列化时间经过单调时钟换算，允许微秒级误差"""
+    delta = datetime.fromisoformat(first) - datetime.fromisoformat(second)
+    assert abs(delta.total_seconds()) < 1e-3
+
+
+class TestCompactRecords:
+    """测试__slots__记录类型"""
+
+    def test_memory_item_round_trip(self):
+        """测试记忆项to_dict/from_dict与旧格式兼容"""
+        data = {
+            'memory_id': 'm1',
+            'content': '光合作用是植物利用光能合成有机物的过程',
+            'memory_type': 'semantic',
+            'importance': 3,
+            'created_at': '2024-03-01T08:30:00.123456',
+            'last_accessed': '2024-03-02T09:00:00',
+            'access_count': 2,
+            'metadata': {'subject': '生物'},
+            'tags': ['生物'],
+            'related_memories': [],
+            'decay_rate': 0.1,
+            'strength': 0.8
+        }
+        item = MemoryItem.from_dict(data)
+        result = item.to_dict()
+
+        assert not hasattr(item, '__dict__')
+        assert item.memory_type == MemoryType.SEMANTIC
+        assert item.importance == MemoryImportance.HIGH
+        for key in ('created_at', 'last_accessed'):
+            assert_same_time(result.pop(key), data[key])
+        assert result == {k: v for k, v in data.items() if k not in ('created_at', 'last_accessed')}
+
+    def test_session_info_round_trip(self):
+        """测试会话信息to_dict/from_dict与旧格式兼容"""
+        session = SessionInfo('s1', 'u1', UserRole.TEACHER, expires_at=datetime.now() + timedelta(hours=1))
+        session.context_types.add('teaching')
+        session.update_activity()
+        session.expires_at += timedelta(hours=1)
+
+        restored = SessionInfo.from_dict(session.to_dict())
+
+        assert not hasattr(session, '__dict__')
+        assert restored.status == SessionStatus.ACTIVE
+        assert restored.context_types == {'teaching'}
+        assert restored.activity_count == 1
+        assert_same_time(restored.expires_at.isoformat(), session.expires_at.isoformat())
+        assert not restored.is_expired(timedelta(minutes=5))
+        assert session.expires_at - datetime.now() > timedelta(minutes=119)
+
+    def test_cache_item_expiry_uses_monotonic_time(self):
+        """测试缓存项使用单调时间判断过期"""
+        item = CacheItem('k', 'v', ttl_seconds=60)
+        assert not item.is_expired()
+
+        item.created_at = datetime.now() - timedelta(seconds=120)
+        assert item.is_expired()
+        assert CacheItem.from_dict(item.to_dict()).is_expired()
+
+    def test_empty_containers_are_allocated_lazily(self):
+        """测试空的元数据、标签和上下文类型在首次访问前不分配容器"""
+        item = MemoryItem('m1', '勾股定理', MemoryType.SEMANTIC, MemoryImportance.HIGH)
+        session = SessionInfo('s1', 'u1', UserRole.STUDENT)
+        assert item._tags is None and item._metadata is None and item._related_memories is None
+        assert session._user_info is None and session._context_types is None
+
+        data = item.to_dict()
+        assert (data['tags'], data['metadata'], data['related_memories']) == ([], {}, [])
+        assert SessionInfo.from_dict(session.to_dict())._context_types is None
+        assert item._tags is None
+
+        item.tags.append('数学')
+        session.context_types.add('tutoring')
+        assert MemoryItem.from_dict(item.to_dict()).tags == ['数学']
+        assert SessionInfo.from_dict(session.to_dict()).context_types == {'tutoring'}
+
+    def test_add_memory_after_decay(self):
+        """测试手动衰减后继续添加记忆，自动衰减的时间比较不受影响"""
+        store = MemoryStore({'auto_decay': True})
+        store.add_memory('勾股定理掌握较好', MemoryType.SEMANTIC, MemoryImportance.HIGH, user_id='u1')
+        store.decay_memories()
+        store.add_memory('三角函数需要巩固', MemoryType.EPISODIC, MemoryImportance.MEDIUM, user_id='u1')
+
+        store.last_decay_time -= store.decay_interval.total_seconds() + 1
+        store.add_memory('二次函数图像理解正确', MemoryType.SEMANTIC, MemoryImportance.HIGH, user_id='u1')
+        assert len(store.get_user_memories('u1')) == 3
+
+
+class TestMemorySearch:
+    """测试倒排索引检索"""
+
+    def _store(self) -> MemoryStore:
+        store = MemoryStore({'auto_decay': False})
+        self.photo = store.add_memory('光合作用是植物利用光能合成有机物的过程', MemoryType.SEMANTIC,
+                                      MemoryImportance.HIGH, user_id='u1', tags=['生物'])
+        self.breath = store.add_memory('植物的呼吸作用会消耗有机物', MemoryType.SEMANTIC,
+                                       MemoryImportance.MEDIUM, user_id='u2', tags=['生物'])
+        self.quad = store.add_memory('Quadratic equations 一元二次方程的求根公式', MemoryType.EPISODIC,
+                                     MemoryImportance.HIGH, user_id='u1', tags=['数学'],
+                                     metadata={'chapter': '方程与不等式'})
+        return store
+
+    def test_tokenize(self):
+        """测试中文二元组与英文单词切分"""
+        assert tokenize('光合作用, Photosynthesis 2024年') == ['光合', '合作', '作用', 'photosynthesis', '2024', '年']
+
+    def test_bm25_ranking(self):
+        """测试BM25排序并结合重要性权重"""
+        store = self._store()
+        results = store.search_memories('光合作用')
+        assert [memory.memory_id for memory, _ in results] == [self.photo, self.breath]
+        assert results[0][1] == pytest.approx(0.75)
+        assert 0 < results[1][1] < results[0][1]
+
+        # 英文大小写不敏感，元数据中的字符串参与检索
+        assert [m.memory_id for m, _ in store.search_memories('QUADRATIC')] == [self.quad]
+        assert [m.memory_id for m, _ in store.search_memories('不等式')] == [self.quad]
+        # 单个汉字扩展为包含它的二元组
+        assert self.photo in [m.memory_id for m, _ in store.search_memories('光')]
+        assert store.search_memories('电磁感应') == []
+
+    def test_filter_pushdown(self):
+        """测试用户、类型、标签与重要性过滤"""
+        store = self._store()
+        assert [m.memory_id for m, _ in store.search_memories('有机物', user_id='u2')] == [self.breath]
+        assert [m.memory_id for m, _ in store.search_memories('方程', user_id='u1',
+                                                              memory_type=MemoryType.SEMANTIC)] == []
+        assert [m.memory_id for m, _ in store.search_memories('作用', tags=['数学'])] == []
+        assert [m.memory_id for m, _ in store.search_memories(
+            '有机物', min_importance=MemoryImportance.HIGH)] == [self.photo]
+        # 没有可检索的词时按过滤范围返回
+        assert {m.memory_id for m, _ in store.search_memories('', user_id='u1')} == {self.photo, self.quad}
+
+    def test_index_follows_updates(self):
+        """测试增删改后索引同步"""
+        store = self._store()
+        store.update_memory(self.breath, content='细胞分裂', tags=['细胞'])
+        assert [m.memory_id for m, _ in store.search_memories('有机物')] == [self.photo]
+        assert [m.memory_id for m, _ in store.search_memories('分裂', tags=['细胞'])] == [self.breath]
+
+        store.update_memory(self.quad, memory_type=MemoryType.SEMANTIC)
+        assert store.search_memories('方程', memory_type=MemoryType.EPISODIC) == []
+        assert [m.memory_id for m, _ in store.search_memories('方程', memory_type=MemoryType.SEMANTIC)] == [self.quad]
+
+        store.remove_memory(self.photo)
+        assert store.search_memories('光合作用') == []
+        assert len(store.search_index) == 2
+        assert self.photo not in store.user_memories['u1']
+
+    def test_index_remove_cleans_postings(self):
+        """测试删除文档后倒排表不残留"""
+        index = BM25Index()
+        index.add('a', {'content': ['光合作用']})
+        index.add('b', {'content': ['光合']})
+        index.remove('a')
+        index.remove('b')
+        assert index.vocabulary_size == 0
+        assert index.search('光合') == {}
+
+
+class TestMemoryConsolidation:
+    """测试基于MinHash-LSH的记忆整合"""
+
+    NOTE = '学生在一元二次方程求根公式的应用中多次出现计算粗心的问题，判别式符号经常写错'
+
+    def test_signature_and_candidates(self):
+        """测试相同集合签名一致，相似集合成为候选"""
+        lsh = MinHashLSH()
+        tokens = tokenize(self.NOTE)
+        signature = lsh.signature(tokens)
+        assert signature == lsh.signature(list(reversed(tokens)))
+        assert lsh.signature([]) is None
+
+        lsh.insert('a', signature, scope='u1')
+        assert lsh.query(lsh.signature(tokenize(self.NOTE + '。'))) == set()
+        assert lsh.query(lsh.signature(tokenize(self.NOTE + '。')), 'u1') == {'a'}
+        assert lsh.query(lsh.signature(tokenize('欧姆定律的实验数据记录')), 'u1') == set()
+        lsh.remove('a')
+        assert lsh.query(signature, 'u1') == set()
+
+    def test_consolidate_within_user(self):
+        """测试只合并同一用户的相似记忆"""
+        store = MemoryStore({'auto_decay': False})
+        first = store.add_memory(self.NOTE, MemoryType.EPISODIC, MemoryImportance.MEDIUM,
+                                 user_id='u1', tags=['数学'])
+        second = store.add_memory(self.NOTE + '，需要加强练习', MemoryType.EPISODIC,
+                                  MemoryImportance.HIGH, user_id='u1', tags=['错题'])
+        other_user = store.add_memory(self.NOTE, MemoryType.EPISODIC, MemoryImportance.LOW, user_id='u2')
+        unrelated = store.add_memory('课堂上主动回答了光合作用相关的问题', MemoryType.EPISODIC,
+                                     MemoryImportance.LOW, user_id='u1')
+
+        assert store.consolidate_memories('u1') == 1
+        assert set(store.memories) == {first, other_user, unrelated}
+        merged = store.memories[first]
+        assert merged.importance == MemoryImportance.HIGH
+        assert first in store.tag_index['错题']
+        assert store.user_memories['u1'] == [first, unrelated]
+        # 合并后的正文可以检索到
+        assert [m.memory_id for m, _ in store.search_memories('加强练习', user_id='u1')] == [first]
+        assert store.consolidate_memories() == 0
+
+    def test_incremental_background_consolidation(self):
+        """测试新增记忆只探测LSH桶，后台线程分段处理队列"""
+        store = MemoryStore({'auto_decay': False, 'consolidation_interval_seconds': 0.01})
+        store.add_memory(self.NOTE, MemoryType.EPISODIC, MemoryImportance.MEDIUM, user_id='u1')
+        assert store.consolidate_pending() == 0
+
+        store.add_memory(self.NOTE + '。', MemoryType.EPISODIC, MemoryImportance.MEDIUM, user_id='u1')
+        store.start_background_consolidation()
+        try:
+            deadline = time.monotonic() + 5
+            while len(store.memories) > 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            store.stop_background_consolidation(timeout=5)
+        assert len(store.memories) == 1
+        assert store.total_memories_consolidated == 1
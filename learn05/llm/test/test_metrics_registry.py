@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+指标注册表单元测试
+测试计数器、仪表、直方图的文本格式导出以及各收集器的接入
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from dataclasses import replace
+from datetime import datetime
+
+import pytest
+
+from llm.components.metrics_registry import MetricsRegistry, get_registry, render_family
+from llm.optimization.performance_monitor import (
+    MetricType, MonitorConfig, PerformanceMetric, PerformanceMonitor
+)
+from llm.unified_interface import LLMMetrics, LLMProvider, LLMResponse, LLMUsage
+
+
+class TestMetricsRegistry:
+    """测试指标注册表"""
+
+    def test_counter_and_gauge(self):
+        """测试计数器和仪表的导出格式"""
+        registry = MetricsRegistry()
+        requests = registry.counter("app_requests_total", "请求数", ("method",))
+        requests.labels("GET").inc()
+        requests.labels(method="GET").inc(2)
+        registry.gauge("app_in_progress", "处理中").set(3)
+
+        text = registry.render()
+        assert "# TYPE app_requests_total counter\n" in text
+        assert 'app_requests_total{method="GET"} 3\n' in text
+        assert "app_in_progress 3\n" in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        """测试直方图桶累计计数，边界值计入le相等的桶"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("app_latency_seconds", "耗时", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.labels("/a").observe(value)
+
+        text = registry.render()
+        assert 'app_latency_seconds_bucket{route="/a",le="0.1"} 2\n' in text
+        assert 'app_latency_seconds_bucket{route="/a",le="1"} 3\n' in text
+        assert 'app_latency_seconds_bucket{route="/a",le="+Inf"} 4\n' in text
+        assert 'app_latency_seconds_count{route="/a"} 4\n' in text
+        assert 'app_latency_seconds_sum{route="/a"} 5.65\n' in text
+
+    def test_label_escaping_and_reregistration(self):
+        """测试标签值转义以及重复注册"""
+        registry = MetricsRegistry()
+        counter = registry.counter("app_errors_total", "错误数", ("message",))
+        counter.labels('a "b"\n').inc()
+
+        assert 'app_errors_total{message="a \\"b\\"\\n"} 1' in registry.render()
+        assert registry.counter("app_errors_total", "错误数", ("message",)) is counter
+        with pytest.raises(ValueError):
+            registry.gauge("app_errors_total", "错误数")
+        with pytest.raises(ValueError):
+            counter.labels("a", "b")
+
+    def test_collector_callback(self):
+        """测试抓取时回调，回调出错时跳过"""
+        registry = MetricsRegistry()
+
+        def broken():
+            raise RuntimeError("boom")
+
+        def collector():
+            return render_family("app_cache_size", "gauge", "缓存条目数", [({'cache': 'l1'}, 10)])
+
+        registry.register_collector(broken)
+        registry.register_collector(collector)
+        assert 'app_cache_size{cache="l1"} 10\n' in registry.render()
+
+        registry.unregister_collector(collector)
+        assert "app_cache_size" not in registry.render()
+
+
+class TestCollectorWiring:
+    """测试已有收集器写入全局注册表"""
+
+    def test_llm_metrics_export(self):
+        """测试LLM请求计数、token和缓存命中，缓存响应不计入耗时和token"""
+        registry = get_registry()
+        counter = registry.get("llm_api_requests_total").labels("tongyi", "qwen-test", "success")
+        tokens = registry.get("llm_tokens_total").labels("tongyi", "qwen-test", "completion")
+        latency = registry.get("llm_request_duration_seconds").labels("tongyi", "qwen-test")
+        hits = registry.get("llm_response_cache_hits_total").labels("tongyi")
+        before = (counter.value, tokens.value, latency.count, hits.value)
+        response = LLMResponse(
+            content="ok", model="qwen-test", provider=LLMProvider.TONGYI,
+            usage=LLMUsage(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+            latency=0.3, success=True
+        )
+        metrics = LLMMetrics()
+        metrics.record_request(response)
+        assert (counter.value, tokens.value, latency.count, hits.value) == (
+            before[0] + 1, before[1] + 5, before[2] + 1, before[3])
+
+        metrics.record_request(replace(response, cached=True))
+        assert (counter.value, tokens.value, latency.count, hits.value) == (
+            before[0] + 2, before[1] + 5, before[2] + 1, before[3] + 1)
+        text = registry.render()
+        assert 'llm_tokens_total{provider="tongyi",model="qwen-test",type="completion"}' in text
+        assert 'llm_response_cache_hits_total{provider="tongyi"}' in text
+
+    def test_performance_monitor_prometheus(self):
+        """测试性能监控器导出计数器和仪表的最新值"""
+        monitor = PerformanceMonitor(MonitorConfig(enable_system_metrics=False))
+        for value in (1, 2):
+            monitor.custom_collector.add_metric(PerformanceMetric(
+                name="queue_depth", metric_type=MetricType.GAUGE, value=value,
+                timestamp=datetime.now(), labels={'queue': 'grading'}, description="队列长度"
+            ))
+        monitor.custom_collector.add_metric(PerformanceMetric(
+            name="step_time", metric_type=MetricType.TIMER, value=0.5, timestamp=datetime.now()
+        ))
+
+        text = monitor.export_metrics("prometheus")
+        assert "# TYPE queue_depth gauge\n" in text
+        assert 'queue_depth{queue="grading"} 2\n' in text
+        assert "step_time" not in text
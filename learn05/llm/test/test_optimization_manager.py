@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+优化管理器单元测试
+测试自动调参的实际调整、边界与冷却、审计日志和延迟回归回滚
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from llm.optimization.optimization_manager import OptimizationManager, OptimizationConfig
+
+
+@pytest.fixture
+def manager():
+    config = OptimizationConfig(
+        enable_monitoring=False,
+        enable_auto_optimization=False,
+        autotune_cooldown=0,
+        autotune_min_samples=5
+    )
+    manager = OptimizationManager(config)
+    yield manager
+    manager.shutdown()
+
+
+def feed_latencies(manager, seconds: float, count: int = 20):
+    for _ in range(count):
+        manager.record_latency(seconds)
+
+
+class TestAutoTuner:
+    """测试自动调参"""
+
+    def test_memory_pressure_tightens_cache(self, manager):
+        """测试内存紧张时缩短TTL并缩小缓存，审计日志记录前后指标"""
+        for i in range(1000):
+            manager.cache_manager.set(f"k{i}", i)
+        feed_latencies(manager, 0.1)
+
+        adjustments = manager.run_optimization_cycle({'memory_usage': 90})
+
+        assert {a.knob for a in adjustments} == {'cache_ttl', 'cache_max_size'}
+        assert manager.config.cache_ttl == 1800
+        assert manager.cache_manager.config.ttl_seconds == 1800
+        assert manager.cache_manager.config.max_size == 500
+        assert manager.cache_manager.size() == 500
+
+        record = manager.autotuner.get_audit_log()[0]
+        assert record['status'] == 'applied'
+        assert record['metrics_before']['memory_usage'] == 90
+        assert record['metrics_before']['p95_latency'] == pytest.approx(0.1)
+
+        # 下一轮延迟未变差，调整被保留并记录调整后的指标
+        feed_latencies(manager, 0.1)
+        manager.run_optimization_cycle({'memory_usage': 70})
+        record = manager.autotuner.get_audit_log()[0]
+        assert record['status'] == 'kept'
+        assert record['metrics_after']['memory_usage'] == 70
+
+    def test_rollback_on_latency_regression(self, manager):
+        """测试调整后p95延迟变差时自动回滚"""
+        feed_latencies(manager, 0.1)
+        adjustments = manager.run_optimization_cycle({'cpu_usage': 10, 'active_requests': 4, 'queue_length': 3,
+                                                      'cache_hit_rate': 0.9})
+        assert [(a.knob, a.old_value, a.new_value) for a in adjustments] == [('max_workers', 4, 8)]
+        assert manager.processor._executor._max_workers == 8
+
+        feed_latencies(manager, 0.5)
+        manager.run_optimization_cycle({'cpu_usage': 95, 'cache_hit_rate': 0.9})
+
+        assert manager.processor.config.max_workers == 4
+        assert manager.processor._executor._max_workers == 4
+        assert manager.autotuner.get_audit_log()[0]['status'] == 'rolled_back'
+        assert manager.autotuner.rollbacks == 1
+
+    def test_idle_workers_are_not_increased(self, manager):
+        """测试CPU空闲但没有排队任务、工作线程也没占满时不增加工作线程"""
+        feed_latencies(manager, 0.1)
+        for _ in range(3):
+            adjustments = manager.run_optimization_cycle({'cpu_usage': 10, 'active_requests': 1,
+                                                          'cache_hit_rate': 0.9})
+            assert 'max_workers' not in {a.knob for a in adjustments}
+        assert manager.processor.config.max_workers == 4
+
+    def test_bounds_cooldown_and_hysteresis(self, manager):
+        """测试调整受边界、冷却期和最小变化幅度限制"""
+        tuner = manager.autotuner
+        knob = tuner.knobs['cache_ttl']
+
+        # 单步最多翻倍且不超过上限
+        assert tuner.propose('cache_ttl', 100000).new_value == 7200
+        tuner._pending.clear()
+
+        # 冷却期内不再调整
+        knob.cooldown = 3600
+        assert tuner.propose('cache_ttl', 60) is None
+
+        # 变化太小视为抖动
+        knob.cooldown = 0
+        assert tuner.propose('cache_ttl', 7000) is None
+        assert manager.config.cache_ttl == 7200
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+性能监控单元测试
+测试列式指标环形缓冲区的查询、覆盖和保留期清理，以及高基数标签下驻留表和最新指标表有界
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from datetime import datetime, timedelta, timezone
+
+from llm.optimization.performance_monitor import (
+    MetricRingBuffer,
+    MetricType,
+    MonitorConfig,
+    PerformanceMetric,
+    SystemMetricsCollector,
+)
+
+START = datetime(2024, 3, 1, 8, 0, 0, 123456)
+
+
+def make_metric(index: int, name: str = None, value=None) -> PerformanceMetric:
+    return PerformanceMetric(
+        name=name or ("cpu" if index % 2 else "memory"),
+        metric_type=MetricType.GAUGE,
+        value=index if value is None else value,
+        timestamp=START + timedelta(seconds=index),
+        labels={'host': f"h{index % 3}"},
+        unit="%"
+    )
+
+
+class TestMetricRingBuffer:
+    """测试列式环形缓冲区"""
+
+    def test_round_trip_preserves_fields(self):
+        """测试取出的指标与写入时一致"""
+        buffer = MetricRingBuffer(10)
+        metrics = [make_metric(0), make_metric(1, value=0.25)]
+        for metric in metrics:
+            buffer.append(metric)
+
+        assert buffer.query() == metrics
+        assert isinstance(buffer.query()[0].value, int)
+
+    def test_time_and_name_queries(self):
+        """测试时间闭区间和名称过滤"""
+        buffer = MetricRingBuffer(100)
+        for index in range(20):
+            buffer.append(make_metric(index))
+
+        result = buffer.query(START + timedelta(seconds=5), START + timedelta(seconds=9), ['cpu'])
+        assert [m.value for m in result] == [5, 7, 9]
+        result = buffer.query(metric_names=['cpu', 'memory', 'disk'], end_time=START + timedelta(seconds=2))
+        assert [m.value for m in result] == [0, 1, 2]
+
+    def test_overwrite_and_retention(self):
+        """测试容量满时覆盖最旧指标，保留期清理只移动头指针"""
+        buffer = MetricRingBuffer(8)
+        for index in range(200):
+            buffer.append(make_metric(index))
+
+        assert len(buffer) == 8
+        assert [m.value for m in buffer.query(metric_names=['cpu'])] == [193, 195, 197, 199]
+
+        assert buffer.drop_before(START + timedelta(seconds=197)) == 5
+        assert [m.value for m in buffer.query()] == [197, 198, 199]
+
+    def test_out_of_order_timestamps(self):
+        """测试少量乱序写入时时间过滤仍然精确"""
+        buffer = MetricRingBuffer(10)
+        for index in (0, 2, 1, 3):
+            buffer.append(make_metric(index))
+
+        result = buffer.query(START + timedelta(seconds=1), START + timedelta(seconds=1))
+        assert [m.value for m in result] == [1]
+
+    def test_timezone_aware_timestamps(self):
+        """测试带时区的时间戳按实际时刻索引，可以和不带时区的本地时间混用查询"""
+        buffer = MetricRingBuffer(10)
+        utc_start = START.astimezone(timezone.utc)
+        for index in range(3):
+            metric = make_metric(index)
+            metric.timestamp = (utc_start + timedelta(seconds=index)).astimezone(timezone(timedelta(hours=-5)))
+            buffer.append(metric)
+        buffer.append(make_metric(3))
+
+        result = buffer.query(utc_start + timedelta(seconds=1), START + timedelta(seconds=3))
+        assert [m.value for m in result] == [1, 2, 3]
+        assert result[0].timestamp == utc_start + timedelta(seconds=1)
+        assert result[-1].timestamp.tzinfo is None
+        assert buffer.drop_before(utc_start + timedelta(seconds=2)) == 2
+
+    def test_high_cardinality_tables_are_bounded(self):
+        """测试每个指标标签都不同时驻留表有界，淘汰后的条目被回收且查询结果不变"""
+        buffer = MetricRingBuffer(8)
+        for index in range(5000):
+            metric = make_metric(index)
+            metric.labels = {'request_id': str(index)}
+            buffer.append(metric)
+
+        limit = 2 * len(buffer) + MetricRingBuffer._COMPACT_SLACK
+        assert len(buffer._series) <= limit and len(buffer._label_sets) <= limit
+        assert [m.labels['request_id'] for m in buffer.query()] == [str(index) for index in range(4992, 5000)]
+
+        buffer.drop_before(START + timedelta(seconds=4999))
+        buffer._compact_tables()
+        assert len(buffer._label_sets) == 1 and len(buffer._label_lookup) == 1
+        assert buffer.query()[0].labels == {'request_id': '4999'}
+
+        buffer.clear()
+        assert not buffer._series and not buffer._label_lookup
+
+
+class TestMetricCollector:
+    """测试指标收集器的最新指标表"""
+
+    def test_latest_metrics_follow_buffer(self):
+        """测试最新指标表不超过缓冲区容量，保留期清理后不再导出已淘汰的(名称, 标签)"""
+        collector = SystemMetricsCollector(MonitorConfig(max_metrics=4, retention_period=60))
+        for index in range(10):
+            metric = make_metric(index, name='latency')
+            metric.labels = {'user': str(index)}
+            collector.add_metric(metric)
+        assert [m.labels['user'] for m in collector.get_latest_metrics()] == ['6', '7', '8', '9']
+
+        now = datetime.now()
+        collector.add_metric(PerformanceMetric('latency', MetricType.GAUGE, 1, now, {'user': '9'}))
+        collector.add_metric(PerformanceMetric('latency', MetricType.GAUGE, 2, now, {'user': '10'}))
+        collector.clear_old_metrics()
+        assert [(m.labels['user'], m.value) for m in collector.get_latest_metrics()] == [('9', 1), ('10', 2)]
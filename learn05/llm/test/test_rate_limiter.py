@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+速率限制器单元测试
+测试异步速率限制器的FIFO等待、双桶限流和配额修正
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import asyncio
+import time
+
+import pytest
+
+from llm.components.rate_limiter import (
+    AsyncTokenBucketRateLimiter,
+    AsyncWindowRateLimiter,
+    AsyncLLMRateLimiter,
+    MultiLevelRateLimiter,
+    TokenBucketRateLimiter,
+    estimate_tokens,
+    get_preset_async_rate_limiter,
+    get_preset_llm_rate_limiter
+)
+from llm.providers.tongyi_client import TongyiLLMClient
+from llm.unified_interface import LLMRequest
+
+
+class TestAsyncTokenBucketRateLimiter:
+    """测试异步令牌桶"""
+
+    def test_waiting_does_not_block_event_loop(self):
+        """测试等待期间事件循环仍可调度其他任务"""
+        limiter = AsyncTokenBucketRateLimiter(rate=20, capacity=1)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await limiter.acquire()
+            await asyncio.gather(limiter.acquire(), ticker())
+
+        asyncio.run(run())
+
+        assert len(ticks) == 5
+
+    def test_waiters_served_in_fifo_order(self):
+        """测试等待者按到达顺序获得令牌"""
+        limiter = AsyncTokenBucketRateLimiter(rate=100, capacity=1)
+        order = []
+
+        async def worker(index):
+            await limiter.acquire()
+            order.append(index)
+
+        async def run():
+            await asyncio.gather(*(worker(i) for i in range(5)))
+
+        asyncio.run(run())
+
+        assert order == [0, 1, 2, 3, 4]
+
+    def test_oversized_request_allowed_when_bucket_full(self):
+        """测试超过容量的请求在桶满时放行并形成欠额"""
+        limiter = AsyncTokenBucketRateLimiter(rate=10, capacity=5)
+
+        asyncio.run(limiter.acquire(8))
+
+        assert limiter.tokens == pytest.approx(-3, abs=0.1)
+        assert not limiter.try_acquire()
+
+
+class TestAsyncWindowRateLimiter:
+    """测试异步滑动窗口"""
+
+    def test_window_limits_requests(self):
+        """测试窗口内超出上限后需要等待"""
+        limiter = AsyncWindowRateLimiter(window_size=0.1, max_requests=2)
+
+        async def run():
+            start = time.monotonic()
+            for _ in range(3):
+                await limiter.acquire()
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(run())
+
+        assert elapsed >= 0.09
+
+
+class TestAsyncLLMRateLimiter:
+    """测试RPM + TPM双桶限流"""
+
+    def test_reservation_corrected_by_actual_usage(self):
+        """测试按实际用量补扣和返还token配额"""
+        limiter = AsyncLLMRateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+
+        async def run():
+            reserved = await limiter.acquire(100)
+            limiter.record_usage(reserved, 300)
+            return reserved
+
+        reserved = asyncio.run(run())
+
+        assert reserved == 100
+        assert limiter.token_limiter.tokens == pytest.approx(700, abs=1)
+
+        limiter.record_usage(200, 50)
+        assert limiter.token_limiter.tokens == pytest.approx(850, abs=1)
+
+    def test_cancelled_token_wait_returns_request_slot(self):
+        """测试等待token配额时超时取消会归还请求配额"""
+        limiter = AsyncLLMRateLimiter(requests_per_minute=60, tokens_per_minute=100)
+
+        async def run():
+            await limiter.acquire(100)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(limiter.acquire(100), timeout=0.05)
+
+        asyncio.run(run())
+
+        assert limiter.request_limiter.tokens == pytest.approx(59, abs=0.5)
+
+    def test_failed_provider_call_returns_reservation(self):
+        """测试提供商调用失败时预留的token配额全部返还"""
+        client = TongyiLLMClient({'api_key': 'test', 'tokens_per_minute': 1000})
+
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError("上游不可用")
+
+        client._call_http_api = unavailable
+        client._call_openai_api = unavailable
+        request = LLMRequest(prompt="光合作用的条件" * 20)
+
+        async def run():
+            return [await client.generate(request) for _ in range(3)]
+
+        responses = asyncio.run(run())
+
+        assert not any(response.success for response in responses)
+        assert client.rate_limiter.token_limiter.tokens == pytest.approx(1000, abs=1)
+
+    def test_estimate_request_tokens(self):
+        """测试提示词token估算"""
+        assert estimate_tokens("光合作用") == 4
+        assert estimate_tokens("hello world!") == 3
+        tokens = AsyncLLMRateLimiter.estimate_request_tokens(
+            messages=[{"role": "user", "content": "你好"}]
+        )
+        assert tokens == 6
+
+    def test_presets(self):
+        """测试预定义配置生成异步限制器"""
+        limiter = get_preset_async_rate_limiter('tongyi_light')
+        assert isinstance(limiter, AsyncWindowRateLimiter)
+
+        llm_limiter = get_preset_llm_rate_limiter('openai_paid_tier', tokens_per_minute=90000)
+        assert llm_limiter.requests_per_minute == 1800
+        assert isinstance(llm_limiter.request_limiter, AsyncTokenBucketRateLimiter)
+
+
+class TestMultiLevelRateLimiter:
+    """测试多级速率限制器组合异步限制器"""
+
+    def test_wait_async_composes_sync_and_async_limiters(self):
+        """测试同时组合同步与异步限制器"""
+        async_limiter = AsyncTokenBucketRateLimiter(rate=10, capacity=2)
+        sync_limiter = TokenBucketRateLimiter(rate=10, capacity=2)
+        limiter = MultiLevelRateLimiter([async_limiter, sync_limiter])
+
+        async def run():
+            await limiter.wait_async()
+            await limiter.wait_async()
+
+        asyncio.run(run())
+
+        assert async_limiter.tokens < 1
+        assert not limiter.acquire()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+重试引擎单元测试
+测试重试预算、Retry-After、截止时间感知以及同步/异步装饰器
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import asyncio
+import time
+
+import pytest
+
+from llm.components.retry_handler import (
+    RetryBudget,
+    RetryEngine,
+    ExponentialBackoffRetryHandler,
+    get_retry_after,
+    retry_decorator
+)
+from llm.unified_client import RetryManager
+from llm.unified_interface import (
+    LLMResponse, LLMProvider, LLMUsage, LLMErrorType, LLMRateLimitException
+)
+
+
+class Flaky:
+    """前n次调用失败的函数"""
+
+    def __init__(self, failures: int, exception: Exception = None):
+        self.failures = failures
+        self.exception = exception or ConnectionError("boom")
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exception
+        return "ok"
+
+
+class TestRetryEngine:
+    """测试重试引擎"""
+
+    def test_retries_until_success(self):
+        """测试失败后重试直至成功"""
+        engine = RetryEngine(max_attempts=3, base_delay=0.001, max_delay=0.01)
+        func = Flaky(2)
+
+        assert asyncio.run(engine.execute(func)) == "ok"
+        assert func.calls == 3
+        stats = engine.get_stats()
+        assert stats['retries_attempted'] == 2
+        assert stats['retries_succeeded'] == 1
+
+    def test_budget_suppresses_retries(self):
+        """测试预算耗尽后不再重试"""
+        budget = RetryBudget(ratio=0.1, min_retries_per_second=0.0)
+        budget.tokens = 1.0
+        engine = RetryEngine(max_attempts=5, base_delay=0.001, max_delay=0.001, budget=budget)
+
+        async def run():
+            results = []
+            for _ in range(3):
+                try:
+                    results.append(await engine.execute(Flaky(10)))
+                except ConnectionError:
+                    results.append(None)
+            return results
+
+        assert asyncio.run(run()) == [None, None, None]
+        stats = engine.get_stats()
+        # 预算只够约一次重试，其余全部被抑制
+        assert stats['retries_attempted'] <= 2
+        assert stats['suppressed_by_budget'] == 3
+
+    def test_deadline_skips_retry(self):
+        """测试截止时间前无法完成的重试被跳过"""
+        engine = RetryEngine(max_attempts=3, base_delay=1.0, max_delay=1.0)
+        func = Flaky(1)
+        deadline = time.monotonic() + 0.1
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(engine.execute(func, deadline=deadline))
+        assert func.calls == 1
+        assert engine.get_stats()['suppressed_by_deadline'] == 1
+
+    def test_retry_after_is_honoured(self):
+        """测试等待时间不短于Retry-After"""
+        engine = RetryEngine(max_attempts=1, base_delay=0.001, max_delay=0.001)
+        func = Flaky(1, LLMRateLimitException("限流", retry_after=0.2))
+
+        start = time.monotonic()
+        assert asyncio.run(engine.execute(func)) == "ok"
+        assert time.monotonic() - start >= 0.2
+
+    def test_decorrelated_jitter_bounds(self):
+        """测试去相关抖动的取值范围"""
+        engine = RetryEngine(base_delay=0.5, max_delay=4.0)
+        previous = 0.5
+        for attempt in range(1, 20):
+            delay = engine.decorrelated_jitter(attempt, previous)
+            assert 0.5 <= delay <= min(4.0, max(0.5, previous * 3))
+            previous = delay
+
+    def test_parse_retry_after_header(self):
+        """测试解析Retry-After响应头"""
+        class Response:
+            headers = {'Retry-After': '3'}
+
+        class HTTPError(Exception):
+            response = Response()
+
+        assert get_retry_after(HTTPError()) == 3.0
+        assert get_retry_after(ValueError()) is None
+
+
+class TestRetryDecorator:
+    """测试重试装饰器"""
+
+    def test_async_function(self):
+        """测试装饰异步函数时不阻塞事件循环"""
+        handler = ExponentialBackoffRetryHandler(max_attempts=3, base_delay=0.001, max_delay=0.01)
+        func = Flaky(2, ConnectionError("boom"))
+        handler.retriable_exceptions = (ConnectionError,)
+
+        @retry_decorator(handler)
+        async def call():
+            return await func()
+
+        assert asyncio.iscoroutinefunction(call)
+        assert asyncio.run(call()) == "ok"
+        assert func.calls == 3
+
+    def test_sync_function(self):
+        """测试同步函数仍按原策略重试"""
+        handler = ExponentialBackoffRetryHandler(max_attempts=2, base_delay=0.001, max_delay=0.01)
+        handler.retriable_exceptions = (ConnectionError,)
+        calls = []
+
+        @retry_decorator(handler)
+        def call():
+            calls.append(1)
+            raise ConnectionError("boom")
+
+        with pytest.raises(ConnectionError):
+            call()
+        assert len(calls) == 3
+
+    def test_handler_changes_apply_to_engine(self):
+        """测试创建引擎后修改预算和延迟参数仍然生效，统计信息保留"""
+        handler = ExponentialBackoffRetryHandler(max_attempts=3, base_delay=0.001, max_delay=0.01)
+        handler.retriable_exceptions = (ConnectionError,)
+        assert asyncio.run(handler.retry_async(Flaky(1))) == "ok"
+
+        budget = RetryBudget(ratio=0.1, min_retries_per_second=0.0)
+        budget.tokens = 0.0
+        handler.budget = budget
+        handler.max_delay = 0.002
+        with pytest.raises(ConnectionError):
+            asyncio.run(handler.retry_async(Flaky(1)))
+
+        engine = handler.engine
+        assert engine.max_delay == 0.002 and engine.budget is budget
+        assert engine.get_stats()['retries_attempted'] == 1
+        assert engine.get_stats()['suppressed_by_budget'] == 1
+
+
+class TestRetryManager:
+    """测试统一客户端的重试管理器"""
+
+    def test_retries_retriable_error_response(self):
+        """测试限流错误响应会被重试，重试耗尽后返回最后的错误响应"""
+        manager = RetryManager(max_retries=2, base_delay=0.001, max_delay=0.001)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            return LLMResponse(
+                content="", model="m", provider=LLMProvider.OPENAI, usage=LLMUsage(),
+                latency=0.0, success=False, error="限流", error_type=LLMErrorType.RATE_LIMIT
+            )
+
+        response = asyncio.run(manager.execute_with_retry(call))
+        assert not response.success
+        assert len(calls) == 3
+        assert manager.get_stats()['retries_attempted'] == 2
+
+    def test_exponential_base_is_deprecated(self):
+        """测试RetryManager的exponential_base参数已废弃"""
+        with pytest.warns(DeprecationWarning):
+            RetryManager(exponential_base=3.0)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+共享指标段单元测试
+测试多进程写入后的汇总抓取，以及已退出进程槽位的回收
+"""
+
+import sys
+import os
+import multiprocessing
+import uuid
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from llm.components.metrics_registry import MetricsRegistry, histogram_quantile
+from llm.components.shared_metrics import SharedMetricsSegment
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, 'fork') or sys.platform == 'win32', reason="需要fork和fcntl"
+)
+
+
+@pytest.fixture
+def shared_registry():
+    registry = MetricsRegistry()
+    segment = SharedMetricsSegment(f"llm_test_{uuid.uuid4().hex[:12]}", slots=4,
+                                   slot_entries=64, slot_cells=512)
+    registry.enable_shared(segment)
+    yield registry, segment
+    registry.disable_shared()
+    segment.unlink()
+
+
+def _run_worker(target):
+    process = multiprocessing.get_context('fork').Process(target=target)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+class TestSharedMetrics:
+    """测试多进程共享指标"""
+
+    def test_fleet_aggregation(self, shared_registry):
+        """测试子进程写入的计数器和直方图并入抓取结果"""
+        registry, segment = shared_registry
+        requests = registry.counter("app_requests_total", "请求数", ("status",))
+        latency = registry.histogram("app_latency_seconds", "耗时", buckets=(0.1, 1.0))
+        requests.labels("200").inc(2)
+        latency.observe(0.05)
+
+        def worker():
+            requests.labels("200").inc(3)
+            requests.labels("500").inc()
+            latency.observe(0.5)
+            # 正常退出时释放槽位，计数并入归档槽
+            registry.disable_shared()
+            os._exit(0)
+
+        _run_worker(worker)
+
+        assert registry.values("app_requests_total") == {("200",): [5.0], ("500",): [1.0]}
+        text = registry.render()
+        assert 'app_requests_total{status="200"} 5\n' in text
+        assert 'app_requests_total{status="500"} 1\n' in text
+        assert 'app_latency_seconds_bucket{le="1"} 2\n' in text
+        assert "app_latency_seconds_count 2\n" in text
+        # 本进程自身的值不受影响
+        assert requests.labels("200").value == 2
+        assert segment.live_workers() == 1
+
+    def test_dead_worker_reclaimed(self, shared_registry):
+        """测试崩溃进程的槽位被回收：计数器保留，仪表丢弃"""
+        registry, segment = shared_registry
+        jobs = registry.counter("app_jobs_total", "任务数")
+        in_progress = registry.gauge("app_in_progress", "处理中")
+        in_progress.set(1)
+
+        def worker():
+            jobs.inc(4)
+            in_progress.set(7)
+            # 不释放槽位直接退出，模拟worker崩溃
+            os._exit(0)
+
+        _run_worker(worker)
+
+        assert registry.values("app_jobs_total") == {(): [4.0]}
+        assert registry.values("app_in_progress") == {(str(os.getpid()),): [1.0]}
+        assert segment.live_workers() == 1
+
+        # 回收后的槽位可以再次分配
+        for _ in range(5):
+            _run_worker(worker)
+        assert registry.values("app_jobs_total") == {(): [24.0]}
+
+    def test_gauges_exported_per_worker(self, shared_registry):
+        """测试仪表不跨进程求和，每个存活worker带pid标签各导出一条"""
+        registry, segment = shared_registry
+        pool_size = registry.gauge("app_pool_size", "连接池大小", ("pool",))
+        pool_size.labels("db").set(4)
+        context = multiprocessing.get_context('fork')
+        ready, done = context.Event(), context.Event()
+
+        def worker():
+            pool_size.labels("db").set(6)
+            ready.set()
+            done.wait(30)
+            os._exit(0)
+
+        process = context.Process(target=worker)
+        process.start()
+        try:
+            assert ready.wait(30)
+            assert registry.values("app_pool_size") == {
+                ("db", str(os.getpid())): [4.0], ("db", str(process.pid)): [6.0]}
+            text = registry.render()
+            assert f'app_pool_size{{pool="db",pid="{os.getpid()}"}} 4\n' in text
+            assert f'app_pool_size{{pool="db",pid="{process.pid}"}} 6\n' in text
+        finally:
+            done.set()
+            process.join(30)
+
+        text = registry.render()
+        assert f'pid="{process.pid}"' not in text
+
+    def test_close_releases_cell_views(self):
+        """测试断开共享内存前释放交出的单元格视图，迁回本进程的指标保留数值"""
+        registry = MetricsRegistry()
+        segment = SharedMetricsSegment(f"llm_test_{uuid.uuid4().hex[:12]}", slots=2,
+                                       slot_entries=8, slot_cells=64)
+        try:
+            registry.enable_shared(segment)
+            latency = registry.histogram("app_latency_seconds", "耗时", ("route",), buckets=(0.1, 1.0))
+            latency.labels("/chat").observe(0.5)
+            view = segment.allocate("app_orphan_total", (), 0, 1)
+
+            registry.disable_shared()
+            with pytest.raises(ValueError):
+                view.tolist()
+            latency.labels("/chat").observe(0.05)
+            assert latency.labels("/chat").count == 2
+        finally:
+            segment.unlink()
+
+    def test_histogram_quantile(self):
+        """测试由桶计数估算分位数"""
+        bounds = (1.0, 2.0, float('inf'))
+        assert histogram_quantile(0.5, bounds, [2, 2, 0, 6.0, 4]) == 1.0
+        assert histogram_quantile(0.75, bounds, [2, 2, 0, 6.0, 4]) == 1.5
+        assert histogram_quantile(0.5, bounds, [0, 0, 0, 0.0, 0]) == 0.0
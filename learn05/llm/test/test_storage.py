@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+上下文持久化存储单元测试
+测试SQLite后端的延迟写入、全文检索，以及记忆、上下文和会话重启后的懒加载
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from llm.context.context_manager import ContextManager, ContextType, MessageRole
+from llm.context.memory_store import MemoryImportance, MemoryStore, MemoryType
+from llm.context.session_manager import SessionManager, SessionStatus, UserRole
+from llm.context.storage import SQLiteStorage
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'context.db')
+
+
+def open_storage(path: str) -> SQLiteStorage:
+    # 写入间隔足够长，由测试显式flush/close
+    return SQLiteStorage(path, flush_interval=60)
+
+
+class TestSQLiteStorage:
+    """测试SQLite存储后端"""
+
+    def test_pending_writes_are_visible_before_flush(self, db_path):
+        """测试待写队列中的记录可以直接读到，flush后写入数据库"""
+        storage = open_storage(db_path)
+        manager = ContextManager({'strategy': 'sliding_window'}, storage=storage)
+        context = manager.create_context('s1', ContextType.TUTORING, user_info={'user_id': 'u1'})
+        context.add_message(MessageRole.USER, '什么是勾股定理')
+        manager._persist(context)
+
+        assert storage.get('context', 's1')[1] == 'u1'
+        assert storage.count('context') == 1
+        assert storage.flush() == 1
+        assert storage.flush() == 0
+
+        storage.delete('context', 's1')
+        assert storage.get('context', 's1') is None
+        assert storage.count('context') == 0
+        storage.close()
+
+    def test_memory_full_text_search(self, db_path):
+        """测试记忆正文写入FTS5后按中文二元组检索"""
+        storage = open_storage(db_path)
+        store = MemoryStore({'auto_decay': False}, storage=storage)
+        store.add_memory('学生掌握了光合作用的原理', MemoryType.SEMANTIC, MemoryImportance.HIGH, user_id='u1')
+        store.add_memory('欧姆定律计算粗心', MemoryType.EPISODIC, MemoryImportance.MEDIUM, user_id='u2')
+        storage.flush()
+
+        assert storage.search_memories('光合作用') and storage.search_memories('光合作用')[0][1] == 'u1'
+        assert [owner for _, owner in storage.search_memories('欧姆')] == ['u2']
+        assert storage.search_memories('化学方程式') == []
+        storage.close()
+
+
+class TestLazyLoading:
+    """测试重启后从存储后端懒加载"""
+
+    def test_memories_reload_per_user(self, db_path):
+        """测试记忆按用户懒加载，未指定用户的检索通过FTS5找到所属用户"""
+        storage = open_storage(db_path)
+        store = MemoryStore({'auto_decay': False}, storage=storage)
+        first = store.add_memory('一元二次方程求根公式掌握较好', MemoryType.SEMANTIC,
+                                 MemoryImportance.HIGH, user_id='u1', tags=['数学'])
+        store.add_memory('文言文翻译需要巩固', MemoryType.EPISODIC, MemoryImportance.MEDIUM, user_id='u2')
+        store.update_memory(first, tags=['数学', '方程'])
+        storage.close()
+
+        storage = open_storage(db_path)
+        store = MemoryStore({'auto_decay': False}, storage=storage)
+        assert store.memories == {}
+        assert store.get_memory_statistics()['stored_memories'] == 2
+
+        assert [memory.content for memory in store.get_user_memories('u2')] == ['文言文翻译需要巩固']
+        assert first not in store.memories
+
+        results = store.search_memories('求根公式')
+        assert [memory.memory_id for memory, _ in results] == [first]
+        assert store.memories[first].tags == ['数学', '方程']
+        assert store.get_memories_by_tags(['方程'])[0].memory_id == first
+
+        assert store.remove_memory(first)
+        storage.close()
+        storage = open_storage(db_path)
+        assert storage.get('memory', first) is None
+        assert storage.count('memory') == 1
+        storage.close()
+
+    def test_contexts_reload_and_evict(self, db_path):
+        """测试上下文超出常驻上限时淘汰，访问时重新加载"""
+        storage = open_storage(db_path)
+        manager = ContextManager({'max_resident_contexts': 2}, storage=storage)
+        for index in range(3):
+            manager.create_context(f's{index}', ContextType.LEARNING)
+            manager.add_message(f's{index}', MessageRole.USER, f'第{index}个问题')
+        assert list(manager.contexts) == ['s1', 's2']
+
+        context = manager.get_context('s0')
+        assert [message.content for message in context.messages] == ['第0个问题']
+        assert list(manager.contexts) == ['s2', 's0']
+        assert sorted(manager.list_active_sessions()) == ['s0', 's1', 's2']
+        storage.close()
+
+        storage = open_storage(db_path)
+        manager = ContextManager({}, storage=storage)
+        assert manager.add_message('s1', MessageRole.ASSISTANT, '回答')
+        assert [message.content for message in manager.get_context('s1').messages] == ['第1个问题', '回答']
+        assert manager.get_context_statistics()['stored_contexts'] == 3
+        assert manager.remove_context('s2')
+        assert manager.get_context('s2') is None
+        storage.close()
+
+    def test_sessions_reload_by_user(self, db_path):
+        """测试会话按用户索引加载，终止状态和会话数限制在重启后仍然生效"""
+        storage = open_storage(db_path)
+        manager = SessionManager({'max_sessions_per_user': 2}, storage=storage)
+        first = manager.create_session('u1', UserRole.STUDENT)
+        second = manager.create_session('u1', UserRole.STUDENT)
+        manager.add_context_type(second, 'tutoring')
+        other = manager.create_session('u2', UserRole.TEACHER)
+        manager.terminate_session(other)
+        storage.close()
+
+        storage = open_storage(db_path)
+        manager = SessionManager({'max_sessions_per_user': 2}, storage=storage)
+        assert manager.sessions == {}
+        assert {session.session_id for session in manager.get_user_sessions('u1')} == {first, second}
+        assert manager.get_session_by_user_and_context('u1', 'tutoring').session_id == second
+        assert manager.get_user_sessions('u2') == []
+        assert manager.get_session(other).status == SessionStatus.TERMINATED
+
+        # 第三个会话挤掉最久未活动的first
+        manager.get_session(second)
+        third = manager.create_session('u1', UserRole.STUDENT)
+        assert {session.session_id for session in manager.get_user_sessions('u1')} == {second, third}
+        assert storage.get('session', first) is None
+        storage.close()
+
+    def test_exports_and_statistics_include_stored_records(self, db_path, tmp_path):
+        """测试重启后导出、活跃列表和统计包括未加载到内存的记录"""
+        storage = open_storage(db_path)
+        store = MemoryStore({'auto_decay': False}, storage=storage)
+        contexts = ContextManager({}, storage=storage)
+        sessions = SessionManager({}, storage=storage)
+        memory_ids = [store.add_memory(f'第{index}条学习记录', MemoryType.EPISODIC,
+                                       MemoryImportance.MEDIUM, user_id=f'u{index}') for index in range(2)]
+        for index in range(2):
+            contexts.create_context(f's{index}', ContextType.LEARNING)
+            contexts.add_message(f's{index}', MessageRole.USER, f'第{index}个问题')
+        session_ids = {sessions.create_session(f'u{index}', UserRole.STUDENT) for index in range(2)}
+        storage.close()
+
+        storage = open_storage(db_path)
+        store = MemoryStore({'auto_decay': False}, storage=storage)
+        contexts = ContextManager({}, storage=storage)
+        sessions = SessionManager({}, storage=storage)
+
+        store.export_memories(str(tmp_path / 'u1.json'), user_id='u1')
+        store.export_memories(str(tmp_path / 'memories.json'))
+        with open(tmp_path / 'u1.json', encoding='utf-8') as f:
+            assert list(json.load(f)['memories']) == [memory_ids[1]]
+        with open(tmp_path / 'memories.json', encoding='utf-8') as f:
+            assert set(json.load(f)['memories']) == set(memory_ids)
+
+        contexts.save_contexts_to_file(str(tmp_path / 'contexts.json'))
+        with open(tmp_path / 'contexts.json', encoding='utf-8') as f:
+            assert set(json.load(f)['contexts']) == {'s0', 's1'}
+        statistics = contexts.get_context_statistics()
+        assert statistics['total_contexts'] == 2
+        assert statistics['total_messages'] == 2
+        assert contexts.contexts == {}
+
+        assert {session.session_id for session in sessions.get_active_sessions()} == session_ids
+        statistics = sessions.get_session_statistics()
+        assert statistics['total_sessions'] == 2
+        assert statistics['active_sessions'] == 2
+        assert statistics['total_users'] == 2
+        sessions.export_sessions(str(tmp_path / 'sessions.json'))
+        with open(tmp_path / 'sessions.json', encoding='utf-8') as f:
+            assert set(json.load(f)['sessions']) == session_ids
+        assert sessions.sessions == {}
+        storage.close()
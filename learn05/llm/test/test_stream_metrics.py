@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+流式指标单元测试
+测试首token耗时、分片间隔、输出速率的记录以及统一客户端和性能监控器的接入
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import asyncio
+import time
+from typing import AsyncIterator, List
+
+from llm.components.stream_metrics import (
+    OUTCOME_CANCELLED, SCOPE_CLIENT, SCOPE_PROVIDER,
+    StreamMetricsTracker, StreamTimer, get_stream_tracker
+)
+from llm.unified_interface import LLMProvider, LLMRequest, LLMResponse, UnifiedLLMInterface
+from llm.unified_client import UnifiedLLMClient
+
+
+class SlowStartClient(UnifiedLLMInterface):
+    """首个分片前有固定等待的模拟客户端"""
+
+    def __init__(self, first_token_delay: float):
+        super().__init__(LLMProvider.TONGYI, {'default_model': 'stream-test-model'})
+        self.first_token_delay = first_token_delay
+
+    async def generate(self, request: LLMRequest) -> LLMResponse:
+        raise NotImplementedError
+
+    async def chat(self, request: LLMRequest) -> LLMResponse:
+        raise NotImplementedError
+
+    async def stream_generate(self, request: LLMRequest) -> AsyncIterator[str]:
+        await asyncio.sleep(self.first_token_delay)
+        for chunk in ["光合作用", "是植物", "利用光能"]:
+            yield chunk
+            await asyncio.sleep(0.01)
+
+    async def stream_chat(self, request: LLMRequest) -> AsyncIterator[str]:
+        async for chunk in self.stream_generate(request):
+            yield chunk
+
+    def get_available_models(self) -> List[str]:
+        return ['stream-test-model']
+
+    async def health_check(self) -> bool:
+        return True
+
+
+class TestStreamTimer:
+    """测试流式计时器"""
+
+    def test_records_ttft_gaps_and_rate(self):
+        """测试首token耗时、分片间隔和输出速率"""
+        tracker = StreamMetricsTracker()
+        records = []
+
+        class Listener:
+            def on_finish(self, record):
+                records.append(record)
+
+        listener = Listener()
+        tracker.add_listener(listener.on_finish)
+
+        timer = StreamTimer('tongyi', 'qwen-plus', SCOPE_PROVIDER, tracker=tracker)
+        time.sleep(0.02)
+        for _ in range(3):
+            timer.on_chunk(10)
+            time.sleep(0.01)
+        record = timer.finish()
+
+        assert timer.finish() is None
+        assert records == [record]
+        assert record.time_to_first_token >= 0.02
+        assert record.chunks == 3 and record.output_tokens == 30
+        assert 0 < record.tokens_per_second <= 30 / 0.02
+
+        stats = tracker.get_stats(SCOPE_PROVIDER)['tongyi/qwen-plus']
+        assert stats['time_to_first_token']['count'] == 1
+        assert stats['inter_chunk']['count'] == 2
+        assert stats['outcomes']['completed'] == 1
+        assert tracker.get_stats(SCOPE_CLIENT) == {}
+
+    def test_cancelled_stream_has_no_duration(self):
+        """测试取消的流只计数，不计入耗时分布"""
+        tracker = StreamMetricsTracker()
+        timer = StreamTimer('openai', 'gpt-4o', tracker=tracker)
+        timer.on_chunk(5)
+        timer.finish(OUTCOME_CANCELLED)
+
+        stats = tracker.get_stats()['openai/gpt-4o']
+        assert stats['outcomes']['cancelled'] == 1
+        assert stats['duration']['count'] == 0
+
+
+class TestStreamingIntegration:
+    """测试统一客户端与性能监控器的接入"""
+
+    def test_client_stream_feeds_monitor(self):
+        """测试统一客户端记录端到端首token耗时，并触发慢首token告警"""
+        from llm.monitoring import PerformanceMonitor
+
+        get_stream_tracker().clear()
+        monitor = PerformanceMonitor(slow_first_token_threshold=0.05)
+        client = UnifiedLLMClient({'cache_enabled': False})
+        client.register_client(LLMProvider.TONGYI, SlowStartClient(first_token_delay=0.1))
+
+        async def run():
+            request = LLMRequest(prompt="什么是光合作用", model='stream-test-model')
+            return [chunk async for chunk in client.stream_chat(request)]
+
+        assert len(asyncio.run(run())) == 3
+
+        health = monitor.get_health_status()
+        streaming = health['streaming']
+        assert streaming['models']['tongyi/stream-test-model']['completed'] == 1
+        assert streaming['time_to_first_token_p95'] >= 0.1
+        assert health['health_score'] < 100
+        assert [alert['type'] for alert in monitor.alerts] == ['slow_first_token']
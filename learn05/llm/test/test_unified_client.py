@@ -0,0 +1,578 @@
+# -*- coding: utf-8 -*-
+"""
+统一LLM客户端单元测试
+测试UnifiedLLMClient的缓存、请求合并等功能
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import asyncio
+import subprocess
+from typing import AsyncIterator, List
+
+import pytest
+
+from llm.unified_interface import (
+    UnifiedLLMInterface, LLMRequest, LLMResponse, LLMProvider, LLMUsage,
+    LLMException, LLMTimeoutException, global_metrics
+)
+from llm.unified_client import UnifiedLLMClient, AdaptiveConcurrencyLimiter
+from llm.request_deadline import DeadlineExceededError, deadline_scope, effective_timeout
+
+
+class FakeLLMClient(UnifiedLLMInterface):
+    """可控延迟的模拟LLM客户端"""
+
+    def __init__(self, delay: float = 0.05, content: str = "模拟响应"):
+        super().__init__(LLMProvider.TONGYI, {'default_model': 'fake-model'})
+        self.delay = delay
+        self.content = content
+        self.call_count = 0
+
+    async def generate(self, request: LLMRequest) -> LLMResponse:
+        self.call_count += 1
+        await asyncio.sleep(self.delay)
+        return self._create_success_response(
+            content=self.content,
+            model=request.model or self.default_model,
+            usage=LLMUsage(prompt_tokens=5, completion_tokens=5, total_tokens=10),
+            latency=self.delay
+        )
+
+    async def chat(self, request: LLMRequest) -> LLMResponse:
+        return await self.generate(request)
+
+    async def stream_generate(self, request: LLMRequest) -> AsyncIterator[str]:
+        self.call_count += 1
+        for chunk in ["模拟", "响应"]:
+            await asyncio.sleep(self.delay / 2)
+            yield chunk
+
+    async def stream_chat(self, request: LLMRequest) -> AsyncIterator[str]:
+        async for chunk in self.stream_generate(request):
+            yield chunk
+
+    def get_available_models(self) -> List[str]:
+        return ['fake-model']
+
+    async def health_check(self) -> bool:
+        return True
+
+
+class FailingModelClient(FakeLLMClient):
+    """对指定模型返回错误响应的模拟客户端，记录收到的模型"""
+
+    def __init__(self, failing_models=(), **kwargs):
+        super().__init__(**kwargs)
+        self.failing_models = set(failing_models)
+        self.models = []
+
+    async def generate(self, request: LLMRequest) -> LLMResponse:
+        self.models.append(request.model)
+        if request.model in self.failing_models:
+            self.call_count += 1
+            await asyncio.sleep(self.delay)
+            return self._create_error_response(request, LLMException("模型不可用"), self.delay)
+        return await super().generate(request)
+
+
+class TestRequestCoalescing:
+    """测试请求合并（single-flight）"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        global_metrics.reset()
+        self.fake_client = FakeLLMClient()
+        self.client = UnifiedLLMClient({'cache_enabled': False})
+        self.client.register_client(LLMProvider.TONGYI, self.fake_client)
+
+    def test_concurrent_identical_requests_share_upstream_call(self):
+        """测试并发的相同请求只调用一次上游"""
+        async def run():
+            requests = [LLMRequest(prompt="什么是光合作用") for _ in range(20)]
+            return await asyncio.gather(*(self.client.generate(r) for r in requests))
+
+        responses = asyncio.run(run())
+
+        assert self.fake_client.call_count == 1
+        assert all(r.success and r.content == "模拟响应" for r in responses)
+        assert sum(1 for r in responses if not r.cached) == 1
+        assert global_metrics.get_stats()['coalesced_hits'] == 19
+        assert self.client._inflight_requests == {}
+
+    def test_different_requests_are_not_coalesced(self):
+        """测试不同请求不会被合并"""
+        async def run():
+            return await asyncio.gather(
+                self.client.generate(LLMRequest(prompt="问题一")),
+                self.client.generate(LLMRequest(prompt="问题二"))
+            )
+
+        asyncio.run(run())
+
+        assert self.fake_client.call_count == 2
+        assert global_metrics.get_stats()['coalesced_hits'] == 0
+
+    def test_coalescing_can_be_disabled(self):
+        """测试关闭请求合并"""
+        client = UnifiedLLMClient({'cache_enabled': False, 'request_coalescing': False})
+        client.register_client(LLMProvider.TONGYI, self.fake_client)
+
+        async def run():
+            return await asyncio.gather(
+                *(client.generate(LLMRequest(prompt="相同问题")) for _ in range(3))
+            )
+
+        asyncio.run(run())
+
+        assert self.fake_client.call_count == 3
+
+    def test_follower_retries_when_leader_cancelled(self):
+        """测试发起方被取消时等待方重新执行"""
+        async def run():
+            leader = asyncio.create_task(self.client.generate(LLMRequest(prompt="取消测试")))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(self.client.generate(LLMRequest(prompt="取消测试")))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        response = asyncio.run(run())
+
+        assert response.success
+        assert self.fake_client.call_count == 2
+
+
+class TestStreamCache:
+    """测试流式响应的缓存与回放"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        global_metrics.reset()
+        self.fake_client = FakeLLMClient()
+        self.client = UnifiedLLMClient()
+        self.client.register_client(LLMProvider.TONGYI, self.fake_client)
+
+    async def _collect(self, iterator) -> List[str]:
+        return [chunk async for chunk in iterator]
+
+    def test_completed_stream_is_replayed_from_cache(self):
+        """测试完整结束的流被缓存并按分片回放"""
+        request = LLMRequest(messages=[{"role": "user", "content": "制定学习计划"}])
+
+        async def run():
+            first = await self._collect(self.client.stream_chat(request))
+            second = await self._collect(self.client.stream_chat(request))
+            cached = await self.client.cache.get_cached_response(request.get_cache_key())
+            return first, second, cached
+
+        first, second, cached = asyncio.run(run())
+
+        assert first == second == ["模拟", "响应"]
+        assert self.fake_client.call_count == 1
+        # 缓存只保存分片偏移，用量按文本估算
+        assert cached.metadata['stream_replay']['chunk_offsets'] == [2, 4]
+        assert 'stream_chunks' not in cached.metadata
+        assert cached.usage.completion_tokens == 4
+        assert cached.usage.total_tokens > cached.usage.completion_tokens
+
+    def test_stream_cache_shared_with_non_streaming_path(self):
+        """测试流式缓存与非流式请求共用缓存键"""
+        request = LLMRequest(prompt="什么是光合作用")
+
+        async def run():
+            await self._collect(self.client.stream_generate(request))
+            return await self.client.generate(request)
+
+        response = asyncio.run(run())
+
+        assert response.cached
+        assert response.content == "模拟响应"
+        assert 'stream_replay' not in (response.metadata or {})
+        assert self.fake_client.call_count == 1
+
+    def test_partial_stream_is_not_cached(self):
+        """测试提前关闭的流不会被缓存"""
+        request = LLMRequest(prompt="中途断开")
+
+        async def run():
+            stream = self.client.stream_generate(request)
+            async for _ in stream:
+                break
+            await stream.aclose()
+            return await self._collect(self.client.stream_generate(request))
+
+        chunks = asyncio.run(run())
+
+        assert chunks == ["模拟", "响应"]
+        assert self.fake_client.call_count == 2
+
+    def test_cancelled_stream_closes_upstream_and_releases_slot(self):
+        """测试调用方断开后上游流被关闭、并发名额归还并记录节省的token"""
+        closed = []
+
+        async def upstream(request):
+            try:
+                for chunk in ["第一段", "第二段", "第三段"]:
+                    await asyncio.sleep(0.01)
+                    yield chunk
+            finally:
+                closed.append(True)
+
+        self.fake_client.stream_generate = upstream
+        request = LLMRequest(prompt="学生中途关闭页面", max_tokens=100)
+
+        async def run():
+            stream = self.client.stream_generate(request)
+            async for _ in stream:
+                break
+            await stream.aclose()
+
+        asyncio.run(run())
+
+        stats = global_metrics.get_stats()
+        assert closed == [True]
+        assert self.client.concurrency_limiters[LLMProvider.TONGYI].in_flight == 0
+        assert stats['cancelled_streams'] == 1
+        assert 0 < stats['cancelled_stream_tokens_saved'] < 100
+
+
+class TestSemanticCache:
+    """测试语义近似缓存"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        global_metrics.reset()
+        self.fake_client = FakeLLMClient()
+        self.client = UnifiedLLMClient({'semantic_cache_enabled': True})
+        self.client.register_client(LLMProvider.TONGYI, self.fake_client)
+
+    def test_near_duplicate_prompt_served_from_semantic_cache(self):
+        """测试近似重复的低温度提示词命中语义缓存"""
+        async def run():
+            await self.client.generate(LLMRequest(prompt="什么是光合作用", temperature=0))
+            return await self.client.generate(LLMRequest(prompt="光合作用是什么？", temperature=0))
+
+        response = asyncio.run(run())
+
+        assert response.cached
+        assert response.metadata['semantic_cache_hit']
+        assert self.fake_client.call_count == 1
+        assert self.client.semantic_cache.get_stats()['hits'] == 1
+
+    def test_different_question_misses(self):
+        """测试不同问题不会误命中"""
+        async def run():
+            await self.client.generate(LLMRequest(prompt="光合作用是什么", temperature=0))
+            return await self.client.generate(LLMRequest(prompt="呼吸作用是什么", temperature=0))
+
+        response = asyncio.run(run())
+
+        assert not response.cached
+        assert self.fake_client.call_count == 2
+
+    def test_high_temperature_requests_bypass_semantic_cache(self):
+        """测试高温度请求不使用语义缓存"""
+        async def run():
+            await self.client.generate(LLMRequest(prompt="什么是光合作用", temperature=0.7))
+            return await self.client.generate(LLMRequest(prompt="光合作用是什么？", temperature=0.7))
+
+        asyncio.run(run())
+
+        assert self.fake_client.call_count == 2
+
+    def test_template_threshold_and_false_positive_report(self):
+        """测试模板阈值与误命中上报"""
+        self.client.semantic_cache.template_thresholds['strict'] = 0.99
+        metadata = {'template': 'strict'}
+
+        async def run():
+            await self.client.generate(LLMRequest(prompt="什么是光合作用", temperature=0, metadata=metadata))
+            strict = await self.client.generate(LLMRequest(prompt="光合作用是什么？", temperature=0, metadata=metadata))
+            await self.client.generate(LLMRequest(prompt="什么是呼吸作用", temperature=0))
+            loose = await self.client.generate(LLMRequest(prompt="呼吸作用是什么？", temperature=0))
+            return strict, loose
+
+        strict, loose = asyncio.run(run())
+
+        assert not strict.cached
+        assert loose.metadata['semantic_cache_hit']
+        self.client.report_semantic_false_positive(loose)
+        stats = self.client.semantic_cache.get_stats()
+        assert stats['false_positives'] == 1
+        assert stats['templates']['strict']['misses'] == 2
+
+    def test_embedding_matrix_reuses_rows(self):
+        """测试向量模式在预分配矩阵上检索，淘汰的行被复用，不同作用域互不匹配"""
+        def embed(text):
+            return [text.count(char) for char in "光合呼吸作用是什么"]
+
+        cache = UnifiedLLMClient({'semantic_cache_enabled': True, 'semantic_cache_max_entries': 2,
+                                  'semantic_embedding_function': embed}).semantic_cache
+        response = self.fake_client._create_success_response("答案", "fake-model", LLMUsage(), 0.0)
+        for prompt in ["什么是光合作用", "什么是呼吸作用", "光合作用是什么"]:
+            cache.add(LLMRequest(prompt=prompt, temperature=0), response)
+
+        assert cache.get_stats()['entries'] == 2
+        assert cache._vectors.shape[0] == 3 and cache._used_rows == 3
+        hit = cache.lookup(LLMRequest(prompt="光合作用是什么？", temperature=0))
+        assert hit.metadata['similarity'] == pytest.approx(1.0)
+        assert cache.lookup(LLMRequest(prompt="光合作用是什么？", temperature=0, max_tokens=10)) is None
+
+        cache.add(LLMRequest(prompt="呼吸作用是什么", temperature=0), response)
+        assert cache._used_rows == 3
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = self.client.semantic_cache
+        cache.max_entries = 2
+        response = self.fake_client._create_success_response("答案", "fake-model", LLMUsage(), 0.0)
+        for prompt in ["第一个问题", "第二个问题", "第三个问题"]:
+            cache.add(LLMRequest(prompt=prompt, temperature=0), response)
+
+        assert cache.get_stats()['entries'] == 2
+        assert cache.get_stats()['evictions'] == 1
+        assert cache.lookup(LLMRequest(prompt="第一个问题", temperature=0)) is None
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """测试自适应并发限制器"""
+
+    def test_limit_grows_when_saturated_and_halves_on_rate_limit(self):
+        """测试满载成功时上限增长，限流时乘性减小"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=10)
+
+        async def run():
+            for _ in range(20):
+                await limiter.acquire()
+                await limiter.acquire()
+                limiter.release(latency=0.1)
+                limiter.release(latency=0.1)
+            grown = limiter.limit
+            await limiter.acquire()
+            limiter.release(rate_limited=True)
+            return grown
+
+        grown = asyncio.run(run())
+
+        assert grown > 2
+        assert limiter.limit == grown * 0.5
+        assert limiter.get_stats()['rate_limited'] == 1
+
+    def test_waiters_are_admitted_in_fifo_order(self):
+        """测试等待者按FIFO顺序获得名额"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+        order = []
+
+        async def worker(index):
+            await limiter.acquire()
+            order.append(index)
+            await asyncio.sleep(0.01)
+            limiter.release()
+
+        async def run():
+            await asyncio.gather(*(worker(i) for i in range(5)))
+
+        asyncio.run(run())
+
+        assert order == [0, 1, 2, 3, 4]
+        assert limiter.get_stats()['queued'] == 4
+        assert limiter.in_flight == 0
+
+    def test_retry_after_pauses_admission(self):
+        """测试限流的retry_after期间暂停放行"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+
+        async def run():
+            await limiter.acquire()
+            limiter.release(rate_limited=True, retry_after=0.1)
+            start = asyncio.get_running_loop().time()
+            await limiter.acquire()
+            return asyncio.get_running_loop().time() - start
+
+        waited = asyncio.run(run())
+
+        assert waited >= 0.09
+
+    def test_client_exposes_concurrency_metrics(self):
+        """测试客户端暴露并发指标"""
+        client = UnifiedLLMClient({'max_concurrent_requests': 3})
+        client.register_client(LLMProvider.TONGYI, FakeLLMClient())
+
+        asyncio.run(client.generate(LLMRequest(prompt="并发指标")))
+
+        stats = client.get_metrics()['concurrency']['tongyi']
+        assert stats['current_limit'] == 3
+        assert stats['in_flight'] == 0
+        assert stats['acquired'] == 1
+
+
+class TestHedging:
+    """测试对冲请求"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        global_metrics.reset()
+        self.slow_client = FakeLLMClient(delay=0.5, content="慢响应")
+        self.fast_client = FakeLLMClient(delay=0.01, content="快响应")
+        self.fast_client.provider = LLMProvider.OPENAI
+        self.fast_client.default_model = 'fast-model'
+        self.client = UnifiedLLMClient({
+            'cache_enabled': False,
+            'hedging_enabled': True,
+            'hedging_default_delay': 0.05,
+            'hedging_min_delay': 0.01,
+            'fallback_providers': [LLMProvider.OPENAI]
+        })
+        self.client.register_client(LLMProvider.TONGYI, self.slow_client)
+        self.client.register_client(LLMProvider.OPENAI, self.fast_client)
+
+    def test_slow_primary_is_hedged_and_loser_cancelled(self):
+        """测试主请求过慢时对冲请求胜出，主请求被取消"""
+        async def run():
+            response = await self.client.generate(LLMRequest(prompt="对冲测试", model='fake-model'))
+            await asyncio.sleep(0)
+            return response
+
+        response = asyncio.run(run())
+
+        stats = self.client.get_metrics()['hedging']
+        assert response.content == "快响应"
+        # 对冲请求使用降级提供商的默认模型，而不是主请求的模型名
+        assert response.model == 'fast-model'
+        assert stats['hedges_fired'] == 1
+        assert stats['hedges_won'] == 1
+        assert self.client.concurrency_limiters[LLMProvider.TONGYI].in_flight == 0
+
+    def test_hedge_winner_is_not_cached_for_primary(self):
+        """测试对冲请求胜出时不把其他模型的回答写入主请求的缓存"""
+        self.client.cache.enabled = True
+        request = LLMRequest(prompt="对冲缓存", model='fake-model')
+
+        async def run():
+            response = await self.client.generate(request)
+            return response, await self.client.cache.get_cached_response(request.get_cache_key())
+
+        response, cached = asyncio.run(run())
+
+        assert response.content == "快响应"
+        assert cached is None
+        assert self.client.semantic_cache.lookup(request) is None
+
+    def test_failed_hedge_is_skipped_by_fallback(self):
+        """测试主请求和对冲请求都失败时进入降级流程，并跳过已对冲过的选项"""
+        failing = FailingModelClient(failing_models={'fake-model', 'hedge-model'}, delay=0.1)
+        backup = FailingModelClient(failing_models={'hedge-model'}, delay=0.01, content="降级响应")
+        backup.provider = LLMProvider.OPENAI
+        self.client.register_client(LLMProvider.TONGYI, failing)
+        self.client.register_client(LLMProvider.OPENAI, backup)
+        self.client.fallback_manager.fallback_models = {LLMProvider.OPENAI: ['hedge-model', 'backup-model']}
+
+        response = asyncio.run(self.client.generate(LLMRequest(prompt="都失败", model='fake-model')))
+
+        assert response.success
+        assert response.content == "降级响应"
+        assert backup.models == ['hedge-model', 'backup-model']
+
+    def test_hedge_budget_limits_extra_requests(self):
+        """测试对冲预算限制额外请求比例"""
+        hedging = self.client.fallback_manager.hedging
+        hedging._budget_tokens = 1.0
+        hedging.budget_ratio = 0.0
+
+        async def run():
+            await self.client.generate(LLMRequest(prompt="预算一"))
+            return await self.client.generate(LLMRequest(prompt="预算二"))
+
+        second = asyncio.run(run())
+
+        stats = hedging.get_stats()
+        assert second.content == "慢响应"
+        assert stats['hedges_fired'] == 1
+        assert stats['suppressed_by_budget'] == 1
+
+    def test_fast_primary_is_not_hedged(self):
+        """测试主请求在阈值内返回时不发出对冲"""
+        self.slow_client.delay = 0.01
+        self.client.fallback_manager.hedging.default_delay = 1.0
+
+        response = asyncio.run(self.client.generate(LLMRequest(prompt="快速主请求")))
+
+        assert response.content == "慢响应"
+        assert self.fast_client.call_count == 0
+
+
+class TimeoutLLMClient(FakeLLMClient):
+    """总是返回超时错误响应的模拟客户端"""
+
+    async def generate(self, request: LLMRequest) -> LLMResponse:
+        self.call_count += 1
+        return self._create_error_response(request, LLMTimeoutException("请求超时"), self.delay)
+
+
+class TestDeadlinePropagation:
+    """测试请求截止时间传播"""
+
+    def setup_method(self):
+        """测试前的设置"""
+        global_metrics.reset()
+        self.fake_client = FakeLLMClient(delay=0.01)
+        self.client = UnifiedLLMClient({'cache_enabled': False})
+        self.client.register_client(LLMProvider.TONGYI, self.fake_client)
+
+    def test_expired_deadline_fails_fast(self):
+        """测试截止时间已过时不再调用提供商"""
+        async def run():
+            with deadline_scope(0):
+                return await self.client.generate(LLMRequest(prompt="已超时的请求"))
+
+        with pytest.raises(DeadlineExceededError):
+            asyncio.run(run())
+        assert self.fake_client.call_count == 0
+
+    def test_retry_skipped_when_deadline_too_close(self):
+        """测试等待后来不及完成的重试被跳过"""
+        timeout_client = TimeoutLLMClient(delay=0.0)
+        self.client.register_client(LLMProvider.TONGYI, timeout_client)
+        self.client.retry_manager.engine.base_delay = 1.0
+
+        async def run():
+            with deadline_scope(0.3):
+                return await self.client.generate(LLMRequest(prompt="快超时的请求"))
+
+        response = asyncio.run(run())
+
+        assert not response.success
+        assert timeout_client.call_count == 1
+        assert self.client.retry_manager.get_stats()['suppressed_by_deadline'] == 1
+
+    def test_nested_scope_only_tightens(self):
+        """测试内层截止时间不会放宽外层截止时间"""
+        with deadline_scope(0.5):
+            with deadline_scope(10):
+                assert effective_timeout(30) <= 0.5
+            assert effective_timeout(0.1) == 0.1
+        assert effective_timeout(30) == 30
+
+    def test_package_import_uses_single_module(self):
+        """测试以llm包导入时只加载llm.*模块，不修改sys.path，截止时间和指标模块只有一份"""
+        code = (
+            "import sys\n"
+            "path = list(sys.path)\n"
+            "import llm\n"
+            "from llm import manager, monitoring, unified_client\n"
+            "from llm.providers import tongyi_client\n"
+            "assert sys.path == path\n"
+            "assert manager.check_deadline is unified_client.check_deadline is llm.request_deadline.check_deadline\n"
+            "print(sorted(name for name in sys.modules if name.endswith(('request_deadline', 'metrics_registry', 'unified_interface'))))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', code], cwd=project_root,
+                                capture_output=True, text=True, check=True)
+        assert result.stdout.split('\n')[-2] == (
+            "['llm.components.metrics_registry', 'llm.request_deadline', 'llm.unified_interface']"
+        )
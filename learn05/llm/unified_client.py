@@ -6,30 +6,55 @@
 """
 
 import asyncio
+import hashlib
 import json
+import re
 import time
-import random
-from typing import Dict, List, Optional, Any, AsyncIterator, Callable
-from dataclasses import asdict
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, Sequence, Tuple
+from dataclasses import asdict, replace
 import logging
-from contextlib import asynccontextmanager
+import warnings
+from contextlib import aclosing, asynccontextmanager
 
 try:
     import redis.asyncio as redis
 except ImportError:
     redis = None
 
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from unified_interface import (
-    UnifiedLLMInterface, LLMRequest, LLMResponse, LLMProvider,
-    LLMException, LLMRateLimitException, LLMNetworkException, LLMTimeoutException,
-    global_metrics
-)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from .unified_interface import (
+        UnifiedLLMInterface, LLMRequest, LLMResponse, LLMProvider, LLMUsage,
+        LLMException, LLMRateLimitException, LLMNetworkException, LLMTimeoutException,
+        LLMErrorType, global_metrics
+    )
+    from .components.minhash_lsh import MinHashLSH, jaccard
+    from .components.rate_limiter import AsyncLLMRateLimiter, estimate_tokens
+    from .components.retry_handler import RetryBudget, RetryEngine
+    from .components.stream_metrics import OUTCOME_CANCELLED, OUTCOME_ERROR, SCOPE_CLIENT, StreamTimer
+    from .request_deadline import DeadlineExceededError, check_deadline, get_deadline, remaining_time
+except ImportError:
+    from unified_interface import (
+        UnifiedLLMInterface, LLMRequest, LLMResponse, LLMProvider, LLMUsage,
+        LLMException, LLMRateLimitException, LLMNetworkException, LLMTimeoutException,
+        LLMErrorType, global_metrics
+    )
+    from components.minhash_lsh import MinHashLSH, jaccard
+    from components.rate_limiter import AsyncLLMRateLimiter, estimate_tokens
+    from components.retry_handler import RetryBudget, RetryEngine
+    from components.stream_metrics import OUTCOME_CANCELLED, OUTCOME_ERROR, SCOPE_CLIENT, StreamTimer
+    from request_deadline import DeadlineExceededError, check_deadline, get_deadline, remaining_time
 
 logger = logging.getLogger(__name__)
 
+# 流式响应写入缓存时，回放用的分片偏移和间隔放在metadata的该键下，非流式命中时去掉
+STREAM_REPLAY_KEY = 'stream_replay'
+
 
 class LLMCache:
     """LLM缓存管理器"""
@@ -122,43 +147,379 @@ class LLMCache:
             logger.warning(f"缓存清理失败: {e}")
 
 
+class SemanticCache:
+    """语义近似缓存（第二级缓存）
+    
+    在精确缓存未命中时，通过本地索引查找近似重复的提示词（不发起网络调用）。
+    默认使用字符n-gram MinHash + LSH分桶（components.minhash_lsh），也可传入本地向量化函数使用余弦相似度。
+    只有除最后一条用户输入外其余参数完全一致的请求才会相互匹配。
+    
+    误命中统计（false_positives/false_positive_rate）只来自report_false_positive的显式上报，
+    客户端本身不校验回答内容；调用方未接入上报时该指标恒为0，不代表没有误命中。
+    """
+    
+    _PUNCTUATION = re.compile(r'[\s\W_]+', re.UNICODE)
+    
+    def __init__(self, enabled: bool = False, threshold: float = 0.7,
+                 template_thresholds: Optional[Dict[str, float]] = None,
+                 max_entries: int = 2000, ttl: int = 3600,
+                 max_temperature: float = 0.0, ngram_sizes: Tuple[int, ...] = (1, 2),
+                 num_perm: int = 64, bands: int = 16,
+                 embedding_function: Optional[Callable[[str], Sequence[float]]] = None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.template_thresholds = template_thresholds or {}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.ngram_sizes = ngram_sizes
+        self.num_perm = num_perm
+        self.bands = bands
+        self.embedding_function = embedding_function
+        
+        # entry_id -> 缓存条目，按访问顺序排列（LRU）
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # n-gram模式的LSH索引，作用域即请求的scope
+        self._lsh = MinHashLSH(num_perm=num_perm, bands=bands)
+        # scope -> entry_id集合（向量模式下的候选集合）
+        self._scopes: Dict[str, set] = {}
+        # 向量模式（numpy可用时）：预分配的向量矩阵，每个条目占一行，增删时原地更新
+        self._vectors = None
+        self._row_scopes = None  # 每行所属作用域的编号，空闲行为-1
+        self._row_ids: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self._used_rows = 0
+        self._scope_codes: Dict[str, int] = {}
+        self._next_scope_code = 0
+        
+        self.stats = {
+            'hits': 0, 'misses': 0, 'false_positives': 0,
+            'evictions': 0, 'expired': 0, 'skipped': 0
+        }
+        self.template_stats: Dict[str, Dict[str, int]] = {}
+    
+    def _split_request(self, request: LLMRequest) -> Tuple[Optional[str], Optional[str]]:
+        """拆分出用于相似度比较的文本和必须精确一致的作用域键"""
+        if request.prompt:
+            text = request.prompt
+            prompt, messages = None, request.messages
+        elif request.messages and request.messages[-1].get('role') == 'user':
+            text = request.messages[-1].get('content', '')
+            prompt, messages = None, request.messages[:-1]
+        else:
+            return None, None
+        
+        scope_data = {
+            'prompt': prompt,
+            'messages': messages,
+            'model': request.model,
+            'temperature': request.temperature,
+            'max_tokens': request.max_tokens,
+            'top_p': request.top_p,
+            'frequency_penalty': request.frequency_penalty,
+            'presence_penalty': request.presence_penalty,
+            'stop': request.stop,
+            'template': self._get_template(request)
+        }
+        scope_str = json.dumps(scope_data, sort_keys=True, ensure_ascii=False)
+        return text, hashlib.md5(scope_str.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _get_template(request: LLMRequest) -> str:
+        """获取请求对应的提示词模板名称"""
+        return (request.metadata or {}).get('template', 'default')
+    
+    def _get_threshold(self, template: str) -> float:
+        """获取模板对应的相似度阈值"""
+        return self.template_thresholds.get(template, self.threshold)
+    
+    def _shingles(self, text: str) -> frozenset:
+        """字符n-gram切分（忽略空白和标点，适用于中英文）"""
+        normalized = self._PUNCTUATION.sub('', text.lower())
+        shingles = set()
+        for n in self.ngram_sizes:
+            for i in range(len(normalized) - n + 1):
+                shingles.add(normalized[i:i + n])
+        return frozenset(shingles)
+    
+    def _embed(self, text: str):
+        """调用本地向量化函数并归一化"""
+        vector = self.embedding_function(text)
+        if np is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            return vector / norm if norm > 0 else vector
+        norm = sum(v * v for v in vector) ** 0.5
+        return [v / norm for v in vector] if norm > 0 else list(vector)
+    
+    def _is_applicable(self, request: LLMRequest) -> bool:
+        """是否可使用语义缓存（仅低温度、确定性较强的请求）"""
+        return self.enabled and request.temperature <= self.max_temperature
+    
+    def _record(self, template: str, key: str):
+        self.stats[key] += 1
+        template_stat = self.template_stats.setdefault(
+            template, {'hits': 0, 'misses': 0, 'false_positives': 0}
+        )
+        if key in template_stat:
+            template_stat[key] += 1
+    
+    def lookup(self, request: LLMRequest) -> Optional[LLMResponse]:
+        """查找近似重复请求的缓存响应"""
+        if not self._is_applicable(request):
+            return None
+        
+        text, scope = self._split_request(request)
+        template = self._get_template(request)
+        if text is None:
+            self.stats['skipped'] += 1
+            return None
+        
+        best_id, best_score = self._find_best(text, scope)
+        if best_id is None or best_score < self._get_threshold(template):
+            self._record(template, 'misses')
+            return None
+        
+        entry = self._entries[best_id]
+        self._entries.move_to_end(best_id)
+        self._record(template, 'hits')
+        
+        response = LLMResponse.from_dict(json.loads(entry['response']))
+        response.cached = True
+        response.metadata = dict(response.metadata or {})
+        response.metadata.update({
+            'semantic_cache_hit': True,
+            'semantic_entry_id': best_id,
+            'semantic_template': template,
+            'similarity': best_score
+        })
+        return response
+    
+    def _find_best(self, text: str, scope: str) -> Tuple[Optional[str], float]:
+        """在索引中查找最相似的条目"""
+        now = time.time()
+        best_id, best_score = None, 0.0
+        
+        if self.embedding_function and np is not None:
+            return self._find_best_vector(text, scope, now)
+        if self.embedding_function:
+            candidates = list(self._scopes.get(scope, ()))
+            if not candidates:
+                return None, 0.0
+            query = self._embed(text)
+            scores = [sum(x * y for x, y in zip(self._entries[c]['vector'], query))
+                      for c in candidates]
+            ranked = sorted(zip(candidates, scores), key=lambda item: item[1], reverse=True)
+        else:
+            shingles = self._shingles(text)
+            if not shingles:
+                return None, 0.0
+            candidates = self._lsh.query(self._lsh.signature(shingles), scope)
+            # LSH只用于召回候选，最终用精确Jaccard相似度判断
+            ranked = sorted(
+                ((c, jaccard(shingles, self._entries[c]['shingles'])) for c in candidates),
+                key=lambda item: item[1], reverse=True
+            )
+        
+        for entry_id, score in ranked:
+            if now - self._entries[entry_id]['timestamp'] > self.ttl:
+                self._remove(entry_id)
+                self.stats['expired'] += 1
+                continue
+            best_id, best_score = entry_id, score
+            break
+        return best_id, best_score
+    
+    def _find_best_vector(self, text: str, scope: str, now: float) -> Tuple[Optional[str], float]:
+        """在预分配的向量矩阵上一次矩阵乘法打分，只取同一作用域的行"""
+        code = self._scope_codes.get(scope)
+        if code is None:
+            return None, 0.0
+        used = self._used_rows
+        scores = self._vectors[:used] @ self._embed(text)
+        scores[self._row_scopes[:used] != code] = -np.inf
+        while True:
+            row = int(np.argmax(scores))
+            score = float(scores[row])
+            if score == -np.inf:
+                return None, 0.0
+            entry_id = self._row_ids[row]
+            if now - self._entries[entry_id]['timestamp'] <= self.ttl:
+                return entry_id, score
+            self._remove(entry_id)
+            self.stats['expired'] += 1
+            scores[row] = -np.inf
+    
+    def _allocate_row(self, vector, scope: str) -> int:
+        """为条目分配向量矩阵中的一行（优先复用被移除条目的行）"""
+        if self._vectors is None:
+            # 容量为max_entries+1：新增条目后才淘汰最旧的条目
+            capacity = self.max_entries + 1
+            self._vectors = np.zeros((capacity, vector.shape[0]), dtype=np.float32)
+            self._row_scopes = np.full(capacity, -1, dtype=np.int64)
+            self._row_ids = [None] * capacity
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = self._used_rows
+            self._used_rows += 1
+            if row == len(self._vectors):
+                # max_entries在运行中调大时扩容
+                self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                self._row_scopes = np.concatenate([self._row_scopes, np.full_like(self._row_scopes, -1)])
+                self._row_ids.extend([None] * row)
+        code = self._scope_codes.get(scope)
+        if code is None:
+            code = self._scope_codes[scope] = self._next_scope_code
+            self._next_scope_code += 1
+        self._vectors[row] = vector
+        self._row_scopes[row] = code
+        return row
+    
+    def add(self, request: LLMRequest, response: LLMResponse):
+        """将成功响应加入语义索引"""
+        if not self._is_applicable(request) or not response.success:
+            return
+        
+        text, scope = self._split_request(request)
+        if text is None:
+            return
+        
+        entry_id = hashlib.md5(f"{scope}:{text}".encode('utf-8')).hexdigest()
+        if entry_id in self._entries:
+            self._remove(entry_id)
+        
+        entry = {
+            'scope': scope,
+            'timestamp': time.time(),
+            'response': json.dumps(response.to_dict(), ensure_ascii=False)
+        }
+        if self.embedding_function and np is not None:
+            entry['row'] = self._allocate_row(self._embed(text), scope)
+            self._row_ids[entry['row']] = entry_id
+        elif self.embedding_function:
+            entry['vector'] = self._embed(text)
+        else:
+            entry['shingles'] = self._shingles(text)
+            if not entry['shingles']:
+                return
+            self._lsh.insert(entry_id, self._lsh.signature(entry['shingles']), scope)
+        
+        self._entries[entry_id] = entry
+        self._scopes.setdefault(scope, set()).add(entry_id)
+        
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.stats['evictions'] += 1
+    
+    def _remove(self, entry_id: str):
+        """从索引中移除条目"""
+        entry = self._entries.pop(entry_id, None)
+        if not entry:
+            return
+        self._lsh.remove(entry_id)
+        if 'row' in entry:
+            self._row_scopes[entry['row']] = -1
+            self._row_ids[entry['row']] = None
+            self._free_rows.append(entry['row'])
+        scope_entries = self._scopes.get(entry['scope'])
+        if scope_entries is not None:
+            scope_entries.discard(entry_id)
+            if not scope_entries:
+                del self._scopes[entry['scope']]
+                self._scope_codes.pop(entry['scope'], None)
+    
+    def report_false_positive(self, entry_id: str, template: str = 'default'):
+        """报告一次误命中（近似匹配返回了不合适的答案），并移除该条目
+        
+        这是误命中统计的唯一来源，需由判断回答是否合适的调用方（如用户反馈、答案校验）调用。
+        """
+        self._record(template, 'false_positives')
+        self._remove(entry_id)
+    
+    def clear(self):
+        """清空语义缓存"""
+        self._entries.clear()
+        self._lsh.clear()
+        self._scopes.clear()
+        if self._vectors is not None:
+            self._row_scopes[:] = -1
+            self._row_ids = [None] * len(self._row_ids)
+        self._free_rows.clear()
+        self._used_rows = 0
+        self._scope_codes.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取语义缓存统计"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'hit_rate': self.stats['hits'] / lookups if lookups > 0 else 0.0,
+            'false_positive_rate': (self.stats['false_positives'] / self.stats['hits']
+                                    if self.stats['hits'] > 0 else 0.0),
+            'templates': self.template_stats
+        }
+
+
 class RetryManager:
-    """重试管理器"""
+    """重试管理器（基于共享重试引擎，带重试预算与截止时间感知）"""
+    
+    # 可重试的错误响应类型
+    RETRIABLE_ERROR_TYPES = {
+        LLMErrorType.RATE_LIMIT: LLMRateLimitException,
+        LLMErrorType.NETWORK_ERROR: LLMNetworkException,
+        LLMErrorType.TIMEOUT: LLMTimeoutException
+    }
     
     def __init__(self, max_retries: int = 3, base_delay: float = 1.0, 
-                 max_delay: float = 60.0, exponential_base: float = 2.0):
+                 max_delay: float = 60.0, exponential_base: Optional[float] = None,
+                 budget_ratio: Optional[float] = 0.1, min_retries_per_second: float = 1.0):
+        if exponential_base is not None:
+            # 退避由RetryEngine按decorrelated jitter计算，不再使用指数基数
+            warnings.warn("RetryManager的exponential_base参数已废弃且不再生效", DeprecationWarning, stacklevel=2)
         self.max_retries = max_retries
         self.base_delay = base_delay
         self.max_delay = max_delay
-        self.exponential_base = exponential_base
+        self.engine = RetryEngine(
+            max_attempts=max_retries,
+            base_delay=base_delay,
+            max_delay=max_delay,
+            budget=RetryBudget(budget_ratio, min_retries_per_second) if budget_ratio is not None else None,
+            retry_predicate=lambda failures, e: self._should_retry(e, failures - 1),
+            result_error=self._response_error
+        )
     
-    async def execute_with_retry(self, func: Callable, *args, **kwargs) -> Any:
-        """执行带重试的函数"""
-        last_exception = None
+    async def execute_with_retry(self, func: Callable, *args,
+                                 deadline: Optional[float] = None, **kwargs) -> Any:
+        """执行带重试的函数
         
-        for attempt in range(self.max_retries + 1):
-            try:
-                return await func(*args, **kwargs)
-            except Exception as e:
-                last_exception = e
-                
-                # 判断是否应该重试
-                if not self._should_retry(e, attempt):
-                    break
-                
-                if attempt < self.max_retries:
-                    delay = self._calculate_delay(attempt)
-                    logger.warning(f"第{attempt + 1}次尝试失败，{delay}秒后重试: {e}")
-                    await asyncio.sleep(delay)
-        
-        # 所有重试都失败了
-        raise last_exception
+        可重试的错误响应（限流、网络、超时）同样会重试，重试耗尽后返回最后一次的错误响应。
+        """
+        return await self.engine.execute(func, *args, deadline=deadline, **kwargs)
+    
+    def _response_error(self, result: Any) -> Optional[Exception]:
+        """将可重试的错误响应转换为对应异常"""
+        if not isinstance(result, LLMResponse) or result.success:
+            return None
+        exception_class = self.RETRIABLE_ERROR_TYPES.get(result.error_type)
+        if exception_class is None:
+            return None
+        retry_after = (result.metadata or {}).get('retry_after')
+        if exception_class is LLMRateLimitException:
+            return exception_class(result.error or "", retry_after=retry_after)
+        return exception_class(result.error or "")
     
     def _should_retry(self, exception: Exception, attempt: int) -> bool:
         """判断是否应该重试"""
         if attempt >= self.max_retries:
             return False
         
+        # 请求截止时间已过，重试没有意义
+        if isinstance(exception, DeadlineExceededError):
+            return False
+        
         # 网络错误和超时错误可以重试
         if isinstance(exception, (LLMNetworkException, LLMTimeoutException)):
             return True
@@ -174,16 +535,9 @@ class RetryManager:
         # 其他异常可以重试
         return True
     
-    def _calculate_delay(self, attempt: int) -> float:
-        """计算延迟时间（指数退避 + 随机抖动）"""
-        delay = self.base_delay * (self.exponential_base ** attempt)
-        delay = min(delay, self.max_delay)
-        
-        # 添加随机抖动（±25%）
-        jitter = delay * 0.25 * (2 * random.random() - 1)
-        delay += jitter
-        
-        return max(0, delay)
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重试指标"""
+        return self.engine.get_stats()
 
 
 class CircuitBreaker:
@@ -233,13 +587,260 @@ class CircuitBreaker:
             self.state = 'OPEN'
 
 
+class AdaptiveConcurrencyLimiter:
+    """自适应并发限制器（AIMD）
+    
+    成功时加性增大并发上限，遇到限流或延迟明显升高时乘性减小；
+    收到限流异常的retry_after时，在该时间内暂停放行新请求。
+    等待者按FIFO顺序获得名额。
+    """
+    
+    def __init__(self, initial_limit: int = 10, min_limit: int = 1, max_limit: int = 100,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0,
+                 smoothing: float = 0.2):
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._waiters: deque = deque()
+        self._wakeup_handle = None
+        
+        # 延迟跟踪：短期EWMA与缓慢漂移的基线
+        self._latency_ewma: Optional[float] = None
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        
+        self.stats = {
+            'acquired': 0, 'queued': 0, 'total_wait_time': 0.0, 'max_wait_time': 0.0,
+            'increases': 0, 'decreases': 0, 'rate_limited': 0
+        }
+    
+    @property
+    def current_limit(self) -> int:
+        """当前生效的并发上限"""
+        return int(self.limit)
+    
+    def _can_admit(self) -> bool:
+        return self.in_flight < self.current_limit and time.monotonic() >= self.blocked_until
+    
+    async def acquire(self):
+        """获取一个并发名额"""
+        start = time.monotonic()
+        if not self._waiters and self._can_admit():
+            self.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            self.stats['queued'] += 1
+            self._schedule_wakeup()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 名额已分配给当前等待者，归还名额
+                    self.in_flight -= 1
+                    self._wake_waiters()
+                else:
+                    self._waiters.remove(future)
+                raise
+        
+        wait_time = time.monotonic() - start
+        self.stats['acquired'] += 1
+        self.stats['total_wait_time'] += wait_time
+        self.stats['max_wait_time'] = max(self.stats['max_wait_time'], wait_time)
+    
+    def release(self, latency: Optional[float] = None, rate_limited: bool = False,
+                retry_after: Optional[float] = None, overloaded: bool = False):
+        """释放名额并根据请求结果调整并发上限
+        
+        Args:
+            latency: 成功请求的延迟（None表示不参与延迟调整）
+            rate_limited: 是否被限流
+            retry_after: 限流时服务端建议的等待秒数
+            overloaded: 是否出现超时等过载信号
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        
+        if rate_limited:
+            self.stats['rate_limited'] += 1
+            self._decrease(force=True)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        elif overloaded:
+            self._decrease()
+        elif latency is not None:
+            self._on_latency(latency)
+        
+        self._wake_waiters()
+    
+    def _on_latency(self, latency: float):
+        """根据延迟变化调整上限"""
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+            self._baseline_latency = latency
+        else:
+            self._latency_ewma += self.smoothing * (latency - self._latency_ewma)
+            # 基线取较低值并缓慢向上漂移，适应模型整体变慢的情况
+            self._baseline_latency = min(
+                self._latency_ewma,
+                self._baseline_latency + 0.01 * (self._latency_ewma - self._baseline_latency)
+            )
+        
+        if self._latency_ewma > self._baseline_latency * self.latency_tolerance:
+            self._decrease()
+        elif self.in_flight + 1 >= self.current_limit and self.limit < self.max_limit:
+            # 只有名额被充分使用时才增大上限，每个“窗口”约增加1
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.stats['increases'] += 1
+    
+    def _decrease(self, force: bool = False):
+        """乘性减小上限（非强制时每个延迟周期最多减小一次）"""
+        now = time.monotonic()
+        cooldown = self._latency_ewma or 1.0
+        if not force and now - self._last_decrease < cooldown:
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._last_decrease = now
+        self.stats['decreases'] += 1
+    
+    def _wake_waiters(self):
+        """按FIFO顺序唤醒等待者并直接分配名额"""
+        while self._waiters and self._can_admit():
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(True)
+        self._schedule_wakeup()
+    
+    def _schedule_wakeup(self):
+        """限流暂停期间，到期后自动唤醒等待者"""
+        delay = self.blocked_until - time.monotonic()
+        if not self._waiters or delay <= 0 or self._wakeup_handle is not None:
+            return
+        
+        def _wakeup():
+            self._wakeup_handle = None
+            self._wake_waiters()
+        
+        self._wakeup_handle = asyncio.get_running_loop().call_later(delay, _wakeup)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限制器指标"""
+        acquired = self.stats['acquired']
+        return {
+            **self.stats,
+            'current_limit': self.current_limit,
+            'in_flight': self.in_flight,
+            'queue_depth': len(self._waiters),
+            'average_wait_time': self.stats['total_wait_time'] / acquired if acquired > 0 else 0.0,
+            'latency_ewma': self._latency_ewma,
+            'baseline_latency': self._baseline_latency,
+            'blocked_remaining': max(0.0, self.blocked_until - time.monotonic())
+        }
+
+
+class HedgingPolicy:
+    """对冲请求策略
+    
+    主请求超过动态阈值（按模型统计的滚动延迟分位数）仍未返回时，
+    向下一个降级选项发出对冲请求。通过令牌桶限制额外请求的比例。
+    """
+    
+    def __init__(self, enabled: bool = False, percentile: float = 95.0,
+                 budget_ratio: float = 0.1, max_burst: float = 10.0,
+                 min_samples: int = 20, default_delay: float = 10.0,
+                 min_delay: float = 0.5, window_size: int = 200,
+                 latency_source: Optional[Callable[[str, float], Optional[float]]] = None):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.max_burst = max_burst
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.window_size = window_size
+        # 外部延迟分位数来源，例如 MetricsCollector.get_latency_percentile
+        self.latency_source = latency_source
+        
+        self._latencies: Dict[str, deque] = {}
+        self._budget_tokens = max_burst
+        self.stats = {
+            'requests': 0, 'hedges_fired': 0, 'hedges_won': 0,
+            'suppressed_by_budget': 0
+        }
+    
+    def record_latency(self, model: str, latency: float):
+        """记录成功请求的延迟"""
+        window = self._latencies.get(model)
+        if window is None:
+            window = self._latencies[model] = deque(maxlen=self.window_size)
+        window.append(latency)
+    
+    def get_hedge_delay(self, model: str) -> float:
+        """获取对冲阈值（秒）"""
+        delay = None
+        if self.latency_source:
+            try:
+                delay = self.latency_source(model, self.percentile)
+            except Exception as e:
+                logger.warning(f"获取延迟分位数失败: {e}")
+        
+        if delay is None:
+            window = self._latencies.get(model)
+            if window and len(window) >= self.min_samples:
+                ordered = sorted(window)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+                delay = ordered[index]
+        
+        if delay is None:
+            delay = self.default_delay
+        return max(self.min_delay, delay)
+    
+    def on_request(self):
+        """每个主请求为对冲预算补充令牌"""
+        self.stats['requests'] += 1
+        self._budget_tokens = min(self.max_burst, self._budget_tokens + self.budget_ratio)
+    
+    def try_acquire_hedge(self) -> bool:
+        """尝试消耗一次对冲预算"""
+        if self._budget_tokens >= 1.0:
+            self._budget_tokens -= 1.0
+            self.stats['hedges_fired'] += 1
+            return True
+        self.stats['suppressed_by_budget'] += 1
+        return False
+    
+    def record_hedge_won(self):
+        """记录对冲请求先于主请求成功"""
+        self.stats['hedges_won'] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲指标"""
+        requests = self.stats['requests']
+        fired = self.stats['hedges_fired']
+        return {
+            **self.stats,
+            'enabled': self.enabled,
+            'hedge_rate': fired / requests if requests > 0 else 0.0,
+            'win_rate': self.stats['hedges_won'] / fired if fired > 0 else 0.0,
+            'budget_tokens': self._budget_tokens
+        }
+
+
 class FallbackManager:
     """降级管理器"""
     
     def __init__(self, fallback_providers: List[LLMProvider] = None,
-                 fallback_models: Dict[LLMProvider, List[str]] = None):
+                 fallback_models: Dict[LLMProvider, List[str]] = None,
+                 hedging: Optional[HedgingPolicy] = None):
         self.fallback_providers = fallback_providers or []
         self.fallback_models = fallback_models or {}
+        self.hedging = hedging or HedgingPolicy()
         
     def get_fallback_options(self, original_provider: LLMProvider, 
                            original_model: str) -> List[tuple]:
@@ -264,6 +865,18 @@ class FallbackManager:
         return options
 
 
+class HedgedRequestError(LLMException):
+    """主请求和对冲请求都没有成功
+
+    Attributes:
+        hedged_option: 已经作为对冲请求尝试过的(提供商, 模型)，降级时跳过
+    """
+
+    def __init__(self, message: str, hedged_option: Tuple[LLMProvider, str]):
+        super().__init__(message)
+        self.hedged_option = hedged_option
+
+
 class UnifiedLLMClient:
     """统一LLM客户端管理器"""
     
@@ -274,18 +887,46 @@ class UnifiedLLMClient:
             ttl=self.config.get('cache_ttl', 3600),
             enabled=self.config.get('cache_enabled', True)
         )
+        self.semantic_cache = SemanticCache(
+            enabled=self.config.get('semantic_cache_enabled', False),
+            threshold=self.config.get('semantic_cache_threshold', 0.7),
+            template_thresholds=self.config.get('semantic_cache_template_thresholds'),
+            max_entries=self.config.get('semantic_cache_max_entries', 2000),
+            ttl=self.config.get('cache_ttl', 3600),
+            max_temperature=self.config.get('semantic_cache_max_temperature', 0.0),
+            embedding_function=self.config.get('semantic_embedding_function')
+        )
         self.retry_manager = RetryManager(
-            max_retries=self.config.get('max_retries', 3)
+            max_retries=self.config.get('max_retries', 3),
+            budget_ratio=self.config.get('retry_budget_ratio', 0.1),
+            min_retries_per_second=self.config.get('retry_budget_min_per_second', 1.0)
         )
         self.circuit_breakers: Dict[LLMProvider, CircuitBreaker] = {}
         self.fallback_manager = FallbackManager(
             fallback_providers=self.config.get('fallback_providers', []),
-            fallback_models=self.config.get('fallback_models', {})
+            fallback_models=self.config.get('fallback_models', {}),
+            hedging=HedgingPolicy(
+                enabled=self.config.get('hedging_enabled', False),
+                percentile=self.config.get('hedging_percentile', 95.0),
+                budget_ratio=self.config.get('hedging_budget_ratio', 0.1),
+                default_delay=self.config.get('hedging_default_delay', 10.0),
+                min_delay=self.config.get('hedging_min_delay', 0.5)
+            )
         )
         self.default_provider = LLMProvider(self.config.get('default_provider', 'tongyi'))
         
-        # 并发控制
-        self.semaphore = asyncio.Semaphore(self.config.get('max_concurrent_requests', 10))
+        # 并发控制（每个提供商一个自适应限制器）
+        self.concurrency_limiters: Dict[LLMProvider, AdaptiveConcurrencyLimiter] = {}
+        
+        # 请求合并（single-flight）：相同缓存键的并发请求共享一次上游调用
+        self.coalescing_enabled = self.config.get('request_coalescing', True)
+        self._inflight_requests: Dict[str, asyncio.Future] = {}
+        
+        # 流式缓存回放配置
+        self.stream_replay_timing = self.config.get('stream_replay_timing', 'none')
+        self.stream_replay_speedup = self.config.get('stream_replay_speedup', 10.0)
+        # 完整流式输出的平均token数（估算取消节省量）
+        self._avg_stream_tokens: Optional[float] = None
         
     def register_client(self, provider: LLMProvider, client: UnifiedLLMInterface):
         """注册LLM客户端"""
@@ -294,6 +935,12 @@ class UnifiedLLMClient:
             failure_threshold=self.config.get('circuit_breaker_threshold', 5),
             recovery_timeout=self.config.get('circuit_breaker_timeout', 60)
         )
+        self.concurrency_limiters[provider] = AdaptiveConcurrencyLimiter(
+            initial_limit=self.config.get('max_concurrent_requests', 10),
+            min_limit=self.config.get('min_concurrent_requests', 1),
+            max_limit=self.config.get('max_concurrent_limit', 100),
+            latency_tolerance=self.config.get('concurrency_latency_tolerance', 2.0)
+        )
         logger.info(f"注册LLM客户端: {provider.value}")
     
     def get_client(self, provider: Optional[LLMProvider] = None) -> UnifiedLLMInterface:
@@ -304,74 +951,272 @@ class UnifiedLLMClient:
         return self.clients[provider]
     
     @asynccontextmanager
-    async def _acquire_semaphore(self):
-        """获取信号量"""
-        await self.semaphore.acquire()
+    async def _acquire_slot(self, provider: LLMProvider, track_latency: bool = True):
+        """获取提供商并发名额，结束时按结果反馈给自适应限制器
+        
+        yield一个字典，调用方可写入'response'供限制器判断是否被限流。
+        """
+        limiter = self.concurrency_limiters[provider]
         try:
-            yield
-        finally:
-            self.semaphore.release()
+            # 排队等待不超过请求剩余时间
+            await asyncio.wait_for(limiter.acquire(), timeout=remaining_time())
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError(f"等待{provider.value}并发名额时已超过请求截止时间")
+        outcome: Dict[str, Any] = {}
+        start_time = time.time()
+        try:
+            yield outcome
+        except LLMRateLimitException as e:
+            limiter.release(rate_limited=True, retry_after=e.retry_after)
+            raise
+        except (LLMTimeoutException, asyncio.TimeoutError):
+            limiter.release(overloaded=True)
+            raise
+        except BaseException:
+            limiter.release()
+            raise
+        else:
+            response = outcome.get('response')
+            if response is not None and response.error_type == LLMErrorType.RATE_LIMIT:
+                retry_after = (response.metadata or {}).get('retry_after')
+                limiter.release(rate_limited=True, retry_after=retry_after)
+            elif response is not None and response.error_type == LLMErrorType.TIMEOUT:
+                limiter.release(overloaded=True)
+            elif track_latency and (response is None or response.success):
+                limiter.release(latency=time.time() - start_time)
+            else:
+                limiter.release()
     
     async def generate(self, request: LLMRequest, 
                       provider: Optional[LLMProvider] = None) -> LLMResponse:
         """生成文本响应"""
-        async with self._acquire_semaphore():
-            return await self._execute_with_fallback('generate', request, provider)
+        return await self._execute_with_fallback('generate', request, provider)
     
     async def chat(self, request: LLMRequest,
                   provider: Optional[LLMProvider] = None) -> LLMResponse:
         """进行对话"""
-        async with self._acquire_semaphore():
-            return await self._execute_with_fallback('chat', request, provider)
+        return await self._execute_with_fallback('chat', request, provider)
     
     async def stream_generate(self, request: LLMRequest,
                             provider: Optional[LLMProvider] = None) -> AsyncIterator[str]:
         """流式生成文本"""
-        async with self._acquire_semaphore():
-            client = self.get_client(provider)
-            async for chunk in client.stream_generate(request):
+        async with aclosing(self._stream_with_cache('stream_generate', request, provider)) as stream:
+            async for chunk in stream:
                 yield chunk
     
     async def stream_chat(self, request: LLMRequest,
                         provider: Optional[LLMProvider] = None) -> AsyncIterator[str]:
         """流式对话"""
-        async with self._acquire_semaphore():
-            client = self.get_client(provider)
-            async for chunk in client.stream_chat(request):
+        async with aclosing(self._stream_with_cache('stream_chat', request, provider)) as stream:
+            async for chunk in stream:
+                yield chunk
+    
+    async def _stream_with_cache(self, method: str, request: LLMRequest,
+                                 provider: Optional[LLMProvider] = None) -> AsyncIterator[str]:
+        """执行带缓存的流式请求：命中缓存时回放，完整结束后按分片写入缓存"""
+        # 与非流式请求共用缓存键，两种调用方式可互相命中
+        cache_key = request.get_cache_key()
+        cached_response = await self.cache.get_cached_response(cache_key)
+        if cached_response:
+            global_metrics.record_request(cached_response)
+            async for chunk in self._replay_stream(cached_response, request):
                 yield chunk
+            return
+        
+        provider = provider or self.default_provider
+        chunks: List[str] = []
+        chunk_offsets: List[int] = []
+        chunk_delays: List[float] = []
+        offset = 0
+        start_time = time.time()
+        last_chunk_time = start_time
+        
+        client = self.get_client(provider)
+        streamed_tokens = 0
+        # 端到端计时（含排队），学生感知的首token耗时
+        timer = StreamTimer(provider.value, request.model or client.default_model, SCOPE_CLIENT)
+        try:
+            # 流式耗时与输出长度相关，不参与延迟调整；
+            # 调用方关闭或取消时逐层关闭上游流，并立即归还并发名额
+            async with self._acquire_slot(provider, track_latency=False), \
+                    aclosing(getattr(client, method)(request)) as stream:
+                async for chunk in stream:
+                    now = time.time()
+                    chunks.append(chunk)
+                    offset += len(chunk)
+                    chunk_offsets.append(offset)
+                    chunk_delays.append(now - last_chunk_time)
+                    last_chunk_time = now
+                    tokens = estimate_tokens(chunk)
+                    streamed_tokens += tokens
+                    timer.on_chunk(tokens)
+                    yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            timer.finish(OUTCOME_CANCELLED)
+            self._record_stream_cancelled(request, streamed_tokens)
+            raise
+        except Exception:
+            timer.finish(OUTCOME_ERROR)
+            raise
+        
+        # 只有完整结束的流才会执行到这里（异常或调用方提前关闭都不会缓存）
+        timer.finish()
+        self._record_stream_completed(streamed_tokens)
+        content = "".join(chunks)
+        # 流式接口不返回用量，按文本估算；分片只记录结束偏移，回放时从content切分
+        prompt_tokens = AsyncLLMRateLimiter.estimate_request_tokens(request.prompt, request.messages)
+        completion_tokens = estimate_tokens(content)
+        response = LLMResponse(
+            content=content,
+            model=request.model or client.default_model,
+            provider=provider,
+            usage=LLMUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens),
+            latency=time.time() - start_time,
+            success=True,
+            metadata={STREAM_REPLAY_KEY: {'chunk_offsets': chunk_offsets, 'chunk_delays': chunk_delays}}
+        )
+        await self.cache.cache_response(cache_key, response)
+        global_metrics.record_request(response)
+    
+    def _record_stream_completed(self, output_tokens: int):
+        """记录完整结束的流式输出长度，用于估算取消时节省的token"""
+        if self._avg_stream_tokens is None:
+            self._avg_stream_tokens = float(output_tokens)
+        else:
+            self._avg_stream_tokens = 0.9 * self._avg_stream_tokens + 0.1 * output_tokens
+    
+    def _record_stream_cancelled(self, request: LLMRequest, streamed_tokens: int):
+        """记录被调用方取消的流式请求，按max_tokens或历史平均输出长度估算节省的token"""
+        expected_tokens = request.max_tokens or self._avg_stream_tokens or streamed_tokens
+        tokens_saved = max(0, int(expected_tokens) - streamed_tokens)
+        global_metrics.record_stream_cancelled(streamed_tokens, tokens_saved)
+        logger.info(f"流式请求被调用方取消: 已输出约{streamed_tokens}个token，估算节省{tokens_saved}个token")
+    
+    async def _replay_stream(self, response: LLMResponse,
+                             request: LLMRequest) -> AsyncIterator[str]:
+        """以流的形式回放缓存的响应"""
+        replay = (response.metadata or {}).get(STREAM_REPLAY_KEY) or {}
+        content = response.content
+        offsets = replay.get('chunk_offsets') or [len(content)]
+        chunks = [content[start:end] for start, end in zip([0] + offsets[:-1], offsets)]
+        chunk_delays = replay.get('chunk_delays') or []
+        
+        # 回放节奏：none-立即输出，original-原始节奏，compressed-按倍率压缩
+        timing = (request.metadata or {}).get('stream_replay_timing', self.stream_replay_timing)
+        
+        for index, chunk in enumerate(chunks):
+            if timing != 'none' and index < len(chunk_delays):
+                delay = chunk_delays[index]
+                if timing == 'compressed':
+                    delay /= self.stream_replay_speedup
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk
     
     async def _execute_with_fallback(self, method: str, request: LLMRequest,
                                    provider: Optional[LLMProvider] = None) -> LLMResponse:
         """执行带降级的请求"""
-        provider = provider or self.default_provider
-        original_model = request.model
+        if method not in ['generate', 'chat']:
+            return await self._execute_uncached(method, request, provider)
         
         # 检查缓存
-        if method in ['generate', 'chat']:
-            cache_key = request.get_cache_key()
-            cached_response = await self.cache.get_cached_response(cache_key)
-            if cached_response:
-                global_metrics.record_request(cached_response)
-                return cached_response
+        cache_key = request.get_cache_key()
+        cached_response = await self.cache.get_cached_response(cache_key)
+        if cached_response:
+            # 流式请求写入的回放数据不属于响应内容
+            if cached_response.metadata:
+                cached_response.metadata.pop(STREAM_REPLAY_KEY, None)
+            global_metrics.record_request(cached_response)
+            return cached_response
+        
+        # 精确缓存未命中时查找近似重复的请求
+        semantic_response = self.semantic_cache.lookup(request)
+        if semantic_response:
+            global_metrics.record_request(semantic_response)
+            return semantic_response
+        
+        if not self.coalescing_enabled:
+            return await self._execute_uncached(method, request, provider, cache_key)
+        
+        # 已有相同请求在执行中，等待其结果
+        inflight = self._inflight_requests.get(cache_key)
+        if inflight is not None:
+            return await self._wait_inflight(inflight, method, request, provider)
+        
+        future = asyncio.get_running_loop().create_future()
+        # 没有等待者时也标记异常已读取，避免事件循环告警
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight_requests[cache_key] = future
+        try:
+            response = await self._execute_uncached(method, request, provider, cache_key)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight_requests.get(cache_key) is future:
+                del self._inflight_requests[cache_key]
+    
+    async def _wait_inflight(self, inflight: asyncio.Future, method: str,
+                             request: LLMRequest,
+                             provider: Optional[LLMProvider]) -> LLMResponse:
+        """等待进行中的相同请求，共享其响应"""
+        global_metrics.record_coalesced_hit()
+        try:
+            response = await asyncio.wait_for(asyncio.shield(inflight), timeout=remaining_time())
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("等待进行中的相同请求时已超过请求截止时间")
+        except asyncio.CancelledError:
+            # 发起请求的调用方被取消时，由当前调用方重新执行
+            if inflight.cancelled():
+                return await self._execute_with_fallback(method, request, provider)
+            raise
+        
+        shared_response = replace(response, cached=response.success)
+        global_metrics.record_request(shared_response)
+        return shared_response
+    
+    async def _execute_uncached(self, method: str, request: LLMRequest,
+                                provider: Optional[LLMProvider] = None,
+                                cache_key: Optional[str] = None) -> LLMResponse:
+        """执行未命中缓存的请求，失败时尝试降级选项"""
+        provider = provider or self.default_provider
+        original_model = request.model
+        check_deadline("LLM请求")
         
         # 尝试主要选项
         try:
-            response = await self._execute_single_request(method, request, provider)
+            response, hedged = await self._execute_primary(method, request, provider)
             
-            # 缓存成功的响应
-            if response.success and method in ['generate', 'chat']:
+            # 缓存成功的响应（对冲请求胜出时是其他提供商或模型的回答，与降级响应一样不写入主请求的缓存键）
+            if response.success and cache_key and not hedged:
                 await self.cache.cache_response(cache_key, response)
+                self.semantic_cache.add(request, response)
             
             global_metrics.record_request(response)
             return response
             
+        except DeadlineExceededError:
+            # 截止时间已过，降级请求也来不及完成
+            raise
         except Exception as e:
             logger.warning(f"主要请求失败: {e}")
             
-            # 尝试降级选项
+            # 尝试降级选项（跳过已经作为对冲请求失败过的选项）
             fallback_options = self.fallback_manager.get_fallback_options(provider, original_model)
+            hedged_option = getattr(e, 'hedged_option', None)
             
             for fallback_provider, fallback_model in fallback_options:
+                if hedged_option is not None and fallback_provider in self.clients and \
+                        (fallback_provider, fallback_model or self.clients[fallback_provider].default_model) \
+                        == hedged_option:
+                    continue
+                check_deadline("降级请求")
                 try:
                     fallback_request = LLMRequest(**asdict(request))
                     if fallback_model:
@@ -386,6 +1231,8 @@ class UnifiedLLMClient:
                         global_metrics.record_request(response)
                         return response
                         
+                except DeadlineExceededError:
+                    raise
                 except Exception as fallback_error:
                     logger.warning(f"降级失败 {fallback_provider.value}: {fallback_error}")
                     continue
@@ -403,6 +1250,71 @@ class UnifiedLLMClient:
             global_metrics.record_request(error_response)
             return error_response
     
+    async def _execute_primary(self, method: str, request: LLMRequest,
+                               provider: LLMProvider) -> Tuple[LLMResponse, bool]:
+        """执行主要请求，开启对冲时在超过阈值后向降级选项发出对冲请求
+
+        Returns:
+            Tuple[LLMResponse, bool]: 响应，以及它是否来自对冲请求
+
+        Raises:
+            HedgedRequestError: 主请求和对冲请求都没有成功
+        """
+        hedging = self.fallback_manager.hedging
+        if not hedging.enabled:
+            return await self._execute_single_request(method, request, provider), False
+        
+        # 未配置降级模型时使用降级提供商的默认模型，主请求的模型名对其他提供商无效
+        hedge_options = [
+            (option_provider, option_model or self.clients[option_provider].default_model)
+            for option_provider, option_model in
+            self.fallback_manager.get_fallback_options(provider, request.model)
+            if option_provider in self.clients
+        ]
+        hedge_options = [option for option in hedge_options if option[1]]
+        if not hedge_options:
+            return await self._execute_single_request(method, request, provider), False
+        
+        hedging.on_request()
+        model = request.model or self.get_client(provider).default_model
+        primary = asyncio.ensure_future(self._execute_single_request(method, request, provider))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedging.get_hedge_delay(model))
+            if done or not hedging.try_acquire_hedge():
+                return await primary, False
+            
+            hedge_provider, hedge_model = hedge_options[0]
+            hedge_request = replace(request, model=hedge_model)
+            hedge = asyncio.ensure_future(
+                self._execute_single_request(method, hedge_request, hedge_provider)
+            )
+            tasks.append(hedge)
+            logger.info(f"主请求超过对冲阈值，发出对冲请求: {hedge_provider.value}/{hedge_model}")
+            
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().success:
+                        if task is hedge:
+                            hedging.record_hedge_won()
+                        return task.result(), task is hedge
+            
+            # 两个请求都没有成功：截止时间已过时直接抛出，否则交给降级流程
+            for task in (primary, hedge):
+                if isinstance(task.exception(), DeadlineExceededError):
+                    raise task.exception()
+            primary_error = primary.exception()
+            reason = primary_error if primary_error is not None else primary.result().error
+            raise HedgedRequestError(f"主请求和对冲请求都失败: {reason}",
+                                     (hedge_provider, hedge_model)) from primary_error
+        finally:
+            # 输掉的请求（或调用方被取消时的所有请求）直接取消，释放并发名额
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
     async def _execute_single_request(self, method: str, request: LLMRequest,
                                     provider: LLMProvider) -> LLMResponse:
         """执行单个请求"""
@@ -410,18 +1322,26 @@ class UnifiedLLMClient:
         circuit_breaker = self.circuit_breakers[provider]
         
         async def _call_method():
-            if method == 'generate':
-                return await client.generate(request)
-            elif method == 'chat':
-                return await client.chat(request)
-            else:
+            if method not in ['generate', 'chat']:
                 raise ValueError(f"不支持的方法: {method}")
+            # 每次尝试单独占用名额，重试退避期间不占用并发
+            async with self._acquire_slot(provider) as outcome:
+                response = await getattr(client, method)(request)
+                outcome['response'] = response
+                return response
         
-        # 通过熔断器和重试管理器执行
-        return await circuit_breaker.call(
+        # 通过熔断器和重试管理器执行（重试不会超出请求截止时间）
+        response = await circuit_breaker.call(
             self.retry_manager.execute_with_retry,
-            _call_method
+            _call_method,
+            deadline=get_deadline()
         )
+        if response.success:
+            self.fallback_manager.hedging.record_latency(response.model, response.latency)
+        else:
+            # 提供商因截止时间返回的错误响应直接转为超时异常，快速失败
+            check_deadline(f"{provider.value}请求")
+        return response
     
     async def health_check(self) -> Dict[LLMProvider, bool]:
         """健康检查"""
@@ -436,7 +1356,18 @@ class UnifiedLLMClient:
     
     def get_metrics(self) -> Dict[str, Any]:
         """获取指标"""
-        return global_metrics.get_stats()
+        metrics = global_metrics.get_stats()
+        metrics['concurrency'] = self.get_concurrency_stats()
+        metrics['hedging'] = self.fallback_manager.hedging.get_stats()
+        metrics['retry'] = self.retry_manager.get_stats()
+        return metrics
+    
+    def get_concurrency_stats(self) -> Dict[str, Any]:
+        """获取各提供商的自适应并发指标"""
+        return {
+            provider.value: limiter.get_stats()
+            for provider, limiter in self.concurrency_limiters.items()
+        }
     
     def reset_metrics(self):
         """重置指标"""
@@ -444,4 +1375,41 @@ class UnifiedLLMClient:
     
     async def clear_cache(self, pattern: str = "*"):
         """清理缓存"""
-        await self.cache.clear_cache(pattern)
\ No newline at end of file
+        await self.cache.clear_cache(pattern)
+        if pattern == "*":
+            self.semantic_cache.clear()
+    
+    def report_semantic_false_positive(self, response: LLMResponse):
+        """报告语义缓存误命中的响应，移除对应条目
+        
+        客户端不校验回答内容，语义缓存的误命中率只统计通过本方法上报的次数。
+        """
+        metadata = response.metadata or {}
+        if metadata.get('semantic_cache_hit'):
+            self.semantic_cache.report_false_positive(
+                metadata['semantic_entry_id'],
+                metadata.get('semantic_template', 'default')
+            )
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        return {
+            'memory_cache_size': len(self.cache.memory_cache),
+            'semantic_cache': self.semantic_cache.get_stats()
+        }
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取各提供商的HTTP连接池统计"""
+        return {
+            provider.value: client.get_pool_stats()
+            for provider, client in self.clients.items()
+            if hasattr(client, 'get_pool_stats')
+        }
+    
+    async def close(self):
+        """关闭所有已注册的客户端"""
+        for provider, client in self.clients.items():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"关闭客户端失败 {provider.value}: {e}")
\ No newline at end of file
@@ -15,8 +15,18 @@ from typing import Dict, List, Optional, Any, AsyncIterator, Union
 from enum import Enum
 import logging
 
+try:
+    from .request_deadline import effective_timeout
+    from .components.metrics_registry import get_registry
+except ImportError:
+    from request_deadline import effective_timeout
+    from components.metrics_registry import get_registry
+
 logger = logging.getLogger(__name__)
 
+# LLM请求耗时桶（秒）
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
 
 class LLMProvider(Enum):
     """LLM提供商枚举"""
@@ -215,6 +225,14 @@ class UnifiedLLMInterface(ABC):
         """健康检查"""
         pass
     
+    async def close(self):
+        """关闭客户端，释放连接等资源"""
+        pass
+    
+    def _request_timeout(self) -> float:
+        """本次调用的超时时间（按请求截止时间收缩，截止时间已过时抛出DeadlineExceededError）"""
+        return effective_timeout(self.timeout, f"{self.provider.value}调用")
+    
     def get_provider(self) -> LLMProvider:
         """获取提供商"""
         return self.provider
@@ -233,6 +251,13 @@ class UnifiedLLMInterface(ABC):
         error_type = LLMErrorType.UNKNOWN
         if isinstance(error, LLMException):
             error_type = error.error_type
+        elif isinstance(error, TimeoutError):
+            error_type = LLMErrorType.TIMEOUT
+        
+        metadata = None
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            metadata = {'retry_after': retry_after}
         
         return LLMResponse(
             content="",
@@ -242,7 +267,8 @@ class UnifiedLLMInterface(ABC):
             latency=latency,
             success=False,
             error=str(error),
-            error_type=error_type
+            error_type=error_type,
+            metadata=metadata
         )
     
     def _create_success_response(self, content: str, model: str, usage: LLMUsage,
@@ -264,7 +290,27 @@ class UnifiedLLMInterface(ABC):
 
 
 class LLMMetrics:
-    """LLM指标收集器"""
+    """LLM指标收集器
+    
+    除本地统计字典外，同时写入全局指标注册表（Prometheus计数器不随reset清零）。
+    """
+    
+    _registry = get_registry()
+    requests_total = _registry.counter(
+        'llm_api_requests_total', 'LLM请求数', ('provider', 'model', 'status'))
+    errors_total = _registry.counter(
+        'llm_api_errors_total', 'LLM请求错误数', ('provider', 'error_type'))
+    latency_seconds = _registry.histogram(
+        'llm_request_duration_seconds', 'LLM请求耗时（秒）', ('provider', 'model'),
+        buckets=LLM_LATENCY_BUCKETS)
+    tokens_total = _registry.counter(
+        'llm_tokens_total', 'LLM消耗的token数', ('provider', 'model', 'type'))
+    cache_hits_total = _registry.counter(
+        'llm_response_cache_hits_total', '命中响应缓存的LLM请求数', ('provider',))
+    coalesced_total = _registry.counter(
+        'llm_coalesced_requests_total', '复用进行中相同请求的次数')
+    cancelled_streams_total = _registry.counter(
+        'llm_stream_cancellations_total', '被调用方中途取消的流式请求数')
     
     def __init__(self):
         self.request_count = 0
@@ -274,7 +320,28 @@ class LLMMetrics:
         self.total_tokens = 0
         self.error_types = {}
         self.provider_stats = {}
+        self.coalesced_count = 0
+        self.cancelled_streams = 0
+        self.cancelled_stream_tokens = 0
+        self.cancelled_stream_tokens_saved = 0
+        
+    def record_coalesced_hit(self):
+        """记录一次请求合并命中（复用进行中的相同请求）"""
+        self.coalesced_count += 1
+        self.coalesced_total.inc()
+    
+    def record_stream_cancelled(self, tokens_streamed: int, tokens_saved: int):
+        """记录一次被调用方中途取消的流式请求
         
+        Args:
+            tokens_streamed: 取消前已输出的token数
+            tokens_saved: 估算节省的输出token数
+        """
+        self.cancelled_streams += 1
+        self.cancelled_stream_tokens += tokens_streamed
+        self.cancelled_stream_tokens_saved += tokens_saved
+        self.cancelled_streams_total.inc()
+    
     def record_request(self, response: LLMResponse):
         """记录请求指标"""
         self.request_count += 1
@@ -303,6 +370,26 @@ class LLMMetrics:
             if response.error_type:
                 error_type = response.error_type.value
                 self.error_types[error_type] = self.error_types.get(error_type, 0) + 1
+        
+        self._export(provider_name, response)
+    
+    def _export(self, provider_name: str, response: LLMResponse):
+        """写入全局指标注册表"""
+        model = response.model or "unknown"
+        self.requests_total.labels(provider_name, model, 'success' if response.success else 'error').inc()
+        if response.cached:
+            # 缓存和合并返回的响应带着原请求的耗时和用量，不再计入上游耗时和token消耗
+            self.cache_hits_total.labels(provider_name).inc()
+        elif response.success:
+            self.latency_seconds.labels(provider_name, model).observe(response.latency)
+            usage = response.usage
+            if usage.prompt_tokens:
+                self.tokens_total.labels(provider_name, model, 'prompt').inc(usage.prompt_tokens)
+            if usage.completion_tokens:
+                self.tokens_total.labels(provider_name, model, 'completion').inc(usage.completion_tokens)
+        else:
+            error_type = response.error_type.value if response.error_type else 'unknown'
+            self.errors_total.labels(provider_name, error_type).inc()
     
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
@@ -317,7 +404,12 @@ class LLMMetrics:
             'average_latency': avg_latency,
             'total_tokens': self.total_tokens,
             'error_types': self.error_types,
-            'provider_stats': self.provider_stats
+            'provider_stats': self.provider_stats,
+            'coalesced_hits': self.coalesced_count,
+            'coalesced_rate': self.coalesced_count / self.request_count if self.request_count > 0 else 0,
+            'cancelled_streams': self.cancelled_streams,
+            'cancelled_stream_tokens': self.cancelled_stream_tokens,
+            'cancelled_stream_tokens_saved': self.cancelled_stream_tokens_saved
         }
     
     def reset(self):
@@ -17,6 +17,11 @@ from collections import defaultdict, deque
 from functools import wraps
 from contextlib import asynccontextmanager
 
+try:
+    from ..components.histogram import WindowedHistogram, merge_histograms
+except (ImportError, ValueError):
+    from components.histogram import WindowedHistogram, merge_histograms
+
 @dataclass
 class PerformanceMetrics:
     """性能指标数据结构"""
@@ -51,7 +56,8 @@ class MetricsCollector:
         self.system_metrics: deque = deque(maxlen=max_metrics)
         self.error_counts = defaultdict(int)
         self.request_counts = defaultdict(int)
-        self.response_times = defaultdict(list)
+        # 每个"服务.操作"一个流式直方图，保留最近1小时的窗口
+        self.response_times: Dict[str, WindowedHistogram] = defaultdict(WindowedHistogram)
         
     def add_performance_metric(self, metric: PerformanceMetrics):
         """添加性能指标"""
@@ -60,14 +66,10 @@ class MetricsCollector:
         # 更新统计信息
         key = f"{metric.service_name}.{metric.operation}"
         self.request_counts[key] += 1
-        self.response_times[key].append(metric.duration)
+        self.response_times[key].record(metric.duration, now=metric.timestamp.timestamp())
         
         if not metric.success:
             self.error_counts[key] += 1
-        
-        # 保持响应时间列表大小
-        if len(self.response_times[key]) > 1000:
-            self.response_times[key] = self.response_times[key][-1000:]
     
     def add_system_metric(self, metric: SystemMetrics):
         """添加系统指标"""
@@ -116,6 +118,15 @@ class MetricsCollector:
             op_durations = [m.duration for m in filtered_metrics if m.operation == operation]
             stats['avg_duration'] = sum(op_durations) / len(op_durations) if op_durations else 0
         
+        # 响应时间分位数（由直方图合并得到，窗口超过1小时按1小时计算）
+        window_seconds = time_window.total_seconds() if time_window else None
+        histogram = merge_histograms(
+            histogram.snapshot(window_seconds)
+            for key, histogram in list(self.response_times.items())
+            if not service_name or key.split('.', 1)[0] == service_name
+        )
+        percentiles = histogram.quantiles((0.5, 0.9, 0.99)) if histogram else {}
+        
         return {
             "time_window": str(time_window) if time_window else "all_time",
             "service_name": service_name or "all_services",
@@ -126,6 +137,9 @@ class MetricsCollector:
             "avg_response_time": avg_duration,
             "max_response_time": max_duration,
             "min_response_time": min_duration,
+            "p50_response_time": percentiles.get(0.5, 0),
+            "p90_response_time": percentiles.get(0.9, 0),
+            "p99_response_time": percentiles.get(0.99, 0),
             "operation_stats": dict(operation_stats)
         }
     
@@ -11,16 +11,18 @@ from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any, AsyncIterator
 import logging
 from datetime import datetime
+from contextlib import aclosing
 import json
 import asyncio
 
 from database import get_db, User
-from models.response import APIResponse, ResponseBuilder
+from models.response import APIResponse, ResponseBuilder, ErrorCode
 from middleware.exception_handler import (
     BusinessException,
     ValidationException,
     ResourceNotFoundException,
-    AuthenticationException
+    AuthenticationException,
+    LLMException
 )
 from auth import get_current_user, role_required
 import httpx
@@ -42,7 +44,8 @@ class AIServiceClient:
         if headers:
             default_headers.update(headers)
         
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+        # 超时时间不超过请求剩余时间
+        async with httpx.AsyncClient(timeout=effective_timeout(self.timeout, "AI服务调用")) as client:
             if method.upper() == 'GET':
                 response = await client.get(url, headers=default_headers)
             elif method.upper() == 'POST':
@@ -108,7 +111,16 @@ class AIServiceClient:
 try:
     from llm.unified_client import UnifiedLLMClient
     from llm.agents.agent_manager import AgentManager
+    # 截止时间与LLM模块内部是同一份上下文变量
+    from llm.request_deadline import DeadlineExceededError, deadline_scope, effective_timeout
 except ImportError:
+    from contextlib import nullcontext as deadline_scope
+    DeadlineExceededError = asyncio.TimeoutError
+    
+    def effective_timeout(timeout, operation=None):
+        return timeout
+    
+    
     # 模拟实现，用于开发阶段
     class UnifiedLLMClient:
         async def chat(self, messages):
@@ -140,8 +152,49 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 智能分析请求的端到端截止时间（秒）
+ANALYZE_DEADLINE_SECONDS = float(os.getenv('AI_ANALYZE_DEADLINE', '60'))
+# 流式响应期间检查客户端是否断开的间隔（秒）
+DISCONNECT_POLL_SECONDS = float(os.getenv('AI_STREAM_DISCONNECT_POLL', '0.5'))
+
 # 初始化AI服务
 llm_client = UnifiedLLMClient()
+
+
+async def _wait_for_disconnect(http_request: Request):
+    """轮询直到客户端断开连接"""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def _stream_until_disconnect(stream: AsyncIterator[str], http_request: Request) -> AsyncIterator[Optional[str]]:
+    """转发上游分片，客户端断开时产出None并结束
+
+    等待下一个分片与断开检测并发进行：上游长时间没有输出时，断开后也会立即取消等待并关闭上游流，
+    释放并发名额，而不是等到下一个token或超时。
+    """
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(http_request))
+    try:
+        async with aclosing(stream):
+            while True:
+                next_chunk = asyncio.ensure_future(stream.__anext__())
+                try:
+                    await asyncio.wait({next_chunk, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    if not next_chunk.done():
+                        # 断开或自身被取消：先取消正在等待的分片，再由aclosing关闭上游流（生成器运行中无法aclose）
+                        next_chunk.cancel()
+                        await asyncio.wait({next_chunk})
+                if next_chunk.cancelled():
+                    yield None
+                    return
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    return
+                yield chunk
+    finally:
+        disconnect.cancel()
 agent_manager = AgentManager()
 ai_service_client = AIServiceClient()
 
@@ -519,6 +572,7 @@ async def ai_chat(
 @router.post("/chat/stream")
 async def ai_chat_stream(
     request: ChatRequest,
+    http_request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -557,11 +611,16 @@ async def ai_chat_stream(
                 
                 # 流式调用LLM
                 full_content = ""
-                async for chunk in llm_client.stream_chat(messages):
-                    if chunk:
-                        full_content += chunk
-                        # 发送SSE格式的数据
-                        yield f"data: {json.dumps({'content': chunk, 'type': 'chunk'}, ensure_ascii=False)}\n\n"
+                async with aclosing(_stream_until_disconnect(llm_client.stream_chat(messages), http_request)) as stream:
+                    async for chunk in stream:
+                        # 客户端已断开：上游流已取消，退出时关闭并释放并发名额
+                        if chunk is None:
+                            logger.info(f"客户端已断开，取消会话 {request.session_id} 的流式响应")
+                            return
+                        if chunk:
+                            full_content += chunk
+                            # 发送SSE格式的数据
+                            yield f"data: {json.dumps({'content': chunk, 'type': 'chunk'}, ensure_ascii=False)}\n\n"
                 
                 # 保存完整的AI响应
                 ai_message = {
@@ -612,36 +671,38 @@ async def intelligent_analysis(
     try:
         logger.info(f"用户 {current_user.id} 请求智能分析: {request.analysis_type}")
         
-        # 根据分析类型调用相应的AI服务
-        if request.analysis_type == AnalysisType.STUDENT_PERFORMANCE:
-            # 调用成绩分析服务
-            # 这里需要根据target_id获取学生成绩数据
-            grades_data = []  # 从数据库获取成绩数据
-            ai_result = await ai_service_client.analyze_grades(grades_data, "student_performance")
-        elif request.analysis_type == AnalysisType.CLASS_SUMMARY:
-            # 调用课堂分析服务
-            classroom_data = {"class_id": request.target_id}  # 从数据库获取课堂数据
-            ai_result = await ai_service_client.analyze_real_time_learning(classroom_data)
-        else:
-            # 对于其他分析类型，使用智能体管理器
-            agent = agent_manager.get_agent("general_analysis")
-            if agent:
-                analysis_context = {
-                    "analysis_type": request.analysis_type,
-                    "target_id": request.target_id,
-                    "date_range": request.date_range,
-                    "additional_context": request.additional_context or {},
-                    "user_id": current_user.id,
-                    "db": db
-                }
-                ai_result = await agent.analyze(analysis_context)
+        # 整个分析请求共享一个截止时间，下游各层据此收缩超时、跳过来不及完成的重试
+        with deadline_scope(ANALYZE_DEADLINE_SECONDS):
+            # 根据分析类型调用相应的AI服务
+            if request.analysis_type == AnalysisType.STUDENT_PERFORMANCE:
+                # 调用成绩分析服务
+                # 这里需要根据target_id获取学生成绩数据
+                grades_data = []  # 从数据库获取成绩数据
+                ai_result = await ai_service_client.analyze_grades(grades_data, "student_performance")
+            elif request.analysis_type == AnalysisType.CLASS_SUMMARY:
+                # 调用课堂分析服务
+                classroom_data = {"class_id": request.target_id}  # 从数据库获取课堂数据
+                ai_result = await ai_service_client.analyze_real_time_learning(classroom_data)
             else:
-                # 默认分析逻辑
-                ai_result = {
-                    "summary": f"针对目标 {request.target_id} 的 {request.analysis_type} 分析已完成",
-                    "insights": ["整体表现呈上升趋势", "核心指标达到预期目标"],
-                    "recommendations": ["建议继续保持当前学习策略", "可以适当增加挑战性内容"]
-                }
+                # 对于其他分析类型，使用智能体管理器
+                agent = agent_manager.get_agent("general_analysis")
+                if agent:
+                    analysis_context = {
+                        "analysis_type": request.analysis_type,
+                        "target_id": request.target_id,
+                        "date_range": request.date_range,
+                        "additional_context": request.additional_context or {},
+                        "user_id": current_user.id,
+                        "db": db
+                    }
+                    ai_result = await agent.analyze(analysis_context)
+                else:
+                    # 默认分析逻辑
+                    ai_result = {
+                        "summary": f"针对目标 {request.target_id} 的 {request.analysis_type} 分析已完成",
+                        "insights": ["整体表现呈上升趋势", "核心指标达到预期目标"],
+                        "recommendations": ["建议继续保持当前学习策略", "可以适当增加挑战性内容"]
+                    }
         
         # 处理AI服务返回的结果
         if isinstance(ai_result, dict):
@@ -693,6 +754,9 @@ async def intelligent_analysis(
         logger.info(f"用户 {current_user.id} 执行了 {request.analysis_type} 分析")
         return ResponseBuilder.success(response_data, "智能分析完成")
         
+    except DeadlineExceededError:
+        logger.warning(f"智能分析超过截止时间({ANALYZE_DEADLINE_SECONDS}秒): 用户 {current_user.id}")
+        raise LLMException("智能分析超时，请稍后重试", ErrorCode.LLM_TIMEOUT)
     except BusinessException:
         raise
     except Exception as e:
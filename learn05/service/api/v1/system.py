@@ -24,6 +24,7 @@ from middleware.exception_handler import (
 )
 from auth import get_current_user, role_required
 from config.database_config import database_health_check, get_database_stats
+from middleware.metrics import get_fleet_http_stats
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -275,16 +276,8 @@ async def get_performance_metrics(
         # 数据库统计
         db_stats = get_database_stats()
         
-        # API统计（这里需要从性能监控中间件获取）
-        api_stats = {
-            "total_requests": 0,
-            "avg_response_time": 0.0,
-            "error_rate": 0.0
-        }
-        
-        # 尝试从请求中获取性能统计
-        if hasattr(request.app.state, 'performance_stats'):
-            api_stats = request.app.state.performance_stats
+        # API统计（启用共享指标段时为全体worker的汇总）
+        api_stats = get_fleet_http_stats()
         
         metrics = PerformanceMetrics(
             timestamp=datetime.now(),
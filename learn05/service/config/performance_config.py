@@ -227,6 +227,9 @@ class MonitoringConfig:
     # 指标收集
     metrics_enabled: bool = field(default_factory=lambda: os.getenv("MONITORING_METRICS", "true").lower() == "true")
     metrics_endpoint: str = field(default_factory=lambda: os.getenv("MONITORING_METRICS_ENDPOINT", "/metrics"))
+    # 多worker共享指标段名称（为空时各worker只导出自身指标）
+    shared_metrics_name: str = field(default_factory=lambda: os.getenv("MONITORING_SHARED_METRICS", ""))
+    shared_metrics_slots: int = field(default_factory=lambda: int(os.getenv("MONITORING_SHARED_METRICS_SLOTS", "16")))
     
     # 健康检查
     health_check_enabled: bool = field(default_factory=lambda: os.getenv("MONITORING_HEALTH_CHECK", "true").lower() == "true")
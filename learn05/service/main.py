@@ -26,6 +26,8 @@ from llm_api import router as llm_router
 # 导入中间件和异常处理
 from middleware.exception_handler import setup_exception_handlers
 from middleware import setup_middleware, get_middleware_manager
+from middleware.metrics import instrument_engine, metrics_response, enable_shared_metrics
+from config.performance_config import get_performance_config
 from models.response import APIResponse, ResponseBuilder
 
 # 导入原有路由（保持兼容性）
@@ -86,6 +88,14 @@ app = FastAPI(
 # 设置异常处理
 setup_exception_handlers(app)
 
+# 多worker部署时各worker写入同一共享指标段，/metrics返回全体worker的汇总值
+_monitoring_config = get_performance_config().monitoring
+if _monitoring_config.shared_metrics_name:
+    enable_shared_metrics(_monitoring_config.shared_metrics_name, _monitoring_config.shared_metrics_slots)
+
+# 数据库语句耗时指标
+instrument_engine(engine)
+
 # 设置所有中间件（包括CORS、性能监控、缓存、限流、压缩等）
 setup_middleware(app, {
     "cors": {
@@ -143,6 +153,11 @@ def health_check():
         }
     )
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus指标抓取端点"""
+    return metrics_response()
+
 @app.get("/api/info")
 def api_info():
     """获取API信息"""
@@ -154,6 +169,7 @@ def api_info():
             "docs": "/docs",
             "redoc": "/redoc",
             "health": "/health",
+            "metrics": "/metrics",
             "api_v1": "/api/v1",
             "llm": "/llm",
             "performance": "/api/performance"
@@ -30,6 +30,7 @@ from .compression_middleware import (
     ContentOptimizationMiddleware,
     setup_compression_middleware
 )
+from .metrics import get_fleet_http_stats
 
 # 尝试导入缓存管理器
 try:
@@ -128,6 +129,9 @@ class MiddlewareManager:
         if self.performance_middleware:
             stats["performance"] = self.performance_middleware.get_stats()
         
+        # 全体worker的汇总（performance只反映处理本次请求的worker）
+        stats["fleet"] = get_fleet_http_stats()
+        
         if self.cache_middleware:
             stats["cache"] = self.cache_middleware.get_cache_stats()
         
@@ -16,6 +16,8 @@ from starlette.responses import JSONResponse
 import asyncio
 from datetime import datetime, timedelta
 
+from .metrics import http_cache_requests_total
+
 # 尝试导入缓存管理器
 try:
     from ..utils.cache_manager import CacheManager
@@ -72,7 +74,8 @@ class CacheMiddleware(BaseHTTPMiddleware):
             "/api/v1/auth/",
             "/api/v1/system/health",
             "/docs",
-            "/openapi.json"
+            "/openapi.json",
+            "/metrics"
         ]
         self.cache_headers = cache_headers
         self.key_generator = CacheKeyGenerator()
@@ -104,11 +107,13 @@ class CacheMiddleware(BaseHTTPMiddleware):
             cached_response = await self.cache_manager.get(cache_key)
             if cached_response:
                 self.cache_stats["hits"] += 1
+                http_cache_requests_total.labels("hit").inc()
                 cache_logger.debug(f"缓存命中: {cache_key}")
                 return self._create_response_from_cache(cached_response, request)
             
             # 缓存未命中，处理请求
             self.cache_stats["misses"] += 1
+            http_cache_requests_total.labels("miss").inc()
             response = await call_next(request)
             
             # 缓存响应（异步）
@@ -124,6 +129,7 @@ class CacheMiddleware(BaseHTTPMiddleware):
             
         except Exception as e:
             self.cache_stats["errors"] += 1
+            http_cache_requests_total.labels("error").inc()
             cache_logger.error(f"缓存操作失败: {e}")
             # 缓存失败时继续正常处理请求
             return await call_next(request)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus指标模块
+
+本模块定义服务端HTTP、响应缓存和数据库指标，并提供/metrics抓取响应。
+指标写入llm组件中的全局指标注册表，与LLM调用指标一并导出；
+多worker部署时启用共享指标段，任一worker的抓取都返回全体worker的汇总值。
+"""
+
+import time
+import logging
+
+from fastapi import Request, Response
+from starlette.routing import Match
+
+# 与LLM模块共用同一个注册表
+from llm.components.metrics_registry import get_registry, CONTENT_TYPE_LATEST
+from llm.components.shared_metrics import SharedMetricsSegment
+
+logger = logging.getLogger(__name__)
+
+registry = get_registry()
+
+# HTTP指标（名称与grafana-dashboard.json一致）
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP请求数", ("method", "handler", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP请求处理耗时（秒）", ("method", "handler")
+)
+http_requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "正在处理的HTTP请求数"
+)
+
+# 响应缓存指标
+http_cache_requests_total = registry.counter(
+    "http_cache_requests_total", "可缓存请求的缓存查询结果", ("result",)
+)
+
+# 数据库指标
+db_query_duration_seconds = registry.histogram(
+    "db_query_duration_seconds", "数据库语句执行耗时（秒）", ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+db_query_errors_total = registry.counter(
+    "db_query_errors_total", "数据库语句执行失败数", ("operation",)
+)
+
+
+def get_route_template(request: Request) -> str:
+    """获取请求匹配的路由模板（如/api/v1/users/{user_id}），避免按实际路径产生过多标签值"""
+    route = request.scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+
+    for route in getattr(request.app, "routes", ()):
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+def _statement_operation(statement: str) -> str:
+    """取SQL语句的首个关键字作为操作类型"""
+    parts = statement.lstrip().split(None, 1)
+    return parts[0].upper() if parts else "UNKNOWN"
+
+
+def instrument_engine(engine):
+    """为SQLAlchemy引擎注册语句耗时与失败统计"""
+    from sqlalchemy import event
+
+    if getattr(engine, "_metrics_instrumented", False):
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_time")
+        if start_times:
+            db_query_duration_seconds.labels(_statement_operation(statement)).observe(
+                time.perf_counter() - start_times.pop()
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+        db_query_errors_total.labels(_statement_operation(exception_context.statement or "")).inc()
+
+    engine._metrics_instrumented = True
+    logger.info("数据库指标已启用")
+
+
+def metrics_response() -> Response:
+    """渲染全部指标，供/metrics端点返回"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE_LATEST)
+
+
+def enable_shared_metrics(name: str, slots: int = 16) -> bool:
+    """启用多worker共享指标段（每个worker进程导入应用时调用一次），失败时退回单进程指标"""
+    if not name or registry.shared_segment is not None:
+        return False
+    try:
+        registry.enable_shared(SharedMetricsSegment(name, slots=slots))
+        return True
+    except Exception as e:
+        logger.error(f"启用共享指标段失败，指标只统计本worker: {e}")
+        return False
+
+
+def get_fleet_http_stats() -> dict:
+    """全体worker的HTTP请求汇总（未启用共享指标段时为本worker）"""
+    total_requests = 0
+    error_requests = 0
+    for (_, _, status), values in registry.values("http_requests_total").items():
+        total_requests += values[0]
+        if status.isdigit() and int(status) >= 400:
+            error_requests += values[0]
+
+    duration_sum = 0.0
+    duration_count = 0
+    for values in registry.values("http_request_duration_seconds").values():
+        duration_sum += values[-2]
+        duration_count += values[-1]
+
+    segment = registry.shared_segment
+    return {
+        "workers": segment.live_workers() if segment is not None else 1,
+        "total_requests": int(total_requests),
+        "error_requests": int(error_requests),
+        "avg_response_time": duration_sum / duration_count if duration_count else 0.0,
+        "error_rate": error_requests / total_requests * 100 if total_requests else 0.0,
+        "in_progress": int(sum(values[0] for values in registry.values("http_requests_in_progress").values()))
+    }
@@ -15,6 +15,13 @@ from starlette.types import ASGIApp
 import json
 from datetime import datetime
 
+from .metrics import (
+    get_route_template,
+    http_requests_total,
+    http_request_duration_seconds,
+    http_requests_in_progress
+)
+
 # 配置日志
 logger = logging.getLogger(__name__)
 performance_logger = logging.getLogger("performance")
@@ -45,6 +52,7 @@ class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
         # 记录请求信息
         await self._log_request_start(request, request_id)
         
+        http_requests_in_progress.inc()
         try:
             # 处理请求
             response = await call_next(request)
@@ -61,6 +69,7 @@ class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
             
             # 更新统计信息
             self._update_stats(process_time, response.status_code)
+            self._export_metrics(request, process_time, response.status_code)
             
             return response
             
@@ -73,9 +82,12 @@ class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
             
             # 更新错误统计
             self._update_stats(process_time, 500, is_error=True)
+            self._export_metrics(request, process_time, 500)
             
             # 重新抛出异常
             raise exc
+        finally:
+            http_requests_in_progress.dec()
     
     async def _log_request_start(self, request: Request, request_id: str):
         """记录请求开始"""
@@ -164,6 +176,12 @@ class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
             (current_avg * (total - 1) + process_time) / total
         )
     
+    def _export_metrics(self, request: Request, process_time: float, status_code: int):
+        """写入Prometheus指标（按路由模板聚合）"""
+        handler = get_route_template(request)
+        http_requests_total.labels(request.method, handler, str(status_code)).inc()
+        http_request_duration_seconds.labels(request.method, handler).observe(process_time)
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
         total = self.request_stats["total_requests"]